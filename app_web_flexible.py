@@ -23,7 +23,7 @@ from indicadores_adulto import (
     PAQUETE_INTEGRAL_ADULTO,
     verificar_cumplimiento_indicador as verificar_indicador_adulto,
     calcular_estadisticas_indicador as calcular_stats_adulto,
-    verificar_paquete_integral as verificar_paquete_adulto
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto
 )
 
 from indicadores_joven import (
@@ -31,7 +31,7 @@ from indicadores_joven import (
     PAQUETE_INTEGRAL_JOVEN,
     verificar_cumplimiento_indicador as verificar_indicador_joven,
     calcular_estadisticas_indicador as calcular_stats_joven,
-    verificar_paquete_integral as verificar_paquete_joven
+    verificar_paquete_integral_lote as verificar_paquete_lote_joven
 )
 
 from indicadores_adulto_mayor import (
@@ -39,9 +39,59 @@ from indicadores_adulto_mayor import (
     PAQUETE_INTEGRAL_ADULTO_MAYOR,
     verificar_cumplimiento_indicador as verificar_indicador_adulto_mayor,
     calcular_estadisticas_indicador as calcular_stats_adulto_mayor,
-    verificar_paquete_integral as verificar_paquete_adulto_mayor
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto_mayor
 )
 
+from motor_cumplimiento import componentes_de_lote
+
+from carga_consolidados import (
+    leer_maestros,
+    renombrar_maestros,
+    HILOS_POR_DEFECTO,
+    ESQUEMA_MAESTRO_PACIENTE,
+    ESQUEMA_MAESTRO_PERSONAL,
+    ESQUEMA_MAESTRO_REGISTRADOR
+)
+
+from descripciones import cargar_descripciones as cargar_descripciones_compiladas
+
+from cache_compartido import estado_registro
+
+from procesamiento import procesar_conjunto
+
+from indice_presencia import construir_indice_presencia, filas_paciente
+
+from indice_filtros import construir_indice_filtros, construir_catalogo_filtros, filtrar_con_indice
+
+from cache_filtros import resultado_filtros, resumir_filtrado, congelar_filtros, actualizar_tamano
+
+from denominadores import denominador_indicador
+
+from tablero_indicadores import (
+    CURSOS_VIDA,
+    AGRUPACIONES,
+    evaluar_tablero,
+    evaluar_por_grupo,
+    matriz_cumplimiento,
+    grupos_de,
+    etiquetar_grupos
+)
+
+from exportacion_json import generar_json_exportacion, generar_json_exportacion_personalizada
+
+from supervision_paciente import (
+    supervisar_paciente_individual,
+    generar_json_correccion_individual,
+    generar_json_paquete_integral,
+    supervisar_lote,
+    resumen_supervision_lote
+)
+
+from auditoria_lab import AGRUPACIONES_AUDITORIA, auditar_lab, filas_con_error, resumen_auditoria
+
+from perfilado import trazar, etapa, resumir_traza, traza_json
+from evaluacion_compartida import sesion_evaluacion, resumir_sesion
+
 # Configuración de la página
 st.set_page_config(
     page_title="HISMINSA - Análisis Flexible",
@@ -119,6 +169,18 @@ if 'ups_dict' not in st.session_state:
     st.session_state.ups_dict = {}
 if 'etnia_dict' not in st.session_state:
     st.session_state.etnia_dict = {}
+if 'indice_presencia' not in st.session_state:
+    st.session_state.indice_presencia = None
+if 'indice_filtros' not in st.session_state:
+    st.session_state.indice_filtros = None
+if 'resultado_filtrado' not in st.session_state:
+    st.session_state.resultado_filtrado = None  # (clave, df_filtrado, índice restringido, resumen) de la última ejecución
+if 'detalle_carga' not in st.session_state:
+    st.session_state.detalle_carga = None
+if 'clave_dataset' not in st.session_state:
+    st.session_state.clave_dataset = None  # huella del conjunto en la caché compartida
+if 'traza_carga' not in st.session_state:
+    st.session_state.traza_carga = None  # etapas medidas en la última carga (sobrevive al st.rerun)
 
 def verificar_archivos_directorio():
     """Verifica qué archivos maestros están disponibles en el directorio"""
@@ -130,164 +192,26 @@ def verificar_archivos_directorio():
     }
     return archivos_estado
 
-def cargar_descripciones(mostrar_mensajes=False):
-    """Carga las descripciones de códigos desde el archivo Excel"""
-    try:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        archivo_desc = os.path.join(base_path, 'codigos_descripcion.xlsx')
-        
-        if not os.path.exists(archivo_desc):
-            if mostrar_mensajes:
-                st.warning(f"No se encontró el archivo: {archivo_desc}")
-            return {}, {}, {}, {}
-        
-        # Primero verificar si tenemos openpyxl instalado
-        try:
-            import openpyxl
-        except ImportError:
-            if mostrar_mensajes:
-                st.error("❌ Necesitas instalar openpyxl: pip install openpyxl")
-            return {}, {}, {}, {}
-        
-        # Leer el archivo Excel y obtener las hojas disponibles
-        try:
-            xl_file = pd.ExcelFile(archivo_desc, engine='openpyxl')
-            hojas_disponibles = xl_file.sheet_names
-            if mostrar_mensajes:
-                st.info(f"📋 Hojas encontradas en el archivo: {', '.join(hojas_disponibles)}")
-        except Exception as e:
-            if mostrar_mensajes:
-                st.error(f"❌ Error al abrir el archivo Excel: {str(e)}")
-            return {}, {}, {}, {}
-        
-        # Leer cada hoja del Excel
-        cie10_dict = {}
-        estab_dict = {}
-        ups_dict = {}
-        etnia_dict = {}
-        
-        # Función para corregir la codificación de caracteres
-        def fix_encoding(text):
-            """Corrige problemas de codificación UTF-8/Latin-1"""
-            if pd.isna(text):
-                return text
-            
-            text = str(text)
-            
-            # Intentar corregir la codificación
-            try:
-                # Si el texto contiene caracteres típicos de mala codificación
-                if 'Ã' in text or 'Â' in text:
-                    # Intentar recodificar de latin-1 a utf-8
-                    try:
-                        text_bytes = text.encode('latin-1', errors='ignore')
-                        text_fixed = text_bytes.decode('utf-8', errors='ignore')
-                        # Solo usar el texto corregido si no tiene caracteres de reemplazo
-                        if '�' not in text_fixed:
-                            return text_fixed
-                    except:
-                        pass
-            except:
-                pass
-            
-            return text
-        
-        # Intentar leer CIE10 - buscar también con nombre alternativo
-        hojas_cie = [h for h in hojas_disponibles if 'CIE' in h.upper()]
-        if hojas_cie:
-            try:
-                df_cie10 = pd.read_excel(archivo_desc, sheet_name=hojas_cie[0], engine='openpyxl')
-                if len(df_cie10.columns) >= 2:
-                    # Limpiar espacios y corregir codificación
-                    codigos = df_cie10.iloc[:, 0].astype(str).str.strip()
-                    descripciones = df_cie10.iloc[:, 1].apply(fix_encoding)
-                    cie10_dict = dict(zip(codigos, descripciones))
-                    if mostrar_mensajes:
-                        st.success(f"✅ CIE10 cargado: {len(cie10_dict)} códigos")
-            except Exception as e:
-                if mostrar_mensajes:
-                    st.warning(f"⚠️ Error al leer hoja CIE10: {str(e)}")
-        
-        # Intentar leer Establecimientos - buscar con nombre alternativo
-        hojas_estab = [h for h in hojas_disponibles if 'ESTABLECIMIENTO' in h.upper()]
-        if hojas_estab:
-            try:
-                df_estab = pd.read_excel(archivo_desc, sheet_name=hojas_estab[0], engine='openpyxl')
-                if len(df_estab.columns) >= 2:
-                    # Limpiar espacios y corregir codificación
-                    ids = df_estab.iloc[:, 0].astype(str).str.strip()
-                    nombres = df_estab.iloc[:, 1].apply(fix_encoding)
-                    estab_dict = dict(zip(ids, nombres))
-                    if mostrar_mensajes:
-                        st.success(f"✅ Establecimientos cargado: {len(estab_dict)} registros")
-            except Exception as e:
-                if mostrar_mensajes:
-                    st.warning(f"⚠️ Error al leer hoja Establecimientos: {str(e)}")
-        
-        # Intentar leer UPS - buscar con nombre alternativo
-        hojas_ups = [h for h in hojas_disponibles if 'UPS' in h.upper()]
-        if hojas_ups:
-            try:
-                df_ups = pd.read_excel(archivo_desc, sheet_name=hojas_ups[0], engine='openpyxl')
-                if len(df_ups.columns) >= 2:
-                    # Limpiar espacios y corregir codificación
-                    ids = df_ups.iloc[:, 0].astype(str).str.strip()
-                    descripciones = df_ups.iloc[:, 1].apply(fix_encoding)
-                    ups_dict = dict(zip(ids, descripciones))
-                    if mostrar_mensajes:
-                        st.success(f"✅ UPS cargado: {len(ups_dict)} servicios")
-            except Exception as e:
-                if mostrar_mensajes:
-                    st.warning(f"⚠️ Error al leer hoja UPS: {str(e)}")
-        
-        # Intentar leer Etnias - buscar con nombre alternativo
-        hojas_etnia = [h for h in hojas_disponibles if 'ETNIA' in h.upper()]
-        if hojas_etnia:
-            try:
-                df_etnia = pd.read_excel(archivo_desc, sheet_name=hojas_etnia[0], engine='openpyxl')
-                if len(df_etnia.columns) >= 2:
-                    # Convertir a int solo si es posible
-                    try:
-                        ids = df_etnia.iloc[:, 0].astype(int)
-                        descripciones = df_etnia.iloc[:, 1].apply(fix_encoding)
-                        etnia_dict = dict(zip(ids, descripciones))
-                    except:
-                        ids = df_etnia.iloc[:, 0].astype(str).str.strip()
-                        descripciones = df_etnia.iloc[:, 1].apply(fix_encoding)
-                        etnia_dict = dict(zip(ids, descripciones))
-                    if mostrar_mensajes:
-                        st.success(f"✅ Etnias cargado: {len(etnia_dict)} etnias")
-            except Exception as e:
-                if mostrar_mensajes:
-                    st.warning(f"⚠️ Error al leer hoja Etnias: {str(e)}")
-        
-        return cie10_dict, estab_dict, ups_dict, etnia_dict
-        
-    except Exception as e:
-        if mostrar_mensajes:
-            st.warning(f"No se pudo cargar el archivo de descripciones: {str(e)}")
-        return {}, {}, {}, {}
+def cargar_descripciones(mostrar_mensajes=False, forzar=False):
+    """Carga las descripciones de códigos (archivo compilado o Excel codigos_descripcion.xlsx)"""
+    diccionarios, mensajes, origen = cargar_descripciones_compiladas(forzar=forzar)
+    
+    if mostrar_mensajes:
+        for nivel, texto in mensajes:
+            getattr(st, nivel)(texto)
+        if origen != 'excel':
+            st.success(f"⚡ Descripciones desde caché ({origen}): "
+                       f"{len(diccionarios['cie10'])} CIE10, {len(diccionarios['estab'])} establecimientos, "
+                       f"{len(diccionarios['ups'])} UPS, {len(diccionarios['etnia'])} etnias")
+    
+    return diccionarios['cie10'], diccionarios['estab'], diccionarios['ups'], diccionarios['etnia']
 
-@st.cache_data
+@st.cache_resource
 def cargar_archivos_maestros_directorio():
     """Carga los archivos maestros desde el directorio"""
     try:
         base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        # Cargar archivos maestros
-        df_pacientes = pd.read_csv(os.path.join(base_path, 'MaestroPaciente.csv'), encoding='latin-1')
-        df_personal = pd.read_csv(os.path.join(base_path, 'MaestroPersonal.csv'), encoding='latin-1')
-        df_registradores = pd.read_csv(os.path.join(base_path, 'MaestroRegistrador.csv'), encoding='latin-1')
-        
-        # Renombrar columnas
-        pacientes_cols = {col: f'pac_{col}' for col in df_pacientes.columns if col != 'Id_Paciente'}
-        personal_cols = {col: f'per_{col}' for col in df_personal.columns if col != 'Id_Personal'}
-        registrador_cols = {col: f'reg_{col}' for col in df_registradores.columns if col != 'Id_Registrador'}
-        
-        df_pacientes = df_pacientes.rename(columns=pacientes_cols)
-        df_personal = df_personal.rename(columns=personal_cols)
-        df_registradores = df_registradores.rename(columns=registrador_cols)
-        
+        df_pacientes, df_personal, df_registradores = leer_maestros(base_path)
         return df_pacientes, df_personal, df_registradores, True
     except Exception as e:
         return None, None, None, str(e)
@@ -296,9 +220,12 @@ def procesar_archivos_maestros_subidos(archivo_pacientes, archivo_personal, arch
     """Procesa archivos maestros subidos por el usuario"""
     try:
         # Leer archivos
-        df_pacientes = pd.read_csv(archivo_pacientes, encoding='latin-1') if archivo_pacientes else None
-        df_personal = pd.read_csv(archivo_personal, encoding='latin-1') if archivo_personal else None
-        df_registradores = pd.read_csv(archivo_registradores, encoding='latin-1') if archivo_registradores else None
+        df_pacientes = pd.read_csv(archivo_pacientes, encoding='latin-1',
+                                   dtype=ESQUEMA_MAESTRO_PACIENTE) if archivo_pacientes else None
+        df_personal = pd.read_csv(archivo_personal, encoding='latin-1',
+                                  dtype=ESQUEMA_MAESTRO_PERSONAL) if archivo_personal else None
+        df_registradores = pd.read_csv(archivo_registradores, encoding='latin-1',
+                                       dtype=ESQUEMA_MAESTRO_REGISTRADOR) if archivo_registradores else None
         
         # Si falta algún archivo, cargar del directorio
         if df_pacientes is None or df_personal is None or df_registradores is None:
@@ -311,311 +238,165 @@ def procesar_archivos_maestros_subidos(archivo_pacientes, archivo_personal, arch
                 df_registradores = df_reg_dir
         
         # Renombrar columnas
-        if df_pacientes is not None:
-            pacientes_cols = {col: f'pac_{col}' for col in df_pacientes.columns if col != 'Id_Paciente'}
-            df_pacientes = df_pacientes.rename(columns=pacientes_cols)
-        
-        if df_personal is not None:
-            personal_cols = {col: f'per_{col}' for col in df_personal.columns if col != 'Id_Personal'}
-            df_personal = df_personal.rename(columns=personal_cols)
-        
-        if df_registradores is not None:
-            registrador_cols = {col: f'reg_{col}' for col in df_registradores.columns if col != 'Id_Registrador'}
-            df_registradores = df_registradores.rename(columns=registrador_cols)
+        df_pacientes, df_personal, df_registradores = renombrar_maestros(df_pacientes, df_personal, df_registradores)
         
         return df_pacientes, df_personal, df_registradores, True
     except Exception as e:
         return None, None, None, str(e)
 
-def procesar_consolidados(archivos_subidos, df_pacientes, df_personal, df_registradores, mostrar_mensajes=True):
-    """Procesa múltiples archivos consolidados"""
-    dfs_consolidados = []
-    archivos_procesados = []
-    errores = []
-    
-    for archivo in archivos_subidos:
-        try:
-            # Leer el archivo consolidado
-            df_temp = pd.read_csv(archivo, encoding='latin-1')
-            
-            # Extraer fecha del nombre del archivo si es posible
-            nombre_archivo = archivo.name
-            fecha_archivo = None
-            
-            # Intentar extraer fecha del nombre (formato: consolidado DD-MM-YYYY.csv)
-            import re
-            match = re.search(r'(\d{2}-\d{2}-\d{4})', nombre_archivo)
-            if match:
-                fecha_str = match.group(1)
-                fecha_archivo = pd.to_datetime(fecha_str, format='%d-%m-%Y')
-            
-            # Si tiene columna Fecha_Atencion, usarla; si no, usar la fecha extraída
-            if 'Fecha_Atencion' not in df_temp.columns and fecha_archivo:
-                df_temp['Fecha_Atencion'] = fecha_archivo
-            
-            dfs_consolidados.append(df_temp)
-            archivos_procesados.append(nombre_archivo)
-            
-        except Exception as e:
-            errores.append(f"Error en {archivo.name}: {str(e)}")
-    
-    if not dfs_consolidados:
-        return None, archivos_procesados, errores
-    
-    # Combinar todos los consolidados
-    df_consolidado_total = pd.concat(dfs_consolidados, ignore_index=True)
-    
-    # CORRECCIÓN: Convertir IDs a string para evitar problemas de tipos de datos
-    # Convertir columnas ID a string en el consolidado
-    for col in ['Id_Paciente', 'Id_Personal', 'Id_Registrador']:
-        if col in df_consolidado_total.columns:
-            df_consolidado_total[col] = df_consolidado_total[col].astype(str).str.replace('.0', '', regex=False)
-    
-    # Convertir columnas ID a string en los archivos maestros
-    df_pacientes = df_pacientes.copy()
-    df_personal = df_personal.copy()
-    df_registradores = df_registradores.copy()
-    
-    df_pacientes['Id_Paciente'] = df_pacientes['Id_Paciente'].astype(str).str.replace('.0', '', regex=False)
-    df_personal['Id_Personal'] = df_personal['Id_Personal'].astype(str).str.replace('.0', '', regex=False)
-    df_registradores['Id_Registrador'] = df_registradores['Id_Registrador'].astype(str).str.replace('.0', '', regex=False)
-    
-    # Unir con los archivos maestros
-    df_completo = df_consolidado_total.copy()
-    df_completo = pd.merge(df_completo, df_pacientes, on='Id_Paciente', how='left')
-    df_completo = pd.merge(df_completo, df_personal, on='Id_Personal', how='left')
-    df_completo = pd.merge(df_completo, df_registradores, on='Id_Registrador', how='left')
-    
-    # Calcular edad y crear columnas adicionales
-    df_completo['pac_Fecha_Nacimiento'] = pd.to_datetime(df_completo['pac_Fecha_Nacimiento'], errors='coerce')
-    df_completo['Fecha_Atencion'] = pd.to_datetime(df_completo['Fecha_Atencion'], errors='coerce')
-    df_completo['edad_anos'] = ((df_completo['Fecha_Atencion'] - df_completo['pac_Fecha_Nacimiento']).dt.days / 365.25).round(1)
-    
-    # Calcular edad en años, meses y días
-    def calcular_edad_detallada(fecha_nac, fecha_aten):
-        if pd.isna(fecha_nac) or pd.isna(fecha_aten):
-            return "N/A"
-        años = fecha_aten.year - fecha_nac.year
-        meses = fecha_aten.month - fecha_nac.month
-        dias = fecha_aten.day - fecha_nac.day
-        
-        if dias < 0:
-            meses -= 1
-            dias += 30
-        if meses < 0:
-            años -= 1
-            meses += 12
-            
-        return f"{años}a {meses}m {dias}d"
-    
-    df_completo['edad_detallada'] = df_completo.apply(
-        lambda row: calcular_edad_detallada(row['pac_Fecha_Nacimiento'], row['Fecha_Atencion']), 
-        axis=1
-    )
-    
-    df_completo['Paciente_Completo'] = df_completo['pac_Apellido_Paterno_Paciente'].fillna('') + ' ' + \
-                                      df_completo['pac_Apellido_Materno_Paciente'].fillna('') + ', ' + \
-                                      df_completo['pac_Nombres_Paciente'].fillna('')
-    
-    df_completo['Personal_Completo'] = df_completo['per_Apellido_Paterno_Personal'].fillna('') + ' ' + \
-                                      df_completo['per_Apellido_Materno_Personal'].fillna('') + ', ' + \
-                                      df_completo['per_Nombres_Personal'].fillna('')
-    
-    df_completo['Turno_Desc'] = df_completo['Id_Turno'].map({1: 'Mañana', 2: 'Tarde', 3: 'Noche'})
-    
-    # Descripción de condición de establecimiento y servicio
-    condicion_map = {'N': 'Nuevo', 'C': 'Continuador', 'R': 'Reingresante'}
-    df_completo['Condicion_Establecimiento_Desc'] = df_completo['Id_Condicion_Establecimiento'].map(condicion_map)
-    df_completo['Condicion_Servicio_Desc'] = df_completo['Id_Condicion_Servicio'].map(condicion_map)
-    
-    # Formatear fechas
-    df_completo['Fecha_Formato'] = df_completo['Fecha_Atencion'].dt.strftime('%d/%m/%Y')
-    df_completo['Fecha_Nacimiento_Formato'] = df_completo['pac_Fecha_Nacimiento'].dt.strftime('%d/%m/%Y')
-    
-    # Procesar FUR y calcular FPP
-    df_completo['Fecha_Ultima_Regla'] = pd.to_datetime(df_completo['Fecha_Ultima_Regla'], errors='coerce')
-    df_completo['FUR_Formato'] = df_completo['Fecha_Ultima_Regla'].dt.strftime('%d/%m/%Y')
-    
-    # Calcular FPP (Fecha Probable de Parto) = FUR + 280 días
-    df_completo['FPP'] = df_completo['Fecha_Ultima_Regla'] + pd.Timedelta(days=280)
-    df_completo['FPP_Formato'] = df_completo['FPP'].dt.strftime('%d/%m/%Y')
-    
-    # Formatear fechas de registro y modificación
-    df_completo['Fecha_Registro'] = pd.to_datetime(df_completo['Fecha_Registro'], errors='coerce')
-    df_completo['Fecha_Modificacion'] = pd.to_datetime(df_completo['Fecha_Modificacion'], errors='coerce')
-    df_completo['Fecha_Registro_Formato'] = df_completo['Fecha_Registro'].dt.strftime('%d/%m/%Y %H:%M')
-    df_completo['Fecha_Modificacion_Formato'] = df_completo['Fecha_Modificacion'].dt.strftime('%d/%m/%Y %H:%M')
-    
-    # Formato de Lote-Página-Registro
-    df_completo['Lote_Pag_Reg'] = df_completo['Lote'].astype(str) + '-' + \
-                                   df_completo['Num_Pag'].astype(str) + '-' + \
-                                   df_completo['Num_Reg'].astype(str)
-    
+def procesar_consolidados(archivos_subidos, df_pacientes, df_personal, df_registradores, mostrar_mensajes=True,
+                          df_existente=None, n_hilos=None):
+    """
+    Procesa múltiples archivos consolidados (con caché en disco por archivo).
+    Con df_existente solo se enriquecen los archivos subidos y se agregan a los
+    datos ya cargados, omitiendo atenciones repetidas.
+    Si otra sesión ya procesó el mismo conjunto, se reutiliza su DataFrame
+    (compartido y de solo lectura).
+    El procesamiento está en procesamiento.procesar_conjunto; aquí solo se
+    guarda el estado de la sesión y se muestran los mensajes.
+    """
     # Cargar descripciones desde el archivo Excel (usar caché si ya están cargadas)
     if not st.session_state.descripciones_cargadas:
-        cie10_dict, estab_dict, ups_dict, etnia_dict = cargar_descripciones(mostrar_mensajes=True)
+        cie10_dict, estab_dict, ups_dict, etnia_dict = cargar_descripciones(
+            mostrar_mensajes=True,
+            forzar=st.session_state.get('recompilar_descripciones', False)
+        )
+        st.session_state.recompilar_descripciones = False
         st.session_state.cie10_dict = cie10_dict
         st.session_state.estab_dict = estab_dict
         st.session_state.ups_dict = ups_dict
         st.session_state.etnia_dict = etnia_dict
         st.session_state.descripciones_cargadas = True
-    else:
-        cie10_dict = st.session_state.cie10_dict
-        estab_dict = st.session_state.estab_dict
-        ups_dict = st.session_state.ups_dict
-        etnia_dict = st.session_state.etnia_dict
     
-    # Aplicar descripciones de CIE10
-    if cie10_dict and len(cie10_dict) > 0:
-        # Limpiar espacios y convertir a string
-        df_completo['Codigo_Item_Clean'] = df_completo['Codigo_Item'].astype(str).str.strip().str.upper()
-        
-        # Crear diccionario limpio - ya vienen limpios desde cargar_descripciones
-        cie10_dict_clean = {}
-        for k, v in cie10_dict.items():
-            key_clean = str(k).strip().upper()
-            cie10_dict_clean[key_clean] = str(v)
-        
-        # Aplicar mapeo
-        df_completo['CIE10_Descripcion'] = df_completo['Codigo_Item_Clean'].map(cie10_dict_clean)
-        
-        # Contar cuántos se mapearon exitosamente
-        mapped_count = df_completo['CIE10_Descripcion'].notna().sum()
-        total_count = len(df_completo)
-        unique_codes = df_completo['Codigo_Item_Clean'].dropna().nunique()
-        
-        # Mostrar estadísticas de mapeo
-        if mostrar_mensajes:
-            st.info(f"📊 CIE10: {mapped_count}/{total_count} registros mapeados ({mapped_count/total_count*100:.1f}%), "
-                   f"{unique_codes} códigos únicos")
-        
-        # Si hay muy pocos mapeos, mostrar algunos ejemplos para debug
-        if mapped_count < total_count * 0.5:  # Menos del 50% mapeado
-            sample_codes = list(df_completo['Codigo_Item_Clean'].dropna().unique()[:5])
-            sample_keys = list(cie10_dict_clean.keys())[:5]
-            if mostrar_mensajes:
-                with st.expander("🔍 Ver detalles de mapeo CIE10"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write("**Ejemplos de códigos en datos:**")
-                        for code in sample_codes:
-                            st.text(f"'{code}'")
-                    with col2:
-                        st.write("**Ejemplos en diccionario:**")
-                        for key in sample_keys:
-                            st.text(f"'{key}'")
-        
-        # Rellenar valores faltantes
-        df_completo['CIE10_Descripcion'] = df_completo['CIE10_Descripcion'].fillna('Sin descripción')
-    else:
-        df_completo['CIE10_Descripcion'] = 'Sin archivo de descripciones'
+    descripciones = {
+        'cie10': st.session_state.cie10_dict,
+        'estab': st.session_state.estab_dict,
+        'ups': st.session_state.ups_dict,
+        'etnia': st.session_state.etnia_dict
+    }
     
-    # Aplicar descripciones de Establecimientos
-    if estab_dict and len(estab_dict) > 0:
-        # Convertir ambos a string para el mapeo
-        df_completo['Id_Establecimiento_Str'] = df_completo['Id_Establecimiento'].astype(str).str.strip()
-        
-        # Crear diccionario limpio - ya vienen limpios desde cargar_descripciones
-        estab_dict_clean = {}
-        for k, v in estab_dict.items():
-            key_clean = str(k).strip()
-            estab_dict_clean[key_clean] = str(v)
-        
-        # Aplicar mapeo
-        df_completo['Establecimiento_Nombre'] = df_completo['Id_Establecimiento_Str'].map(estab_dict_clean)
-        
-        # Contar mapeos exitosos
-        mapped_count = df_completo['Establecimiento_Nombre'].notna().sum()
-        total_count = len(df_completo)
-        unique_estab = df_completo['Id_Establecimiento_Str'].dropna().nunique()
-        
-        if mostrar_mensajes:
-            st.info(f"🏥 Establecimientos: {mapped_count}/{total_count} registros mapeados ({mapped_count/total_count*100:.1f}%), "
-                   f"{unique_estab} establecimientos únicos")
-        
-        df_completo['Establecimiento_Nombre'] = df_completo['Establecimiento_Nombre'].fillna('Sin nombre')
-    else:
-        df_completo['Establecimiento_Nombre'] = 'Sin archivo de descripciones'
+    archivos = [(archivo.name, archivo.getvalue()) for archivo in archivos_subidos]
     
-    # Aplicar descripciones de UPS
-    if ups_dict and len(ups_dict) > 0:
-        # Convertir ambos a string para el mapeo
-        df_completo['Id_Ups_Str'] = df_completo['Id_Ups'].astype(str).str.strip()
-        
-        # Crear diccionario limpio - ya vienen limpios desde cargar_descripciones
-        ups_dict_clean = {}
-        for k, v in ups_dict.items():
-            key_clean = str(k).strip()
-            ups_dict_clean[key_clean] = str(v)
-        
-        # Aplicar mapeo
-        df_completo['UPS_Descripcion'] = df_completo['Id_Ups_Str'].map(ups_dict_clean)
-        
-        # Contar mapeos exitosos
-        mapped_count = df_completo['UPS_Descripcion'].notna().sum()
-        total_count = len(df_completo)
-        unique_ups = df_completo['Id_Ups_Str'].dropna().nunique()
-        
-        if mostrar_mensajes:
-            st.info(f"🏪 UPS: {mapped_count}/{total_count} registros mapeados ({mapped_count/total_count*100:.1f}%), "
-                   f"{unique_ups} servicios únicos")
-        
-        df_completo['UPS_Descripcion'] = df_completo['UPS_Descripcion'].fillna('Sin descripción')
-    else:
-        df_completo['UPS_Descripcion'] = 'Sin archivo de descripciones'
+    # Carga, modo agregar, caché compartida e índices (sin interfaz), con su propia traza
+    with etapa('procesar consolidados'), trazar("Carga de consolidados") as traza_carga:
+        resultado = procesar_conjunto(
+            archivos, df_pacientes, df_personal, df_registradores, descripciones,
+            df_existente=df_existente,
+            indice_existente=st.session_state.indice_presencia if df_existente is not None else None,
+            clave_base=st.session_state.clave_dataset if df_existente is not None else None,
+            n_hilos=n_hilos
+        )
+    st.session_state.traza_carga = traza_carga
     
-    # Aplicar descripciones de Etnias
-    if etnia_dict:
-        df_completo['Etnia_Desc'] = df_completo['pac_Id_Etnia'].map(etnia_dict).fillna('No especificado')
-    else:
-        # Usar diccionario básico si no hay archivo
-        etnia_map = {
-            40: 'Mestizo',
-            58: 'Otros'
-        }
-        df_completo['Etnia_Desc'] = df_completo['pac_Id_Etnia'].map(etnia_map).fillna('No especificado')
+    # Detalle por archivo para el expander de resultados (sobrevive al st.rerun)
+    st.session_state.detalle_carga = resultado['detalle_carga']
+    
+    if resultado['df_completo'] is not None:
+        st.session_state.indice_presencia = resultado['indice_presencia']
+        st.session_state.indice_filtros = resultado['indice_filtros']
+        st.session_state.clave_dataset = resultado['clave_dataset']
     
-    return df_completo, archivos_procesados, errores
+    if mostrar_mensajes:
+        mostrar_diagnosticos(resultado)
+    
+    return resultado['df_completo'], resultado['archivos_procesados'], resultado['errores']
+
+def mostrar_diagnosticos(resultado):
+    """Muestra los mensajes de procesar_conjunto y la muestra de mapeo CIE10"""
+    for nivel, texto in resultado['diagnosticos']:
+        getattr(st, nivel)(texto)
+    
+    # Si hay muy pocos mapeos, mostrar algunos ejemplos para debug
+    muestra = resultado['muestra_cie10']
+    if muestra:
+        with st.expander("🔍 Ver detalles de mapeo CIE10"):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**Ejemplos de códigos en datos:**")
+                for code in muestra['codigos']:
+                    st.text(f"'{code}'")
+            with col2:
+                st.write("**Ejemplos en diccionario:**")
+                for key in muestra['claves']:
+                    st.text(f"'{key}'")
 
-def crear_filtros_sidebar(df):
-    """Crea los filtros en la barra lateral"""
+def mostrar_rendimiento(traza_ejecucion):
+    """Expander con tiempo y memoria por etapa de la última carga y de esta ejecución"""
+    trazas = [traza for traza in (st.session_state.traza_carga, traza_ejecucion) if traza and traza['etapas']]
+    
+    with st.expander("⏱️ Rendimiento"):
+        if not trazas:
+            st.caption("No se midieron etapas en esta ejecución")
+            return
+        
+        for traza in trazas:
+            st.markdown(f"**{traza['nombre']}** ({traza['inicio']}): {traza['segundos_total']:.2f} s")
+            df_etapas = pd.DataFrame(resumir_traza(traza))
+            # Sangría según el anidamiento de las etapas
+            df_etapas['etapa'] = [
+                '\u2003' * nivel + nombre for nivel, nombre in zip(df_etapas['nivel'], df_etapas['etapa'])
+            ]
+            df_etapas = df_etapas.drop(columns='nivel').rename(columns={
+                'etapa': 'Etapa', 'llamadas': 'Llamadas', 'segundos': 'Tiempo (s)',
+                'segundos_max': 'Máximo (s)', 'memoria_mb': 'Memoria (MB)', 'porcentaje': '% del total'
+            })
+            st.dataframe(df_etapas, use_container_width=True, hide_index=True)
+            
+            predicados = traza.get('predicados')
+            if predicados and predicados['consultas']:
+                st.markdown(
+                    f"**Predicados compartidos:** {predicados['consultas']} consultas, "
+                    f"{predicados['evaluaciones']} evaluadas sobre los datos, "
+                    f"{predicados['recorridos_ahorrados']} recorridos ahorrados"
+                )
+                df_predicados = pd.DataFrame(predicados['predicados']).rename(columns={
+                    'predicado': 'Predicado', 'consultas': 'Consultas',
+                    'evaluaciones': 'Evaluaciones', 'ahorrados': 'Ahorrados'
+                })
+                st.dataframe(df_predicados, use_container_width=True, hide_index=True)
+        
+        st.caption("Memoria: variación de la memoria residente del proceso durante la etapa. "
+                   "Con varios archivos en paralelo las etapas se superponen y el valor es orientativo.")
+        st.download_button(
+            "📥 Descargar traza (JSON)",
+            data=traza_json(*trazas),
+            file_name=f"traza_rendimiento_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            key="descargar_traza_rendimiento"
+        )
+
+def crear_filtros_sidebar(df, catalogo=None):
+    """Crea los filtros en la barra lateral (opciones del catálogo calculado en la carga)"""
+    if catalogo is None:
+        catalogo = construir_catalogo_filtros(df)
+    
     st.sidebar.header("🔍 Filtros de Búsqueda")
     
     # Filtro por rango de fechas
     st.sidebar.subheader("📅 Rango de Fechas")
-    fechas_unicas = sorted(df['Fecha_Atencion'].dt.date.unique())
+    primera_fecha, ultima_fecha = catalogo['fecha_min'], catalogo['fecha_max']
     
-    if len(fechas_unicas) > 1:
+    if primera_fecha != ultima_fecha:
         fecha_min = st.sidebar.date_input(
             "Fecha inicial:",
-            value=fechas_unicas[0],
-            min_value=fechas_unicas[0],
-            max_value=fechas_unicas[-1]
+            value=primera_fecha,
+            min_value=primera_fecha,
+            max_value=ultima_fecha
         )
         fecha_max = st.sidebar.date_input(
             "Fecha final:",
-            value=fechas_unicas[-1],
-            min_value=fechas_unicas[0],
-            max_value=fechas_unicas[-1]
+            value=ultima_fecha,
+            min_value=primera_fecha,
+            max_value=ultima_fecha
         )
     else:
-        fecha_min = fecha_max = fechas_unicas[0]
+        fecha_min = fecha_max = primera_fecha
         st.sidebar.info(f"Solo hay datos del {fecha_min}")
     
-    # Filtro por establecimiento
-    # Crear diccionario de código -> nombre
-    estab_codigo_nombre = {}
-    for codigo in df['Id_Establecimiento'].unique():
-        # Convertir código a string y limpiar espacios
-        codigo_str = str(codigo).strip()
-        nombre = df[df['Id_Establecimiento'] == codigo]['Establecimiento_Nombre'].iloc[0] if 'Establecimiento_Nombre' in df.columns else 'Sin nombre'
-        estab_codigo_nombre[codigo_str] = f"{codigo_str} - {nombre}"
-    
-    # Crear lista de opciones con formato "código - nombre"
-    establecimientos_display = ['Todos'] + [estab_codigo_nombre[codigo] for codigo in sorted(estab_codigo_nombre.keys())]
+    # Filtro por establecimiento (opciones con formato "código - nombre")
     establecimiento_display = st.sidebar.selectbox(
         "Establecimiento:",
-        establecimientos_display
+        catalogo['establecimientos']
     )
     
     # Extraer el código seleccionado
@@ -652,10 +433,9 @@ def crear_filtros_sidebar(df):
     genero_sel = st.sidebar.selectbox("Género:", generos)
     
     # Filtro por profesional de salud
-    profesionales = ['Todos'] + sorted(df['Personal_Completo'].dropna().unique().tolist())
     profesional_sel = st.sidebar.selectbox(
         "Profesional de Salud:",
-        profesionales,
+        catalogo['profesionales'],
         key="profesional_filter"
     )
     
@@ -672,82 +452,45 @@ def crear_filtros_sidebar(df):
         'profesional': profesional_sel
     }
 
-def aplicar_filtros(df, filtros):
-    """Aplica los filtros seleccionados al dataframe"""
-    df_filtrado = df.copy()
-    
-    # Filtro por fechas
-    df_filtrado = df_filtrado[
-        (df_filtrado['Fecha_Atencion'].dt.date >= filtros['fecha_min'].date()) & 
-        (df_filtrado['Fecha_Atencion'].dt.date <= filtros['fecha_max'].date())
-    ]
-    
-    # Filtro por establecimiento
-    if filtros['establecimiento'] != 'Todos':
-        # Convertir ambos valores a string para comparación
-        df_filtrado = df_filtrado[df_filtrado['Id_Establecimiento'].astype(str).str.strip() == str(filtros['establecimiento']).strip()]
-    
-    # Filtro por edad
-    df_filtrado = df_filtrado[
-        (df_filtrado['edad_anos'] >= filtros['edad_min']) & 
-        (df_filtrado['edad_anos'] <= filtros['edad_max'])
-    ]
-    
-    # Filtro por DNI
-    if filtros['dni']:
-        df_filtrado = df_filtrado[df_filtrado['pac_Numero_Documento'] == filtros['dni']]
-    
-    # Filtro por código
-    if filtros['codigo']:
-        df_filtrado = df_filtrado[
-            df_filtrado['Codigo_Item'].str.contains(filtros['codigo'], case=False, na=False)
-        ]
-    
-    # Filtro por turno
-    if filtros['turno'] != 'Todos':
-        df_filtrado = df_filtrado[df_filtrado['Turno_Desc'] == filtros['turno']]
-    
-    # Filtro por género
-    if filtros['genero'] != 'Todos':
-        df_filtrado = df_filtrado[df_filtrado['pac_Genero'] == filtros['genero']]
-    
-    # Filtro por profesional
-    if filtros['profesional'] != 'Todos':
-        df_filtrado = df_filtrado[df_filtrado['Personal_Completo'] == filtros['profesional']]
-    
-    return df_filtrado
+def aplicar_filtros(df, filtros, indice=None):
+    """
+    Aplica los filtros seleccionados al dataframe usando el índice de filtros
+    (se construye si no corresponde a df). Sin filtros efectivos retorna df
+    sin copiar: el resultado es de solo lectura.
+    """
+    return filtrar_con_indice(df, indice, filtros)
 
-def mostrar_metricas(df):
-    """Muestra métricas principales"""
+def mostrar_metricas(df, resumen=None):
+    """Muestra métricas principales (resumen precalculado por resumir_filtrado)"""
+    if resumen is None:
+        resumen = resumir_filtrado(df)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric(
             "Total Atenciones",
-            f"{len(df):,}",
+            f"{resumen['registros']:,}",
             help="Número total de atenciones en el período"
         )
     
     with col2:
         st.metric(
             "Pacientes Únicos",
-            f"{df['Id_Paciente'].nunique():,}",
+            f"{resumen['pacientes']:,}",
             help="Número de pacientes diferentes atendidos"
         )
     
     with col3:
-        dias_datos = df['Fecha_Atencion'].dt.date.nunique()
         st.metric(
             "Días con Datos",
-            f"{dias_datos}",
+            f"{resumen['dias_datos']}",
             help="Cantidad de días diferentes con atenciones"
         )
     
     with col4:
-        promedio_diario = len(df) / dias_datos if dias_datos > 0 else 0
         st.metric(
             "Promedio Diario",
-            f"{promedio_diario:.0f}",
+            f"{resumen['promedio_diario']:.0f}",
             help="Promedio de atenciones por día"
         )
 
@@ -860,7 +603,9 @@ def seccion_carga_archivos():
         col1, col2 = st.columns([2, 1])
         with col1:
             if st.button("🔄 Recargar descripciones", key="reload_desc", type="secondary"):
+                # Volver a leer el Excel y regenerar el archivo compilado
                 st.session_state.descripciones_cargadas = False
+                st.session_state.recompilar_descripciones = True
                 st.rerun()
         
         # Mostrar información de las descripciones cargadas
@@ -946,428 +691,8 @@ def seccion_carga_archivos():
     
     return archivos_consolidados, archivo_pacientes, archivo_personal, archivo_registradores
 
-# ==============================================================================
-# FUNCIONES DE SUPERVISIÓN INDIVIDUAL
-# ==============================================================================
-
-def supervisar_paciente_individual(df, dni, curso_vida):
-    """
-    Realiza una supervisión completa de un paciente individual
-    Retorna un diccionario con toda la información de cumplimiento
-    """
-    df_paciente = df[df['pac_Numero_Documento'] == dni]
-    
-    if df_paciente.empty:
-        return None
-    
-    # Información básica del paciente
-    info_basica = {
-        'dni': dni,
-        'nombre': df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else 'Sin nombre',
-        'edad': df_paciente['edad_anos'].iloc[0],
-        'sexo': df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else 'No especificado',
-        'fecha_nacimiento': df_paciente['Fecha_Nacimiento_Formato'].iloc[0] if 'Fecha_Nacimiento_Formato' in df_paciente.columns else '',
-        'establecimiento': df_paciente['Establecimiento_Nombre'].iloc[0] if 'Establecimiento_Nombre' in df_paciente.columns else '',
-        'total_atenciones': len(df_paciente),
-        'fechas_atencion': sorted(df_paciente['Fecha_Atencion'].unique()) if 'Fecha_Atencion' in df_paciente.columns else []
-    }
-    
-    # Obtener funciones según curso de vida
-    if curso_vida == "Adulto (30-59 años)":
-        indicadores = INDICADORES_ADULTO
-        paquete_info = PAQUETE_INTEGRAL_ADULTO
-        verificar_paquete = verificar_paquete_adulto
-        verificar_indicador = verificar_indicador_adulto
-    elif curso_vida == "Joven (18-29 años)":
-        indicadores = INDICADORES_JOVEN
-        paquete_info = PAQUETE_INTEGRAL_JOVEN
-        verificar_paquete = verificar_paquete_joven
-        verificar_indicador = verificar_indicador_joven
-    else:  # Adulto Mayor
-        indicadores = INDICADORES_ADULTO_MAYOR
-        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
-        verificar_paquete = verificar_paquete_adulto_mayor
-        verificar_indicador = verificar_indicador_adulto_mayor
-    
-    # Verificar paquete integral
-    resultado_paquete = verificar_paquete(df_paciente, dni)
-    
-    # Verificar cada indicador individual
-    resultados_indicadores = {}
-    for key, info in indicadores.items():
-        if key not in ['plan_atencion_elaborado', 'plan_atencion_ejecutado']:
-            resultado = validar_indicador_detallado(df_paciente, key, info, curso_vida)
-            resultados_indicadores[key] = resultado
-    
-    # Calcular métricas generales
-    total_indicadores = len(resultados_indicadores)
-    indicadores_completos = sum(1 for r in resultados_indicadores.values() if r['cumple'])
-    indicadores_parciales = sum(1 for r in resultados_indicadores.values() if r['parcial'])
-    indicadores_faltantes = total_indicadores - indicadores_completos - indicadores_parciales
-    
-    # Detectar errores de LAB
-    errores_lab = detectar_errores_lab(df_paciente, indicadores)
-    
-    # Generar recomendaciones
-    recomendaciones = generar_recomendaciones_correccion(
-        df_paciente, resultado_paquete, resultados_indicadores, errores_lab, curso_vida
-    )
-    
-    return {
-        'info_basica': info_basica,
-        'paquete_integral': resultado_paquete,
-        'indicadores': resultados_indicadores,
-        'metricas': {
-            'total_indicadores': total_indicadores,
-            'completos': indicadores_completos,
-            'parciales': indicadores_parciales,
-            'faltantes': indicadores_faltantes,
-            'porcentaje_cumplimiento': round((indicadores_completos / total_indicadores * 100) if total_indicadores > 0 else 0, 1)
-        },
-        'errores_lab': errores_lab,
-        'recomendaciones': recomendaciones
-    }
-
-def validar_indicador_detallado(df_paciente, indicador_key, indicador_info, curso_vida):
-    """
-    Valida un indicador específico y retorna información detallada
-    """
-    resultado = {
-        'nombre': indicador_info['nombre'],
-        'cumple': False,
-        'parcial': False,
-        'codigos_presentes': [],
-        'codigos_faltantes': [],
-        'errores_lab': [],
-        'observaciones': []
-    }
-    
-    # Obtener códigos presentes del paciente
-    codigos_paciente = set(df_paciente['Codigo_Item'].unique())
-    
-    # Verificar según tipo de indicador
-    if 'reglas' in indicador_info:
-        if isinstance(indicador_info['reglas'], list):
-            # Indicador con múltiples reglas
-            for regla in indicador_info['reglas']:
-                codigo = regla['codigo']
-                df_codigo = df_paciente[df_paciente['Codigo_Item'] == codigo]
-                
-                if not df_codigo.empty:
-                    # Código presente, verificar LAB
-                    resultado['codigos_presentes'].append({
-                        'codigo': codigo,
-                        'descripcion': regla.get('descripcion', ''),
-                        'tipo_dx': df_codigo['Tipo_Diagnostico'].iloc[0],
-                        'lab': df_codigo['Valor_Lab'].iloc[0] if 'Valor_Lab' in df_codigo.columns else ''
-                    })
-                    
-                    # Validar LAB si aplica
-                    if 'lab_valores' in regla and regla['lab_valores']:
-                        lab_actual = df_codigo['Valor_Lab'].iloc[0] if 'Valor_Lab' in df_codigo.columns else ''
-                        # Manejar NaN como string vacío
-                        if pd.isna(lab_actual):
-                            lab_actual = ''
-                        lab_actual = str(lab_actual)
-                        
-                        # Verificar si el valor actual está en los esperados
-                        if lab_actual not in regla['lab_valores']:
-                            resultado['errores_lab'].append({
-                                'codigo': codigo,
-                                'lab_actual': lab_actual if lab_actual else '(vacío)',
-                                'lab_esperados': regla['lab_valores']
-                            })
-                else:
-                    # Código faltante
-                    resultado['codigos_faltantes'].append({
-                        'codigo': codigo,
-                        'descripcion': regla.get('descripcion', ''),
-                        'tipo_dx': regla.get('tipo_dx', 'D'),
-                        'lab_requerido': regla.get('lab_valores', [])
-                    })
-        else:
-            # Indicador con estructura compleja (ej: tamizaje VIH)
-            resultado['observaciones'].append("Indicador con validación especial")
-    
-    # Determinar estado general
-    if len(resultado['codigos_faltantes']) == 0 and len(resultado['errores_lab']) == 0:
-        resultado['cumple'] = True
-    elif len(resultado['codigos_presentes']) > 0:
-        resultado['parcial'] = True
-    
-    return resultado
-
-def detectar_errores_lab(df_paciente, indicadores):
-    """
-    Detecta errores en valores LAB según las reglas de los indicadores
-    """
-    errores = []
-    
-    for key, info in indicadores.items():
-        if 'reglas' in info and isinstance(info['reglas'], list):
-            for regla in info['reglas']:
-                if 'lab_valores' in regla and regla['lab_valores']:
-                    codigo = regla['codigo']
-                    df_codigo = df_paciente[df_paciente['Codigo_Item'] == codigo]
-                    
-                    if not df_codigo.empty:
-                        lab_actual = df_codigo['Valor_Lab'].iloc[0] if 'Valor_Lab' in df_codigo.columns else ''
-                        # Manejar NaN como string vacío
-                        if pd.isna(lab_actual):
-                            lab_actual = ''
-                        lab_actual = str(lab_actual)
-                        
-                        # Si el valor vacío no está permitido y el actual está vacío o no está en los esperados
-                        if lab_actual not in regla['lab_valores']:
-                            errores.append({
-                                'indicador': info['nombre'],
-                                'indicador_key': key,  # Agregar la clave del indicador
-                                'codigo': codigo,
-                                'descripcion': regla.get('descripcion', ''),
-                                'lab_actual': lab_actual if lab_actual else '(vacío)',
-                                'lab_esperados': regla['lab_valores'],
-                                'lab_descripcion': regla.get('lab_descripcion', '')
-                            })
-    
-    return errores
-
-def generar_recomendaciones_correccion(df_paciente, resultado_paquete, resultados_indicadores, errores_lab, curso_vida):
-    """
-    Genera recomendaciones específicas de corrección con priorización del paquete integral
-    """
-    recomendaciones = []
-    
-    # Definir componentes prioritarios del paquete integral por curso de vida
-    componentes_prioritarios = {
-        "Adulto (30-59 años)": {
-            'Valoración Clínica y Tamizaje Laboratorial': 'valoracion_clinica',
-            'Tamizaje Agudeza Visual': 'agudeza_visual',
-            'Tamizaje Trastornos Depresivos': 'depresion',
-            'Tamizaje Violencia': 'violencia',
-            'Tamizaje VIH': 'vih',
-            'Evaluación Oral Completa': 'eval_oral',
-            'Tamizaje Alcohol y Drogas': 'alcohol_drogas'
-        },
-        "Joven (18-29 años)": {
-            'Valoración Clínica y Factores de Riesgo': 'valoracion_clinica',
-            'Tamizaje Violencia Intrafamiliar': 'violencia',
-            'Salud Sexual y Reproductiva': 'salud_sexual',
-            'Tamizaje VIH/ITS': 'vih',
-            'Evaluación Oral': 'eval_oral',
-            'Salud Mental': 'salud_mental'
-        },
-        "Adulto Mayor (60+ años)": {
-            'Valoración Clínica Integral': 'valoracion_clinica',
-            'Evaluación Funcional': 'evaluacion_funcional',
-            'Tamizaje Depresión Geriátrica': 'depresion',
-            'Tamizaje Deterioro Cognitivo': 'deterioro_cognitivo',
-            'Valoración Nutricional': 'valoracion_nutricional',
-            'Prevención de Caídas': 'prevencion_caidas'
-        }
-    }
-    
-    componentes_curso = componentes_prioritarios.get(curso_vida, {})
-    
-    # PRIMERO: Componentes del paquete integral completamente faltantes
-    for componente, cumple in resultado_paquete['componentes'].items():
-        if not cumple and componente in componentes_curso:
-            indicador_key = componentes_curso[componente]
-            if indicador_key in resultados_indicadores:
-                resultado_ind = resultados_indicadores[indicador_key]
-                # Si no tiene ningún código registrado
-                if not resultado_ind.get('codigos_presentes', []):
-                    for codigo_faltante in resultado_ind['codigos_faltantes']:
-                        recomendaciones.append({
-                            'tipo': 'paquete_integral_faltante',
-                            'prioridad': 'muy_alta',
-                            'componente': componente,
-                            'indicador': resultado_ind['nombre'],
-                            'codigo': codigo_faltante['codigo'],
-                            'descripcion': codigo_faltante['descripcion'],
-                            'mensaje': f"🚨 PAQUETE INTEGRAL - {componente}: Agregar {codigo_faltante['codigo']} - {codigo_faltante['descripcion']}",
-                            'es_paquete_integral': True
-                        })
-    
-    # SEGUNDO: Componentes del paquete integral parcialmente completos
-    for componente, cumple in resultado_paquete['componentes'].items():
-        if not cumple and componente in componentes_curso:
-            indicador_key = componentes_curso[componente]
-            if indicador_key in resultados_indicadores:
-                resultado_ind = resultados_indicadores[indicador_key]
-                # Si tiene algunos códigos pero faltan otros
-                if resultado_ind['parcial'] and resultado_ind.get('codigos_presentes', []):
-                    for codigo_faltante in resultado_ind['codigos_faltantes']:
-                        recomendaciones.append({
-                            'tipo': 'paquete_integral_parcial',
-                            'prioridad': 'alta',
-                            'componente': componente,
-                            'indicador': resultado_ind['nombre'],
-                            'codigo': codigo_faltante['codigo'],
-                            'descripcion': codigo_faltante['descripcion'],
-                            'mensaje': f"⚠️ PAQUETE INTEGRAL (Parcial) - {componente}: Completar {codigo_faltante['codigo']}",
-                            'es_paquete_integral': True
-                        })
-    
-    # TERCERO: Errores de LAB en componentes del paquete
-    for error in errores_lab:
-        es_paquete = False
-        for componente, indicador_key in componentes_curso.items():
-            if error.get('indicador_key') == indicador_key:
-                es_paquete = True
-                recomendaciones.append({
-                    'tipo': 'error_lab_paquete',
-                    'prioridad': 'alta',
-                    'componente': componente,
-                    'indicador': error['indicador'],
-                    'codigo': error['codigo'],
-                    'lab_actual': error['lab_actual'],
-                    'lab_esperados': error['lab_esperados'],
-                    'mensaje': f"🔧 PAQUETE INTEGRAL - Corregir LAB de {error['codigo']}: actual '{error['lab_actual']}', esperado: {', '.join(error['lab_esperados'])}",
-                    'es_paquete_integral': True
-                })
-                break
-    
-    # CUARTO: Otros indicadores NO prioritarios
-    indicadores_paquete = list(componentes_curso.values())
-    for key, resultado in resultados_indicadores.items():
-        if key not in indicadores_paquete and resultado['parcial']:
-            for codigo_faltante in resultado['codigos_faltantes']:
-                recomendaciones.append({
-                    'tipo': 'codigo_faltante',
-                    'prioridad': 'media',
-                    'indicador': resultado['nombre'],
-                    'codigo': codigo_faltante['codigo'],
-                    'descripcion': codigo_faltante['descripcion'],
-                    'mensaje': f"Agregar código {codigo_faltante['codigo']} para completar {resultado['nombre']}",
-                    'es_paquete_integral': False
-                })
-    
-    # QUINTO: Errores de LAB NO prioritarios
-    for error in errores_lab:
-        es_paquete = any(error.get('indicador_key') == ind_key for ind_key in indicadores_paquete)
-        if not es_paquete:
-            recomendaciones.append({
-                'tipo': 'error_lab',
-                'prioridad': 'media',
-                'indicador': error['indicador'],
-                'codigo': error['codigo'],
-                'lab_actual': error['lab_actual'],
-                'lab_esperados': error['lab_esperados'],
-                'mensaje': f"Corregir LAB de {error['codigo']}: actual '{error['lab_actual']}', esperado: {', '.join(error['lab_esperados'])}",
-                'es_paquete_integral': False
-            })
-    
-    # Ordenar por prioridad
-    prioridad_orden = {'muy_alta': 0, 'alta': 1, 'media': 2, 'baja': 3}
-    recomendaciones.sort(key=lambda x: prioridad_orden.get(x['prioridad'], 4))
-    
-    return recomendaciones
-
-def generar_json_correccion_individual(df_paciente, recomendaciones, curso_vida):
-    """
-    Genera un JSON de corrección para un paciente individual
-    """
-    dni = df_paciente['pac_Numero_Documento'].iloc[0]
-    edad = df_paciente['edad_anos'].iloc[0]
-    nombre = df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else ''
-    sexo = df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else ''
-    
-    diagnosticos = []
-    
-    # Agregar códigos faltantes (todos los tipos)
-    for rec in recomendaciones:
-        if rec['tipo'] in ['codigo_faltante', 'paquete_integral_faltante', 'paquete_integral_parcial']:
-            diag = {
-                "codigo": rec['codigo'],
-                "descripcion": f"{rec['codigo']} - {rec['descripcion']}",
-                "tipo": "D",
-                "tipo_original": "D",
-                "modificado": False
-            }
-            
-            # Agregar LAB si es necesario
-            if rec.get('lab_requerido') and len(rec['lab_requerido']) > 0:
-                # Usar el primer valor no vacío
-                lab_val = next((v for v in rec['lab_requerido'] if v != ""), None)
-                if lab_val:
-                    diag['lab'] = lab_val
-            
-            diagnosticos.append(diag)
-    
-    # Generar estructura JSON
-    json_data = {
-        "fecha_exportacion": datetime.now().isoformat() + 'Z',
-        "dia_his": str(datetime.now().day),
-        "fecha_atencion": datetime.now().strftime("%Y-%m-%d"),
-        "total_pacientes": 1,
-        "cambios_realizados": 0,
-        "tipo_correccion": "supervision_individual",
-        "pacientes": [{
-            "dni": dni,
-            "nombre": nombre,
-            "edad": str(edad),
-            "sexo": sexo,
-            "diagnosticos": diagnosticos
-        }]
-    }
-    
-    return json_data
-
-def generar_json_paquete_integral(df_paciente, recomendaciones, curso_vida):
-    """
-    Genera un JSON solo con los códigos del paquete integral prioritario
-    """
-    dni = df_paciente['pac_Numero_Documento'].iloc[0]
-    edad = df_paciente['edad_anos'].iloc[0]
-    nombre = df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else ''
-    sexo = df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else ''
-    
-    diagnosticos = []
-    
-    # Solo códigos del paquete integral
-    for rec in recomendaciones:
-        if rec.get('es_paquete_integral', False) and rec['tipo'] in ['paquete_integral_faltante', 'paquete_integral_parcial']:
-            diag = {
-                "codigo": rec['codigo'],
-                "descripcion": f"{rec['codigo']} - {rec['descripcion']}",
-                "tipo": "D",
-                "tipo_original": "D",
-                "modificado": False,
-                "componente": rec.get('componente', '')
-            }
-            
-            # Agregar LAB si es necesario
-            if rec.get('lab_requerido') and len(rec['lab_requerido']) > 0:
-                diag["lab"] = rec['lab_requerido'][0]
-            
-            diagnosticos.append(diag)
-    
-    json_data = {
-        "tipo_archivo": "correccion_paquete_integral",
-        "version": "2.0",
-        "fecha_generacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "establecimiento": "HOSPITAL/CENTRO",
-        "mes": datetime.now().strftime("%Y-%m"),
-        "dia_his": str(datetime.now().day),
-        "fecha_atencion": datetime.now().strftime("%Y-%m-%d"),
-        "total_pacientes": 1,
-        "cambios_realizados": 0,
-        "tipo_correccion": "paquete_integral_prioritario",
-        "curso_vida": curso_vida,
-        "pacientes": [{
-            "dni": dni,
-            "nombre": nombre,
-            "edad": str(edad),
-            "sexo": sexo,
-            "total_codigos_paquete": len(diagnosticos),
-            "diagnosticos": diagnosticos
-        }]
-    }
-    
-    return json_data
-
-def main():
-    """Función principal de la aplicación"""
+def mostrar_aplicacion():
+    """Secciones de carga de archivos y de análisis"""
     # Título y descripción
     st.title("🏥 Sistema de Análisis Flexible HISMINSA")
     st.markdown("### Análisis de atenciones con carga flexible de archivos")
@@ -1383,6 +708,32 @@ def main():
     # Botón de procesamiento
     if archivos_consolidados:
         st.markdown("---")
+        
+        # Con datos ya cargados se puede agregar solo los consolidados nuevos
+        modo_agregar = False
+        if st.session_state.datos_cargados and st.session_state.df_completo is not None:
+            modo_carga = st.radio(
+                "Modo de carga",
+                ["🔁 Reemplazar datos cargados", "➕ Agregar a los datos cargados"],
+                horizontal=True,
+                help="Agregar procesa solo los archivos subidos y omite las atenciones "
+                     "(Id_Cita/Lote/Num_Pag/Num_Reg) que ya están cargadas"
+            )
+            modo_agregar = modo_carga.startswith("➕")
+        
+        with st.expander("⚙️ Opciones de procesamiento"):
+            n_hilos = st.number_input(
+                "Archivos en paralelo",
+                min_value=1,
+                max_value=32,
+                value=HILOS_POR_DEFECTO,
+                help="Número de consolidados que se leen y enriquecen a la vez"
+            )
+            conjuntos = estado_registro()
+            if conjuntos:
+                st.caption(f"🗄️ Conjuntos compartidos en el servidor: {len(conjuntos)} "
+                           f"({sum(c['mb'] for c in conjuntos):,.0f} MB)")
+        
         col1, col2, col3 = st.columns([2, 1, 2])
         
         with col2:
@@ -1414,7 +765,9 @@ def main():
                         df_pacientes,
                         df_personal,
                         df_registradores,
-                        mostrar_mensajes=True
+                        mostrar_mensajes=True,
+                        df_existente=st.session_state.df_completo if modo_agregar else None,
+                        n_hilos=int(n_hilos)
                     )
                     
                     if df_completo is not None:
@@ -1440,15 +793,44 @@ def main():
     if st.session_state.datos_cargados and st.session_state.df_completo is not None:
         df = st.session_state.df_completo
         
-        # Crear filtros
-        filtros = crear_filtros_sidebar(df)
+        # Resultado de la última carga: tiempo por archivo y advertencias
+        if st.session_state.detalle_carga:
+            detalle_carga = st.session_state.detalle_carga
+            with st.expander(f"📂 Resultado de la carga ({len(detalle_carga['archivos'])} archivos, "
+                             f"{detalle_carga['segundos_total']:.1f} s)"):
+                df_detalle = pd.DataFrame(detalle_carga['archivos'])
+                if not df_detalle.empty:
+                    df_detalle = df_detalle.rename(columns={
+                        'archivo': 'Archivo', 'origen': 'Origen', 'filas': 'Registros', 'segundos': 'Tiempo (s)'
+                    })
+                    st.dataframe(df_detalle, use_container_width=True, hide_index=True)
+                for error in detalle_carga['errores']:
+                    st.warning(error)
         
-        # Aplicar filtros
-        df_filtrado = aplicar_filtros(df, filtros)
+        # Crear filtros
+        if st.session_state.indice_filtros is None:
+            st.session_state.indice_filtros = construir_indice_filtros(df)
+        filtros = crear_filtros_sidebar(df, st.session_state.indice_filtros['catalogo'])
+        
+        # Aplicar filtros. El resultado (filas, índice de presencia restringido a
+        # ellas y resúmenes) se reutiliza mientras no cambien los filtros ni el conjunto
+        if st.session_state.indice_presencia is None:
+            st.session_state.indice_presencia = construir_indice_presencia(df)
+        
+        clave_filtrado = (st.session_state.clave_dataset, id(df), congelar_filtros(filtros))
+        anterior = st.session_state.resultado_filtrado
+        if anterior is not None and anterior[0] == clave_filtrado:
+            _, df_filtrado, indice_filtrado, resumen_filtrado = anterior
+        else:
+            df_filtrado, indice_filtrado, resumen_filtrado = resultado_filtros(
+                df, filtros, st.session_state.clave_dataset,
+                st.session_state.indice_filtros, st.session_state.indice_presencia
+            )
+            st.session_state.resultado_filtrado = (clave_filtrado, df_filtrado, indice_filtrado, resumen_filtrado)
         
         # Mostrar métricas
         st.markdown("---")
-        mostrar_metricas(df_filtrado)
+        mostrar_metricas(df_filtrado, resumen_filtrado)
         
         # Crear tabs de análisis
         tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📊 Tabla", "📈 Gráficos", "📅 Temporal", "📋 Resumen", "🎯 Indicadores", "🔍 Supervisión Individual"])
@@ -1600,7 +982,7 @@ def main():
                 
                 with col1:
                     fig_turno = px.pie(
-                        df_filtrado['Turno_Desc'].value_counts().reset_index(),
+                        resumen_filtrado['turnos'],
                         values='count',
                         names='Turno_Desc',
                         title="Distribución por Turno"
@@ -1609,7 +991,7 @@ def main():
                 
                 with col2:
                     fig_genero = px.bar(
-                        df_filtrado['pac_Genero'].value_counts().reset_index(),
+                        resumen_filtrado['generos'],
                         x='pac_Genero',
                         y='count',
                         title="Distribución por Género"
@@ -1617,9 +999,8 @@ def main():
                     st.plotly_chart(fig_genero, use_container_width=True)
                 
                 # Top diagnósticos
-                top_diagnosticos = df_filtrado['Codigo_Item'].value_counts().head(10).reset_index()
                 fig_diagnosticos = px.bar(
-                    top_diagnosticos,
+                    resumen_filtrado['top_diagnosticos'],
                     x='count',
                     y='Codigo_Item',
                     orientation='h',
@@ -1628,12 +1009,10 @@ def main():
                 st.plotly_chart(fig_diagnosticos, use_container_width=True)
         
         with tab3:
-            if len(df_filtrado) > 0 and df_filtrado['Fecha_Atencion'].dt.date.nunique() > 1:
+            if len(df_filtrado) > 0 and resumen_filtrado['dias_datos'] > 1:
                 # Tendencia temporal
-                df_por_dia = df_filtrado.groupby(df_filtrado['Fecha_Atencion'].dt.date).size().reset_index(name='Atenciones')
-                
                 fig_temporal = px.line(
-                    df_por_dia,
+                    resumen_filtrado['por_dia'],
                     x='Fecha_Atencion',
                     y='Atenciones',
                     title="Tendencia de Atenciones",
@@ -1642,14 +1021,8 @@ def main():
                 st.plotly_chart(fig_temporal, use_container_width=True)
                 
                 # Patrón semanal
-                df_filtrado['Dia_Semana'] = df_filtrado['Fecha_Atencion'].dt.day_name()
-                df_filtrado['Dia_Num'] = df_filtrado['Fecha_Atencion'].dt.dayofweek
-                
-                df_semanal = df_filtrado.groupby(['Dia_Num', 'Dia_Semana']).size().reset_index(name='Atenciones')
-                df_semanal = df_semanal.sort_values('Dia_Num')
-                
                 fig_semanal = px.bar(
-                    df_semanal,
+                    resumen_filtrado['semanal'],
                     x='Dia_Semana',
                     y='Atenciones',
                     title="Patrón Semanal de Atenciones"
@@ -1666,22 +1039,19 @@ def main():
             with col1:
                 st.markdown("**Período:**")
                 if len(df_filtrado) > 0:
-                    fecha_min = df_filtrado['Fecha_Atencion'].min()
-                    fecha_max = df_filtrado['Fecha_Atencion'].max()
-                    st.write(f"Desde: {fecha_min.strftime('%d/%m/%Y')}")
-                    st.write(f"Hasta: {fecha_max.strftime('%d/%m/%Y')}")
+                    st.write(f"Desde: {resumen_filtrado['fecha_min'].strftime('%d/%m/%Y')}")
+                    st.write(f"Hasta: {resumen_filtrado['fecha_max'].strftime('%d/%m/%Y')}")
             
             with col2:
                 st.markdown("**Estadísticas:**")
-                st.write(f"Registros: {len(df_filtrado):,}")
-                st.write(f"Pacientes: {df_filtrado['Id_Paciente'].nunique():,}")
-                st.write(f"Personal: {df_filtrado['Id_Personal'].nunique():,}")
+                st.write(f"Registros: {resumen_filtrado['registros']:,}")
+                st.write(f"Pacientes: {resumen_filtrado['pacientes']:,}")
+                st.write(f"Personal: {resumen_filtrado['personal']:,}")
             
             with col3:
                 st.markdown("**Top Diagnósticos:**")
                 if len(df_filtrado) > 0:
-                    top_5 = df_filtrado['Codigo_Item'].value_counts().head(5)
-                    for codigo, count in top_5.items():
+                    for codigo, count in resumen_filtrado['top_diagnosticos'].head(5).itertuples(index=False):
                         st.write(f"{codigo}: {count}")
         
         with tab5:
@@ -1701,11 +1071,35 @@ def main():
                 # Selector de tipo de supervisión
                 tipo_supervision = st.selectbox(
                     "Tipo de Supervisión:",
-                    ["Indicadores Individuales", "Paquete de Atención Integral"],
+                    ["Indicadores Individuales", "Paquete de Atención Integral", "Tablero de Indicadores",
+                     "Cumplimiento por Grupo", "Auditoría LAB"],
                     key="tipo_supervision"
                 )
             
             with col2:
+                if tipo_supervision in ("Tablero de Indicadores", "Cumplimiento por Grupo"):
+                    alcance_tablero = st.radio(
+                        "Indicadores a evaluar:",
+                        ["Curso de vida seleccionado", "Los tres cursos de vida"],
+                        key="alcance_tablero"
+                    )
+                
+                if tipo_supervision == "Cumplimiento por Grupo":
+                    agrupacion = st.radio(
+                        "Agrupar por:",
+                        list(AGRUPACIONES),
+                        horizontal=True,
+                        key="agrupacion_matriz"
+                    )
+                
+                if tipo_supervision == "Auditoría LAB":
+                    agrupacion_lab = st.radio(
+                        "Agrupar por:",
+                        list(AGRUPACIONES_AUDITORIA),
+                        horizontal=True,
+                        key="agrupacion_auditoria_lab"
+                    )
+                
                 if tipo_supervision == "Indicadores Individuales":
                     # Selector de indicador según curso de vida
                     if curso_vida == "Adulto (30-59 años)":
@@ -1794,7 +1188,8 @@ def main():
                     INDICADORES = INDICADORES_ADULTO_MAYOR
                 
                 # Verificar cumplimiento del indicador
-                df_indicador = verificar_indicador(df_filtrado, indicador_key)
+                with etapa(f"indicador: {indicador_key}"):
+                    df_indicador = verificar_indicador(df_filtrado, indicador_key, indice=indice_filtrado)
                 
                 if df_indicador is not None and not df_indicador.empty:
                     # Mostrar estadísticas
@@ -1802,18 +1197,10 @@ def main():
                     
                     # Calcular estadísticas
                     dni_cumplen = df_indicador['pac_Numero_Documento'].nunique()
-                    dni_total = df_filtrado[
-                        (df_filtrado['edad_anos'] >= INDICADORES[indicador_key]['edad_min']) & 
-                        (df_filtrado['edad_anos'] <= INDICADORES[indicador_key]['edad_max'])
-                    ]['pac_Numero_Documento'].nunique()
-                    
-                    # Aplicar filtro de género si corresponde
-                    if 'genero' in INDICADORES[indicador_key]:
-                        dni_total = df_filtrado[
-                            (df_filtrado['edad_anos'] >= INDICADORES[indicador_key]['edad_min']) & 
-                            (df_filtrado['edad_anos'] <= INDICADORES[indicador_key]['edad_max']) &
-                            (df_filtrado['pac_Genero'] == INDICADORES[indicador_key]['genero'])
-                        ]['pac_Numero_Documento'].nunique()
+                    # Población elegible por banda de edad y género (se calcula una vez por filtrado)
+                    dni_total = denominador_indicador(
+                        df_filtrado, INDICADORES[indicador_key], resumen_filtrado['denominadores']
+                    )
                     
                     porcentaje_cumplimiento = (dni_cumplen / dni_total * 100) if dni_total > 0 else 0
                     
@@ -1990,15 +1377,15 @@ def main():
                 # Seleccionar rango de edad y función según curso de vida
                 if curso_vida == "Adulto (30-59 años)":
                     edad_min, edad_max = 30, 59
-                    verificar_paquete = verificar_paquete_adulto
+                    verificar_paquete_lote = verificar_paquete_lote_adulto
                     grupo_etario = "Adultos"
                 elif curso_vida == "Joven (18-29 años)":
                     edad_min, edad_max = 18, 29
-                    verificar_paquete = verificar_paquete_joven
+                    verificar_paquete_lote = verificar_paquete_lote_joven
                     grupo_etario = "Jóvenes"
                 else:  # Adulto Mayor
                     edad_min, edad_max = 60, 150
-                    verificar_paquete = verificar_paquete_adulto_mayor
+                    verificar_paquete_lote = verificar_paquete_lote_adulto_mayor
                     grupo_etario = "Adultos Mayores"
                 
                 # Filtrar por curso de vida
@@ -2041,80 +1428,75 @@ def main():
                         key="columnas_paquete"
                     )
                     
-                    # Obtener DNIs únicos
-                    dni_curso = df_curso['pac_Numero_Documento'].unique()
-                    
-                    # Calcular cumplimiento del paquete para cada DNI
-                    resultados_paquete = []
+                    # Columnas de la tabla por componente del paquete según curso de vida
+                    if curso_vida == "Adulto (30-59 años)":
+                        mapa_componentes = {
+                            'Val. Clínica': 'Valoración Clínica y Tamizaje Laboratorial',
+                            'Depresión': 'Tamizaje Trastornos Depresivos',
+                            'Violencia': 'Tamizaje Violencia',
+                            'VIH': 'Tamizaje VIH',
+                            'Agudeza Visual': 'Tamizaje Agudeza Visual',
+                            'Eval. Oral': 'Evaluación Oral Completa',
+                            'Alcohol/Drogas': 'Tamizaje Alcohol y Drogas'
+                        }
+                    elif curso_vida == "Joven (18-29 años)":
+                        mapa_componentes = {
+                            'Val. Clínica': 'Valoración Clínica y Factores de Riesgo',
+                            'Violencia': 'Tamizaje Violencia Intrafamiliar',
+                            'Alcohol/Drogas': 'Tamizaje Alcohol y Drogas',
+                            'Depresión': 'Tamizaje Depresión',
+                            'Eval. Nutricional': 'Evaluación Nutricional y Antropométrica',
+                            'Consejería SSR': 'Consejería Salud Sexual y Reproductiva'
+                        }
+                    else:  # Adulto Mayor
+                        mapa_componentes = {
+                            'VACAM': 'VACAM - Valoración Clínica',
+                            'Agudeza Visual': 'Tamizaje Agudeza Visual',
+                            'Salud Mental': 'Tamizaje Integral Salud Mental',
+                            'Eval. Oral': 'Evaluación Oral Completa',
+                            'Vac. Influenza': 'Vacuna Influenza',
+                            'Consejería': 'Consejería Integral',
+                            'Val. Clínica/Lab': 'Valoración Clínica y Laboratorio'
+                        }
                     
                     with st.spinner(f'Analizando paquetes de atención integral para {grupo_etario.lower()}...'):
-                        for dni in dni_curso[:100]:  # Limitar a 100 para evitar demoras
-                            resultado = verificar_paquete(df_curso, dni)
-                            
-                            # Obtener información del paciente
-                            info_paciente = df_curso[df_curso['pac_Numero_Documento'] == dni].iloc[0]
-                            
-                            # Construir registro con información básica primero
-                            registro = {
-                                'DNI': dni,
-                                'Nombre': info_paciente['Paciente_Completo'],
-                                'Fecha Nacimiento': info_paciente.get('Fecha_Nacimiento_Formato', 'N/A'),
-                                'Edad': info_paciente['edad_anos'],
-                                'Género': info_paciente['pac_Genero'],
-                                'Última Atención': df_curso[df_curso['pac_Numero_Documento'] == dni]['Fecha_Formato'].max()
-                            }
-                            
-                            # Agregar columnas seleccionadas
-                            for col in columnas_seleccionadas_paquete:
-                                if col in info_paciente.index:
-                                    registro[columnas_disponibles_paquete[col]] = info_paciente[col]
-                                else:
-                                    # Para otras columnas, obtener el último valor
-                                    ultimo_registro = df_curso[df_curso['pac_Numero_Documento'] == dni].iloc[-1]
-                                    registro[columnas_disponibles_paquete[col]] = ultimo_registro.get(col, 'N/A')
-                            
-                            # Agregar componentes según curso de vida
-                            if curso_vida == "Adulto (30-59 años)":
-                                registro.update({
-                                    'Val. Clínica': '✅' if resultado['componentes'].get('Valoración Clínica y Tamizaje Laboratorial', False) else '❌',
-                                    'Depresión': '✅' if resultado['componentes'].get('Tamizaje Trastornos Depresivos', False) else '❌',
-                                    'Violencia': '✅' if resultado['componentes'].get('Tamizaje Violencia', False) else '❌',
-                                    'VIH': '✅' if resultado['componentes'].get('Tamizaje VIH', False) else '❌',
-                                    'Agudeza Visual': '✅' if resultado['componentes'].get('Tamizaje Agudeza Visual', False) else '❌',
-                                    'Eval. Oral': '✅' if resultado['componentes'].get('Evaluación Oral Completa', False) else '❌',
-                                    'Alcohol/Drogas': '✅' if resultado['componentes'].get('Tamizaje Alcohol y Drogas', False) else '❌'
-                                })
-                            elif curso_vida == "Joven (18-29 años)":
-                                registro.update({
-                                    'Val. Clínica': '✅' if resultado['componentes'].get('Valoración Clínica y Factores de Riesgo', False) else '❌',
-                                    'Violencia': '✅' if resultado['componentes'].get('Tamizaje Violencia Intrafamiliar', False) else '❌',
-                                    'Alcohol/Drogas': '✅' if resultado['componentes'].get('Tamizaje Alcohol y Drogas', False) else '❌',
-                                    'Depresión': '✅' if resultado['componentes'].get('Tamizaje Depresión', False) else '❌',
-                                    'Eval. Nutricional': '✅' if resultado['componentes'].get('Evaluación Nutricional y Antropométrica', False) else '❌',
-                                    'Consejería SSR': '✅' if resultado['componentes'].get('Consejería Salud Sexual y Reproductiva', False) else '❌'
-                                })
-                            else:  # Adulto Mayor
-                                registro.update({
-                                    'VACAM': '✅' if resultado['componentes'].get('VACAM - Valoración Clínica', False) else '❌',
-                                    'Agudeza Visual': '✅' if resultado['componentes'].get('Tamizaje Agudeza Visual', False) else '❌',
-                                    'Salud Mental': '✅' if resultado['componentes'].get('Tamizaje Integral Salud Mental', False) else '❌',
-                                    'Eval. Oral': '✅' if resultado['componentes'].get('Evaluación Oral Completa', False) else '❌',
-                                    'Vac. Influenza': '✅' if resultado['componentes'].get('Vacuna Influenza', False) else '❌',
-                                    'Consejería': '✅' if resultado['componentes'].get('Consejería Integral', False) else '❌',
-                                    'Val. Clínica/Lab': '✅' if resultado['componentes'].get('Valoración Clínica y Laboratorio', False) else '❌'
-                                })
-                            
-                            # Agregar columnas de estado del paquete al final
-                            registro.update({
-                                'N° Componentes': sum(resultado['componentes'].values()),
-                                'Plan Elaborado': '✅' if resultado['plan_elaborado'] else '❌',
-                                'Plan Ejecutado': '✅' if resultado['plan_ejecutado'] else '❌',
-                                'Completo': '✅' if resultado['completo'] else '❌'
-                            })
-                            
-                            resultados_paquete.append(registro)
-                    
-                    df_paquetes = pd.DataFrame(resultados_paquete)
+                        # Paquete de todos los DNIs del curso de vida en una sola pasada
+                        df_lote = verificar_paquete_lote(df_curso, indice_filtrado)
+                        dnis_lote = df_lote['pac_Numero_Documento']
+                        
+                        # Primer registro y última atención de cada paciente
+                        info_pacientes = df_curso.drop_duplicates('pac_Numero_Documento').set_index('pac_Numero_Documento').reindex(dnis_lote)
+                        ultima_atencion = df_curso.groupby('pac_Numero_Documento', sort=False)['Fecha_Formato'].max().reindex(dnis_lote)
+                        
+                        # Construir tabla con información básica primero
+                        df_paquetes = pd.DataFrame({
+                            'DNI': dnis_lote.to_numpy(),
+                            'Nombre': info_pacientes['Paciente_Completo'].to_numpy(),
+                            'Fecha Nacimiento': info_pacientes['Fecha_Nacimiento_Formato'].to_numpy() if 'Fecha_Nacimiento_Formato' in info_pacientes.columns else 'N/A',
+                            'Edad': info_pacientes['edad_anos'].to_numpy(),
+                            'Género': info_pacientes['pac_Genero'].to_numpy(),
+                            'Última Atención': ultima_atencion.to_numpy()
+                        })
+                        
+                        # Agregar columnas seleccionadas
+                        for col in columnas_seleccionadas_paquete:
+                            if col in info_pacientes.columns:
+                                df_paquetes[columnas_disponibles_paquete[col]] = info_pacientes[col].to_numpy()
+                            else:
+                                df_paquetes[columnas_disponibles_paquete[col]] = 'N/A'
+                        
+                        # Agregar componentes según curso de vida
+                        for columna, componente in mapa_componentes.items():
+                            if componente in df_lote.columns:
+                                df_paquetes[columna] = df_lote[componente].map({True: '✅', False: '❌'}).to_numpy()
+                            else:
+                                df_paquetes[columna] = '❌'
+                        
+                        # Agregar columnas de estado del paquete al final
+                        df_paquetes['N° Componentes'] = df_lote[componentes_de_lote(df_lote)].sum(axis=1).to_numpy()
+                        df_paquetes['Plan Elaborado'] = df_lote['plan_elaborado'].map({True: '✅', False: '❌'}).to_numpy()
+                        df_paquetes['Plan Ejecutado'] = df_lote['plan_ejecutado'].map({True: '✅', False: '❌'}).to_numpy()
+                        df_paquetes['Completo'] = df_lote['completo'].map({True: '✅', False: '❌'}).to_numpy()
                     
                     # Calcular número de componentes esperados según curso de vida
                     if curso_vida == "Adulto (30-59 años)":
@@ -2193,7 +1575,7 @@ def main():
                     # Mostrar métricas
                     col1, col2, col3, col4 = st.columns(4)
                     
-                    total_personas = len(dni_curso)
+                    total_personas = len(df_lote)
                     con_plan = len(df_paquetes[df_paquetes['Plan Elaborado'] == '✅'])
                     completos = len(df_paquetes[df_paquetes['Completo'] == '✅'])
                     porcentaje_completo = (completos / total_personas * 100) if total_personas > 0 else 0
@@ -2345,7 +1727,10 @@ def main():
                             
                             with col_exp1:
                                 if st.button("📥 Exportar JSON para Corrección", type="primary", key="btn_export_simple"):
-                                    json_data = generar_json_exportacion(df_filtrado, filtro_paquete, curso_vida)
+                                    json_data = generar_json_exportacion(
+                                        df_filtrado, filtro_paquete, curso_vida, indice_filtrado,
+                                        st.session_state.cie10_dict
+                                    )
                                     
                                     if json_data:
                                         json_str = json.dumps(json_data, indent=2, ensure_ascii=False)
@@ -2561,7 +1946,10 @@ def main():
                                         st.session_state.pacientes_seleccionados,
                                         componentes_seleccionados,
                                         st.session_state.codigos_seleccionados,
-                                        curso_vida
+                                        curso_vida,
+                                        indice_filtrado,
+                                        exportar_solo_faltantes=st.session_state.get('exportar_solo_faltantes', True),
+                                        cie10_dict=st.session_state.cie10_dict
                                     )
                                     
                                     if json_personalizado:
@@ -2651,6 +2039,227 @@ def main():
                 
                 else:
                     st.warning(f"No se encontraron registros de {grupo_etario.lower()} ({edad_min}-{edad_max} años) en el período seleccionado.")
+            
+            elif tipo_supervision == "Tablero de Indicadores":
+                # Todos los indicadores en una sola pasada (se guarda con el resultado del filtrado)
+                st.markdown("### 📊 Tablero de Cumplimiento de Indicadores")
+                
+                cursos_tablero = tuple(CURSOS_VIDA) if alcance_tablero == "Los tres cursos de vida" else (curso_vida,)
+                tableros = resumen_filtrado['tableros']
+                if cursos_tablero not in tableros:
+                    with st.spinner("Evaluando indicadores..."):
+                        tableros[cursos_tablero] = evaluar_tablero(
+                            df_filtrado, cursos_tablero, indice_filtrado, resumen_filtrado['denominadores']
+                        )
+                    actualizar_tamano(resumen_filtrado)
+                df_tablero = tableros[cursos_tablero]
+                
+                if df_tablero.empty:
+                    st.warning("No hay registros en el período seleccionado.")
+                else:
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Indicadores", f"{len(df_tablero)}")
+                    with col2:
+                        st.metric("Satisfactorios", f"{(df_tablero['clasificacion'] == 'Satisfactorio').sum()}")
+                    with col3:
+                        st.metric("Críticos", f"{(df_tablero['clasificacion'] == 'Crítico').sum()}")
+                    with col4:
+                        st.metric("% Promedio", f"{df_tablero['porcentaje'].mean():.1f}%")
+                    
+                    df_mostrar_tablero = df_tablero.drop(columns='clave').rename(columns={
+                        'curso_vida': 'Curso de Vida',
+                        'indicador': 'Indicador',
+                        'numerador': 'Numerador',
+                        'denominador': 'Denominador',
+                        'porcentaje': '% Cumplimiento',
+                        'meta': 'Meta',
+                        'brecha': 'Brecha',
+                        'clasificacion': 'Clasificación'
+                    })
+                    if len(cursos_tablero) == 1:
+                        df_mostrar_tablero = df_mostrar_tablero.drop(columns='Curso de Vida')
+                    
+                    st.dataframe(
+                        df_mostrar_tablero,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "% Cumplimiento": st.column_config.ProgressColumn(
+                                "% Cumplimiento", format="%.1f%%", min_value=0, max_value=100
+                            ),
+                            "Brecha": st.column_config.NumberColumn("Brecha", format="%.1f")
+                        }
+                    )
+                    
+                    csv = df_mostrar_tablero.to_csv(index=False, encoding='latin-1')
+                    st.download_button(
+                        label="📥 Descargar Tablero CSV",
+                        data=csv.encode('latin-1', errors='replace'),
+                        file_name=f'tablero_indicadores_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+                        mime='text/csv'
+                    )
+            
+            elif tipo_supervision == "Cumplimiento por Grupo":
+                # Matrices grupo × indicador en una sola pasada (se guardan con el resultado del filtrado)
+                st.markdown(f"### 🗺️ Cumplimiento por {agrupacion}")
+                
+                cursos_matriz = tuple(CURSOS_VIDA) if alcance_tablero == "Los tres cursos de vida" else (curso_vida,)
+                matrices = resumen_filtrado['matrices']
+                if (agrupacion, cursos_matriz) not in matrices:
+                    with st.spinner("Evaluando indicadores por grupo..."):
+                        df_grupos = evaluar_por_grupo(
+                            df_filtrado, grupos_de(df_filtrado, agrupacion), cursos_matriz, indice_filtrado
+                        )
+                    
+                    # Etiquetas legibles: "código - nombre" del establecimiento y meses como texto
+                    df_grupos = etiquetar_grupos(df_grupos, agrupacion, st.session_state.indice_filtros['catalogo'])
+                    matrices[(agrupacion, cursos_matriz)] = df_grupos
+                    actualizar_tamano(resumen_filtrado)
+                df_grupos = matrices[(agrupacion, cursos_matriz)]
+                
+                if df_grupos.empty:
+                    st.warning("No hay registros en el período seleccionado.")
+                else:
+                    matriz = matriz_cumplimiento(df_grupos)
+                    fig_matriz = px.imshow(
+                        matriz,
+                        color_continuous_scale='RdYlGn',
+                        zmin=0,
+                        zmax=100,
+                        aspect='auto',
+                        text_auto='.0f',
+                        labels={'x': 'Indicador', 'y': agrupacion, 'color': '% Cumplimiento'},
+                        title=f"% de Cumplimiento por {agrupacion} e Indicador"
+                    )
+                    fig_matriz.update_layout(height=max(400, 28 * len(matriz) + 200))
+                    st.plotly_chart(fig_matriz, use_container_width=True)
+                    
+                    df_exportar_grupos = df_grupos.drop(columns='clave').rename(columns={
+                        'grupo': agrupacion,
+                        'curso_vida': 'Curso de Vida',
+                        'indicador': 'Indicador',
+                        'numerador': 'Numerador',
+                        'denominador': 'Denominador',
+                        'porcentaje': '% Cumplimiento',
+                        'meta': 'Meta',
+                        'brecha': 'Brecha',
+                        'clasificacion': 'Clasificación'
+                    })
+                    with st.expander("📋 Detalle (numerador y denominador por grupo)"):
+                        st.dataframe(df_exportar_grupos, use_container_width=True, hide_index=True)
+                    
+                    marca_tiempo = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    col_csv, col_parquet = st.columns(2)
+                    with col_csv:
+                        st.download_button(
+                            label="📥 Descargar CSV",
+                            data=df_exportar_grupos.to_csv(index=False).encode('latin-1', errors='replace'),
+                            file_name=f'cumplimiento_por_{agrupacion.lower()}_{marca_tiempo}.csv',
+                            mime='text/csv',
+                            key="descargar_matriz_csv"
+                        )
+                    with col_parquet:
+                        try:
+                            buffer_parquet = io.BytesIO()
+                            df_exportar_grupos.to_parquet(buffer_parquet, index=False)
+                            st.download_button(
+                                label="📥 Descargar Parquet",
+                                data=buffer_parquet.getvalue(),
+                                file_name=f'cumplimiento_por_{agrupacion.lower()}_{marca_tiempo}.parquet',
+                                mime='application/octet-stream',
+                                key="descargar_matriz_parquet"
+                            )
+                        except ImportError:
+                            st.caption("Para exportar en Parquet instala pyarrow: pip install pyarrow")
+            
+            elif tipo_supervision == "Auditoría LAB":
+                # Valores LAB de todas las filas en una sola pasada (las marcas se guardan con el resultado del filtrado)
+                st.markdown(f"### 🧪 Auditoría de Valores LAB por {agrupacion_lab}")
+                st.caption(
+                    "Cada registro se revisa con las reglas del curso de vida de su edad: si su código "
+                    "tiene valores LAB definidos, el LAB registrado debe ser uno de los permitidos."
+                )
+                
+                if resumen_filtrado.get('auditoria_lab') is None:
+                    with st.spinner("Auditando valores LAB..."):
+                        resumen_filtrado['auditoria_lab'] = auditar_lab(df_filtrado, indice_filtrado)
+                    actualizar_tamano(resumen_filtrado)
+                marcas_lab = resumen_filtrado['auditoria_lab']
+                
+                registros_auditados = int(marcas_lab['auditada'].sum())
+                if registros_auditados == 0:
+                    st.warning("No hay registros con códigos que exijan valores LAB en el período seleccionado.")
+                else:
+                    errores_lab_total = int(marcas_lab['error_lab'].sum())
+                    df_auditoria = resumen_auditoria(df_filtrado, marcas_lab, agrupacion_lab)
+                    
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Registros auditados", f"{registros_auditados:,}")
+                    with col2:
+                        st.metric("Errores LAB", f"{errores_lab_total:,}")
+                    with col3:
+                        st.metric("% Error", f"{errores_lab_total / registros_auditados * 100:.1f}%")
+                    with col4:
+                        st.metric(f"{agrupacion_lab} con errores", f"{(df_auditoria['errores_lab'] > 0).sum()}")
+                    
+                    columnas_grupo = [c for c in AGRUPACIONES_AUDITORIA[agrupacion_lab] if c in df_auditoria.columns]
+                    df_mostrar_auditoria = df_auditoria.rename(columns={
+                        'registros_auditados': 'Registros Auditados',
+                        'errores_lab': 'Errores LAB',
+                        'porcentaje_error': '% Error',
+                        'codigos_con_error': 'Códigos con más errores'
+                    })
+                    
+                    con_errores = df_auditoria[df_auditoria['errores_lab'] > 0].head(20)
+                    if not con_errores.empty:
+                        fig_auditoria = px.bar(
+                            con_errores.assign(grupo=con_errores[columnas_grupo].astype(str).agg(' - '.join, axis=1)),
+                            x='errores_lab',
+                            y='grupo',
+                            orientation='h',
+                            color='porcentaje_error',
+                            color_continuous_scale='Reds',
+                            labels={'errores_lab': 'Errores LAB', 'grupo': agrupacion_lab, 'porcentaje_error': '% Error'},
+                            title=f"{agrupacion_lab} con más errores LAB"
+                        )
+                        fig_auditoria.update_layout(height=max(400, 28 * len(con_errores) + 150), yaxis={'autorange': 'reversed'})
+                        st.plotly_chart(fig_auditoria, use_container_width=True)
+                    
+                    st.dataframe(
+                        df_mostrar_auditoria,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "% Error": st.column_config.NumberColumn("% Error", format="%.2f%%")
+                        }
+                    )
+                    
+                    df_errores_lab = filas_con_error(df_filtrado, marcas_lab)
+                    with st.expander(f"📋 Registros con error LAB ({len(df_errores_lab):,})"):
+                        st.dataframe(df_errores_lab.head(1000), use_container_width=True, hide_index=True)
+                        if len(df_errores_lab) > 1000:
+                            st.caption("Se muestran los primeros 1,000 registros; la descarga incluye todos.")
+                    
+                    marca_tiempo = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    col_resumen, col_registros = st.columns(2)
+                    with col_resumen:
+                        st.download_button(
+                            label=f"📥 Descargar Resumen por {agrupacion_lab} (CSV)",
+                            data=df_mostrar_auditoria.to_csv(index=False).encode('latin-1', errors='replace'),
+                            file_name=f'auditoria_lab_por_{agrupacion_lab.lower()}_{marca_tiempo}.csv',
+                            mime='text/csv',
+                            key="descargar_auditoria_lab"
+                        )
+                    with col_registros:
+                        st.download_button(
+                            label="📥 Descargar Registros con Error (CSV)",
+                            data=df_errores_lab.to_csv(index=False).encode('latin-1', errors='replace'),
+                            file_name=f'errores_lab_{marca_tiempo}.csv',
+                            mime='text/csv',
+                            key="descargar_errores_lab"
+                        )
         
         # Tab 6: Supervisión Individual
         with tab6:
@@ -2720,7 +2329,7 @@ def main():
                     # Realizar supervisión
                     with st.spinner("Analizando datos del paciente..."):
                         resultado_supervision = supervisar_paciente_individual(
-                            df_filtrado, dni_buscar, curso_vida_supervision
+                            df_filtrado, dni_buscar, curso_vida_supervision, indice_filtrado
                         )
                     
                     if resultado_supervision:
@@ -3174,7 +2783,7 @@ def main():
                                     st.markdown("### 📥 Exportar Códigos del Paquete Integral")
                                     
                                     json_paquete = generar_json_paquete_integral(
-                                        df_filtrado[df_filtrado['pac_Numero_Documento'] == dni_buscar],
+                                        filas_paciente(indice_filtrado, df_filtrado, dni_buscar),
                                         resultado_supervision['recomendaciones'],
                                         curso_vida_supervision
                                     )
@@ -3286,7 +2895,7 @@ def main():
                             with col_exp1:
                                 # JSON de corrección solo con códigos faltantes
                                 json_correccion = generar_json_correccion_individual(
-                                    df_filtrado[df_filtrado['pac_Numero_Documento'] == dni_buscar],
+                                    filas_paciente(indice_filtrado, df_filtrado, dni_buscar),
                                     resultado_supervision['recomendaciones'],
                                     curso_vida_supervision
                                 )
@@ -3349,6 +2958,81 @@ RECOMENDACIONES
                 else:
                     st.warning("⚠️ Por favor ingrese un DNI válido de 8 dígitos")
             
+            # Supervisión de todos los pacientes del curso de vida (tabla larga)
+            st.markdown("---")
+            st.markdown("### 📋 Supervisión por Lote")
+            st.caption("La misma verificación de la búsqueda por DNI para todos los pacientes del curso de vida "
+                       "en los datos filtrados: una fila por código de cada indicador y por componente del paquete.")
+            
+            if st.button("📋 Supervisar todos los pacientes", key="btn_supervision_lote"):
+                edad_min_lote, edad_max_lote = {
+                    "Adulto (30-59 años)": (30, 59),
+                    "Joven (18-29 años)": (18, 29),
+                    "Adulto Mayor (60+ años)": (60, 150)
+                }[curso_vida_supervision]
+                df_curso_lote = df_filtrado[
+                    (df_filtrado['edad_anos'] >= edad_min_lote) & (df_filtrado['edad_anos'] <= edad_max_lote)
+                ]
+                barra = st.progress(0.0, text="Preparando supervisión por lote...")
+                tabla_lote = supervisar_lote(
+                    df_curso_lote, curso_vida_supervision, indice_filtrado,
+                    progreso=lambda fraccion, mensaje: barra.progress(fraccion, text=mensaje)
+                )
+                barra.empty()
+                st.session_state.supervision_lote = (clave_filtrado, curso_vida_supervision, tabla_lote)
+            
+            supervision_lote = st.session_state.get('supervision_lote')
+            if supervision_lote and supervision_lote[0] == clave_filtrado and supervision_lote[1] == curso_vida_supervision:
+                tabla_lote = supervision_lote[2]
+                if tabla_lote.empty:
+                    st.warning("No hay pacientes del curso de vida en el período seleccionado.")
+                else:
+                    resumen_lote = resumen_supervision_lote(tabla_lote)
+                    col_l1, col_l2, col_l3, col_l4 = st.columns(4)
+                    with col_l1:
+                        st.metric("Pacientes", f"{resumen_lote['pacientes']:,}")
+                    with col_l2:
+                        st.metric("Paquete completo", f"{resumen_lote['paquete_completo']:,}")
+                    with col_l3:
+                        st.metric("Códigos faltantes", f"{resumen_lote['codigos_faltantes']:,}")
+                    with col_l4:
+                        st.metric("Errores LAB", f"{resumen_lote['errores_lab']:,}")
+                    
+                    col_f1, col_f2, col_f3 = st.columns(3)
+                    with col_f1:
+                        estados_lote = st.multiselect(
+                            "Estado:", sorted(tabla_lote['estado'].unique()),
+                            default=[e for e in ('faltante', 'error_lab') if e in set(tabla_lote['estado'])],
+                            key="estados_lote"
+                        )
+                    with col_f2:
+                        prioridades_lote = st.multiselect(
+                            "Prioridad:", ['muy_alta', 'alta', 'media', 'sin recomendación'], key="prioridades_lote"
+                        )
+                    with col_f3:
+                        indicadores_lote = st.multiselect(
+                            "Indicador:", list(tabla_lote['indicador'].unique()), key="indicadores_lote"
+                        )
+                    
+                    mascara_lote = pd.Series(True, index=tabla_lote.index)
+                    if estados_lote:
+                        mascara_lote &= tabla_lote['estado'].isin(estados_lote)
+                    if prioridades_lote:
+                        mascara_lote &= tabla_lote['prioridad'].replace('', 'sin recomendación').isin(prioridades_lote)
+                    if indicadores_lote:
+                        mascara_lote &= tabla_lote['indicador'].isin(indicadores_lote)
+                    tabla_mostrar = tabla_lote[mascara_lote]
+                    
+                    st.caption(f"{len(tabla_mostrar):,} de {len(tabla_lote):,} filas")
+                    st.dataframe(tabla_mostrar, use_container_width=True, hide_index=True)
+                    st.download_button(
+                        label="📥 Descargar Supervisión por Lote (CSV)",
+                        data=tabla_mostrar.to_csv(index=False).encode('latin-1', errors='replace'),
+                        file_name=f"supervision_lote_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime='text/csv',
+                        key="descargar_supervision_lote"
+                    )
+            
             # Información de ayuda
             with st.expander("ℹ️ Cómo usar la Supervisión Individual", expanded=False):
                 st.markdown("""
@@ -3370,6 +3054,7 @@ RECOMENDACIONES
                 - **Descargar JSON de corrección**: Genera un archivo con solo los códigos faltantes
                 - **Descargar reporte completo**: Informe detallado del estado del paciente
                 - **Ver recomendaciones**: Sugerencias priorizadas para completar el paquete
+                - **Supervisar todos los pacientes**: Tabla con el estado de cada código y componente de todos los pacientes del curso de vida, filtrable y descargable en CSV
                 """)
     
     else:
@@ -3389,8 +3074,9 @@ RECOMENDACIONES
         
         **Nota:** Solo actualiza los archivos maestros si tienes versiones más recientes
         """)
-    
-    # Pie de página
+
+def mostrar_pie_pagina():
+    """Pie de página con el origen de los maestros"""
     st.markdown("---")
     st.markdown(
         f"""<div style='text-align: center; color: #666;'>
@@ -3400,527 +3086,17 @@ RECOMENDACIONES
         unsafe_allow_html=True
     )
 
-# ==============================================================================
-# FUNCIONES DE EXPORTACIÓN JSON PARA AUTOMATIZACIÓN HIS-MINSA
-# ==============================================================================
-
-def obtener_codigos_faltantes_paquete(df_paciente, curso_vida):
-    """
-    Identifica qué códigos le faltan a un paciente para completar su paquete integral
-    Retorna lista de diagnósticos faltantes con formato para JSON
-    """
-    codigos_faltantes = []
-    
-    # Obtener información según curso de vida
-    if curso_vida == "Adulto (30-59 años)":
-        paquete_info = PAQUETE_INTEGRAL_ADULTO
-        verificar_func = verificar_paquete_adulto
-        edad_paciente = df_paciente['edad_anos'].iloc[0]
-    elif curso_vida == "Joven (18-29 años)":
-        paquete_info = PAQUETE_INTEGRAL_JOVEN
-        verificar_func = verificar_paquete_joven
-        edad_paciente = df_paciente['edad_anos'].iloc[0]
-    else:  # Adulto Mayor
-        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
-        verificar_func = verificar_paquete_adulto_mayor
-        edad_paciente = df_paciente['edad_anos'].iloc[0]
-    
-    # Verificar qué tiene y qué le falta
-    dni = df_paciente['pac_Numero_Documento'].iloc[0]
-    resultado_paquete = verificar_func(df_paciente, dni)
-    
-    # Revisar cada componente del paquete
-    for componente in paquete_info['componentes_minimos']:
-        if not resultado_paquete['componentes'].get(componente['componente'], False):
-            # Este componente le falta, obtener los códigos necesarios
-            if 'indicador' in componente:
-                # Buscar el indicador correspondiente
-                if curso_vida == "Adulto (30-59 años)":
-                    indicador_info = INDICADORES_ADULTO.get(componente['indicador'], {})
-                elif curso_vida == "Joven (18-29 años)":
-                    indicador_info = INDICADORES_JOVEN.get(componente['indicador'], {})
-                else:
-                    indicador_info = INDICADORES_ADULTO_MAYOR.get(componente['indicador'], {})
-                
-                # Procesar reglas del indicador
-                if 'reglas' in indicador_info:
-                    reglas = indicador_info['reglas']
-                    
-                    # Manejar diferentes estructuras de reglas
-                    if isinstance(reglas, dict):
-                        # Caso especial: reglas con opciones (ej: agudeza visual)
-                        if 'opcion_a' in reglas:
-                            # Por defecto usar opción A
-                            for codigo_info in reglas['opcion_a'].get('codigos', []):
-                                codigos_faltantes.append(crear_diagnostico_json(codigo_info))
-                    elif isinstance(reglas, list):
-                        # Reglas normales
-                        for regla in reglas:
-                            # Verificar si esta regla específica ya fue cumplida
-                            if not verificar_codigo_existe(df_paciente, regla['codigo']):
-                                # Para valoración clínica de adultos, no incluir Z017 aquí
-                                if curso_vida == "Adulto (30-59 años)" and componente['indicador'] == 'valoracion_clinica_lab':
-                                    # Solo agregar los códigos básicos (Z019, 99199.22, 99401.13)
-                                    # El Z017 se maneja aparte según la edad
-                                    codigos_faltantes.append(crear_diagnostico_json(regla))
-                                elif curso_vida == "Adulto Mayor (60+ años)" and componente['indicador'] == 'valoracion_clinica_lab':
-                                    # Para adulto mayor, laboratorio SIEMPRE obligatorio
-                                    codigos_faltantes.append(crear_diagnostico_json(regla))
-                                else:
-                                    codigos_faltantes.append(crear_diagnostico_json(regla))
-                
-                # Agregar Z017 para adultos 40-59 si es valoración clínica
-                if (componente['indicador'] == 'valoracion_clinica_lab' and 
-                    curso_vida == "Adulto (30-59 años)" and 
-                    edad_paciente >= 40 and edad_paciente <= 59):
-                    if not verificar_codigo_existe(df_paciente, 'Z017'):
-                        codigos_faltantes.append({
-                            "codigo": "Z017",
-                            "descripcion": "Z017 - Tamizaje laboratorial",
-                            "tipo": "D",
-                            "lab": ""
-                        })
-            
-            # Manejo especial para componentes con reglas por edad (paquete adulto)
-            elif 'reglas_30_39' in componente or 'reglas_40_59' in componente:
-                if edad_paciente >= 30 and edad_paciente <= 39 and 'reglas_30_39' in componente:
-                    for regla in componente['reglas_30_39']:
-                        if not verificar_codigo_existe(df_paciente, regla['codigo']):
-                            if 'condicion' in regla and regla['codigo'] == 'Z017':
-                                # Laboratorio condicional
-                                factores_riesgo = regla.get('factores_riesgo', [])
-                                tiene_factores = any(df_paciente['Codigo_Item'].isin(factores_riesgo))
-                                if tiene_factores:
-                                    codigos_faltantes.append(crear_diagnostico_json(regla))
-                            else:
-                                codigos_faltantes.append(crear_diagnostico_json(regla))
-                elif edad_paciente >= 40 and edad_paciente <= 59 and 'reglas_40_59' in componente:
-                    for regla in componente['reglas_40_59']:
-                        if not verificar_codigo_existe(df_paciente, regla['codigo']):
-                            codigos_faltantes.append(crear_diagnostico_json(regla))
-    
-    # Agregar código de plan si no lo tiene
-    if not resultado_paquete['plan_elaborado']:
-        codigos_faltantes.append({
-            "codigo": "99801",
-            "descripcion": "99801 - Plan de Atención Integral Elaborado",
-            "tipo": "D",
-            "lab": "1"
-        })
-    
-    if not resultado_paquete['plan_ejecutado']:
-        codigos_faltantes.append({
-            "codigo": "99801",
-            "descripcion": "99801 - Plan de Atención Integral Ejecutado",
-            "tipo": "D",
-            "lab": "TA"
-        })
-    
-    return codigos_faltantes
-
-def verificar_codigo_existe(df_paciente, codigo):
-    """Verifica si un código ya existe en los registros del paciente"""
-    return not df_paciente[df_paciente['Codigo_Item'] == codigo].empty
-
-def crear_diagnostico_json(regla):
-    """Crea un diagnóstico en formato JSON a partir de una regla"""
-    # Obtener descripción del diccionario CIE10 si está disponible
-    codigo = regla['codigo']
-    descripcion_cie = ""
-    if hasattr(st.session_state, 'cie10_dict') and codigo in st.session_state.cie10_dict:
-        descripcion_cie = st.session_state.cie10_dict[codigo]
-    else:
-        descripcion_cie = regla.get('descripcion', 'Descripción no disponible')
-    
-    diagnostico = {
-        "codigo": codigo,
-        "descripcion": f"{codigo} - {descripcion_cie}",
-        "tipo": regla.get('tipo_dx', 'D')
-    }
-    
-    # Primero verificar si hay un valor 'lab' directo en la regla (como en reglas_30_39, reglas_40_59)
-    if 'lab' in regla:
-        if isinstance(regla['lab'], list):
-            # Si es lista, usar el primer valor
-            diagnostico["lab"] = regla['lab'][0]
-        elif isinstance(regla['lab'], str):
-            diagnostico["lab"] = regla['lab']
-    # Luego verificar lab_valores (estructura de indicadores)
-    elif 'lab_valores' in regla and regla['lab_valores']:
-        if isinstance(regla['lab_valores'], list) and len(regla['lab_valores']) > 0:
-            # Usar el primer valor no vacío
-            lab_val = next((v for v in regla['lab_valores'] if v != ""), None)
-            if lab_val:
-                diagnostico["lab"] = lab_val
-        elif isinstance(regla['lab_valores'], str) and regla['lab_valores']:
-            diagnostico["lab"] = regla['lab_valores']
-    
-    # Casos especiales de LAB según el código
-    if codigo == 'Z019' and 'lab' not in diagnostico:
-        diagnostico["lab"] = "DNT"
-    elif codigo == '99199.22' and 'lab' not in diagnostico:
-        diagnostico["lab"] = "N"  # Normal por defecto
-    elif codigo == '99387' and 'lab' not in diagnostico:
-        diagnostico["lab"] = "AS"  # Autosuficiente por defecto para VACAM
-    elif codigo == '99215.03' and 'lab' not in diagnostico:
-        diagnostico["lab"] = "AS"  # Autosuficiente por defecto para VACAM alternativo
-    elif codigo in ['99209.02', '99209.04'] and 'lab' not in diagnostico:
-        diagnostico["lab"] = "RSM"  # Riesgo de Salud Metabólica por defecto para valoración nutricional
-    elif codigo == '99801':
-        # Plan de atención integral - se maneja en la función principal
-        pass
-    
-    return diagnostico
-
-def generar_json_exportacion(df_filtrado, filtro_estado, curso_vida):
-    """
-    Genera el JSON de exportación para pacientes con paquetes incompletos
-    Compatible con el script de automatización HIS-MINSA
-    """
-    pacientes_json = []
-    
-    # Filtrar según el estado seleccionado
-    if filtro_estado == "Incompletos":
-        # Obtener solo pacientes con paquete incompleto
-        pacientes_procesar = []
-        for dni in df_filtrado['pac_Numero_Documento'].unique():
-            df_dni = df_filtrado[df_filtrado['pac_Numero_Documento'] == dni]
-            if curso_vida == "Adulto (30-59 años)":
-                resultado = verificar_paquete_adulto(df_dni, dni)
-            elif curso_vida == "Joven (18-29 años)":
-                resultado = verificar_paquete_joven(df_dni, dni)
-            else:
-                resultado = verificar_paquete_adulto_mayor(df_dni, dni)
-            
-            if not resultado['completo']:
-                pacientes_procesar.append(dni)
-    elif filtro_estado == "Casi Completos (1-2 faltantes)":
-        # Filtrar por componentes faltantes
-        pacientes_procesar = []
-        # Determinar número total de componentes según curso de vida
-        if curso_vida == "Adulto (30-59 años)":
-            num_componentes_total = 7
-        elif curso_vida == "Joven (18-29 años)":
-            num_componentes_total = 6
-        else:  # Adulto Mayor
-            num_componentes_total = 7
-            
-        for dni in df_filtrado['pac_Numero_Documento'].unique():
-            df_dni = df_filtrado[df_filtrado['pac_Numero_Documento'] == dni]
-            if curso_vida == "Adulto (30-59 años)":
-                resultado = verificar_paquete_adulto(df_dni, dni)
-            elif curso_vida == "Joven (18-29 años)":
-                resultado = verificar_paquete_joven(df_dni, dni)
-            else:
-                resultado = verificar_paquete_adulto_mayor(df_dni, dni)
-            
-            # Calcular componentes completados
-            componentes_completados = sum(resultado['componentes'].values())
-            componentes_faltantes = num_componentes_total - componentes_completados
-            
-            # Si le faltan 1 o 2 componentes
-            if componentes_faltantes in [1, 2] and not resultado['completo']:
-                pacientes_procesar.append(dni)
-    else:
-        return None
-    
-    # Procesar cada paciente
-    for dni in pacientes_procesar[:100]:  # Limitar a 100 por rendimiento
-        df_paciente = df_filtrado[df_filtrado['pac_Numero_Documento'] == dni]
-        info_paciente = df_paciente.iloc[0]
-        
-        # Obtener códigos faltantes
-        codigos_faltantes = obtener_codigos_faltantes_paquete(df_paciente, curso_vida)
-        
-        if codigos_faltantes:
-            # Optimizar códigos antes de agregar
-            codigos_optimizados = optimizar_codigos_exportacion(codigos_faltantes)
-            
-            paciente_json = {
-                "dni": dni,
-                "nombre": info_paciente['Paciente_Completo'],
-                "edad": str(int(info_paciente['edad_anos'])),
-                "sexo": info_paciente['pac_Genero'],
-                "diagnosticos": codigos_optimizados
-            }
-            pacientes_json.append(paciente_json)
-    
-    # Estructura final del JSON
-    fecha_actual = datetime.now()
-    json_exportacion = {
-        "fecha_exportacion": fecha_actual.isoformat(),
-        "dia_his": str(fecha_actual.day),
-        "fecha_atencion": fecha_actual.strftime("%Y-%m-%d"),
-        "curso_vida": curso_vida,
-        "tipo_correccion": "paquete_integral_incompleto",
-        "total_pacientes": len(pacientes_json),
-        "cambios_realizados": 0,
-        "pacientes": pacientes_json
-    }
-    
-    return json_exportacion
-
-def generar_json_exportacion_personalizada(df_filtrado, pacientes_seleccionados, componentes_seleccionados, codigos_seleccionados_dict, curso_vida):
-    """
-    Genera JSON personalizado con selección específica de pacientes y códigos
-    """
-    pacientes_json = []
-    
-    # Obtener configuración de exportación
-    exportar_solo_faltantes = st.session_state.get('exportar_solo_faltantes', True)
-    
-    # Obtener información de referencia según curso de vida
-    if curso_vida == "Adulto (30-59 años)":
-        paquete_info = PAQUETE_INTEGRAL_ADULTO
-        componentes_disponibles = paquete_info['componentes_minimos']
-        indicadores_ref = INDICADORES_ADULTO
-    elif curso_vida == "Joven (18-29 años)":
-        paquete_info = PAQUETE_INTEGRAL_JOVEN
-        componentes_disponibles = paquete_info['componentes_minimos']
-        indicadores_ref = INDICADORES_JOVEN
-    else:
-        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
-        componentes_disponibles = paquete_info['componentes_minimos']
-        indicadores_ref = INDICADORES_ADULTO_MAYOR
-    
-    # Procesar cada paciente seleccionado
-    for dni in pacientes_seleccionados:
-        df_paciente = df_filtrado[df_filtrado['pac_Numero_Documento'] == dni]
-        if df_paciente.empty:
-            continue
-            
-        info_paciente = df_paciente.iloc[0]
-        edad_paciente = info_paciente['edad_anos']
-        
-        # Recolectar códigos para este paciente
-        codigos_paciente = []
-        
-        # Procesar cada componente seleccionado
-        for comp_nombre in componentes_seleccionados:
-            # Saltar el Plan de Atención Integral ya que se maneja por separado
-            if comp_nombre == "Plan de Atención Integral":
-                continue
-                
-            # Encontrar el componente
-            componente = next((c for c in componentes_disponibles if c['componente'] == comp_nombre), None)
-            
-            if componente and 'indicador' in componente:
-                indicador_key = componente['indicador']
-                
-                # Si hay códigos seleccionados específicos para este indicador
-                if indicador_key in codigos_seleccionados_dict and codigos_seleccionados_dict[indicador_key]:
-                    codigos_seleccionados_indicador = codigos_seleccionados_dict[indicador_key]
-                    
-                    # Agregar cada código seleccionado
-                    for codigo_info in codigos_seleccionados_indicador:
-                        # Verificar si debemos incluirlo según la configuración
-                        if exportar_solo_faltantes and verificar_codigo_existe(df_paciente, codigo_info['codigo']):
-                            continue  # Saltar si ya existe y solo queremos faltantes
-                            
-                        # Crear diagnóstico JSON
-                        diagnostico = crear_diagnostico_json(codigo_info['regla'])
-                        
-                        # Aplicar lógica especial para casos específicos
-                        if aplicar_logica_especial_codigo(codigo_info['codigo'], edad_paciente, df_paciente, curso_vida):
-                            codigos_paciente.append(diagnostico)
-                else:
-                    # Si no está en el diccionario o está vacío, incluir todos los códigos del indicador
-                    indicador_info = indicadores_ref.get(indicador_key, {})
-                    if 'reglas' in indicador_info:
-                        reglas = indicador_info['reglas']
-                        
-                        if isinstance(reglas, list):
-                            for regla in reglas:
-                                # Verificar si debemos incluirlo según la configuración
-                                codigo_existe = verificar_codigo_existe(df_paciente, regla['codigo'])
-                                if exportar_solo_faltantes and codigo_existe:
-                                    continue  # Saltar si ya existe y solo queremos faltantes
-                                
-                                # Aplicar lógica especial solo para casos específicos
-                                incluir_codigo = True
-                                
-                                # Caso especial: laboratorio para adultos 30-39
-                                if (regla['codigo'] == 'Z017' and curso_vida == "Adulto (30-59 años)" and 
-                                    edad_paciente >= 30 and edad_paciente <= 39):
-                                    factores_riesgo = ["E65X", "E669", "E6691", "E6692", "E6693", "E6690", 
-                                                     "Z720", "Z721", "Z723", "Z724", "Z783", "Z784"]
-                                    incluir_codigo = any(df_paciente['Codigo_Item'].isin(factores_riesgo))
-                                
-                                if incluir_codigo:
-                                    codigos_paciente.append(crear_diagnostico_json(regla))
-                        
-                        # Agregar laboratorio Z017 para adultos 40-59 si es valoración clínica
-                        if (indicador_key == 'valoracion_clinica_lab' and 
-                            curso_vida == "Adulto (30-59 años)" and 
-                            edad_paciente >= 40 and edad_paciente <= 59):
-                            
-                            # Verificar si necesita Z017
-                            if exportar_solo_faltantes:
-                                if not verificar_codigo_existe(df_paciente, 'Z017'):
-                                    codigos_paciente.append({
-                                        "codigo": "Z017",
-                                        "descripcion": "Z017 - Tamizaje laboratorial",
-                                        "tipo": "D",
-                                        "lab": ""
-                                    })
-                            else:
-                                codigos_paciente.append({
-                                    "codigo": "Z017",
-                                    "descripcion": "Z017 - Tamizaje laboratorial", 
-                                    "tipo": "D",
-                                    "lab": ""
-                                })
-                        
-                        elif isinstance(reglas, dict) and 'opcion_a' in reglas:
-                            # Caso especial de opciones (ej: agudeza visual)
-                            for codigo_info in reglas['opcion_a'].get('codigos', []):
-                                codigo_existe = verificar_codigo_existe(df_paciente, codigo_info['codigo'])
-                                if exportar_solo_faltantes and codigo_existe:
-                                    continue  # Saltar si ya existe y solo queremos faltantes
-                                    
-                                codigos_paciente.append(crear_diagnostico_json(codigo_info))
-            
-            # Manejo especial para componentes con reglas por edad (sin indicador)
-            elif 'reglas_30_39' in componente or 'reglas_40_59' in componente:
-                if edad_paciente >= 30 and edad_paciente <= 39 and 'reglas_30_39' in componente:
-                    for regla in componente['reglas_30_39']:
-                        if not verificar_codigo_existe(df_paciente, regla['codigo']):
-                            if 'condicion' in regla and regla['codigo'] == 'Z017':
-                                # Verificar factores de riesgo
-                                factores_riesgo = regla.get('factores_riesgo', [])
-                                tiene_factores = any(df_paciente['Codigo_Item'].isin(factores_riesgo))
-                                if tiene_factores:
-                                    codigos_paciente.append(crear_diagnostico_json(regla))
-                            else:
-                                codigos_paciente.append(crear_diagnostico_json(regla))
-                elif edad_paciente >= 40 and edad_paciente <= 59 and 'reglas_40_59' in componente:
-                    for regla in componente['reglas_40_59']:
-                        if not verificar_codigo_existe(df_paciente, regla['codigo']):
-                            codigos_paciente.append(crear_diagnostico_json(regla))
-        
-        # Agregar plan de atención si está seleccionado
-        if 'plan_atencion' in codigos_seleccionados_dict:
-            plan_config = codigos_seleccionados_dict['plan_atencion']
-            
-            # Verificar si ya tiene plan elaborado
-            tiene_plan_elaborado = not df_paciente[
-                (df_paciente['Codigo_Item'] == '99801') & 
-                (df_paciente['Valor_Lab'] == '1')
-            ].empty
-            
-            # Verificar si ya tiene plan ejecutado
-            tiene_plan_ejecutado = not df_paciente[
-                (df_paciente['Codigo_Item'] == '99801') & 
-                (df_paciente['Valor_Lab'] == 'TA')
-            ].empty
-            
-            if plan_config.get('elaborado', False):
-                if not exportar_solo_faltantes or not tiene_plan_elaborado:
-                    codigos_paciente.append({
-                        "codigo": "99801",
-                        "descripcion": "99801 - Plan de Atención Integral Elaborado",
-                        "tipo": "D",
-                        "lab": "1"
-                    })
-            
-            if plan_config.get('ejecutado', False):
-                if not exportar_solo_faltantes or not tiene_plan_ejecutado:
-                    codigos_paciente.append({
-                        "codigo": "99801",
-                        "descripcion": "99801 - Plan de Atención Integral Ejecutado",
-                        "tipo": "D",
-                        "lab": "TA"
-                    })
-        
-        # Si hay códigos para este paciente, agregarlo al JSON
-        if codigos_paciente:
-            # Optimizar códigos antes de agregar
-            codigos_optimizados = optimizar_codigos_exportacion(codigos_paciente)
-            
-            paciente_json = {
-                "dni": dni,
-                "nombre": info_paciente['Paciente_Completo'],
-                "edad": str(int(edad_paciente)),
-                "sexo": info_paciente['pac_Genero'],
-                "diagnosticos": codigos_optimizados
-            }
-            pacientes_json.append(paciente_json)
-    
-    # Estructura final del JSON
-    fecha_actual = datetime.now()
-    json_exportacion = {
-        "fecha_exportacion": fecha_actual.isoformat(),
-        "dia_his": str(fecha_actual.day),
-        "fecha_atencion": fecha_actual.strftime("%Y-%m-%d"),
-        "curso_vida": curso_vida,
-        "tipo_correccion": "paquete_integral_personalizado",
-        "modo_exportacion": "seleccion_personalizada",
-        "componentes_incluidos": componentes_seleccionados,
-        "total_pacientes": len(pacientes_json),
-        "total_diagnosticos": sum(len(p['diagnosticos']) for p in pacientes_json),
-        "cambios_realizados": 0,
-        "pacientes": pacientes_json
-    }
-    
-    return json_exportacion
-
-def aplicar_logica_especial_codigo(codigo, edad_paciente, df_paciente, curso_vida):
-    """
-    Aplica lógica especial para determinar si un código debe incluirse
-    basado en edad, factores de riesgo u otras condiciones
-    """
-    # Laboratorio para adultos 30-39 años
-    if codigo == 'Z017' and curso_vida == "Adulto (30-59 años)" and edad_paciente >= 30 and edad_paciente <= 39:
-        # Verificar factores de riesgo
-        factores_riesgo = ["E65X", "E669", "E6691", "E6692", "E6693", "E6690", 
-                         "Z720", "Z721", "Z723", "Z724", "Z783", "Z784"]
-        tiene_factores = any(df_paciente['Codigo_Item'].isin(factores_riesgo))
-        return tiene_factores
-    
-    # Para adultos 40-59 y adultos mayores, laboratorio siempre
-    if codigo == 'Z017' and (
-        (curso_vida == "Adulto (30-59 años)" and edad_paciente >= 40) or
-        curso_vida == "Adulto Mayor (60+ años)"
-    ):
-        return True
-    
-    # Por defecto, incluir el código
-    return True
-
-def optimizar_codigos_exportacion(codigos_list):
+def main():
     """
-    Optimiza la lista de códigos eliminando duplicados y agrupando consejerías
+    Función principal de la aplicación. Cada ejecución del script tiene su
+    traza de rendimiento y su sesión de evaluación: los predicados que
+    comparten indicadores, paquete, exportación y tablero se evalúan una vez.
     """
-    # Eliminar duplicados exactos
-    codigos_unicos = {}
-    for codigo in codigos_list:
-        key = f"{codigo['codigo']}_{codigo.get('lab', '')}"
-        if key not in codigos_unicos:
-            codigos_unicos[key] = codigo
-    
-    # Convertir de vuelta a lista
-    codigos_optimizados = list(codigos_unicos.values())
-    
-    # Identificar códigos de tamizaje de salud mental
-    codigos_salud_mental = ['96150.01', '96150.02', '96150.03', '96150.04', '96150.07']
-    consejerias_salud_mental = ['99402.01', '99402.09']
-    
-    # Verificar si hay tamizajes de salud mental
-    tiene_tamizajes_sm = any(c['codigo'] in codigos_salud_mental for c in codigos_optimizados)
-    
-    if tiene_tamizajes_sm:
-        # Eliminar todas las consejerías de salud mental existentes
-        codigos_optimizados = [c for c in codigos_optimizados if c['codigo'] not in consejerias_salud_mental]
-        
-        # Agregar una sola consejería de salud mental (99402.09)
-        codigos_optimizados.append({
-            "codigo": "99402.09",
-            "descripcion": "99402.09 - Consejería en salud mental",
-            "tipo": "D",
-            "lab": ""
-        })
-    
-    return codigos_optimizados
+    with trazar("Ejecución") as traza, sesion_evaluacion() as sesion:
+        mostrar_aplicacion()
+    traza['predicados'] = resumir_sesion(sesion)
+    mostrar_rendimiento(traza)
+    mostrar_pie_pagina()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
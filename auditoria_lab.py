@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auditoría de Valores LAB de Todo el Conjunto
+Sistema HISMINSA - Supervisión de Indicadores
+
+detectar_errores_lab revisa un paciente y solo el primer registro de cada
+código. La auditoría revisa todas las filas a la vez: cada fila pertenece al
+curso de vida de su edad y, si su código tiene valores LAB definidos en las
+reglas de ese curso, el Valor_Lab debe estar entre los permitidos (la unión
+de los valores de todas las reglas del código; "" permite el LAB vacío).
+
+La regla se evalúa sobre las claves distintas (código, tipo_dx, LAB) del
+índice de presencia y cada fila toma su resultado con un solo acceso por
+posición (curso de la fila, clave de la fila): no hay recorridos por
+paciente ni por regla. Los errores se resumen por establecimiento,
+profesional o registrador.
+"""
+
+import numpy as np
+import pandas as pd
+
+from indicadores_adulto import INDICADORES_ADULTO
+from indicadores_joven import INDICADORES_JOVEN
+from indicadores_adulto_mayor import INDICADORES_ADULTO_MAYOR
+from indice_presencia import construir_indice_presencia, restringir_indice
+from perfilado import perfilar
+
+# Curso de vida -> (indicadores, edad mínima, edad máxima); el mismo rango de la supervisión
+CURSOS_AUDITORIA = {
+    "Joven (18-29 años)": (INDICADORES_JOVEN, 18, 29),
+    "Adulto (30-59 años)": (INDICADORES_ADULTO, 30, 59),
+    "Adulto Mayor (60+ años)": (INDICADORES_ADULTO_MAYOR, 60, 150)
+}
+
+# Agrupación -> columnas del grupo (se usan las que existan en el DataFrame)
+AGRUPACIONES_AUDITORIA = {
+    'Establecimiento': ['Id_Establecimiento', 'Establecimiento_Nombre'],
+    'Profesional': ['Id_Personal', 'Personal_Completo'],
+    'Registrador': ['Id_Registrador', 'reg_Nombres_Registrador']
+}
+
+# Columnas de las filas con error (las que existan)
+COLUMNAS_ERRORES_LAB = [
+    'Fecha_Atencion', 'pac_Numero_Documento', 'Paciente_Completo', 'edad_anos',
+    'Id_Establecimiento', 'Establecimiento_Nombre', 'Personal_Completo', 'Id_Registrador',
+    'Codigo_Item', 'Tipo_Diagnostico', 'Valor_Lab'
+]
+
+
+def reglas_lab(indicadores):
+    """
+    Tabla de reglas de LAB de un curso de vida: {codigo: (valores permitidos,
+    indicadores)} con la unión de los lab_valores de todas sus reglas.
+    """
+    reglas = {}
+    for key, info in indicadores.items():
+        if not isinstance(info.get('reglas'), list):
+            continue
+        for regla in info['reglas']:
+            if not regla.get('lab_valores'):
+                continue
+            permitidos, claves = reglas.setdefault(regla['codigo'], ({}, []))
+            permitidos.update(dict.fromkeys(str(valor) for valor in regla['lab_valores']))
+            if key not in claves:
+                claves.append(key)
+    return {
+        codigo: (tuple(permitidos), claves)
+        for codigo, (permitidos, claves) in reglas.items()
+    }
+
+
+# Reglas de LAB de cada curso de vida (se arman una sola vez al importar)
+REGLAS_LAB = {curso: reglas_lab(indicadores) for curso, (indicadores, _, _) in CURSOS_AUDITORIA.items()}
+
+
+def _evaluar_claves(claves):
+    """
+    Matrices curso × clave: ¿la clave tiene código con reglas de LAB?, ¿su LAB
+    está fuera de los permitidos? y el texto de los valores esperados.
+    """
+    codigos = claves['Codigo_Item'].to_numpy(dtype=object)
+    labs = np.array(['' if pd.isna(v) else str(v) for v in claves['Valor_Lab'].to_numpy(dtype=object)], dtype=object)
+
+    auditada = np.zeros((len(CURSOS_AUDITORIA), len(claves)), dtype=bool)
+    error = np.zeros((len(CURSOS_AUDITORIA), len(claves)), dtype=bool)
+    esperados = np.full((len(CURSOS_AUDITORIA), len(claves)), '', dtype=object)
+    for i, curso in enumerate(CURSOS_AUDITORIA):
+        for codigo, (permitidos, _) in REGLAS_LAB[curso].items():
+            del_codigo = codigos == codigo
+            auditada[i] |= del_codigo
+            error[i] |= del_codigo & ~np.isin(labs, permitidos)
+            esperados[i, del_codigo] = ', '.join(v if v else '(vacío)' for v in permitidos)
+    return auditada, error, esperados
+
+
+def curso_por_fila(df):
+    """Posición en CURSOS_AUDITORIA del curso de vida de cada fila según su edad (-1 si ninguno)"""
+    edades = df['edad_anos'].to_numpy(dtype=float)
+    curso = np.full(len(df), -1, dtype=np.int8)
+    for i, (_, edad_min, edad_max) in enumerate(CURSOS_AUDITORIA.values()):
+        curso[(edades >= edad_min) & (edades <= edad_max)] = i
+    return curso
+
+
+@perfilar('auditoría LAB')
+def auditar_lab(df, indice=None):
+    """
+    Marca cada fila de df: curso_vida, auditada (su código tiene reglas de
+    LAB en su curso), error_lab (Valor_Lab fuera de los permitidos) y
+    lab_esperados (solo en las filas con error). DataFrame alineado con df;
+    curso_vida y lab_esperados son categóricas (pocos valores, una fila por registro).
+    indice: índice de presencia del conjunto (se restringe a df; se construye si no se pasa)
+    """
+    if df.empty:
+        return pd.DataFrame(
+            {'curso_vida': pd.Categorical([], categories=list(CURSOS_AUDITORIA)), 'auditada': pd.Series(dtype=bool),
+             'error_lab': pd.Series(dtype=bool), 'lab_esperados': pd.Categorical([])},
+            index=df.index
+        )
+
+    indice = restringir_indice(indice, df) if indice is not None else construir_indice_presencia(df)
+    auditada_clave, error_clave, esperados_clave = _evaluar_claves(indice['claves'])
+
+    # Un acceso por fila: (curso de la fila, clave de la fila)
+    curso = curso_por_fila(df)
+    con_curso = curso >= 0
+    fila_curso = np.where(con_curso, curso, 0)
+    fila_clave = indice['fila_clave']
+    auditada = con_curso & auditada_clave[fila_curso, fila_clave]
+    error = con_curso & error_clave[fila_curso, fila_clave]
+
+    esperados = np.full(len(df), '', dtype=object)
+    esperados[error] = esperados_clave[fila_curso[error], fila_clave[error]]
+    return pd.DataFrame({
+        'curso_vida': pd.Categorical.from_codes(curso, categories=list(CURSOS_AUDITORIA)),
+        'auditada': auditada,
+        'error_lab': error,
+        'lab_esperados': pd.Categorical(esperados)
+    }, index=df.index)
+
+
+def filas_con_error(df, marcas):
+    """Filas de df con error de LAB, con el curso de vida y los valores esperados"""
+    errores = marcas['error_lab'].to_numpy()
+    columnas = [c for c in COLUMNAS_ERRORES_LAB if c in df.columns]
+    resultado = df.loc[errores, columnas].copy()
+    resultado['curso_vida'] = marcas['curso_vida'].to_numpy()[errores]
+    resultado['lab_esperados'] = marcas['lab_esperados'].to_numpy()[errores]
+    return resultado
+
+
+def resumen_auditoria(df, marcas, agrupacion):
+    """
+    Registros auditados, errores de LAB y % de error por grupo (columnas de
+    AGRUPACIONES_AUDITORIA[agrupacion] presentes en df), de más a menos
+    errores, con los códigos con más errores de cada grupo.
+    """
+    columnas = [c for c in AGRUPACIONES_AUDITORIA[agrupacion] if c in df.columns]
+    auditadas = marcas['auditada'].to_numpy()
+    datos = df.loc[auditadas, columnas + ['Codigo_Item']].copy()
+    datos['error_lab'] = marcas['error_lab'].to_numpy()[auditadas]
+    if datos.empty:
+        return pd.DataFrame(columns=columnas + ['registros_auditados', 'errores_lab', 'porcentaje_error', 'codigos_con_error'])
+
+    resumen = datos.groupby(columnas, observed=True, dropna=False, sort=False).agg(
+        registros_auditados=('error_lab', 'size'),
+        errores_lab=('error_lab', 'sum')
+    ).reset_index()
+    resumen['errores_lab'] = resumen['errores_lab'].astype(int)
+    resumen['porcentaje_error'] = (resumen['errores_lab'] / resumen['registros_auditados'] * 100).round(2)
+
+    # Códigos con más errores en cada grupo
+    con_error = datos[datos['error_lab']]
+    if not con_error.empty:
+        por_codigo = con_error.groupby(columnas + ['Codigo_Item'], observed=True, dropna=False, sort=False).size()
+        por_codigo = por_codigo[por_codigo > 0].sort_values(ascending=False).reset_index(name='n')
+        por_codigo['texto'] = por_codigo['Codigo_Item'].astype(str) + ' (' + por_codigo['n'].astype(str) + ')'
+        codigos = por_codigo.groupby(columnas, observed=True, dropna=False, sort=False)['texto'].agg(
+            lambda textos: ', '.join(textos.iloc[:3])
+        ).reset_index(name='codigos_con_error')
+        resumen = resumen.merge(codigos, on=columnas, how='left')
+    else:
+        resumen['codigos_con_error'] = ''
+    resumen['codigos_con_error'] = resumen['codigos_con_error'].fillna('')
+
+    return resumen.sort_values(['errores_lab', 'porcentaje_error'], ascending=False, kind='stable').reset_index(drop=True)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark con Datos Sintéticos HISMINSA
+Sistema HISMINSA - Supervisión de Indicadores
+
+Genera consolidados diarios y archivos maestros sintéticos (pacientes,
+atenciones por paciente, rango de días y mezcla de códigos tomada de los
+INDICADORES_* y PAQUETE_INTEGRAL_* de los tres cursos de vida) y mide,
+para cada tamaño (por defecto 10k, 100k y 1M filas):
+  - procesar_consolidados (procesamiento.procesar_conjunto, sin caché)
+  - aplicar_filtros con filtros típicos de la barra lateral
+  - cada verificar_cumplimiento_indicador de los tres cursos de vida
+  - verificar_paquete_integral de todos los DNIs (lote) y por DNI (muestra)
+  - generar_json_exportacion de cada curso de vida
+  - evaluar_tablero (todos los indicadores en una pasada)
+Para cada etapa guarda los segundos y el pico de memoria residente del
+proceso (None en Windows, sin el módulo resource); con --memoria-por-etapa también el pico de la etapa (tracemalloc,
+que hace más lentas las etapas: no mezclar esos tiempos con los normales).
+Los resultados se guardan en JSON y CSV y se pueden comparar con una
+corrida anterior (--comparar) para ver regresiones.
+
+Uso:
+    python benchmark_hisminsa.py [--tamanos 10000,100000,1000000] [--salida benchmarks]
+                                 [--comparar benchmarks/anterior.json] [--guardar-datos CARPETA]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+from indicadores_adulto import (
+    INDICADORES_ADULTO,
+    PAQUETE_INTEGRAL_ADULTO,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto,
+    verificar_paquete_integral as verificar_paquete_adulto
+)
+from indicadores_joven import (
+    INDICADORES_JOVEN,
+    PAQUETE_INTEGRAL_JOVEN,
+    verificar_cumplimiento_indicador as verificar_indicador_joven,
+    verificar_paquete_integral as verificar_paquete_joven
+)
+from indicadores_adulto_mayor import (
+    INDICADORES_ADULTO_MAYOR,
+    PAQUETE_INTEGRAL_ADULTO_MAYOR,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto_mayor,
+    verificar_paquete_integral as verificar_paquete_adulto_mayor
+)
+from carga_consolidados import leer_maestros, ARCHIVOS_MAESTROS, HILOS_POR_DEFECTO
+from descripciones import cargar_descripciones
+from procesamiento import procesar_conjunto
+from indice_filtros import filtrar_con_indice
+from indice_presencia import restringir_indice
+from tablero_indicadores import evaluar_tablero
+from exportacion_json import paquete_lote, generar_json_exportacion
+
+# Curso de vida -> (indicadores, verificar_cumplimiento_indicador, verificar_paquete_integral, rango de edad)
+CURSOS_BENCHMARK = {
+    "Adulto (30-59 años)": (INDICADORES_ADULTO, verificar_indicador_adulto, verificar_paquete_adulto, (30, 59)),
+    "Joven (18-29 años)": (INDICADORES_JOVEN, verificar_indicador_joven, verificar_paquete_joven, (18, 29)),
+    "Adulto Mayor (60+ años)": (
+        INDICADORES_ADULTO_MAYOR, verificar_indicador_adulto_mayor, verificar_paquete_adulto_mayor, (60, 150)
+    )
+}
+
+TAMANOS_POR_DEFECTO = (10_000, 100_000, 1_000_000)
+
+# Códigos frecuentes que no forman parte de ningún indicador
+CODIGOS_FONDO = ['Z000', 'J00X', 'K021', 'R51X', 'M545', 'N390', 'E119', 'I10X', 'Z762', 'Z718', 'A09X', 'J069']
+
+FILAS_POR_ATENCION = 3
+
+
+# ==============================================================================
+# GENERADOR DE DATOS SINTÉTICOS
+# ==============================================================================
+
+def codigos_referenciados():
+    """(código, tipo_dx, lab) de todas las reglas de INDICADORES_* y PAQUETE_INTEGRAL_*"""
+    codigos = set()
+
+    def _recorrer(objeto):
+        if isinstance(objeto, dict):
+            if isinstance(objeto.get('codigo'), str):
+                tipos = objeto.get('tipo_dx') or 'D'
+                labs = objeto.get('lab_valores') or objeto.get('lab') or ['']
+                for tipo in ([tipos] if isinstance(tipos, str) else tipos):
+                    for lab in ([labs] if isinstance(labs, str) else labs):
+                        codigos.add((objeto['codigo'], tipo, lab or ''))
+            for valor in objeto.values():
+                _recorrer(valor)
+        elif isinstance(objeto, list):
+            for valor in objeto:
+                _recorrer(valor)
+
+    for catalogo in (INDICADORES_ADULTO, INDICADORES_JOVEN, INDICADORES_ADULTO_MAYOR,
+                     PAQUETE_INTEGRAL_ADULTO, PAQUETE_INTEGRAL_JOVEN, PAQUETE_INTEGRAL_ADULTO_MAYOR):
+        _recorrer(catalogo)
+    return sorted(codigos)
+
+
+def generar_maestros(n_pacientes, n_personal=60, n_registradores=20, n_establecimientos=12,
+                     fecha_referencia='2025-07-01', semilla=0):
+    """MaestroPaciente, MaestroPersonal y MaestroRegistrador con las columnas de los archivos reales"""
+    rng = np.random.default_rng(semilla)
+    referencia = pd.Timestamp(fecha_referencia)
+
+    # Edades de 18 a 90 años al inicio del periodo
+    dias_edad = rng.integers(18 * 365, 90 * 365, n_pacientes)
+    nacimiento = (referencia - pd.to_timedelta(dias_edad, unit='D')).strftime('%Y-%m-%d')
+    df_pacientes = pd.DataFrame({
+        'Id_Paciente': np.arange(1, n_pacientes + 1),
+        'Numero_Documento': [f"{40000000 + i:08d}" for i in range(n_pacientes)],
+        'Apellido_Paterno_Paciente': rng.choice(['QUISPE', 'MAMANI', 'HUAMAN', 'FLORES', 'PEREZ'], n_pacientes),
+        'Apellido_Materno_Paciente': rng.choice(['CONDORI', 'RAMOS', 'CHAVEZ', 'TORRES'], n_pacientes),
+        'Nombres_Paciente': rng.choice(['JUAN', 'MARIA', 'ROSA', 'LUIS', 'CARMEN', 'JOSE'], n_pacientes),
+        'Fecha_Nacimiento': nacimiento,
+        'Genero': rng.choice(['M', 'F'], n_pacientes),
+        'Id_Etnia': rng.choice([40, 58, 80], n_pacientes, p=[0.8, 0.1, 0.1])
+    })
+
+    df_personal = pd.DataFrame({
+        'Id_Personal': np.arange(1, n_personal + 1),
+        'Numero_Documento': [f"{10000000 + i:08d}" for i in range(n_personal)],
+        'Apellido_Paterno_Personal': rng.choice(['GARCIA', 'DIAZ', 'ROJAS', 'VARGAS'], n_personal),
+        'Apellido_Materno_Personal': rng.choice(['CRUZ', 'MENDOZA', 'SALAZAR'], n_personal),
+        'Nombres_Personal': [f"PROFESIONAL {i}" for i in range(1, n_personal + 1)],
+        'Numero_Colegiatura': [f"{50000 + i}" for i in range(n_personal)],
+        'Id_Establecimiento': rng.integers(0, n_establecimientos, n_personal) + 2000
+    })
+
+    df_registradores = pd.DataFrame({
+        'Id_Registrador': np.arange(1, n_registradores + 1),
+        'Numero_Documento': [f"{20000000 + i:08d}" for i in range(n_registradores)],
+        'Nombres_Registrador': [f"DIGITADOR {i}" for i in range(1, n_registradores + 1)]
+    })
+
+    return df_pacientes, df_personal, df_registradores
+
+
+def generar_consolidados(n_filas, df_pacientes, df_personal, n_registradores=20, dias=30,
+                         fecha_inicio='2025-07-01', fraccion_indicadores=0.6, semilla=0):
+    """
+    Consolidados diarios sintéticos: lista de (nombre, DataFrame).
+    Cada atención tiene varias filas de diagnóstico (FILAS_POR_ATENCION en
+    promedio); fraccion_indicadores de las filas usa códigos de indicadores
+    (con su tipo_dx y LAB) y el resto códigos de fondo.
+    """
+    rng = np.random.default_rng(semilla + 1)
+    n_atenciones = max(1, n_filas // FILAS_POR_ATENCION)
+    referenciados = codigos_referenciados()
+
+    # Atributos por atención
+    personal = rng.integers(0, len(df_personal), n_atenciones)
+    dia = rng.integers(0, dias, n_atenciones)
+    atencion = pd.DataFrame({
+        'Id_Cita': np.arange(1, n_atenciones + 1) + semilla * 10_000_000,
+        'Id_Paciente': df_pacientes['Id_Paciente'].to_numpy()[rng.integers(0, len(df_pacientes), n_atenciones)],
+        'Id_Personal': df_personal['Id_Personal'].to_numpy()[personal],
+        'Id_Registrador': rng.integers(1, n_registradores + 1, n_atenciones),
+        'Id_Establecimiento': df_personal['Id_Establecimiento'].to_numpy()[personal],
+        'Id_Ups': rng.choice([301203, 302101, 301101, 303301], n_atenciones),
+        'Id_Turno': rng.choice([1, 2, 3], n_atenciones, p=[0.6, 0.35, 0.05]),
+        'Id_Condicion_Establecimiento': rng.choice(['N', 'C', 'R'], n_atenciones, p=[0.2, 0.75, 0.05]),
+        'Id_Condicion_Servicio': rng.choice(['N', 'C', 'R'], n_atenciones, p=[0.3, 0.65, 0.05]),
+        'Lote': rng.choice(['001', '002', '003', '004'], n_atenciones),
+        'Num_Pag': rng.integers(1, 100, n_atenciones),
+        'Num_Reg': rng.integers(1, 26, n_atenciones),
+        'dia': dia
+    })
+
+    # Filas de diagnóstico: cada fila pertenece a una atención
+    fila_atencion = np.sort(rng.integers(0, n_atenciones, n_filas))
+    df = atencion.iloc[fila_atencion].reset_index(drop=True)
+
+    de_indicador = rng.random(n_filas) < fraccion_indicadores
+    elegidos = rng.integers(0, len(referenciados), n_filas)
+    codigos = np.array([c for c, _, _ in referenciados], dtype=object)
+    tipos = np.array([t for _, t, _ in referenciados], dtype=object)
+    labs = np.array([lab for _, _, lab in referenciados], dtype=object)
+    df['Codigo_Item'] = np.where(de_indicador, codigos[elegidos], rng.choice(CODIGOS_FONDO, n_filas))
+    df['Tipo_Diagnostico'] = np.where(de_indicador, tipos[elegidos], rng.choice(['D', 'P', 'R'], n_filas))
+    df['Valor_Lab'] = np.where(de_indicador, labs[elegidos], '')
+
+    con_medidas = rng.random(n_filas) < 0.2
+    df['Peso'] = np.where(con_medidas, rng.normal(68, 12, n_filas).round(1), np.nan)
+    df['Talla'] = np.where(con_medidas, rng.normal(160, 9, n_filas).round(0), np.nan)
+    df['Hemoglobina'] = np.where(rng.random(n_filas) < 0.05, rng.normal(13, 1.5, n_filas).round(1), np.nan)
+    df['Perimetro_Abdominal'] = np.where(con_medidas, rng.normal(90, 10, n_filas).round(0), np.nan)
+    df['Fecha_Ultima_Regla'] = np.where(rng.random(n_filas) < 0.02, '2025-05-15', None)
+
+    # Un consolidado por día
+    inicio = pd.Timestamp(fecha_inicio)
+    consolidados = []
+    for d, df_dia in df.groupby('dia', sort=True):
+        fecha = inicio + pd.Timedelta(days=int(d))
+        df_dia = df_dia.drop(columns='dia')
+        df_dia['Fecha_Atencion'] = fecha.strftime('%Y-%m-%d')
+        df_dia['Fecha_Registro'] = (fecha + pd.Timedelta(hours=17)).strftime('%Y-%m-%d %H:%M:%S')
+        df_dia['Fecha_Modificacion'] = None
+        consolidados.append((f"consolidado {fecha.strftime('%d-%m-%Y')}.csv", df_dia))
+    return consolidados
+
+
+def escribir_datos(carpeta, n_filas, atenciones_por_paciente=4.0, dias=30, fraccion_indicadores=0.6, semilla=0):
+    """
+    Escribe los maestros en carpeta y los consolidados en carpeta/consolidados.
+    El número de pacientes sale de las atenciones por paciente.
+    Retorna la carpeta de consolidados.
+    """
+    n_pacientes = max(1, int(n_filas / FILAS_POR_ATENCION / atenciones_por_paciente))
+    df_pacientes, df_personal, df_registradores = generar_maestros(n_pacientes, semilla=semilla)
+    for nombre, df in zip(ARCHIVOS_MAESTROS, (df_pacientes, df_personal, df_registradores)):
+        df.to_csv(os.path.join(carpeta, nombre), index=False, encoding='latin-1')
+
+    carpeta_consolidados = os.path.join(carpeta, 'consolidados')
+    os.makedirs(carpeta_consolidados, exist_ok=True)
+    for nombre, df in generar_consolidados(n_filas, df_pacientes, df_personal, len(df_registradores), dias,
+                                           fraccion_indicadores=fraccion_indicadores, semilla=semilla):
+        df.to_csv(os.path.join(carpeta_consolidados, nombre), index=False, encoding='latin-1')
+    return carpeta_consolidados
+
+
+# ==============================================================================
+# MEDICIÓN
+# ==============================================================================
+
+def medir(resultados, tamano, etapa, funcion, *args, trazar=False, **kwargs):
+    """
+    Ejecuta funcion y agrega a resultados {tamano, etapa, segundos,
+    memoria_pico_mb (tracemalloc, solo con trazar), memoria_proceso_mb}
+    """
+    if trazar:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        valor = funcion(*args, **kwargs)
+    finally:
+        segundos = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if trazar else None
+        if trazar:
+            tracemalloc.stop()
+    resultados.append({
+        'tamano': tamano,
+        'etapa': etapa,
+        'segundos': round(segundos, 4),
+        'memoria_pico_mb': round(pico, 1) if pico is not None else None,
+        'memoria_proceso_mb': memoria_proceso_mb()
+    })
+    return valor
+
+
+def memoria_proceso_mb():
+    """Pico de memoria residente del proceso (MB, redondeado); None sin el módulo resource (Windows)"""
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maximo / 1024 / 1024 if sys.platform == 'darwin' else maximo / 1024, 1)
+
+
+def filtros_benchmark(df, catalogo):
+    """Filtros típicos de la barra lateral: sin filtros, un establecimiento, una semana y edad, y código"""
+    base = {
+        'fecha_min': pd.Timestamp(catalogo['fecha_min']),
+        'fecha_max': pd.Timestamp(catalogo['fecha_max']),
+        'establecimiento': 'Todos',
+        'edad_min': 0,
+        'edad_max': 120,
+        'dni': '',
+        'codigo': '',
+        'turno': 'Todos',
+        'genero': 'Todos',
+        'profesional': 'Todos'
+    }
+    establecimiento = catalogo['establecimientos'][1].split(' - ')[0] if len(catalogo['establecimientos']) > 1 else 'Todos'
+    return {
+        'todos': base,
+        'establecimiento': {**base, 'establecimiento': establecimiento},
+        'semana_edad_30_59': {**base, 'fecha_max': base['fecha_min'] + pd.Timedelta(days=6),
+                              'edad_min': 30, 'edad_max': 59},
+        'codigo_99801': {**base, 'codigo': '99801'}
+    }
+
+
+def benchmark_tamano(n_filas, descripciones, args, resultados):
+    """Genera los datos de un tamaño y mide todas las etapas"""
+    trazar = args.memoria_por_etapa
+    with tempfile.TemporaryDirectory() as temporal:
+        carpeta = os.path.join(args.guardar_datos, f'filas_{n_filas}') if args.guardar_datos else temporal
+        os.makedirs(carpeta, exist_ok=True)
+        inicio = time.perf_counter()
+        carpeta_consolidados = escribir_datos(carpeta, n_filas, args.atenciones_por_paciente, args.dias,
+                                              args.fraccion_indicadores, args.semilla)
+        print(f"\n📦 {n_filas:,} filas generadas en {time.perf_counter() - inicio:.1f} s ({carpeta})")
+
+        df_pacientes, df_personal, df_registradores = leer_maestros(carpeta)
+        archivos = []
+        for nombre in sorted(os.listdir(carpeta_consolidados)):
+            with open(os.path.join(carpeta_consolidados, nombre), 'rb') as f:
+                archivos.append((nombre, f.read()))
+
+    carga = medir(
+        resultados, n_filas, 'procesar_consolidados', procesar_conjunto,
+        archivos, df_pacientes, df_personal, df_registradores, descripciones,
+        n_hilos=args.hilos, usar_cache=False, compartir=False, trazar=trazar
+    )
+    del archivos
+    df = carga['df_completo']
+    indice = carga['indice_presencia']
+    indice_filtros = carga['indice_filtros']
+
+    for nombre, filtros in filtros_benchmark(df, indice_filtros['catalogo']).items():
+        medir(resultados, n_filas, f'aplicar_filtros:{nombre}', filtrar_con_indice, df, indice_filtros, filtros,
+              trazar=trazar)
+
+    rng = np.random.default_rng(args.semilla)
+    for curso, (indicadores, verificar_indicador, verificar_paquete, (edad_min, edad_max)) in CURSOS_BENCHMARK.items():
+        for clave in indicadores:
+            medir(resultados, n_filas, f'verificar_cumplimiento_indicador:{curso}:{clave}',
+                  verificar_indicador, df, clave, indice=indice, trazar=trazar)
+
+        df_curso = df[(df['edad_anos'] >= edad_min) & (df['edad_anos'] <= edad_max)]
+        indice_curso = restringir_indice(indice, df_curso)
+        df_lote = medir(resultados, n_filas, f'verificar_paquete_integral_todos:{curso}',
+                        paquete_lote, df_curso, curso, indice_curso, trazar=trazar)
+
+        # Versión por DNI sobre una muestra (en todos los DNIs sería demasiado lenta)
+        dnis = df_lote['pac_Numero_Documento'].to_numpy()
+        muestra = rng.choice(dnis, min(args.muestra_dni, len(dnis)), replace=False) if len(dnis) else []
+        medir(resultados, n_filas, f'verificar_paquete_integral_por_dni_x{len(muestra)}:{curso}',
+              lambda: [verificar_paquete(df_curso, dni) for dni in muestra], trazar=trazar)
+
+        medir(resultados, n_filas, f'generar_json_exportacion:{curso}', generar_json_exportacion,
+              df_curso, "Incompletos", curso, indice_curso, descripciones.get('cie10'), df_lote=df_lote,
+              trazar=trazar)
+
+    medir(resultados, n_filas, 'evaluar_tablero', evaluar_tablero, df, indice=indice, trazar=trazar)
+    return len(df)
+
+
+def resumen_tamano(resultados, tamano):
+    """Segundos totales por grupo de etapas (el prefijo antes de ':')"""
+    grupos = {}
+    for r in resultados:
+        if r['tamano'] == tamano:
+            grupo = r['etapa'].split(':')[0]
+            grupos[grupo] = grupos.get(grupo, 0) + r['segundos']
+    return grupos
+
+
+def comparar(resultados, archivo_anterior, parametros=None, umbral=1.2):
+    """Imprime las etapas que tardan más de umbral veces que en la corrida anterior"""
+    with open(archivo_anterior, encoding='utf-8') as f:
+        anterior = json.load(f)
+    anteriores = {(r['tamano'], r['etapa']): r for r in anterior['resultados']}
+    if parametros is not None:
+        distintos = [k for k, v in parametros.items()
+                     if k not in ('tamanos', 'guardar_datos') and anterior['parametros'].get(k) != v]
+        if distintos:
+            print(f"⚠️  Parámetros distintos a la corrida anterior: {', '.join(distintos)}")
+    regresiones = []
+    for r in resultados:
+        previo = anteriores.get((r['tamano'], r['etapa']))
+        if previo and previo['segundos'] >= 0.05 and r['segundos'] > previo['segundos'] * umbral:
+            regresiones.append((r['tamano'], r['etapa'], previo['segundos'], r['segundos']))
+    print(f"\n🔎 Comparación con {archivo_anterior}: {len(regresiones)} etapas más lentas (>{umbral:.0%})")
+    for tamano, etapa, antes, ahora in regresiones:
+        print(f"   {tamano:>9,} {etapa}: {antes:.3f} s -> {ahora:.3f} s (x{ahora / antes:.2f})")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del procesamiento HISMINSA con datos sintéticos")
+    parser.add_argument('--tamanos', default=','.join(str(t) for t in TAMANOS_POR_DEFECTO),
+                        help="Filas por corrida, separadas por coma")
+    parser.add_argument('--atenciones-por-paciente', type=float, default=4.0)
+    parser.add_argument('--dias', type=int, default=30, help="Días del periodo (un consolidado por día)")
+    parser.add_argument('--fraccion-indicadores', type=float, default=0.6,
+                        help="Fracción de filas con códigos de indicadores")
+    parser.add_argument('--muestra-dni', type=int, default=50,
+                        help="DNIs para medir verificar_paquete_integral por DNI")
+    parser.add_argument('--hilos', type=int, default=HILOS_POR_DEFECTO)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--memoria-por-etapa', action='store_true',
+                        help="Pico de memoria de cada etapa con tracemalloc (los tiempos suben 3-4 veces)")
+    parser.add_argument('--sin-descripciones', action='store_true', help="No mapear codigos_descripcion.xlsx")
+    parser.add_argument('--guardar-datos', help="Carpeta donde dejar los datos generados (por defecto se borran)")
+    parser.add_argument('--salida', default='benchmarks', help="Carpeta de resultados")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior")
+    args = parser.parse_args(argv)
+
+    tamanos = [int(t) for t in args.tamanos.split(',') if t.strip()]
+    if args.sin_descripciones:
+        descripciones = {'cie10': {}, 'estab': {}, 'ups': {}, 'etnia': {}}
+    else:
+        descripciones = cargar_descripciones()[0]
+
+    resultados = []
+    registros = {}
+    for tamano in tamanos:
+        registros[tamano] = benchmark_tamano(tamano, descripciones, args, resultados)
+        print(f"   {'etapa':<40} {'segundos':>10}")
+        for grupo, segundos in resumen_tamano(resultados, tamano).items():
+            print(f"   {grupo:<40} {segundos:>10.3f}")
+        pico_proceso = memoria_proceso_mb()
+        if pico_proceso is not None:
+            print(f"   pico de memoria del proceso: {pico_proceso:,.0f} MB")
+
+    marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+    os.makedirs(args.salida, exist_ok=True)
+    salida = {
+        'fecha': datetime.now().isoformat(),
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar')},
+        'filas_procesadas': registros,
+        'memoria_proceso_mb': memoria_proceso_mb(),
+        'resultados': resultados
+    }
+    ruta_json = os.path.join(args.salida, f'benchmark_{marca}.json')
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    pd.DataFrame(resultados).to_csv(os.path.join(args.salida, f'benchmark_{marca}.csv'), index=False)
+    print(f"\n✅ Resultados en {ruta_json}")
+
+    if args.comparar:
+        comparar(resultados, args.comparar, salida['parametros'])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché Compartida de Conjuntos de Datos
+Sistema HISMINSA - Supervisión de Indicadores
+
+Registro a nivel de proceso (compartido por todas las sesiones de Streamlit)
+de los conjuntos ya procesados: df_completo enriquecido, índice de presencia
+y resultado de la carga. La clave es la huella de contenido de los archivos
+cargados, los maestros y las descripciones, así que dos analistas que cargan
+el mismo mes comparten un único DataFrame. Se expulsa por LRU al superar el
+número máximo de conjuntos o el límite de memoria.
+
+Los DataFrames registrados son de solo lectura: quien necesite columnas
+adicionales debe trabajar sobre una copia o con Series locales.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+# Límites del registro
+MAX_CONJUNTOS = 6
+LIMITE_MEMORIA_MB = 4096
+
+# {clave: {'datos': dict, 'bytes': int, 'creado': datetime, 'usos': int}}
+_REGISTRO = OrderedDict()
+_BLOQUEO = threading.Lock()
+
+
+def tamano_datos(datos):
+    """Memoria aproximada (bytes) de los DataFrames contenidos en el dict"""
+    total = 0
+    for valor in datos.values():
+        if isinstance(valor, pd.DataFrame):
+            total += int(valor.memory_usage(deep=True).sum())
+    return total
+
+
+def _expulsar():
+    """Quita las entradas menos usadas recientemente hasta respetar los límites (se conserva la última)"""
+    limite = LIMITE_MEMORIA_MB * 1024 * 1024
+    while len(_REGISTRO) > 1 and (
+        len(_REGISTRO) > MAX_CONJUNTOS or sum(e['bytes'] for e in _REGISTRO.values()) > limite
+    ):
+        _REGISTRO.popitem(last=False)
+
+
+def obtener_conjunto(clave):
+    """Datos registrados para la clave o None"""
+    with _BLOQUEO:
+        entrada = _REGISTRO.get(clave)
+        if entrada is None:
+            return None
+        _REGISTRO.move_to_end(clave)
+        entrada['usos'] += 1
+        return entrada['datos']
+
+
+def registrar_conjunto(clave, datos):
+    """Registra un conjunto procesado y retorna los datos registrados"""
+    bytes_datos = tamano_datos(datos)
+    with _BLOQUEO:
+        # Si otra sesión lo registró mientras se procesaba, se comparte el existente
+        if clave in _REGISTRO:
+            _REGISTRO.move_to_end(clave)
+            return _REGISTRO[clave]['datos']
+        _REGISTRO[clave] = {
+            'datos': datos,
+            'bytes': bytes_datos,
+            'creado': datetime.now(),
+            'usos': 1
+        }
+        _expulsar()
+    return datos
+
+
+def estado_registro():
+    """Resumen del registro: lista de dicts con clave corta, MB, filas, creado y usos"""
+    with _BLOQUEO:
+        return [
+            {
+                'clave': clave[:12],
+                'mb': entrada['bytes'] / (1024 * 1024),
+                'filas': len(entrada['datos']['df_completo']) if 'df_completo' in entrada['datos'] else 0,
+                'creado': entrada['creado'],
+                'usos': entrada['usos']
+            }
+            for clave, entrada in _REGISTRO.items()
+        ]
+
+
+def limpiar_registro():
+    """Vacía el registro (las sesiones que ya tienen el DataFrame lo conservan)"""
+    with _BLOQUEO:
+        _REGISTRO.clear()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché de Resultados de Filtros
+Sistema HISMINSA - Supervisión de Indicadores
+
+El dict de crear_filtros_sidebar determina por completo df_filtrado. Para no
+recalcularlo en cada interacción (un checkbox en Indicadores o Supervisión
+vuelve a ejecutar todo el script), se guarda por (huella del conjunto,
+filtros congelados): las posiciones de fila filtradas, el índice de presencia
+restringido, los resúmenes de métricas, Gráficos, Temporal y Resumen, la
+tabla de denominadores, los tableros de indicadores, las matrices por
+grupo y las marcas de la auditoría LAB (estos cuatro se llenan a medida
+que se consultan; actualizar_tamano vuelve a medir la entrada al llenarlos).
+
+Es un LRU acotado a nivel de proceso: la clave incluye la huella del conjunto,
+así que sesiones con el mismo conjunto y filtros comparten el resultado.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from indice_filtros import seleccionar_posiciones, indice_vigente, construir_indice_filtros
+from indice_presencia import restringir_indice
+from denominadores import nueva_tabla_denominadores
+from perfilado import etapa, perfilar
+
+# Límites de la caché
+MAX_RESULTADOS = 24
+LIMITE_MEMORIA_MB = 512
+
+# {(clave_dataset, filtros congelados): {'resultado': dict, 'bytes': int}}
+_RESULTADOS = OrderedDict()
+_BLOQUEO = threading.Lock()
+
+
+def congelar_filtros(filtros):
+    """Tupla ordenada (hashable) con los valores del dict de filtros"""
+    return tuple(sorted(filtros.items()))
+
+
+def _conteos(serie, n=None):
+    """value_counts sin categorías vacías, como DataFrame para los gráficos"""
+    conteo = serie.value_counts()
+    conteo = conteo[conteo > 0]
+    if n is not None:
+        conteo = conteo.head(n)
+    return conteo.reset_index()
+
+
+def resumir_filtrado(df_filtrado):
+    """Resúmenes que muestran mostrar_metricas y las pestañas Gráficos, Temporal y Resumen"""
+    fechas = df_filtrado['Fecha_Atencion']
+    dias = fechas.dt.normalize()
+    dias_datos = int(dias.nunique())
+
+    resumen = {
+        'registros': len(df_filtrado),
+        'pacientes': int(df_filtrado['Id_Paciente'].nunique()),
+        'personal': int(df_filtrado['Id_Personal'].nunique()),
+        'dias_datos': dias_datos,
+        'promedio_diario': len(df_filtrado) / dias_datos if dias_datos > 0 else 0,
+        'fecha_min': fechas.min(),
+        'fecha_max': fechas.max(),
+        'turnos': None,
+        'generos': None,
+        'top_diagnosticos': None,
+        'por_dia': None,
+        'semanal': None,
+        'denominadores': nueva_tabla_denominadores(),
+        'tableros': {},
+        'matrices': {},
+        'auditoria_lab': None
+    }
+    if len(df_filtrado) == 0:
+        return resumen
+
+    resumen['turnos'] = _conteos(df_filtrado['Turno_Desc'])
+    resumen['generos'] = _conteos(df_filtrado['pac_Genero'])
+    resumen['top_diagnosticos'] = _conteos(df_filtrado['Codigo_Item'], 10)
+
+    if dias_datos > 1:
+        resumen['por_dia'] = fechas.groupby(fechas.dt.date).size().reset_index(name='Atenciones')
+        resumen['semanal'] = fechas.groupby([
+            fechas.dt.dayofweek.rename('Dia_Num'),
+            fechas.dt.day_name().rename('Dia_Semana')
+        ]).size().reset_index(name='Atenciones').sort_values('Dia_Num')
+
+    return resumen
+
+
+def _calcular(df, filtros, indice_filtros, indice_presencia):
+    """Posiciones, índice de presencia restringido y resúmenes para los filtros"""
+    with etapa('filtros: selección de filas'):
+        if not indice_vigente(indice_filtros, df):
+            indice_filtros = construir_indice_filtros(df)
+        posiciones = seleccionar_posiciones(indice_filtros, filtros)
+        if len(posiciones) < np.iinfo(np.int32).max:
+            posiciones = posiciones.astype(np.int32)
+        df_filtrado = df if len(posiciones) == len(df) else df.iloc[posiciones]
+
+    with etapa('filtros: restringir índice de presencia'):
+        indice_restringido = restringir_indice(indice_presencia, df_filtrado)
+    with etapa('filtros: resúmenes'):
+        resumen = resumir_filtrado(df_filtrado)
+    return {
+        'posiciones': posiciones,
+        'indice_presencia': indice_restringido,
+        'resumen': resumen
+    }, df_filtrado
+
+
+def _bytes_df(df):
+    """Memoria (bytes) de un DataFrame, con el contenido de las columnas de texto"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _tamano(resultado):
+    """
+    Memoria aproximada (bytes) de un resultado, incluidos los denominadores,
+    tableros, matrices por grupo y marcas de la auditoría LAB que se llenan
+    a medida que se consultan
+    """
+    total = resultado['posiciones'].nbytes
+    indice = resultado['indice_presencia']
+    if indice is not None and indice.get('fila_dni') is not None:
+        total += indice['fila_dni'].nbytes + indice['fila_clave'].nbytes
+    resumen = resultado['resumen']
+    total += sum(dnis.nbytes for dnis in resumen['denominadores']['bandas'].values())
+    total += sum(_bytes_df(tablero) for tablero in resumen['tableros'].values())
+    total += sum(_bytes_df(matriz) for matriz in resumen['matrices'].values())
+    if resumen['auditoria_lab'] is not None:
+        total += _bytes_df(resumen['auditoria_lab'])
+    return total
+
+
+def _expulsar():
+    """Quita los resultados menos usados recientemente hasta respetar los límites (se conserva el último)"""
+    limite = LIMITE_MEMORIA_MB * 1024 * 1024
+    while len(_RESULTADOS) > 1 and (
+        len(_RESULTADOS) > MAX_RESULTADOS or sum(e['bytes'] for e in _RESULTADOS.values()) > limite
+    ):
+        _RESULTADOS.popitem(last=False)
+
+
+@perfilar('filtros')
+def resultado_filtros(df, filtros, clave_dataset, indice_filtros=None, indice_presencia=None):
+    """
+    (df_filtrado, indice_presencia restringido, resumen) para los filtros.
+    Con clave_dataset None no se usa la caché. df_filtrado es de solo lectura.
+    """
+    if clave_dataset is None:
+        resultado, df_filtrado = _calcular(df, filtros, indice_filtros, indice_presencia)
+        return df_filtrado, resultado['indice_presencia'], resultado['resumen']
+
+    clave = (clave_dataset, congelar_filtros(filtros))
+    with _BLOQUEO:
+        entrada = _RESULTADOS.get(clave)
+        if entrada is not None:
+            _RESULTADOS.move_to_end(clave)
+
+    if entrada is not None:
+        resultado = entrada['resultado']
+        posiciones = resultado['posiciones']
+        df_filtrado = df if len(posiciones) == len(df) else df.iloc[posiciones]
+        return df_filtrado, resultado['indice_presencia'], resultado['resumen']
+
+    resultado, df_filtrado = _calcular(df, filtros, indice_filtros, indice_presencia)
+    with _BLOQUEO:
+        _RESULTADOS[clave] = {'resultado': resultado, 'bytes': _tamano(resultado)}
+        _expulsar()
+    return df_filtrado, resultado['indice_presencia'], resultado['resumen']
+
+
+def actualizar_tamano(resumen):
+    """
+    Vuelve a medir la entrada que contiene este resumen después de llenar uno
+    de sus cálculos bajo demanda y expulsa lo necesario para respetar los límites.
+    """
+    with _BLOQUEO:
+        for entrada in _RESULTADOS.values():
+            if entrada['resultado']['resumen'] is resumen:
+                entrada['bytes'] = _tamano(entrada['resultado'])
+                _expulsar()
+                return
+
+
+def limpiar_resultados(clave_dataset=None):
+    """Elimina los resultados de un conjunto (o todos)"""
+    with _BLOQUEO:
+        if clave_dataset is None:
+            _RESULTADOS.clear()
+            return
+        for clave in [c for c in _RESULTADOS if c[0] == clave_dataset]:
+            del _RESULTADOS[clave]
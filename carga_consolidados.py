@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carga y Enriquecimiento de Consolidados
+Sistema HISMINSA - Supervisión de Indicadores
+
+Lee cada consolidado diario, lo une con los archivos maestros y agrega las
+columnas derivadas (edades, nombres, fechas formateadas y descripciones).
+El resultado enriquecido de cada archivo se guarda en una caché en disco
+(Parquet) con clave = hash del CSV + hash de maestros + hash de descripciones,
+de modo que al reprocesar un mes solo se vuelven a leer los días que cambiaron.
+"""
+
+import hashlib
+import io
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from perfilado import etapa, propagar
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_CACHE = os.path.join(BASE_PATH, '.cache_hisminsa', 'consolidados')
+
+# Subir cuando cambie la lógica de enriquecimiento para invalidar la caché
+VERSION_CACHE = 2
+
+# Identifican una atención (todas sus filas de diagnóstico comparten la llave)
+COLUMNAS_LLAVE_REGISTRO = ['Id_Cita', 'Lote', 'Num_Pag', 'Num_Reg']
+
+# Hilos por defecto para leer y enriquecer archivos en paralelo
+HILOS_POR_DEFECTO = min(8, os.cpu_count() or 1)
+
+# ==============================================================================
+# ESQUEMA DE COLUMNAS
+# ==============================================================================
+
+# IDs y códigos se leen como texto (sin pasar por float); el resto se infiere
+ESQUEMA_CONSOLIDADO = {
+    'Id_Cita': str,
+    'Id_Paciente': str,
+    'Id_Personal': str,
+    'Id_Registrador': str,
+    'Id_Establecimiento': str,
+    'Id_Ups': str,
+    'Codigo_Item': str,
+    'Tipo_Diagnostico': str,
+    'Valor_Lab': str,
+    'Lote': str,
+    'Id_Condicion_Establecimiento': str,
+    'Id_Condicion_Servicio': str
+}
+
+ESQUEMA_MAESTRO_PACIENTE = {
+    'Id_Paciente': str,
+    'Numero_Documento': str,
+    'Genero': str
+}
+
+ESQUEMA_MAESTRO_PERSONAL = {
+    'Id_Personal': str,
+    'Numero_Documento': str,
+    'Numero_Colegiatura': str
+}
+
+ESQUEMA_MAESTRO_REGISTRADOR = {
+    'Id_Registrador': str,
+    'Numero_Documento': str
+}
+
+# Archivos maestros esperados en el directorio de la aplicación
+ARCHIVOS_MAESTROS = ('MaestroPaciente.csv', 'MaestroPersonal.csv', 'MaestroRegistrador.csv')
+
+# Columnas de baja cardinalidad que se guardan como categóricas en df_completo
+COLUMNAS_CATEGORICAS = [
+    'Codigo_Item', 'Tipo_Diagnostico', 'Valor_Lab', 'Id_Turno', 'Id_Ups', 'Id_Establecimiento',
+    'pac_Genero', 'Id_Condicion_Establecimiento', 'Id_Condicion_Servicio',
+    'Codigo_Item_Clean', 'Id_Establecimiento_Str', 'Id_Ups_Str',
+    'CIE10_Descripcion', 'Establecimiento_Nombre', 'UPS_Descripcion', 'Etnia_Desc',
+    'Turno_Desc', 'Condicion_Establecimiento_Desc', 'Condicion_Servicio_Desc', 'Personal_Completo',
+    'Paciente_Completo', 'edad_detallada', 'Lote', 'Id_Personal', 'Id_Registrador',
+    'Fecha_Nacimiento_Formato', 'FUR_Formato', 'FPP_Formato',
+    'Fecha_Registro_Formato', 'Fecha_Modificacion_Formato'
+]
+
+# Atributos de los maestros (uno por paciente/personal/registrador); el DNI queda como texto
+PREFIJOS_MAESTROS = ('pac_', 'per_', 'reg_')
+COLUMNA_DNI = 'pac_Numero_Documento'
+
+
+def columnas_categoricas(df):
+    """Columnas del DataFrame que se guardan como categóricas"""
+    columnas = [c for c in COLUMNAS_CATEGORICAS if c in df.columns]
+    columnas += [
+        c for c in df.columns
+        if c.startswith(PREFIJOS_MAESTROS) and c != COLUMNA_DNI and c not in columnas
+        and (df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype))
+    ]
+    return columnas
+
+
+def aplicar_categorias(df):
+    """Convierte a categóricas las columnas de baja cardinalidad (en el mismo DataFrame)"""
+    for columna in columnas_categoricas(df):
+        if not isinstance(df[columna].dtype, pd.CategoricalDtype):
+            df[columna] = df[columna].astype('category')
+    return df
+
+
+def alinear_categorias(df_existente, df_nuevo):
+    """
+    Extiende las categorías de df_existente con los valores nuevos de df_nuevo
+    y convierte df_nuevo a las mismas categorías, para que el concat conserve
+    el tipo. Los códigos de las filas existentes no cambian.
+    """
+    df_existente = df_existente.copy(deep=False)
+    df_nuevo = df_nuevo.copy()
+    for columna in columnas_categoricas(df_existente):
+        if columna not in df_nuevo.columns:
+            continue
+        tipo = df_existente[columna].dtype
+        if not isinstance(tipo, pd.CategoricalDtype):
+            continue
+        extra = pd.Index(df_nuevo[columna].dropna().unique()).difference(tipo.categories)
+        if len(extra) > 0:
+            df_existente[columna] = df_existente[columna].cat.add_categories(extra)
+        df_nuevo[columna] = df_nuevo[columna].astype(df_existente[columna].dtype)
+    return df_existente, df_nuevo
+
+
+# ==============================================================================
+# HASHES
+# ==============================================================================
+
+def hash_bytes(datos):
+    """Hash de contenido de un archivo"""
+    return hashlib.sha256(datos).hexdigest()
+
+
+def hash_dataframe(df):
+    """Hash de contenido de un DataFrame (columnas + valores)"""
+    if df is None:
+        return 'ninguno'
+    h = hashlib.sha256()
+    h.update(repr(list(df.columns)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def hash_maestros(df_pacientes, df_personal, df_registradores):
+    """Hash combinado de los tres archivos maestros"""
+    h = hashlib.sha256()
+    for df in (df_pacientes, df_personal, df_registradores):
+        h.update(hash_dataframe(df).encode('utf-8'))
+    return h.hexdigest()
+
+
+def huellas_carga(archivos, df_pacientes, df_personal, df_registradores, descripciones, clave_base=None):
+    """
+    Huellas de contenido de una carga. 'clave' identifica el conjunto resultante
+    (archivos en orden + maestros + descripciones); clave_base encadena la carga
+    previa en modo agregar.
+    """
+    huellas = {
+        'maestros': hash_maestros(df_pacientes, df_personal, df_registradores),
+        'descripciones': hash_descripciones(descripciones)
+    }
+    h = hashlib.sha256(f"v{VERSION_CACHE}|{clave_base or ''}".encode('utf-8'))
+    for _, datos in archivos:
+        h.update(hash_bytes(datos).encode('utf-8'))
+    h.update(huellas['maestros'].encode('utf-8'))
+    h.update(huellas['descripciones'].encode('utf-8'))
+    huellas['clave'] = h.hexdigest()
+    return huellas
+
+
+def hash_descripciones(descripciones):
+    """Hash de los diccionarios de descripciones (CIE10, establecimientos, UPS, etnias)"""
+    h = hashlib.sha256()
+    for nombre in ('cie10', 'estab', 'ups', 'etnia'):
+        h.update(repr(list((descripciones.get(nombre) or {}).items())).encode('utf-8'))
+    return h.hexdigest()
+
+
+# ==============================================================================
+# CACHÉ EN DISCO
+# ==============================================================================
+
+def _ruta_cache(clave, extension):
+    return os.path.join(DIRECTORIO_CACHE, f"{clave}.{extension}")
+
+
+def clave_cache(hash_csv, hash_maestros_actual, hash_descripciones_actual):
+    """Clave del resultado enriquecido de un archivo"""
+    base = f"v{VERSION_CACHE}|{hash_csv}|{hash_maestros_actual}|{hash_descripciones_actual}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+def leer_cache(clave):
+    """Retorna el DataFrame guardado para la clave o None"""
+    try:
+        ruta = _ruta_cache(clave, 'parquet')
+        if os.path.exists(ruta):
+            return pd.read_parquet(ruta)
+        ruta = _ruta_cache(clave, 'pkl')
+        if os.path.exists(ruta):
+            return pd.read_pickle(ruta)
+    except Exception:
+        pass
+    return None
+
+
+def guardar_cache(clave, df):
+    """
+    Guarda el DataFrame en Parquet. Si alguna columna no es serializable en
+    Arrow (ej. tipos mezclados), se usa pickle como respaldo.
+    """
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        ruta = _ruta_cache(clave, 'parquet')
+        try:
+            df.to_parquet(ruta, index=False)
+        except Exception:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            df.to_pickle(_ruta_cache(clave, 'pkl'))
+        return True
+    except Exception:
+        return False
+
+
+def limpiar_cache():
+    """Elimina todos los archivos de la caché de consolidados"""
+    eliminados = 0
+    if os.path.isdir(DIRECTORIO_CACHE):
+        for nombre in os.listdir(DIRECTORIO_CACHE):
+            try:
+                os.remove(os.path.join(DIRECTORIO_CACHE, nombre))
+                eliminados += 1
+            except OSError:
+                pass
+    return eliminados
+
+
+# ==============================================================================
+# LECTURA Y ENRIQUECIMIENTO
+# ==============================================================================
+
+def leer_consolidado(nombre_archivo, datos):
+    """Lee un consolidado (latin-1) y completa Fecha_Atencion desde el nombre si falta"""
+    df_temp = pd.read_csv(io.BytesIO(datos), encoding='latin-1', dtype=ESQUEMA_CONSOLIDADO)
+
+    # Intentar extraer fecha del nombre (formato: consolidado DD-MM-YYYY.csv)
+    fecha_archivo = None
+    match = re.search(r'(\d{2}-\d{2}-\d{4})', nombre_archivo)
+    if match:
+        fecha_archivo = pd.to_datetime(match.group(1), format='%d-%m-%Y')
+
+    # Si tiene columna Fecha_Atencion, usarla; si no, usar la fecha extraída
+    if 'Fecha_Atencion' not in df_temp.columns and fecha_archivo:
+        df_temp['Fecha_Atencion'] = fecha_archivo
+
+    return df_temp
+
+
+def renombrar_maestros(df_pacientes, df_personal, df_registradores):
+    """Agrega los prefijos pac_/per_/reg_ a las columnas de los maestros (salvo la llave)"""
+    if df_pacientes is not None:
+        df_pacientes = df_pacientes.rename(
+            columns={col: f'pac_{col}' for col in df_pacientes.columns if col != 'Id_Paciente'}
+        )
+    if df_personal is not None:
+        df_personal = df_personal.rename(
+            columns={col: f'per_{col}' for col in df_personal.columns if col != 'Id_Personal'}
+        )
+    if df_registradores is not None:
+        df_registradores = df_registradores.rename(
+            columns={col: f'reg_{col}' for col in df_registradores.columns if col != 'Id_Registrador'}
+        )
+    return df_pacientes, df_personal, df_registradores
+
+
+def leer_maestros(directorio=BASE_PATH):
+    """Lee y renombra MaestroPaciente, MaestroPersonal y MaestroRegistrador del directorio"""
+    ruta_pacientes, ruta_personal, ruta_registradores = (
+        os.path.join(directorio, archivo) for archivo in ARCHIVOS_MAESTROS
+    )
+    df_pacientes = pd.read_csv(ruta_pacientes, encoding='latin-1', dtype=ESQUEMA_MAESTRO_PACIENTE)
+    df_personal = pd.read_csv(ruta_personal, encoding='latin-1', dtype=ESQUEMA_MAESTRO_PERSONAL)
+    df_registradores = pd.read_csv(ruta_registradores, encoding='latin-1', dtype=ESQUEMA_MAESTRO_REGISTRADOR)
+    return renombrar_maestros(df_pacientes, df_personal, df_registradores)
+
+
+def _id_a_texto(serie):
+    """Convierte IDs leídos como número a texto sin sufijo .0"""
+    return serie.astype(str).str.replace('.0', '', regex=False)
+
+
+def preparar_maestros(df_pacientes, df_personal, df_registradores):
+    """Copia los maestros con las llaves de unión como texto"""
+    df_pacientes = df_pacientes.copy()
+    df_personal = df_personal.copy()
+    df_registradores = df_registradores.copy()
+
+    df_pacientes['Id_Paciente'] = _id_a_texto(df_pacientes['Id_Paciente'])
+    df_personal['Id_Personal'] = _id_a_texto(df_personal['Id_Personal'])
+    df_registradores['Id_Registrador'] = _id_a_texto(df_registradores['Id_Registrador'])
+
+    return df_pacientes, df_personal, df_registradores
+
+
+def limpiar_diccionario(diccionario, mayusculas=False):
+    """Claves como texto sin espacios (opcionalmente en mayúsculas) y valores como texto"""
+    limpio = {}
+    for k, v in diccionario.items():
+        clave = str(k).strip()
+        limpio[clave.upper() if mayusculas else clave] = str(v)
+    return limpio
+
+
+def calcular_edad_detallada(fecha_nac, fecha_aten):
+    """Edad en años, meses y días con formato 'Xa Ym Zd'"""
+    if pd.isna(fecha_nac) or pd.isna(fecha_aten):
+        return "N/A"
+    años = fecha_aten.year - fecha_nac.year
+    meses = fecha_aten.month - fecha_nac.month
+    dias = fecha_aten.day - fecha_nac.day
+
+    if dias < 0:
+        meses -= 1
+        dias += 30
+    if meses < 0:
+        años -= 1
+        meses += 12
+
+    return f"{años}a {meses}m {dias}d"
+
+
+def _componente_fecha(fechas, atributo):
+    """Año, mes o día como enteros (0 donde la fecha es nula)"""
+    return getattr(fechas.dt, atributo).fillna(0).to_numpy().astype(np.int64)
+
+
+def calcular_edades_detalladas(fecha_nac, fecha_aten):
+    """
+    Versión vectorizada de calcular_edad_detallada para dos Series de fechas.
+    Calcula años, meses y días como arreglos enteros y solo formatea una vez
+    cada combinación distinta.
+    """
+    valido = (fecha_nac.notna() & fecha_aten.notna()).to_numpy()
+
+    años = _componente_fecha(fecha_aten, 'year') - _componente_fecha(fecha_nac, 'year')
+    meses = _componente_fecha(fecha_aten, 'month') - _componente_fecha(fecha_nac, 'month')
+    dias = _componente_fecha(fecha_aten, 'day') - _componente_fecha(fecha_nac, 'day')
+
+    dias_negativos = dias < 0
+    meses -= dias_negativos
+    dias += 30 * dias_negativos
+
+    meses_negativos = meses < 0
+    años -= meses_negativos
+    meses += 12 * meses_negativos
+
+    # meses en [0, 11] y días en [0, 30]: un código entero identifica la edad
+    codigos, inversa = np.unique(((años * 12 + meses) * 31 + dias)[valido], return_inverse=True)
+    textos = np.array(
+        [f"{c // 372}a {(c % 372) // 31}m {c % 31}d" for c in codigos.tolist()],
+        dtype=object
+    )
+
+    resultado = np.full(len(valido), "N/A", dtype=object)
+    resultado[valido] = textos[inversa]
+    return pd.Series(resultado, index=fecha_nac.index)
+
+
+def enriquecer_consolidado(df_consolidado, maestros, descripciones):
+    """
+    Une un consolidado con los maestros (ya preparados con preparar_maestros)
+    y agrega todas las columnas derivadas.
+    descripciones: dict con claves 'cie10', 'estab', 'ups', 'etnia'
+    """
+    df_pacientes, df_personal, df_registradores = maestros
+    df_completo = df_consolidado.copy()
+
+    # Convertir columnas ID a string para evitar problemas de tipos de datos
+    for col in ['Id_Paciente', 'Id_Personal', 'Id_Registrador']:
+        if col in df_completo.columns:
+            df_completo[col] = _id_a_texto(df_completo[col])
+
+    # Unir con los archivos maestros
+    with etapa('carga: merge pacientes'):
+        df_completo = pd.merge(df_completo, df_pacientes, on='Id_Paciente', how='left')
+    with etapa('carga: merge personal'):
+        df_completo = pd.merge(df_completo, df_personal, on='Id_Personal', how='left')
+    with etapa('carga: merge registradores'):
+        df_completo = pd.merge(df_completo, df_registradores, on='Id_Registrador', how='left')
+
+    # Calcular edad y crear columnas adicionales
+    with etapa('carga: fechas y edad'):
+        df_completo['pac_Fecha_Nacimiento'] = pd.to_datetime(df_completo['pac_Fecha_Nacimiento'], errors='coerce')
+        df_completo['Fecha_Atencion'] = pd.to_datetime(df_completo['Fecha_Atencion'], errors='coerce')
+        df_completo['edad_anos'] = ((df_completo['Fecha_Atencion'] - df_completo['pac_Fecha_Nacimiento']).dt.days / 365.25).round(1)
+
+    # Calcular edad en años, meses y días
+    with etapa('carga: edad_detallada'):
+        df_completo['edad_detallada'] = calcular_edades_detalladas(
+            df_completo['pac_Fecha_Nacimiento'], df_completo['Fecha_Atencion']
+        )
+
+    with etapa('carga: columnas derivadas'):
+        df_completo['Paciente_Completo'] = df_completo['pac_Apellido_Paterno_Paciente'].fillna('') + ' ' + \
+                                          df_completo['pac_Apellido_Materno_Paciente'].fillna('') + ', ' + \
+                                          df_completo['pac_Nombres_Paciente'].fillna('')
+
+        df_completo['Personal_Completo'] = df_completo['per_Apellido_Paterno_Personal'].fillna('') + ' ' + \
+                                          df_completo['per_Apellido_Materno_Personal'].fillna('') + ', ' + \
+                                          df_completo['per_Nombres_Personal'].fillna('')
+
+        df_completo['Turno_Desc'] = df_completo['Id_Turno'].map({1: 'Mañana', 2: 'Tarde', 3: 'Noche'})
+
+        # Descripción de condición de establecimiento y servicio
+        condicion_map = {'N': 'Nuevo', 'C': 'Continuador', 'R': 'Reingresante'}
+        df_completo['Condicion_Establecimiento_Desc'] = df_completo['Id_Condicion_Establecimiento'].map(condicion_map)
+        df_completo['Condicion_Servicio_Desc'] = df_completo['Id_Condicion_Servicio'].map(condicion_map)
+
+        # Formatear fechas
+        df_completo['Fecha_Formato'] = df_completo['Fecha_Atencion'].dt.strftime('%d/%m/%Y')
+        df_completo['Fecha_Nacimiento_Formato'] = df_completo['pac_Fecha_Nacimiento'].dt.strftime('%d/%m/%Y')
+
+        # Procesar FUR y calcular FPP (Fecha Probable de Parto) = FUR + 280 días
+        df_completo['Fecha_Ultima_Regla'] = pd.to_datetime(df_completo['Fecha_Ultima_Regla'], errors='coerce')
+        df_completo['FUR_Formato'] = df_completo['Fecha_Ultima_Regla'].dt.strftime('%d/%m/%Y')
+        df_completo['FPP'] = df_completo['Fecha_Ultima_Regla'] + pd.Timedelta(days=280)
+        df_completo['FPP_Formato'] = df_completo['FPP'].dt.strftime('%d/%m/%Y')
+
+        # Formatear fechas de registro y modificación
+        df_completo['Fecha_Registro'] = pd.to_datetime(df_completo['Fecha_Registro'], errors='coerce')
+        df_completo['Fecha_Modificacion'] = pd.to_datetime(df_completo['Fecha_Modificacion'], errors='coerce')
+        df_completo['Fecha_Registro_Formato'] = df_completo['Fecha_Registro'].dt.strftime('%d/%m/%Y %H:%M')
+        df_completo['Fecha_Modificacion_Formato'] = df_completo['Fecha_Modificacion'].dt.strftime('%d/%m/%Y %H:%M')
+
+        # Formato de Lote-Página-Registro
+        df_completo['Lote_Pag_Reg'] = df_completo['Lote'].astype(str) + '-' + \
+                                       df_completo['Num_Pag'].astype(str) + '-' + \
+                                       df_completo['Num_Reg'].astype(str)
+
+    with etapa('carga: descripciones'):
+        # Descripciones de CIE10
+        cie10_dict = descripciones.get('cie10') or {}
+        if cie10_dict:
+            df_completo['Codigo_Item_Clean'] = df_completo['Codigo_Item'].astype(str).str.strip().str.upper()
+            df_completo['CIE10_Descripcion'] = df_completo['Codigo_Item_Clean'].map(
+                limpiar_diccionario(cie10_dict, mayusculas=True)
+            ).fillna('Sin descripción')
+        else:
+            df_completo['CIE10_Descripcion'] = 'Sin archivo de descripciones'
+
+        # Descripciones de Establecimientos
+        estab_dict = descripciones.get('estab') or {}
+        if estab_dict:
+            df_completo['Id_Establecimiento_Str'] = df_completo['Id_Establecimiento'].astype(str).str.strip()
+            df_completo['Establecimiento_Nombre'] = df_completo['Id_Establecimiento_Str'].map(
+                limpiar_diccionario(estab_dict)
+            ).fillna('Sin nombre')
+        else:
+            df_completo['Establecimiento_Nombre'] = 'Sin archivo de descripciones'
+
+        # Descripciones de UPS
+        ups_dict = descripciones.get('ups') or {}
+        if ups_dict:
+            df_completo['Id_Ups_Str'] = df_completo['Id_Ups'].astype(str).str.strip()
+            df_completo['UPS_Descripcion'] = df_completo['Id_Ups_Str'].map(
+                limpiar_diccionario(ups_dict)
+            ).fillna('Sin descripción')
+        else:
+            df_completo['UPS_Descripcion'] = 'Sin archivo de descripciones'
+
+        # Descripciones de Etnias (diccionario básico si no hay archivo)
+        etnia_dict = descripciones.get('etnia') or {40: 'Mestizo', 58: 'Otros'}
+        df_completo['Etnia_Desc'] = df_completo['pac_Id_Etnia'].map(etnia_dict).fillna('No especificado')
+
+    return df_completo
+
+
+def estadisticas_descripciones(df_completo, descripciones):
+    """
+    Cobertura de cada mapeo de descripciones sobre el DataFrame enriquecido.
+    Retorna {nombre: (mapeados, total, unicos, columna_clave, diccionario_limpio)}
+    """
+    estadisticas = {}
+    total = len(df_completo)
+    fuentes = [
+        ('cie10', 'Codigo_Item_Clean', True),
+        ('estab', 'Id_Establecimiento_Str', False),
+        ('ups', 'Id_Ups_Str', False)
+    ]
+    for nombre, columna, mayusculas in fuentes:
+        diccionario = descripciones.get(nombre) or {}
+        if diccionario and columna in df_completo.columns:
+            limpio = limpiar_diccionario(diccionario, mayusculas=mayusculas)
+            mapeados = int(df_completo[columna].isin(limpio.keys()).sum())
+            unicos = df_completo[columna].dropna().nunique()
+            estadisticas[nombre] = (mapeados, total, unicos, columna, limpio)
+    return estadisticas
+
+
+# ==============================================================================
+# PROCESAMIENTO DE VARIOS ARCHIVOS
+# ==============================================================================
+
+def procesar_archivo(nombre_archivo, datos, maestros, descripciones, hash_maestros_actual,
+                     hash_descripciones_actual, usar_cache=True):
+    """
+    Lee y enriquece un archivo, usando la caché si el contenido no cambió.
+    Retorna (DataFrame enriquecido, origen) con origen 'caché' o 'procesado'.
+    """
+    clave = clave_cache(hash_bytes(datos), hash_maestros_actual, hash_descripciones_actual)
+
+    if usar_cache:
+        with etapa('carga: leer caché'):
+            df_cache = leer_cache(clave)
+        if df_cache is not None:
+            return df_cache, 'caché'
+
+    with etapa('carga: lectura CSV'):
+        df_consolidado = leer_consolidado(nombre_archivo, datos)
+    df_enriquecido = enriquecer_consolidado(df_consolidado, maestros, descripciones)
+
+    if usar_cache:
+        with etapa('carga: guardar caché'):
+            guardar_cache(clave, df_enriquecido)
+
+    return df_enriquecido, 'procesado'
+
+
+def _procesar_con_tiempo(nombre_archivo, datos, *args):
+    """procesar_archivo midiendo el tiempo; los errores se retornan en lugar de lanzarse"""
+    inicio = time.perf_counter()
+    try:
+        df_archivo, origen = procesar_archivo(nombre_archivo, datos, *args)
+        return df_archivo, origen, None, time.perf_counter() - inicio
+    except Exception as e:
+        return None, None, str(e), time.perf_counter() - inicio
+
+
+def cargar_consolidados(archivos, df_pacientes, df_personal, df_registradores, descripciones, usar_cache=True,
+                        n_hilos=None, huellas=None):
+    """
+    Procesa varios consolidados en paralelo (n_hilos; por defecto HILOS_POR_DEFECTO).
+    archivos: lista de (nombre, bytes)
+    huellas: resultado de huellas_carga, para no volver a calcular los hashes
+    Retorna (df_completo, archivos_procesados, errores, detalle) donde detalle
+    es una lista de {'archivo', 'origen', 'filas', 'segundos'} por archivo procesado.
+    El resultado se combina en el orden de entrada, sin importar cuál termina primero.
+    """
+    dfs_enriquecidos = []
+    archivos_procesados = []
+    errores = []
+    detalle = []
+
+    maestros = preparar_maestros(df_pacientes, df_personal, df_registradores)
+    if huellas is None:
+        huellas = huellas_carga(archivos, df_pacientes, df_personal, df_registradores, descripciones)
+    hash_maestros_actual = huellas['maestros']
+    hash_descripciones_actual = huellas['descripciones']
+    argumentos = (maestros, descripciones, hash_maestros_actual, hash_descripciones_actual, usar_cache)
+
+    n_hilos = max(1, min(n_hilos or HILOS_POR_DEFECTO, len(archivos) or 1))
+    with ThreadPoolExecutor(max_workers=n_hilos) as ejecutor:
+        futuros = [
+            ejecutor.submit(propagar(_procesar_con_tiempo), nombre_archivo, datos, *argumentos)
+            for nombre_archivo, datos in archivos
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+
+    for (nombre_archivo, _), (df_archivo, origen, error, segundos) in zip(archivos, resultados):
+        if error is not None:
+            errores.append(f"Error en {nombre_archivo}: {error}")
+            continue
+        dfs_enriquecidos.append(df_archivo)
+        archivos_procesados.append(nombre_archivo)
+        detalle.append({'archivo': nombre_archivo, 'origen': origen, 'filas': len(df_archivo),
+                        'segundos': round(segundos, 3)})
+
+    if not dfs_enriquecidos:
+        return None, archivos_procesados, errores, detalle
+
+    # Combinar todos los consolidados enriquecidos
+    with etapa('carga: concatenar y categorías'):
+        df_completo = aplicar_categorias(pd.concat(dfs_enriquecidos, ignore_index=True))
+
+    return df_completo, archivos_procesados, errores, detalle
+
+
+# ==============================================================================
+# MODO AGREGAR
+# ==============================================================================
+
+def llave_registro(df):
+    """Llave de texto por fila con las columnas de COLUMNAS_LLAVE_REGISTRO presentes"""
+    columnas = [c for c in COLUMNAS_LLAVE_REGISTRO if c in df.columns]
+    if not columnas:
+        return None
+    partes = [df[c].astype(str).str.replace(r'\.0$', '', regex=True) for c in columnas]
+    llave = partes[0]
+    for parte in partes[1:]:
+        llave = llave + '|' + parte
+    return llave
+
+
+def anexar_consolidados(df_existente, df_nuevo, filas_por_archivo=None):
+    """
+    Agrega al final de df_existente las filas de df_nuevo cuya atención
+    (Id_Cita/Lote/Num_Pag/Num_Reg) no esté ya cargada. Una atención que viene
+    en varios archivos del mismo lote (archivo subido dos veces, archivos que
+    se solapan) se toma solo del primero que la trae.
+    filas_por_archivo: filas de cada archivo de df_nuevo, en orden (None = un solo archivo)
+    Retorna (df_combinado, filas_agregadas, filas_duplicadas).
+    """
+    llaves_existentes = llave_registro(df_existente)
+    llaves_nuevas = llave_registro(df_nuevo)
+
+    if llaves_nuevas is not None:
+        repetidas = np.zeros(len(df_nuevo), dtype=bool)
+        if llaves_existentes is not None:
+            repetidas |= llaves_nuevas.isin(llaves_existentes).to_numpy()
+
+        # Repetidas dentro del lote: la atención pertenece al primer archivo donde aparece
+        if filas_por_archivo is not None and len(filas_por_archivo) > 1:
+            archivo = np.repeat(np.arange(len(filas_por_archivo)), filas_por_archivo)
+            codigos, _ = pd.factorize(llaves_nuevas)
+            _, primeras = np.unique(codigos, return_index=True)
+            repetidas |= archivo != archivo[primeras][codigos]
+
+        df_nuevo = df_nuevo[~repetidas]
+    duplicadas = len(llaves_nuevas) - len(df_nuevo) if llaves_nuevas is not None else 0
+
+    if df_nuevo.empty:
+        return df_existente, 0, duplicadas
+
+    df_existente, df_nuevo = alinear_categorias(df_existente, aplicar_categorias(df_nuevo.copy()))
+    df_combinado = pd.concat([df_existente, df_nuevo], ignore_index=True)
+    return df_combinado, len(df_nuevo), duplicadas
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compilador de Indicadores
+Sistema HISMINSA - Supervisión de Indicadores
+
+Convierte cada indicador de INDICADORES_* en un plan una sola vez, al
+importar el módulo del curso de vida. El plan guarda la banda de edad/género
+y la expresión (predicados Y/O de motor_cumplimiento) optimizada:
+  - Y/O anidados del mismo operador se aplanan y las subexpresiones
+    repetidas se eliminan
+  - absorción: en "A o (A y B)" sobra la segunda opción (y viceversa)
+  - las opciones de un O que solo difieren en el código (mismo tipo_dx, LAB
+    y edad) se fusionan en un predicado con todos los códigos
+  - las condiciones se ordenan: en un Y primero la más selectiva, en un O
+    primero la más amplia, y las que filtran edad por fila al final
+
+evaluar_plan es el único evaluador: aplica banda y fechas y evalúa la
+expresión con cortocircuito (un Y se detiene cuando ningún DNI puede
+cumplir). Con una sesión de evaluacion_compartida activa, los predicados
+que comparten varios planes sobre el mismo DataFrame, banda y fechas se
+evalúan una sola vez. Un indicador nuevo que solo usa reglas y las banderas que su
+módulo ya interpreta recibe su plan sin escribir código.
+"""
+
+from motor_cumplimiento import Predicado, predicados_de_expresion, filtrar_filas, filtrar_por_expresion
+from denominadores import banda_indicador
+from evaluacion_compartida import ambito
+
+
+# ---------------------------------------------------------------------------
+# Optimización de expresiones
+# ---------------------------------------------------------------------------
+
+def _cobertura(expresion):
+    """
+    Proporción estimada de DNIs que cumplen (solo sirve para ordenar): más
+    códigos o tipos amplían, un filtro de LAB o de edad restringe.
+    """
+    if isinstance(expresion, Predicado):
+        cobertura = len(expresion.codigos) * len(expresion.tipos_dx)
+        if expresion.lab_valores is not None:
+            cobertura *= 0.5
+        if expresion.edad is not None:
+            cobertura *= 0.5
+        return cobertura
+    operador, subexpresiones = expresion
+    coberturas = [_cobertura(sub) for sub in subexpresiones]
+    if operador == 'Y':
+        return min(coberturas)
+    return sum(coberturas)
+
+
+def _filtra_edad(expresion):
+    """¿Algún predicado filtra edad por fila? (recorre las filas y no solo las claves distintas)"""
+    return any(predicado.edad is not None for predicado in predicados_de_expresion(expresion))
+
+
+def _absorbidas(operador, subexpresiones):
+    """Quita las subexpresiones del operador contrario que contienen a una hermana"""
+    contrario = 'O' if operador == 'Y' else 'Y'
+    resultado = []
+    for sub in subexpresiones:
+        if not isinstance(sub, Predicado) and sub[0] == contrario and any(
+            otra is not sub and otra in sub[1] for otra in subexpresiones
+        ):
+            continue
+        resultado.append(sub)
+    return resultado
+
+
+def _fusionar_codigos(subexpresiones):
+    """En un O, une los predicados que solo difieren en el código"""
+    resultado = []
+    posicion = {}
+    for sub in subexpresiones:
+        if not isinstance(sub, Predicado):
+            resultado.append(sub)
+            continue
+        firma = sub._replace(codigos=None)
+        if firma in posicion:
+            previo = resultado[posicion[firma]]
+            codigos = tuple(sorted(set(previo.codigos) | set(sub.codigos)))
+            resultado[posicion[firma]] = previo._replace(codigos=codigos)
+        else:
+            posicion[firma] = len(resultado)
+            resultado.append(sub)
+    return resultado
+
+
+def optimizar_expresion(expresion):
+    """Expresión equivalente aplanada, sin repeticiones, con opciones fusionadas y ordenada"""
+    if isinstance(expresion, Predicado):
+        return expresion
+
+    operador, subexpresiones = expresion
+    planas = []
+    for sub in (optimizar_expresion(sub) for sub in subexpresiones):
+        # Aplanar Y dentro de Y y O dentro de O
+        candidatas = sub[1] if not isinstance(sub, Predicado) and sub[0] == operador else [sub]
+        for candidata in candidatas:
+            if candidata not in planas:
+                planas.append(candidata)
+
+    planas = _absorbidas(operador, planas)
+    if operador == 'O':
+        planas = _fusionar_codigos(planas)
+    if len(planas) == 1:
+        return planas[0]
+
+    # Y: la más selectiva primero (corta antes); O: la más amplia primero.
+    # Las que filtran edad por fila al final; en empate, las más simples
+    signo = 1 if operador == 'Y' else -1
+    planas.sort(key=lambda sub: (
+        _filtra_edad(sub), signo * _cobertura(sub), len(predicados_de_expresion(sub))
+    ))
+    return (operador, planas)
+
+
+# ---------------------------------------------------------------------------
+# Planes
+# ---------------------------------------------------------------------------
+
+def compilar_indicador(clave, indicador, expresion):
+    """
+    Plan de un indicador: {'clave', 'banda', 'fuente', 'expresion', 'por_filas',
+    'predicados', 'predicados_fuente'}.
+    expresion: la del módulo del curso de vida (None si no tiene; el plan
+    queda sin expresión y el módulo lo verifica por su cuenta).
+    por_filas: una sola regla; el resultado son sus filas y no todas las del DNI.
+    """
+    optimizada = optimizar_expresion(expresion) if expresion is not None else None
+    return {
+        'clave': clave,
+        'banda': banda_indicador(indicador),
+        'fuente': expresion,
+        'expresion': optimizada,
+        'por_filas': isinstance(expresion, Predicado),
+        'predicados': predicados_de_expresion(optimizada) if optimizada is not None else [],
+        'predicados_fuente': len(predicados_de_expresion(expresion)) if expresion is not None else 0
+    }
+
+
+def compilar_indicadores(indicadores, expresion_fuente):
+    """Planes de todos los indicadores: {clave: plan}; expresion_fuente(clave) da la expresión del módulo"""
+    return {
+        clave: compilar_indicador(clave, indicador, expresion_fuente(clave))
+        for clave, indicador in indicadores.items()
+    }
+
+
+def filtrar_banda(df, banda, fecha_inicio=None, fecha_fin=None):
+    """Filas dentro de la banda (edad_min, edad_max, genero) y, si se dan, del rango de fechas"""
+    edad_min, edad_max, genero = banda
+    mascara = (df['edad_anos'] >= edad_min) & (df['edad_anos'] <= edad_max)
+    if genero is not None:
+        mascara &= df['pac_Genero'] == genero
+    if fecha_inicio and fecha_fin:
+        mascara &= (df['Fecha_Atencion'] >= fecha_inicio) & (df['Fecha_Atencion'] <= fecha_fin)
+    return df[mascara]
+
+
+def evaluar_plan(df, plan, indice=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Filas que cumplen el plan dentro de su banda: las de la regla si es por
+    filas, o todas las filas de los DNIs que cumplen la expresión.
+    """
+    df_banda = filtrar_banda(df, plan['banda'], fecha_inicio, fecha_fin)
+    # El ámbito se define sobre df (df_banda es una copia nueva en cada llamada)
+    alcance = ambito(df, plan['banda'], fecha_inicio, fecha_fin)
+    if plan['por_filas']:
+        return filtrar_filas(df_banda, plan['expresion'], indice, alcance)
+    return filtrar_por_expresion(df_banda, plan['expresion'], indice, alcance)
+
+
+def resumen_planes(planes):
+    """Predicados antes y después de optimizar, por indicador (para revisar el compilador)"""
+    return [
+        {
+            'indicador': clave,
+            'predicados_fuente': plan['predicados_fuente'],
+            'predicados_plan': len(plan['predicados']),
+            'por_filas': plan['por_filas']
+        }
+        for clave, plan in planes.items() if plan['expresion'] is not None
+    ]
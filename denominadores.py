@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Población Elegible (Denominadores) por Banda de Edad y Género
+Sistema HISMINSA - Supervisión de Indicadores
+
+El denominador de un indicador son los DNIs únicos con edad entre edad_min y
+edad_max (y del género indicado, si lo hay). Los ~50 indicadores de los tres
+cursos de vida comparten unas pocas bandas (edad_min, edad_max, genero), así
+que los DNIs de cada banda se calculan una sola vez por conjunto filtrado y
+se guardan en una tabla que acompaña a los resúmenes del filtrado.
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNA_DNI = 'pac_Numero_Documento'
+
+
+def banda_indicador(indicador):
+    """(edad_min, edad_max, genero o None) del indicador"""
+    return (indicador['edad_min'], indicador['edad_max'], indicador.get('genero'))
+
+
+def bandas_indicadores(*catalogos):
+    """Bandas distintas de uno o más diccionarios de indicadores"""
+    bandas = []
+    for catalogo in catalogos:
+        for indicador in catalogo.values():
+            banda = banda_indicador(indicador)
+            if banda not in bandas:
+                bandas.append(banda)
+    return bandas
+
+
+def nueva_tabla_denominadores():
+    """Tabla vacía: {'etiquetas': índice de filas del conjunto, 'bandas': {banda: DNIs únicos}}"""
+    return {'etiquetas': None, 'bandas': {}}
+
+
+def _tabla_para(df, tabla):
+    """
+    La tabla si corresponde a df (mismas etiquetas de fila en el mismo orden);
+    si no se pasó o cambió el conjunto se vacía y queda asociada a df.
+    """
+    if tabla is None:
+        tabla = nueva_tabla_denominadores()
+    etiquetas = tabla['etiquetas']
+    if etiquetas is None or not (
+        df.index is etiquetas or (len(df) == len(etiquetas) and df.index.equals(etiquetas))
+    ):
+        tabla['bandas'].clear()
+        tabla['etiquetas'] = df.index
+    return tabla
+
+
+def precalcular_denominadores(df, bandas, tabla=None):
+    """
+    Calcula en una pasada los DNIs únicos de las bandas que falten en la tabla:
+    los DNIs se codifican una vez y cada banda es una máscara sobre arreglos.
+    Retorna la tabla.
+    """
+    tabla = _tabla_para(df, tabla)
+    pendientes = [banda for banda in bandas if banda not in tabla['bandas']]
+    if not pendientes:
+        return tabla
+
+    codigos, dnis = pd.factorize(df[COLUMNA_DNI], sort=False)
+    dnis = np.asarray(dnis, dtype=object)
+    edades = df['edad_anos'].to_numpy(dtype=float)
+    generos = df['pac_Genero'].to_numpy(dtype=object) if 'pac_Genero' in df.columns else None
+    validos = codigos >= 0
+
+    for edad_min, edad_max, genero in pendientes:
+        mascara = validos & (edades >= edad_min) & (edades <= edad_max)
+        if genero is not None:
+            mascara &= (generos == genero) if generos is not None else False
+        presentes = np.zeros(len(dnis), dtype=bool)
+        presentes[codigos[mascara]] = True
+        tabla['bandas'][(edad_min, edad_max, genero)] = dnis[presentes]
+
+    return tabla
+
+
+def dnis_elegibles(df, banda, tabla=None):
+    """DNIs únicos (arreglo) de la banda, usando la tabla si ya fue calculada"""
+    tabla = precalcular_denominadores(df, [banda], tabla)
+    return tabla['bandas'][banda]
+
+
+def denominador_banda(df, banda, tabla=None):
+    """Número de DNIs únicos elegibles en la banda"""
+    return len(dnis_elegibles(df, banda, tabla))
+
+
+def denominador_indicador(df, indicador, tabla=None):
+    """Número de DNIs únicos elegibles para el indicador"""
+    return denominador_banda(df, banda_indicador(indicador), tabla)
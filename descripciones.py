@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diccionarios de Descripciones
+Sistema HISMINSA - Supervisión de Indicadores
+
+Lee codigos_descripcion.xlsx (hojas CIE, ESTABLECIMIENTO, UPS y ETNIA) una
+sola vez y guarda los diccionarios ya limpios en un archivo compilado junto
+al Excel. Las siguientes sesiones lo cargan en milisegundos; se invalida si
+cambia la fecha de modificación/tamaño y el contenido del Excel. Además hay
+una caché en memoria compartida por todas las sesiones del proceso.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_DESCRIPCIONES = os.path.join(BASE_PATH, 'codigos_descripcion.xlsx')
+
+# Subir cuando cambie la forma de leer o limpiar las hojas
+VERSION_COMPILADO = 1
+
+# Hojas a leer: (clave, texto a buscar en el nombre de la hoja, mensaje de éxito)
+HOJAS_DESCRIPCIONES = [
+    ('cie10', 'CIE', 'CIE10 cargado: {n} códigos'),
+    ('estab', 'ESTABLECIMIENTO', 'Establecimientos cargado: {n} registros'),
+    ('ups', 'UPS', 'UPS cargado: {n} servicios'),
+    ('etnia', 'ETNIA', 'Etnias cargado: {n} etnias')
+]
+
+NOMBRES_HOJAS = {'cie10': 'CIE10', 'estab': 'Establecimientos', 'ups': 'UPS', 'etnia': 'Etnias'}
+
+# Caché del proceso: {ruta: (firma, diccionarios)}
+_CACHE_PROCESO = {}
+_BLOQUEO = threading.Lock()
+
+
+def ruta_compilado(archivo_desc):
+    """Archivo compilado que acompaña al Excel"""
+    return os.path.splitext(archivo_desc)[0] + '.compilado.pkl'
+
+
+def firma_archivo(archivo_desc):
+    """(fecha de modificación, tamaño) del Excel"""
+    estado = os.stat(archivo_desc)
+    return (estado.st_mtime_ns, estado.st_size)
+
+
+def hash_archivo(archivo_desc):
+    """Hash de contenido del Excel"""
+    h = hashlib.sha256()
+    with open(archivo_desc, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def fix_encoding(text):
+    """Corrige problemas de codificación UTF-8/Latin-1"""
+    if pd.isna(text):
+        return text
+
+    text = str(text)
+
+    # Si el texto contiene caracteres típicos de mala codificación
+    if 'Ã' in text or 'Â' in text:
+        # Intentar recodificar de latin-1 a utf-8
+        try:
+            text_fixed = text.encode('latin-1', errors='ignore').decode('utf-8', errors='ignore')
+            # Solo usar el texto corregido si no tiene caracteres de reemplazo
+            if '�' not in text_fixed:
+                return text_fixed
+        except Exception:
+            pass
+
+    return text
+
+
+def _diccionario_hoja(clave, df_hoja):
+    """Diccionario id -> descripción de una hoja (ids como texto; etnias como entero si es posible)"""
+    descripciones = df_hoja.iloc[:, 1].apply(fix_encoding)
+    if clave == 'etnia':
+        try:
+            return dict(zip(df_hoja.iloc[:, 0].astype(int), descripciones))
+        except (TypeError, ValueError):
+            pass
+    return dict(zip(df_hoja.iloc[:, 0].astype(str).str.strip(), descripciones))
+
+
+def leer_descripciones_excel(archivo_desc):
+    """
+    Lee las hojas del Excel abriéndolo una sola vez.
+    Retorna (diccionarios, mensajes) con diccionarios = {'cie10', 'estab', 'ups', 'etnia'}
+    y mensajes = lista de (nivel, texto) con nivel en info/success/warning/error.
+    """
+    diccionarios = {clave: {} for clave, _, _ in HOJAS_DESCRIPCIONES}
+    mensajes = []
+
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        mensajes.append(('error', "❌ Necesitas instalar openpyxl: pip install openpyxl"))
+        return diccionarios, mensajes
+
+    try:
+        xl_file = pd.ExcelFile(archivo_desc, engine='openpyxl')
+    except Exception as e:
+        mensajes.append(('error', f"❌ Error al abrir el archivo Excel: {str(e)}"))
+        return diccionarios, mensajes
+
+    with xl_file:
+        hojas_disponibles = xl_file.sheet_names
+        mensajes.append(('info', f"📋 Hojas encontradas en el archivo: {', '.join(hojas_disponibles)}"))
+
+        for clave, buscar, mensaje_exito in HOJAS_DESCRIPCIONES:
+            hojas = [h for h in hojas_disponibles if buscar in h.upper()]
+            if not hojas:
+                continue
+            try:
+                df_hoja = xl_file.parse(hojas[0])
+                if len(df_hoja.columns) >= 2:
+                    diccionarios[clave] = _diccionario_hoja(clave, df_hoja)
+                    mensajes.append(('success', "✅ " + mensaje_exito.format(n=len(diccionarios[clave]))))
+            except Exception as e:
+                mensajes.append(('warning', f"⚠️ Error al leer hoja {NOMBRES_HOJAS[clave]}: {str(e)}"))
+
+    return diccionarios, mensajes
+
+
+def _leer_compilado(archivo_desc, firma):
+    """Diccionarios del archivo compilado si sigue vigente para el Excel; si no, None"""
+    ruta = ruta_compilado(archivo_desc)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, 'rb') as f:
+            compilado = pickle.load(f)
+    except Exception:
+        return None
+
+    if compilado.get('version') != VERSION_COMPILADO:
+        return None
+    if compilado.get('firma') == firma:
+        return compilado['diccionarios']
+
+    # Cambió la fecha (ej. copia del archivo): comparar contenido antes de recompilar
+    if compilado.get('hash') == hash_archivo(archivo_desc):
+        _guardar_compilado(archivo_desc, firma, compilado['hash'], compilado['diccionarios'])
+        return compilado['diccionarios']
+    return None
+
+
+def _guardar_compilado(archivo_desc, firma, hash_excel, diccionarios):
+    """Guarda los diccionarios compilados (escritura atómica)"""
+    ruta = ruta_compilado(archivo_desc)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, 'wb') as f:
+            pickle.dump({
+                'version': VERSION_COMPILADO,
+                'firma': firma,
+                'hash': hash_excel,
+                'diccionarios': diccionarios
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)
+    except OSError:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def cargar_descripciones(archivo_desc=ARCHIVO_DESCRIPCIONES, forzar=False):
+    """
+    Diccionarios de descripciones usando, en orden: caché del proceso,
+    archivo compilado y, si ninguno está vigente (o forzar=True), el Excel.
+    Retorna (diccionarios, mensajes, origen) con origen 'memoria', 'compilado' o 'excel'.
+    """
+    if not os.path.exists(archivo_desc):
+        diccionarios = {clave: {} for clave, _, _ in HOJAS_DESCRIPCIONES}
+        return diccionarios, [('warning', f"No se encontró el archivo: {archivo_desc}")], 'excel'
+
+    firma = firma_archivo(archivo_desc)
+
+    with _BLOQUEO:
+        if not forzar:
+            en_memoria = _CACHE_PROCESO.get(archivo_desc)
+            if en_memoria is not None and en_memoria[0] == firma:
+                return en_memoria[1], [], 'memoria'
+
+            diccionarios = _leer_compilado(archivo_desc, firma)
+            if diccionarios is not None:
+                _CACHE_PROCESO[archivo_desc] = (firma, diccionarios)
+                return diccionarios, [], 'compilado'
+
+        diccionarios, mensajes = leer_descripciones_excel(archivo_desc)
+
+        # Solo se compila una lectura sin errores
+        if not any(nivel in ('error', 'warning') for nivel, _ in mensajes):
+            _guardar_compilado(archivo_desc, firma, hash_archivo(archivo_desc), diccionarios)
+            _CACHE_PROCESO[archivo_desc] = (firma, diccionarios)
+
+        return diccionarios, mensajes, 'excel'
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Evaluación Compartida de Predicados
+Sistema HISMINSA - Supervisión de Indicadores
+
+Muchos indicadores y componentes de paquete usan los mismos predicados
+(99402.09, Z019 con DNT, Z017, 99401.13, 99801 con LAB 1/TA...). Mientras
+hay una sesión de evaluación activa, cada predicado se evalúa una sola vez
+por ámbito (el mismo DataFrame con la misma banda de edad/género y fechas)
+y las banderas por DNI o la máscara de filas se reutilizan en todo lo que
+se calcula en esa petición: indicadores, paquetes, exportación y tablero.
+
+La sesión vive en un ContextVar como la traza de perfilado.py: la app abre
+una por ejecución del script y el procesamiento por lotes una por corrida;
+los hilos lanzados con perfilado.propagar comparten la de quien los lanza.
+Sin sesión activa no se guarda nada. resumir_sesion cuenta las consultas,
+las evaluaciones reales y los recorridos de datos ahorrados.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_SESION = ContextVar('sesion_evaluacion_hisminsa', default=None)
+_BLOQUEO = threading.Lock()
+
+
+def nueva_sesion():
+    """Sesión vacía: DataFrames registrados, resultados por (ámbito, clave) y contadores por etiqueta"""
+    return {
+        'dataframes': {},
+        'resultados': {},
+        'consultas': {},
+        'evaluaciones': {}
+    }
+
+
+@contextmanager
+def sesion_evaluacion():
+    """Activa una sesión nueva mientras dura el bloque"""
+    sesion = nueva_sesion()
+    token = _SESION.set(sesion)
+    try:
+        yield sesion
+    finally:
+        _SESION.reset(token)
+
+
+def sesion_activa():
+    """Sesión en la que se comparten los resultados (None si no hay)"""
+    return _SESION.get()
+
+
+def ambito(df, *detalle):
+    """
+    Clave hashable del subconjunto de filas: el DataFrame (por identidad;
+    la sesión conserva una referencia para que no se reutilice su id) más
+    el detalle (banda, fechas). None sin sesión activa.
+    """
+    sesion = _SESION.get()
+    if sesion is None:
+        return None
+    with _BLOQUEO:
+        sesion['dataframes'].setdefault(id(df), df)
+    return (id(df),) + detalle
+
+
+def reutilizar(alcance, clave, calcular, etiqueta=None):
+    """
+    Resultado de calcular() para (alcance, clave), calculado una sola vez por
+    sesión. Con etiqueta la consulta se cuenta en el resumen como recorrido
+    de datos (evaluado o ahorrado).
+    """
+    sesion = _SESION.get()
+    if sesion is None or alcance is None:
+        return calcular()
+
+    llave = (alcance, clave)
+    with _BLOQUEO:
+        encontrado = llave in sesion['resultados']
+        resultado = sesion['resultados'].get(llave)
+        if etiqueta is not None:
+            sesion['consultas'][etiqueta] = sesion['consultas'].get(etiqueta, 0) + 1
+    if encontrado:
+        return resultado
+
+    resultado = calcular()
+    with _BLOQUEO:
+        sesion['resultados'][llave] = resultado
+        if etiqueta is not None:
+            sesion['evaluaciones'][etiqueta] = sesion['evaluaciones'].get(etiqueta, 0) + 1
+    return resultado
+
+
+def registrar_consulta(etiqueta, evaluada):
+    """Cuenta una consulta resuelta con una caché propia (ej. el contexto del tablero)"""
+    sesion = _SESION.get()
+    if sesion is None:
+        return
+    with _BLOQUEO:
+        sesion['consultas'][etiqueta] = sesion['consultas'].get(etiqueta, 0) + 1
+        if evaluada:
+            sesion['evaluaciones'][etiqueta] = sesion['evaluaciones'].get(etiqueta, 0) + 1
+
+
+def resumir_sesion(sesion):
+    """
+    {'consultas', 'evaluaciones', 'recorridos_ahorrados', 'predicados'} con
+    predicados = lista de {'predicado', 'consultas', 'evaluaciones', 'ahorrados'}
+    ordenada por recorridos ahorrados.
+    """
+    with _BLOQUEO:
+        consultas = dict(sesion['consultas'])
+        evaluaciones = dict(sesion['evaluaciones'])
+
+    predicados = [
+        {
+            'predicado': etiqueta,
+            'consultas': n,
+            'evaluaciones': evaluaciones.get(etiqueta, 0),
+            'ahorrados': n - evaluaciones.get(etiqueta, 0)
+        }
+        for etiqueta, n in consultas.items()
+    ]
+    predicados.sort(key=lambda fila: (-fila['ahorrados'], fila['predicado']))
+    total_consultas = sum(consultas.values())
+    total_evaluaciones = sum(evaluaciones.values())
+    return {
+        'consultas': total_consultas,
+        'evaluaciones': total_evaluaciones,
+        'recorridos_ahorrados': total_consultas - total_evaluaciones,
+        'predicados': predicados
+    }
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportación JSON para el Script de Automatización HIS-MINSA
+Sistema HISMINSA - Supervisión de Indicadores
+
+Arma el JSON de pacientes con paquete integral incompleto (códigos faltantes
+por componente, planes 99801 y consejerías agrupadas) y el JSON
+personalizado con los pacientes y códigos elegidos. No depende de
+Streamlit: lo usan la aplicación web y el procesamiento por lotes
+(hisminsa_cli.py); las descripciones CIE10 y la opción de exportar solo
+faltantes se pasan como parámetros.
+"""
+
+from datetime import datetime
+
+from indicadores_adulto import (
+    INDICADORES_ADULTO,
+    PAQUETE_INTEGRAL_ADULTO,
+    verificar_paquete_integral as verificar_paquete_adulto,
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto
+)
+from indicadores_joven import (
+    INDICADORES_JOVEN,
+    PAQUETE_INTEGRAL_JOVEN,
+    verificar_paquete_integral as verificar_paquete_joven,
+    verificar_paquete_integral_lote as verificar_paquete_lote_joven
+)
+from indicadores_adulto_mayor import (
+    INDICADORES_ADULTO_MAYOR,
+    PAQUETE_INTEGRAL_ADULTO_MAYOR,
+    verificar_paquete_integral as verificar_paquete_adulto_mayor,
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto_mayor
+)
+from motor_cumplimiento import componentes_de_lote, resultado_paquete_desde_fila
+from indice_presencia import filas_paciente, registros_paciente, registros_desde_df
+from perfilado import perfilar
+
+
+def obtener_codigos_faltantes_paquete(df_paciente, curso_vida, registros=None, resultado_paquete=None,
+                                      cie10_dict=None):
+    """
+    Identifica qué códigos le faltan a un paciente para completar su paquete integral
+    Retorna lista de diagnósticos faltantes con formato para JSON
+    resultado_paquete: resultado ya calculado (ej. desde el lote); se verifica si no se pasa
+    cie10_dict: descripciones CIE10 para los diagnósticos (opcional)
+    """
+    codigos_faltantes = []
+    
+    if registros is None:
+        registros = registros_desde_df(df_paciente)
+    
+    # Obtener información según curso de vida
+    if curso_vida == "Adulto (30-59 años)":
+        paquete_info = PAQUETE_INTEGRAL_ADULTO
+        verificar_func = verificar_paquete_adulto
+        edad_paciente = df_paciente['edad_anos'].iloc[0]
+    elif curso_vida == "Joven (18-29 años)":
+        paquete_info = PAQUETE_INTEGRAL_JOVEN
+        verificar_func = verificar_paquete_joven
+        edad_paciente = df_paciente['edad_anos'].iloc[0]
+    else:  # Adulto Mayor
+        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
+        verificar_func = verificar_paquete_adulto_mayor
+        edad_paciente = df_paciente['edad_anos'].iloc[0]
+    
+    # Verificar qué tiene y qué le falta
+    if resultado_paquete is None:
+        dni = df_paciente['pac_Numero_Documento'].iloc[0]
+        resultado_paquete = verificar_func(df_paciente, dni)
+    
+    # Revisar cada componente del paquete
+    for componente in paquete_info['componentes_minimos']:
+        if not resultado_paquete['componentes'].get(componente['componente'], False):
+            # Este componente le falta, obtener los códigos necesarios
+            if 'indicador' in componente:
+                # Buscar el indicador correspondiente
+                if curso_vida == "Adulto (30-59 años)":
+                    indicador_info = INDICADORES_ADULTO.get(componente['indicador'], {})
+                elif curso_vida == "Joven (18-29 años)":
+                    indicador_info = INDICADORES_JOVEN.get(componente['indicador'], {})
+                else:
+                    indicador_info = INDICADORES_ADULTO_MAYOR.get(componente['indicador'], {})
+                
+                # Procesar reglas del indicador
+                if 'reglas' in indicador_info:
+                    reglas = indicador_info['reglas']
+                    
+                    # Manejar diferentes estructuras de reglas
+                    if isinstance(reglas, dict):
+                        # Caso especial: reglas con opciones (ej: agudeza visual)
+                        if 'opcion_a' in reglas:
+                            # Por defecto usar opción A
+                            for codigo_info in reglas['opcion_a'].get('codigos', []):
+                                codigos_faltantes.append(crear_diagnostico_json(codigo_info, cie10_dict))
+                    elif isinstance(reglas, list):
+                        # Reglas normales
+                        for regla in reglas:
+                            # Verificar si esta regla específica ya fue cumplida
+                            if not verificar_codigo_existe(df_paciente, regla['codigo'], registros):
+                                # Para valoración clínica de adultos, no incluir Z017 aquí
+                                if curso_vida == "Adulto (30-59 años)" and componente['indicador'] == 'valoracion_clinica_lab':
+                                    # Solo agregar los códigos básicos (Z019, 99199.22, 99401.13)
+                                    # El Z017 se maneja aparte según la edad
+                                    codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+                                elif curso_vida == "Adulto Mayor (60+ años)" and componente['indicador'] == 'valoracion_clinica_lab':
+                                    # Para adulto mayor, laboratorio SIEMPRE obligatorio
+                                    codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+                                else:
+                                    codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+                
+                # Agregar Z017 para adultos 40-59 si es valoración clínica
+                if (componente['indicador'] == 'valoracion_clinica_lab' and 
+                    curso_vida == "Adulto (30-59 años)" and 
+                    edad_paciente >= 40 and edad_paciente <= 59):
+                    if not verificar_codigo_existe(df_paciente, 'Z017', registros):
+                        codigos_faltantes.append({
+                            "codigo": "Z017",
+                            "descripcion": "Z017 - Tamizaje laboratorial",
+                            "tipo": "D",
+                            "lab": ""
+                        })
+            
+            # Manejo especial para componentes con reglas por edad (paquete adulto)
+            elif 'reglas_30_39' in componente or 'reglas_40_59' in componente:
+                if edad_paciente >= 30 and edad_paciente <= 39 and 'reglas_30_39' in componente:
+                    for regla in componente['reglas_30_39']:
+                        if not verificar_codigo_existe(df_paciente, regla['codigo'], registros):
+                            if 'condicion' in regla and regla['codigo'] == 'Z017':
+                                # Laboratorio condicional
+                                factores_riesgo = regla.get('factores_riesgo', [])
+                                tiene_factores = any(codigo in registros for codigo in factores_riesgo)
+                                if tiene_factores:
+                                    codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+                            else:
+                                codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+                elif edad_paciente >= 40 and edad_paciente <= 59 and 'reglas_40_59' in componente:
+                    for regla in componente['reglas_40_59']:
+                        if not verificar_codigo_existe(df_paciente, regla['codigo'], registros):
+                            codigos_faltantes.append(crear_diagnostico_json(regla, cie10_dict))
+    
+    # Agregar código de plan si no lo tiene
+    if not resultado_paquete['plan_elaborado']:
+        codigos_faltantes.append({
+            "codigo": "99801",
+            "descripcion": "99801 - Plan de Atención Integral Elaborado",
+            "tipo": "D",
+            "lab": "1"
+        })
+    
+    if not resultado_paquete['plan_ejecutado']:
+        codigos_faltantes.append({
+            "codigo": "99801",
+            "descripcion": "99801 - Plan de Atención Integral Ejecutado",
+            "tipo": "D",
+            "lab": "TA"
+        })
+    
+    return codigos_faltantes
+
+
+def verificar_codigo_existe(df_paciente, codigo, registros=None):
+    """Verifica si un código ya existe en los registros del paciente"""
+    if registros is not None:
+        return codigo in registros
+    return not df_paciente[df_paciente['Codigo_Item'] == codigo].empty
+
+
+def crear_diagnostico_json(regla, cie10_dict=None):
+    """Crea un diagnóstico en formato JSON a partir de una regla"""
+    # Obtener descripción del diccionario CIE10 si está disponible
+    codigo = regla['codigo']
+    descripcion_cie = ""
+    if cie10_dict and codigo in cie10_dict:
+        descripcion_cie = cie10_dict[codigo]
+    else:
+        descripcion_cie = regla.get('descripcion', 'Descripción no disponible')
+    
+    diagnostico = {
+        "codigo": codigo,
+        "descripcion": f"{codigo} - {descripcion_cie}",
+        "tipo": regla.get('tipo_dx', 'D')
+    }
+    
+    # Primero verificar si hay un valor 'lab' directo en la regla (como en reglas_30_39, reglas_40_59)
+    if 'lab' in regla:
+        if isinstance(regla['lab'], list):
+            # Si es lista, usar el primer valor
+            diagnostico["lab"] = regla['lab'][0]
+        elif isinstance(regla['lab'], str):
+            diagnostico["lab"] = regla['lab']
+    # Luego verificar lab_valores (estructura de indicadores)
+    elif 'lab_valores' in regla and regla['lab_valores']:
+        if isinstance(regla['lab_valores'], list) and len(regla['lab_valores']) > 0:
+            # Usar el primer valor no vacío
+            lab_val = next((v for v in regla['lab_valores'] if v != ""), None)
+            if lab_val:
+                diagnostico["lab"] = lab_val
+        elif isinstance(regla['lab_valores'], str) and regla['lab_valores']:
+            diagnostico["lab"] = regla['lab_valores']
+    
+    # Casos especiales de LAB según el código
+    if codigo == 'Z019' and 'lab' not in diagnostico:
+        diagnostico["lab"] = "DNT"
+    elif codigo == '99199.22' and 'lab' not in diagnostico:
+        diagnostico["lab"] = "N"  # Normal por defecto
+    elif codigo == '99387' and 'lab' not in diagnostico:
+        diagnostico["lab"] = "AS"  # Autosuficiente por defecto para VACAM
+    elif codigo == '99215.03' and 'lab' not in diagnostico:
+        diagnostico["lab"] = "AS"  # Autosuficiente por defecto para VACAM alternativo
+    elif codigo in ['99209.02', '99209.04'] and 'lab' not in diagnostico:
+        diagnostico["lab"] = "RSM"  # Riesgo de Salud Metabólica por defecto para valoración nutricional
+    elif codigo == '99801':
+        # Plan de atención integral - se maneja en la función principal
+        pass
+    
+    return diagnostico
+
+
+def paquete_lote(df, curso_vida, indice=None):
+    """Paquete integral de todos los DNIs del curso de vida en una sola pasada"""
+    if curso_vida == "Adulto (30-59 años)":
+        return verificar_paquete_lote_adulto(df, indice)
+    if curso_vida == "Joven (18-29 años)":
+        return verificar_paquete_lote_joven(df, indice)
+    return verificar_paquete_lote_adulto_mayor(df, indice)
+
+
+@perfilar('exportación JSON')
+def generar_json_exportacion(df_filtrado, filtro_estado, curso_vida, indice=None, cie10_dict=None, df_lote=None):
+    """
+    Genera el JSON de exportación para pacientes con paquetes incompletos
+    Compatible con el script de automatización HIS-MINSA
+    filtro_estado: "Incompletos" o "Casi Completos (1-2 faltantes)" (otro valor retorna None)
+    df_lote: resultado de paquete_lote ya calculado (se calcula si no se pasa)
+    """
+    pacientes_json = []
+    
+    # Paquete de todos los DNIs en una sola pasada
+    if df_lote is None:
+        df_lote = paquete_lote(df_filtrado, curso_vida, indice)
+    
+    # Filtrar según el estado seleccionado
+    if filtro_estado == "Incompletos":
+        # Obtener solo pacientes con paquete incompleto
+        seleccion = ~df_lote['completo']
+    elif filtro_estado == "Casi Completos (1-2 faltantes)":
+        # Determinar número total de componentes según curso de vida
+        if curso_vida == "Adulto (30-59 años)":
+            num_componentes_total = 7
+        elif curso_vida == "Joven (18-29 años)":
+            num_componentes_total = 6
+        else:  # Adulto Mayor
+            num_componentes_total = 7
+        
+        # Calcular componentes completados
+        componentes_faltantes = num_componentes_total - df_lote[componentes_de_lote(df_lote)].sum(axis=1)
+        
+        # Si le faltan 1 o 2 componentes
+        seleccion = componentes_faltantes.isin([1, 2]) & ~df_lote['completo']
+    else:
+        return None
+    
+    df_lote = df_lote[seleccion].set_index('pac_Numero_Documento', drop=False)
+    df_procesar = df_filtrado[df_filtrado['pac_Numero_Documento'].isin(df_lote.index)]
+    
+    # Procesar cada paciente (agrupado en orden de aparición, sin límite)
+    for dni, df_paciente in df_procesar.groupby('pac_Numero_Documento', sort=False):
+        info_paciente = df_paciente.iloc[0]
+        
+        # Obtener códigos faltantes
+        registros = registros_paciente(indice, dni) if indice is not None else None
+        resultado_paquete = resultado_paquete_desde_fila(df_lote.loc[dni])
+        codigos_faltantes = obtener_codigos_faltantes_paquete(
+            df_paciente, curso_vida, registros, resultado_paquete, cie10_dict
+        )
+        
+        if codigos_faltantes:
+            # Optimizar códigos antes de agregar
+            codigos_optimizados = optimizar_codigos_exportacion(codigos_faltantes)
+            
+            paciente_json = {
+                "dni": dni,
+                "nombre": info_paciente['Paciente_Completo'],
+                "edad": str(int(info_paciente['edad_anos'])),
+                "sexo": info_paciente['pac_Genero'],
+                "diagnosticos": codigos_optimizados
+            }
+            pacientes_json.append(paciente_json)
+    
+    # Estructura final del JSON
+    fecha_actual = datetime.now()
+    json_exportacion = {
+        "fecha_exportacion": fecha_actual.isoformat(),
+        "dia_his": str(fecha_actual.day),
+        "fecha_atencion": fecha_actual.strftime("%Y-%m-%d"),
+        "curso_vida": curso_vida,
+        "tipo_correccion": "paquete_integral_incompleto",
+        "total_pacientes": len(pacientes_json),
+        "cambios_realizados": 0,
+        "pacientes": pacientes_json
+    }
+    
+    return json_exportacion
+
+
+def optimizar_codigos_exportacion(codigos_list):
+    """
+    Optimiza la lista de códigos eliminando duplicados y agrupando consejerías
+    """
+    # Eliminar duplicados exactos
+    codigos_unicos = {}
+    for codigo in codigos_list:
+        key = f"{codigo['codigo']}_{codigo.get('lab', '')}"
+        if key not in codigos_unicos:
+            codigos_unicos[key] = codigo
+    
+    # Convertir de vuelta a lista
+    codigos_optimizados = list(codigos_unicos.values())
+    
+    # Identificar códigos de tamizaje de salud mental
+    codigos_salud_mental = ['96150.01', '96150.02', '96150.03', '96150.04', '96150.07']
+    consejerias_salud_mental = ['99402.01', '99402.09']
+    
+    # Verificar si hay tamizajes de salud mental
+    tiene_tamizajes_sm = any(c['codigo'] in codigos_salud_mental for c in codigos_optimizados)
+    
+    if tiene_tamizajes_sm:
+        # Eliminar todas las consejerías de salud mental existentes
+        codigos_optimizados = [c for c in codigos_optimizados if c['codigo'] not in consejerias_salud_mental]
+        
+        # Agregar una sola consejería de salud mental (99402.09)
+        codigos_optimizados.append({
+            "codigo": "99402.09",
+            "descripcion": "99402.09 - Consejería en salud mental",
+            "tipo": "D",
+            "lab": ""
+        })
+    
+    return codigos_optimizados
+
+
+@perfilar('exportación JSON personalizada')
+def generar_json_exportacion_personalizada(df_filtrado, pacientes_seleccionados, componentes_seleccionados,
+                                           codigos_seleccionados_dict, curso_vida, indice=None,
+                                           exportar_solo_faltantes=True, cie10_dict=None):
+    """
+    Genera JSON personalizado con selección específica de pacientes y códigos
+    exportar_solo_faltantes: omitir los códigos que el paciente ya tiene
+    (False los incluye para corregir el LAB)
+    """
+    pacientes_json = []
+    
+    # Obtener información de referencia según curso de vida
+    if curso_vida == "Adulto (30-59 años)":
+        paquete_info = PAQUETE_INTEGRAL_ADULTO
+        componentes_disponibles = paquete_info['componentes_minimos']
+        indicadores_ref = INDICADORES_ADULTO
+    elif curso_vida == "Joven (18-29 años)":
+        paquete_info = PAQUETE_INTEGRAL_JOVEN
+        componentes_disponibles = paquete_info['componentes_minimos']
+        indicadores_ref = INDICADORES_JOVEN
+    else:
+        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
+        componentes_disponibles = paquete_info['componentes_minimos']
+        indicadores_ref = INDICADORES_ADULTO_MAYOR
+    
+    # Procesar cada paciente seleccionado
+    for dni in pacientes_seleccionados:
+        df_paciente = filas_paciente(indice, df_filtrado, dni)
+        if df_paciente.empty:
+            continue
+            
+        info_paciente = df_paciente.iloc[0]
+        edad_paciente = info_paciente['edad_anos']
+        registros = registros_paciente(indice, dni) if indice is not None else registros_desde_df(df_paciente)
+        
+        # Recolectar códigos para este paciente
+        codigos_paciente = []
+        
+        # Procesar cada componente seleccionado
+        for comp_nombre in componentes_seleccionados:
+            # Saltar el Plan de Atención Integral ya que se maneja por separado
+            if comp_nombre == "Plan de Atención Integral":
+                continue
+                
+            # Encontrar el componente
+            componente = next((c for c in componentes_disponibles if c['componente'] == comp_nombre), None)
+            
+            if componente and 'indicador' in componente:
+                indicador_key = componente['indicador']
+                
+                # Si hay códigos seleccionados específicos para este indicador
+                if indicador_key in codigos_seleccionados_dict and codigos_seleccionados_dict[indicador_key]:
+                    codigos_seleccionados_indicador = codigos_seleccionados_dict[indicador_key]
+                    
+                    # Agregar cada código seleccionado
+                    for codigo_info in codigos_seleccionados_indicador:
+                        # Verificar si debemos incluirlo según la configuración
+                        if exportar_solo_faltantes and verificar_codigo_existe(df_paciente, codigo_info['codigo'], registros):
+                            continue  # Saltar si ya existe y solo queremos faltantes
+                            
+                        # Crear diagnóstico JSON
+                        diagnostico = crear_diagnostico_json(codigo_info['regla'], cie10_dict)
+                        
+                        # Aplicar lógica especial para casos específicos
+                        if aplicar_logica_especial_codigo(codigo_info['codigo'], edad_paciente, df_paciente, curso_vida):
+                            codigos_paciente.append(diagnostico)
+                else:
+                    # Si no está en el diccionario o está vacío, incluir todos los códigos del indicador
+                    indicador_info = indicadores_ref.get(indicador_key, {})
+                    if 'reglas' in indicador_info:
+                        reglas = indicador_info['reglas']
+                        
+                        if isinstance(reglas, list):
+                            for regla in reglas:
+                                # Verificar si debemos incluirlo según la configuración
+                                codigo_existe = verificar_codigo_existe(df_paciente, regla['codigo'], registros)
+                                if exportar_solo_faltantes and codigo_existe:
+                                    continue  # Saltar si ya existe y solo queremos faltantes
+                                
+                                # Aplicar lógica especial solo para casos específicos
+                                incluir_codigo = True
+                                
+                                # Caso especial: laboratorio para adultos 30-39
+                                if (regla['codigo'] == 'Z017' and curso_vida == "Adulto (30-59 años)" and 
+                                    edad_paciente >= 30 and edad_paciente <= 39):
+                                    factores_riesgo = ["E65X", "E669", "E6691", "E6692", "E6693", "E6690", 
+                                                     "Z720", "Z721", "Z723", "Z724", "Z783", "Z784"]
+                                    incluir_codigo = any(codigo in registros for codigo in factores_riesgo)
+                                
+                                if incluir_codigo:
+                                    codigos_paciente.append(crear_diagnostico_json(regla, cie10_dict))
+                        
+                        # Agregar laboratorio Z017 para adultos 40-59 si es valoración clínica
+                        if (indicador_key == 'valoracion_clinica_lab' and 
+                            curso_vida == "Adulto (30-59 años)" and 
+                            edad_paciente >= 40 and edad_paciente <= 59):
+                            
+                            # Verificar si necesita Z017
+                            if exportar_solo_faltantes:
+                                if not verificar_codigo_existe(df_paciente, 'Z017', registros):
+                                    codigos_paciente.append({
+                                        "codigo": "Z017",
+                                        "descripcion": "Z017 - Tamizaje laboratorial",
+                                        "tipo": "D",
+                                        "lab": ""
+                                    })
+                            else:
+                                codigos_paciente.append({
+                                    "codigo": "Z017",
+                                    "descripcion": "Z017 - Tamizaje laboratorial", 
+                                    "tipo": "D",
+                                    "lab": ""
+                                })
+                        
+                        elif isinstance(reglas, dict) and 'opcion_a' in reglas:
+                            # Caso especial de opciones (ej: agudeza visual)
+                            for codigo_info in reglas['opcion_a'].get('codigos', []):
+                                codigo_existe = verificar_codigo_existe(df_paciente, codigo_info['codigo'], registros)
+                                if exportar_solo_faltantes and codigo_existe:
+                                    continue  # Saltar si ya existe y solo queremos faltantes
+                                    
+                                codigos_paciente.append(crear_diagnostico_json(codigo_info, cie10_dict))
+            
+            # Manejo especial para componentes con reglas por edad (sin indicador)
+            elif 'reglas_30_39' in componente or 'reglas_40_59' in componente:
+                if edad_paciente >= 30 and edad_paciente <= 39 and 'reglas_30_39' in componente:
+                    for regla in componente['reglas_30_39']:
+                        if not verificar_codigo_existe(df_paciente, regla['codigo'], registros):
+                            if 'condicion' in regla and regla['codigo'] == 'Z017':
+                                # Verificar factores de riesgo
+                                factores_riesgo = regla.get('factores_riesgo', [])
+                                tiene_factores = any(codigo in registros for codigo in factores_riesgo)
+                                if tiene_factores:
+                                    codigos_paciente.append(crear_diagnostico_json(regla, cie10_dict))
+                            else:
+                                codigos_paciente.append(crear_diagnostico_json(regla, cie10_dict))
+                elif edad_paciente >= 40 and edad_paciente <= 59 and 'reglas_40_59' in componente:
+                    for regla in componente['reglas_40_59']:
+                        if not verificar_codigo_existe(df_paciente, regla['codigo'], registros):
+                            codigos_paciente.append(crear_diagnostico_json(regla, cie10_dict))
+        
+        # Agregar plan de atención si está seleccionado
+        if 'plan_atencion' in codigos_seleccionados_dict:
+            plan_config = codigos_seleccionados_dict['plan_atencion']
+            
+            # Verificar si ya tiene plan elaborado
+            tiene_plan_elaborado = not df_paciente[
+                (df_paciente['Codigo_Item'] == '99801') & 
+                (df_paciente['Valor_Lab'] == '1')
+            ].empty
+            
+            # Verificar si ya tiene plan ejecutado
+            tiene_plan_ejecutado = not df_paciente[
+                (df_paciente['Codigo_Item'] == '99801') & 
+                (df_paciente['Valor_Lab'] == 'TA')
+            ].empty
+            
+            if plan_config.get('elaborado', False):
+                if not exportar_solo_faltantes or not tiene_plan_elaborado:
+                    codigos_paciente.append({
+                        "codigo": "99801",
+                        "descripcion": "99801 - Plan de Atención Integral Elaborado",
+                        "tipo": "D",
+                        "lab": "1"
+                    })
+            
+            if plan_config.get('ejecutado', False):
+                if not exportar_solo_faltantes or not tiene_plan_ejecutado:
+                    codigos_paciente.append({
+                        "codigo": "99801",
+                        "descripcion": "99801 - Plan de Atención Integral Ejecutado",
+                        "tipo": "D",
+                        "lab": "TA"
+                    })
+        
+        # Si hay códigos para este paciente, agregarlo al JSON
+        if codigos_paciente:
+            # Optimizar códigos antes de agregar
+            codigos_optimizados = optimizar_codigos_exportacion(codigos_paciente)
+            
+            paciente_json = {
+                "dni": dni,
+                "nombre": info_paciente['Paciente_Completo'],
+                "edad": str(int(edad_paciente)),
+                "sexo": info_paciente['pac_Genero'],
+                "diagnosticos": codigos_optimizados
+            }
+            pacientes_json.append(paciente_json)
+    
+    # Estructura final del JSON
+    fecha_actual = datetime.now()
+    json_exportacion = {
+        "fecha_exportacion": fecha_actual.isoformat(),
+        "dia_his": str(fecha_actual.day),
+        "fecha_atencion": fecha_actual.strftime("%Y-%m-%d"),
+        "curso_vida": curso_vida,
+        "tipo_correccion": "paquete_integral_personalizado",
+        "modo_exportacion": "seleccion_personalizada",
+        "componentes_incluidos": componentes_seleccionados,
+        "total_pacientes": len(pacientes_json),
+        "total_diagnosticos": sum(len(p['diagnosticos']) for p in pacientes_json),
+        "cambios_realizados": 0,
+        "pacientes": pacientes_json
+    }
+    
+    return json_exportacion
+
+
+def aplicar_logica_especial_codigo(codigo, edad_paciente, df_paciente, curso_vida):
+    """
+    Aplica lógica especial para determinar si un código debe incluirse
+    basado en edad, factores de riesgo u otras condiciones
+    """
+    # Laboratorio para adultos 30-39 años
+    if codigo == 'Z017' and curso_vida == "Adulto (30-59 años)" and edad_paciente >= 30 and edad_paciente <= 39:
+        # Verificar factores de riesgo
+        factores_riesgo = ["E65X", "E669", "E6691", "E6692", "E6693", "E6690", 
+                         "Z720", "Z721", "Z723", "Z724", "Z783", "Z784"]
+        tiene_factores = any(df_paciente['Codigo_Item'].isin(factores_riesgo))
+        return tiene_factores
+    
+    # Para adultos 40-59 y adultos mayores, laboratorio siempre
+    if codigo == 'Z017' and (
+        (curso_vida == "Adulto (30-59 años)" and edad_paciente >= 40) or
+        curso_vida == "Adulto Mayor (60+ años)"
+    ):
+        return True
+    
+    # Por defecto, incluir el código
+    return True
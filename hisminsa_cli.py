@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Procesamiento por Lotes sin Interfaz (reportes nocturnos)
+Sistema HISMINSA - Supervisión de Indicadores
+
+Lee todos los consolidados de un directorio, los une con los archivos
+maestros y genera para los tres cursos de vida:
+  - tablero_indicadores: numerador, denominador y % de cada indicador
+  - cumplimiento_por_establecimiento / _profesional / _mes
+  - paquete_<curso>: estado del paquete integral por DNI
+  - supervision_<curso>: supervisión detallada de todos los pacientes (tabla
+    larga: dni, indicador, estado, código, motivo, recomendación)
+  - exportacion_<curso>.json: JSON para el script de automatización HIS-MINSA
+  - auditoria_lab_por_establecimiento / _profesional / _registrador: registros
+    auditados, errores de LAB y % de error por grupo
+  - errores_lab: todos los registros con un Valor_Lab fuera de los permitidos
+  - resumen_ejecucion.json: archivos, errores, tiempos por etapa y
+    predicados compartidos (consultas, evaluaciones y recorridos ahorrados)
+  - traza_rendimiento.json (con --traza): tiempo y memoria de cada etapa interna
+
+Uso:
+    python hisminsa_cli.py CARPETA_CONSOLIDADOS [--maestros CARPETA] [--salida CARPETA]
+                           [--hilos N] [--formatos parquet,csv,json] [--sin-cache] [--traza]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from carga_consolidados import (
+    leer_maestros,
+    ARCHIVOS_MAESTROS,
+    BASE_PATH,
+    HILOS_POR_DEFECTO
+)
+from descripciones import cargar_descripciones
+from indice_presencia import restringir_indice
+from procesamiento import procesar_conjunto
+from tablero_indicadores import CURSOS_VIDA, AGRUPACIONES, evaluar_tablero, evaluar_por_grupo, grupos_de, etiquetar_grupos
+from exportacion_json import paquete_lote, generar_json_exportacion
+from supervision_paciente import supervisar_lote, resumen_supervision_lote
+from auditoria_lab import AGRUPACIONES_AUDITORIA, auditar_lab, filas_con_error, resumen_auditoria
+from perfilado import trazar, etapa as etapa_traza, propagar, guardar_traza
+from evaluacion_compartida import sesion_evaluacion, resumir_sesion
+
+# Curso de vida -> sufijo de los archivos de salida
+SUFIJOS_CURSO = {
+    "Adulto (30-59 años)": 'adulto',
+    "Joven (18-29 años)": 'joven',
+    "Adulto Mayor (60+ años)": 'adulto_mayor'
+}
+
+# Rango de edad de cada curso de vida (el mismo de la pestaña de supervisión)
+EDADES_CURSO = {
+    "Adulto (30-59 años)": (30, 59),
+    "Joven (18-29 años)": (18, 29),
+    "Adulto Mayor (60+ años)": (60, 150)
+}
+
+FORMATOS = ('parquet', 'csv', 'json')
+ESTADOS_EXPORTACION = ("Incompletos", "Casi Completos (1-2 faltantes)")
+
+
+def medir(tiempos, etapa, funcion, *args, **kwargs):
+    """Ejecuta funcion, guarda su duración en tiempos[etapa] y la imprime"""
+    inicio = time.perf_counter()
+    with etapa_traza(etapa):
+        resultado = funcion(*args, **kwargs)
+    tiempos[etapa] = round(time.perf_counter() - inicio, 3)
+    print(f"⏱️  {etapa}: {tiempos[etapa]:.2f} s")
+    return resultado
+
+
+def listar_consolidados(carpeta):
+    """Consolidados (*.csv) de la carpeta en orden alfabético, sin los archivos maestros"""
+    return sorted(
+        nombre for nombre in os.listdir(carpeta)
+        if nombre.lower().endswith('.csv') and nombre not in ARCHIVOS_MAESTROS
+    )
+
+
+def leer_archivos(carpeta, nombres):
+    """Lista de (nombre, bytes) como la que recibe cargar_consolidados"""
+    archivos = []
+    for nombre in nombres:
+        with open(os.path.join(carpeta, nombre), 'rb') as f:
+            archivos.append((nombre, f.read()))
+    return archivos
+
+
+def guardar_tabla(df, ruta_base, formatos, avisos):
+    """Escribe df en Parquet y/o CSV; sin pyarrow el Parquet se reemplaza por CSV"""
+    escritos = []
+    formatos = [f for f in formatos if f in ('parquet', 'csv')]
+    if 'parquet' in formatos:
+        try:
+            df.to_parquet(ruta_base + '.parquet', index=False)
+            escritos.append(ruta_base + '.parquet')
+        except ImportError:
+            avisos.append(f"Sin pyarrow: {os.path.basename(ruta_base)} se guardó solo en CSV")
+            if 'csv' not in formatos:
+                formatos.append('csv')
+    if 'csv' in formatos:
+        df.to_csv(ruta_base + '.csv', index=False, encoding='latin-1', errors='replace')
+        escritos.append(ruta_base + '.csv')
+    return escritos
+
+
+def guardar_json(datos, ruta):
+    """Escribe un dict como JSON legible"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2, default=str)
+    return ruta
+
+
+def procesar_curso(df_completo, curso_vida, indice, estado_exportacion, cie10_dict):
+    """Paquete integral por DNI, JSON de exportación y supervisión por lote de los pacientes del curso de vida"""
+    edad_min, edad_max = EDADES_CURSO[curso_vida]
+    df_curso = df_completo[(df_completo['edad_anos'] >= edad_min) & (df_completo['edad_anos'] <= edad_max)]
+    indice_curso = restringir_indice(indice, df_curso)
+    df_lote = paquete_lote(df_curso, curso_vida, indice_curso)
+    exportacion = generar_json_exportacion(
+        df_curso, estado_exportacion, curso_vida, indice_curso, cie10_dict, df_lote=df_lote
+    )
+    supervision = supervisar_lote(
+        df_curso, curso_vida, indice_curso, df_lote=df_lote,
+        progreso=lambda fraccion, mensaje: print(f"   supervisión {SUFIJOS_CURSO[curso_vida]}: {mensaje}")
+    )
+    return df_lote, exportacion, supervision
+
+
+def procesar_grupos(df_completo, indice, catalogo, n_hilos):
+    """Cumplimiento de todos los indicadores por cada agrupación (en paralelo)"""
+    def _agrupacion(agrupacion):
+        df_grupos = evaluar_por_grupo(df_completo, grupos_de(df_completo, agrupacion), indice=indice)
+        return etiquetar_grupos(df_grupos, agrupacion, catalogo)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(n_hilos, len(AGRUPACIONES)))) as ejecutor:
+        futuros = [ejecutor.submit(propagar(_agrupacion), agrupacion) for agrupacion in AGRUPACIONES]
+        return dict(zip(AGRUPACIONES, (futuro.result() for futuro in futuros)))
+
+
+def procesar_auditoria(df_completo, indice):
+    """Auditoría LAB de todas las filas: (marcas, registros con error, {agrupacion: resumen})"""
+    marcas = auditar_lab(df_completo, indice)
+    resumenes = {
+        agrupacion: resumen_auditoria(df_completo, marcas, agrupacion)
+        for agrupacion in AGRUPACIONES_AUDITORIA
+    }
+    return marcas, filas_con_error(df_completo, marcas), resumenes
+
+
+def procesar_cursos(df_completo, indice, estado_exportacion, cie10_dict, n_hilos):
+    """procesar_curso para los tres cursos de vida (en paralelo)"""
+    with ThreadPoolExecutor(max_workers=max(1, min(n_hilos, len(CURSOS_VIDA)))) as ejecutor:
+        futuros = {
+            curso: ejecutor.submit(propagar(procesar_curso), df_completo, curso, indice, estado_exportacion, cie10_dict)
+            for curso in CURSOS_VIDA
+        }
+        return {curso: futuro.result() for curso, futuro in futuros.items()}
+
+
+def ejecutar(carpeta_consolidados, carpeta_maestros=BASE_PATH, carpeta_salida='reportes_hisminsa',
+             n_hilos=HILOS_POR_DEFECTO, formatos=FORMATOS, usar_cache=True, estado_exportacion="Incompletos"):
+    """
+    Ejecuta todas las etapas y escribe los reportes en carpeta_salida.
+    Retorna el resumen de la ejecución (también se guarda como JSON).
+    """
+    tiempos = {}
+    avisos = []
+    salidas = []
+    inicio = time.perf_counter()
+
+    nombres = listar_consolidados(carpeta_consolidados)
+    if not nombres:
+        raise FileNotFoundError(f"No hay consolidados (*.csv) en {carpeta_consolidados}")
+    os.makedirs(carpeta_salida, exist_ok=True)
+    print(f"📁 {len(nombres)} consolidados en {carpeta_consolidados}")
+
+    diccionarios, mensajes, origen = medir(tiempos, 'descripciones', cargar_descripciones)
+    avisos.extend(texto for nivel, texto in mensajes if nivel in ('warning', 'error'))
+    df_pacientes, df_personal, df_registradores = medir(tiempos, 'maestros', leer_maestros, carpeta_maestros)
+
+    archivos = medir(tiempos, 'lectura', leer_archivos, carpeta_consolidados, nombres)
+    carga = medir(
+        tiempos, 'consolidados', procesar_conjunto,
+        archivos, df_pacientes, df_personal, df_registradores, diccionarios,
+        n_hilos=n_hilos, usar_cache=usar_cache, compartir=False
+    )
+    for etapa, segundos in carga['tiempos'].items():
+        print(f"   {etapa}: {segundos:.2f} s")
+    for d in carga['detalle_carga']['archivos']:
+        print(f"   {d['archivo']}: {d['filas']:,} filas ({d['origen']}, {d['segundos']:.2f} s)")
+    for error in carga['errores']:
+        print(f"   ❌ {error}")
+    df_completo = carga['df_completo']
+    if df_completo is None:
+        raise ValueError("No se pudo procesar ningún consolidado")
+    for _, texto in carga['diagnosticos']:
+        print(f"   {texto}")
+    print(f"📊 {len(df_completo):,} registros, {df_completo['pac_Numero_Documento'].nunique():,} pacientes")
+
+    indice = carga['indice_presencia']
+    catalogo = carga['indice_filtros']['catalogo']
+
+    # Tablero, matrices, paquetes y exportación comparten los predicados evaluados
+    with sesion_evaluacion() as sesion:
+        df_tablero = medir(tiempos, 'tablero', evaluar_tablero, df_completo, indice=indice)
+        grupos = medir(tiempos, 'cumplimiento_por_grupo', procesar_grupos, df_completo, indice, catalogo, n_hilos)
+        cursos = medir(
+            tiempos, 'paquetes_y_exportacion', procesar_cursos,
+            df_completo, indice, estado_exportacion, diccionarios['cie10'], n_hilos
+        )
+    predicados = resumir_sesion(sesion)
+    marcas_lab, errores_lab, auditoria = medir(tiempos, 'auditoria_lab', procesar_auditoria, df_completo, indice)
+    auditoria_lab = {
+        'registros_auditados': int(marcas_lab['auditada'].sum()),
+        'errores_lab': int(marcas_lab['error_lab'].sum())
+    }
+    print(f"🧮 predicados: {predicados['consultas']} consultas, {predicados['evaluaciones']} evaluadas, "
+          f"{predicados['recorridos_ahorrados']} recorridos ahorrados")
+    print(f"🧪 auditoría LAB: {auditoria_lab['errores_lab']:,} errores en "
+          f"{auditoria_lab['registros_auditados']:,} registros auditados")
+
+    # Escritura de reportes
+    inicio_escritura = time.perf_counter()
+    salidas += guardar_tabla(df_tablero, os.path.join(carpeta_salida, 'tablero_indicadores'), formatos, avisos)
+    for agrupacion, df_grupos in grupos.items():
+        ruta = os.path.join(carpeta_salida, f'cumplimiento_por_{agrupacion.lower()}')
+        salidas += guardar_tabla(df_grupos, ruta, formatos, avisos)
+    for agrupacion, df_auditoria in auditoria.items():
+        ruta = os.path.join(carpeta_salida, f'auditoria_lab_por_{agrupacion.lower()}')
+        salidas += guardar_tabla(df_auditoria, ruta, formatos, avisos)
+    salidas += guardar_tabla(errores_lab, os.path.join(carpeta_salida, 'errores_lab'), formatos, avisos)
+    resumen_cursos = {}
+    for curso, (df_lote, exportacion, supervision) in cursos.items():
+        sufijo = SUFIJOS_CURSO[curso]
+        salidas += guardar_tabla(df_lote, os.path.join(carpeta_salida, f'paquete_{sufijo}'), formatos, avisos)
+        salidas += guardar_tabla(supervision, os.path.join(carpeta_salida, f'supervision_{sufijo}'), formatos, avisos)
+        if 'json' in formatos:
+            salidas.append(guardar_json(exportacion, os.path.join(carpeta_salida, f'exportacion_{sufijo}.json')))
+        resumen_cursos[curso] = {
+            'pacientes': len(df_lote),
+            'paquete_completo': int(df_lote['completo'].sum()),
+            'pacientes_exportados': exportacion['total_pacientes'],
+            'supervision': resumen_supervision_lote(supervision) if not supervision.empty else None
+        }
+    tiempos['escritura'] = round(time.perf_counter() - inicio_escritura, 3)
+    print(f"⏱️  escritura: {tiempos['escritura']:.2f} s")
+    tiempos['total'] = round(time.perf_counter() - inicio, 3)
+
+    resumen = {
+        'fecha_ejecucion': datetime.now().isoformat(),
+        'carpeta_consolidados': os.path.abspath(carpeta_consolidados),
+        'registros': len(df_completo),
+        'archivos_procesados': carga['archivos_procesados'],
+        'errores': carga['errores'],
+        'detalle_carga': carga['detalle_carga']['archivos'],
+        'tiempos_carga': carga['tiempos'],
+        'descripciones': origen,
+        'cursos_vida': resumen_cursos,
+        'tiempos_segundos': tiempos,
+        'predicados_compartidos': predicados,
+        'auditoria_lab': auditoria_lab,
+        'avisos': avisos,
+        'salidas': salidas
+    }
+    guardar_json(resumen, os.path.join(carpeta_salida, 'resumen_ejecucion.json'))
+    return resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Genera los reportes de indicadores y paquetes integrales HISMINSA sin interfaz web"
+    )
+    parser.add_argument('consolidados', help="Carpeta con los consolidados diarios (*.csv)")
+    parser.add_argument('--maestros', default=BASE_PATH,
+                        help="Carpeta con MaestroPaciente.csv, MaestroPersonal.csv y MaestroRegistrador.csv")
+    parser.add_argument('--salida', default='reportes_hisminsa', help="Carpeta de los reportes")
+    parser.add_argument('--hilos', type=int, default=HILOS_POR_DEFECTO, help="Hilos de trabajo en paralelo")
+    parser.add_argument('--formatos', default=','.join(FORMATOS),
+                        help="Formatos de salida separados por coma: parquet, csv, json")
+    parser.add_argument('--estado', choices=ESTADOS_EXPORTACION, default="Incompletos",
+                        help="Pacientes a incluir en el JSON de exportación")
+    parser.add_argument('--sin-cache', action='store_true', help="No usar la caché en disco de consolidados")
+    parser.add_argument('--traza', action='store_true',
+                        help="Guardar traza_rendimiento.json con el tiempo y la memoria de cada etapa")
+    args = parser.parse_args(argv)
+
+    formatos = [f.strip().lower() for f in args.formatos.split(',') if f.strip()]
+    desconocidos = [f for f in formatos if f not in FORMATOS]
+    if desconocidos:
+        parser.error(f"Formatos no soportados: {', '.join(desconocidos)}")
+
+    try:
+        with trazar("Procesamiento por lotes") as traza:
+            resumen = ejecutar(
+                args.consolidados, args.maestros, args.salida, max(1, args.hilos), formatos,
+                usar_cache=not args.sin_cache, estado_exportacion=args.estado
+            )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.traza:
+        ruta_traza = guardar_traza(os.path.join(args.salida, 'traza_rendimiento.json'), traza)
+        resumen['salidas'].append(ruta_traza)
+
+    for aviso in resumen['avisos']:
+        print(f"⚠️  {aviso}")
+    print(f"✅ {len(resumen['salidas'])} archivos en {args.salida} ({resumen['tiempos_segundos']['total']:.2f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,13 @@ Definición de Indicadores para Curso de Vida Adulto (30-59 años)
 Sistema HISMINSA - Supervisión de Indicadores
 """
 
+from motor_cumplimiento import (
+    crear_predicado, predicado_desde_regla, todos, alguno, verificar_paquete_lote
+)
+from compilador_indicadores import compilar_indicadores, evaluar_plan
+
+from denominadores import denominador_indicador
+
 # Diccionario completo de indicadores adulto
 INDICADORES_ADULTO = {
     "evaluacion_oral": {
@@ -504,157 +511,75 @@ PAQUETE_INTEGRAL_ADULTO = {
     }
 }
 
-def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None):
+def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None, indice=None):
     """
     Verifica el cumplimiento de un indicador específico
     Retorna DataFrame con DNIs que cumplen y detalles
+    indice: índice de presencia opcional (ver indice_presencia.py)
+    """
+    if indicador_key not in PLANES_ADULTO:
+        return None
+    
+    # Banda de edad/género, fechas y expresión compilada del indicador
+    return evaluar_plan(df, PLANES_ADULTO[indicador_key], indice, fecha_inicio, fecha_fin)
+
+def expresion_fuente(indicador_key):
+    """
+    Expresión (predicados Y/O) del indicador según sus reglas, antes de
+    optimizarla. None si no existe.
     """
     if indicador_key not in INDICADORES_ADULTO:
         return None
     
     indicador = INDICADORES_ADULTO[indicador_key]
-    
-    # Filtrar por edad
-    df_edad = df[
-        (df['edad_anos'] >= indicador['edad_min']) & 
-        (df['edad_anos'] <= indicador['edad_max'])
-    ]
-    
-    # Filtrar por género si aplica
-    if 'genero' in indicador:
-        df_edad = df_edad[df_edad['pac_Genero'] == indicador['genero']]
-    
-    # Filtrar por fechas si se especifican
-    if fecha_inicio and fecha_fin:
-        df_edad = df_edad[
-            (df_edad['Fecha_Atencion'] >= fecha_inicio) & 
-            (df_edad['Fecha_Atencion'] <= fecha_fin)
-        ]
-    
-    # Verificar reglas según tipo de indicador
     if indicador_key == "tamizaje_vih":
-        return verificar_tamizaje_vih(df_edad)
+        return expresion_tamizaje_vih()
     elif 'requiere_ambos' in indicador and indicador['requiere_ambos']:
-        return verificar_indicador_multiple(df_edad, indicador)
+        return expresion_multiple(indicador)
     elif 'requiere_uno' in indicador and indicador['requiere_uno']:
-        return verificar_indicador_opciones(df_edad, indicador)
+        return expresion_opciones(indicador)
     else:
-        return verificar_indicador_simple(df_edad, indicador)
+        return predicado_desde_regla(indicador['reglas'][0])
 
-def verificar_indicador_simple(df, indicador):
-    """Verifica indicadores con una sola regla"""
-    regla = indicador['reglas'][0]
-    
-    # Filtrar por código
-    df_codigo = df[df['Codigo_Item'] == regla['codigo']]
-    
-    # Filtrar por tipo diagnóstico
-    if isinstance(regla['tipo_dx'], list):
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'].isin(regla['tipo_dx'])]
-    else:
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'] == regla['tipo_dx']]
-    
-    # Filtrar por valores Lab si aplica
-    if 'lab_valores' in regla and regla['lab_valores']:
-        if "" in regla['lab_valores']:
-            # Incluir valores vacíos
-            df_codigo = df_codigo[
-                df_codigo['Valor_Lab'].isna() | 
-                df_codigo['Valor_Lab'].isin(regla['lab_valores'])
-            ]
-        else:
-            df_codigo = df_codigo[df_codigo['Valor_Lab'].isin(regla['lab_valores'])]
-    
-    return df_codigo
+def expresion_multiple(indicador):
+    """Todos los códigos de las reglas"""
+    return todos(*[predicado_desde_regla(regla) for regla in indicador['reglas']])
+
+def expresion_opciones(indicador):
+    """Al menos una opción; cada opción puede tener su propio rango de edad y LAB sin aceptar vacíos"""
+    return alguno(*[
+        predicado_desde_regla(regla, lab_con_vacios=False, con_edad='edad_min' in regla)
+        for regla in indicador['reglas']
+    ])
 
-def verificar_indicador_multiple(df, indicador):
-    """Verifica indicadores que requieren múltiples códigos"""
-    dfs_cumplimiento = []
-    
-    for regla in indicador['reglas']:
-        df_temp = df[
-            (df['Codigo_Item'] == regla['codigo']) &
-            (df['Tipo_Diagnostico'] == regla['tipo_dx'])
-        ]
-        
-        if 'lab_valores' in regla and regla['lab_valores']:
-            if "" in regla['lab_valores']:
-                df_temp = df_temp[
-                    df_temp['Valor_Lab'].isna() | 
-                    df_temp['Valor_Lab'].isin(regla['lab_valores'])
-                ]
-            else:
-                df_temp = df_temp[df_temp['Valor_Lab'].isin(regla['lab_valores'])]
-        
-        dfs_cumplimiento.append(df_temp['pac_Numero_Documento'].unique())
-    
-    # Encontrar DNIs que tienen todos los códigos requeridos
-    dni_comun = set(dfs_cumplimiento[0])
-    for dni_set in dfs_cumplimiento[1:]:
-        dni_comun = dni_comun.intersection(set(dni_set))
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_comun))]
+def expresion_tamizaje_vih():
+    """Pre-test + prueba (dual o rápida) + post-test"""
+    return todos(
+        crear_predicado('99401.33', 'D'),
+        alguno(
+            crear_predicado('86318.01', 'D'),
+            crear_predicado(['86703.01', '86703.02'], 'D')
+        ),
+        crear_predicado(['99401.34', '99403.03'], 'D')
+    )
 
-def verificar_tamizaje_vih(df):
-    """Verificación especial para tamizaje VIH con su flujo específico"""
-    # Buscar pre-test
-    df_pretest = df[
-        (df['Codigo_Item'] == '99401.33') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar pruebas (dual o rápida)
-    df_dual = df[
-        (df['Codigo_Item'] == '86318.01') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    df_rapida = df[
-        (df['Codigo_Item'].isin(['86703.01', '86703.02'])) & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar post-test
-    df_posttest = df[
-        (df['Codigo_Item'].isin(['99401.34', '99403.03'])) & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # DNIs con flujo completo
-    dni_pretest = set(df_pretest['pac_Numero_Documento'].unique())
-    dni_prueba = set(df_dual['pac_Numero_Documento'].unique()) | set(df_rapida['pac_Numero_Documento'].unique())
-    dni_posttest = set(df_posttest['pac_Numero_Documento'].unique())
-    
-    dni_completo = dni_pretest & dni_prueba & dni_posttest
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_completo))]
+# Planes compilados una sola vez al importar (ver compilador_indicadores.py)
+PLANES_ADULTO = compilar_indicadores(INDICADORES_ADULTO, expresion_fuente)
 
-def verificar_indicador_opciones(df, indicador):
-    """Verifica indicadores donde se requiere al menos una opción"""
-    dni_cumple = set()
-    
-    for regla in indicador['reglas']:
-        df_temp = df[
-            (df['Codigo_Item'] == regla['codigo']) &
-            (df['Tipo_Diagnostico'] == regla['tipo_dx'])
-        ]
-        
-        if 'edad_min' in regla:
-            df_temp = df_temp[
-                (df_temp['edad_anos'] >= regla['edad_min']) &
-                (df_temp['edad_anos'] <= regla['edad_max'])
-            ]
-        
-        if 'lab_valores' in regla:
-            df_temp = df_temp[df_temp['Valor_Lab'].isin(regla['lab_valores'])]
-        
-        dni_cumple.update(df_temp['pac_Numero_Documento'].unique())
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
+def expresion_indicador(indicador_key):
+    """
+    Expresión optimizada que verificar_cumplimiento_indicador evalúa dentro
+    de la banda de edad/género del indicador. None si no existe.
+    """
+    plan = PLANES_ADULTO.get(indicador_key)
+    return plan['expresion'] if plan is not None else None
 
-def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
-    """Calcula estadísticas de cumplimiento para un indicador"""
-    df_cumple = verificar_cumplimiento_indicador(df, indicador_key)
+def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None, indice=None, denominadores=None):
+    """
+    Calcula estadísticas de cumplimiento para un indicador.
+    denominadores: tabla de denominadores.py del conjunto (se reutilizan las bandas ya calculadas).
+    """
+    df_cumple = verificar_cumplimiento_indicador(df, indicador_key, indice=indice)
     
     if df_cumple is None:
         return None
@@ -672,15 +597,8 @@ def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
         else:
             denominador = poblacion_total * 0.3  # 30% por defecto
     else:
-        # Contar población elegible en los datos
-        df_elegible = df[
-            (df['edad_anos'] >= indicador['edad_min']) & 
-            (df['edad_anos'] <= indicador['edad_max'])
-        ]
-        if 'genero' in indicador:
-            df_elegible = df_elegible[df_elegible['pac_Genero'] == indicador['genero']]
-        
-        denominador = df_elegible['pac_Numero_Documento'].nunique()
+        # Contar población elegible en los datos (DNIs únicos de la banda de edad/género)
+        denominador = denominador_indicador(df, indicador, denominadores)
     
     porcentaje = (dni_cumplen / denominador * 100) if denominador > 0 else 0
     
@@ -776,6 +694,14 @@ def verificar_paquete_integral(df, dni=None):
     
     return resultados
 
+def verificar_paquete_integral_lote(df, indice=None):
+    """
+    Verifica el paquete integral de todos los DNIs a la vez.
+    Retorna un DataFrame con una fila por DNI, una columna booleana por
+    componente y plan_elaborado, plan_ejecutado y completo.
+    """
+    return verificar_paquete_lote(df, PAQUETE_INTEGRAL_ADULTO, verificar_cumplimiento_indicador, indice)
+
 def verificar_valoracion_clinica_30_39(df, dni):
     """Verifica valoración clínica para 30-39 años"""
     df_dni = df[df['pac_Numero_Documento'] == dni]
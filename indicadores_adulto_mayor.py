@@ -5,6 +5,14 @@ Definición de Indicadores para Curso de Vida Adulto Mayor (60+ años)
 Sistema HISMINSA - Supervisión de Indicadores
 """
 
+from motor_cumplimiento import (
+    crear_predicado, predicado_desde_regla, todos, alguno,
+    filas_de_dnis, verificar_paquete_lote
+)
+from compilador_indicadores import compilar_indicadores, evaluar_plan, filtrar_banda
+
+from denominadores import denominador_indicador
+
 # Diccionario completo de indicadores adulto mayor
 INDICADORES_ADULTO_MAYOR = {
     "paquete_atencion_integral": {
@@ -467,177 +475,76 @@ PAQUETE_INTEGRAL_ADULTO_MAYOR = {
     }
 }
 
-def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None):
+def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None, indice=None):
     """
     Verifica el cumplimiento de un indicador específico
     Retorna DataFrame con DNIs que cumplen y detalles
+    indice: índice de presencia opcional (ver indice_presencia.py)
     """
-    if indicador_key not in INDICADORES_ADULTO_MAYOR:
+    if indicador_key not in PLANES_ADULTO_MAYOR:
         return None
     
-    indicador = INDICADORES_ADULTO_MAYOR[indicador_key]
-    
-    # Filtrar por edad
-    df_edad = df[
-        (df['edad_anos'] >= indicador['edad_min']) & 
-        (df['edad_anos'] <= indicador['edad_max'])
-    ]
-    
-    # Filtrar por género si aplica
-    if 'genero' in indicador:
-        df_edad = df_edad[df_edad['pac_Genero'] == indicador['genero']]
+    plan = PLANES_ADULTO_MAYOR[indicador_key]
+    if plan['expresion'] is None:
+        # Paquete integral: se verifica por lote
+        df_edad = filtrar_banda(df, plan['banda'], fecha_inicio, fecha_fin)
+        return verificar_paquete_integral_resumido(df_edad, indice)
     
-    # Filtrar por fechas si se especifican
-    if fecha_inicio and fecha_fin:
-        df_edad = df_edad[
-            (df_edad['Fecha_Atencion'] >= fecha_inicio) & 
-            (df_edad['Fecha_Atencion'] <= fecha_fin)
-        ]
+    # Banda de edad/género, fechas y expresión compilada del indicador
+    return evaluar_plan(df, plan, indice, fecha_inicio, fecha_fin)
+
+def expresion_fuente(indicador_key):
+    """
+    Expresión (predicados Y/O) del indicador según sus reglas, antes de
+    optimizarla. None si no existe o si es el paquete integral (se verifica
+    por lote).
+    """
+    if indicador_key not in INDICADORES_ADULTO_MAYOR:
+        return None
     
-    # Verificar reglas según tipo de indicador
+    indicador = INDICADORES_ADULTO_MAYOR[indicador_key]
     if indicador_key == "vacam":
-        return verificar_vacam(df_edad)
+        return expresion_vacam()
     elif indicador_key == "agudeza_visual":
-        return verificar_agudeza_visual(df_edad)
+        return expresion_agudeza_visual()
     elif indicador_key == "tamizaje_salud_mental":
-        return verificar_tamizaje_salud_mental(df_edad)
+        return expresion_tamizaje_salud_mental()
     elif indicador_key == "valoracion_clinica_lab":
-        return verificar_valoracion_clinica_lab(df_edad)
+        return expresion_valoracion_clinica_lab()
     elif indicador_key == "paquete_atencion_integral":
-        return verificar_paquete_integral_resumido(df_edad)
+        return None
     elif 'requiere_todos' in indicador and indicador['requiere_todos']:
-        return verificar_indicador_todos(df_edad, indicador)
+        return expresion_todos(indicador)
     else:
-        return verificar_indicador_simple(df_edad, indicador)
+        return predicado_desde_regla(indicador['reglas'][0])
 
-def verificar_indicador_simple(df, indicador):
-    """Verifica indicadores con una sola regla"""
-    regla = indicador['reglas'][0]
-    
-    # Filtrar por código
-    df_codigo = df[df['Codigo_Item'] == regla['codigo']]
-    
-    # Filtrar por tipo diagnóstico
-    if isinstance(regla['tipo_dx'], list):
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'].isin(regla['tipo_dx'])]
-    else:
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'] == regla['tipo_dx']]
-    
-    # Filtrar por valores Lab si aplica
-    if 'lab_valores' in regla and regla['lab_valores']:
-        if "" in regla['lab_valores']:
-            # Incluir valores vacíos
-            df_codigo = df_codigo[
-                df_codigo['Valor_Lab'].isna() | 
-                df_codigo['Valor_Lab'].isin(regla['lab_valores'])
-            ]
-        else:
-            df_codigo = df_codigo[df_codigo['Valor_Lab'].isin(regla['lab_valores'])]
-    
-    return df_codigo
+def expresion_todos(indicador):
+    """Todos los componentes de las reglas"""
+    return todos(*[predicado_desde_regla(regla) for regla in indicador['reglas']])
 
-def verificar_indicador_todos(df, indicador):
-    """Verifica indicadores que requieren todos los componentes"""
-    dni_cumple = set()
-    
-    # Agrupar por DNI
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        cumple_todos = True
-        
-        for regla in indicador['reglas']:
-            df_codigo = df_dni[
-                (df_dni['Codigo_Item'] == regla['codigo']) &
-                (df_dni['Tipo_Diagnostico'] == regla['tipo_dx'])
-            ]
-            
-            if 'lab_valores' in regla and regla['lab_valores']:
-                if "" in regla['lab_valores']:
-                    df_codigo = df_codigo[
-                        df_codigo['Valor_Lab'].isna() | 
-                        df_codigo['Valor_Lab'].isin(regla['lab_valores'])
-                    ]
-                else:
-                    df_codigo = df_codigo[df_codigo['Valor_Lab'].isin(regla['lab_valores'])]
-            
-            if df_codigo.empty:
-                cumple_todos = False
-                break
-        
-        if cumple_todos:
-            dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
-
-def verificar_vacam(df):
-    """Verificación especial para VACAM"""
-    dni_cumple = set()
-    
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        
-        # Verificar VACAM (99387 o 99215.03) con clasificación obligatoria
-        tiene_vacam_99387 = not df_dni[
-            (df_dni['Codigo_Item'] == '99387') & 
-            (df_dni['Tipo_Diagnostico'] == 'D') &
-            (df_dni['Valor_Lab'].isin(['AS', 'E', 'AF', 'GC']))
-        ].empty
-        
-        tiene_vacam_99215 = not df_dni[
-            (df_dni['Codigo_Item'] == '99215.03') & 
-            (df_dni['Tipo_Diagnostico'] == 'D') &
-            (df_dni['Valor_Lab'].isin(['AS', 'E', 'AF', 'GC']))
-        ].empty
-        
-        # Verificar consejería posterior
-        tiene_consejeria = not df_dni[
-            (df_dni['Codigo_Item'] == '99401') & 
-            (df_dni['Tipo_Diagnostico'] == 'D')
-        ].empty
-        
-        # Necesita uno de los VACAM + consejería
-        if (tiene_vacam_99387 or tiene_vacam_99215) and tiene_consejeria:
-            dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
+def expresion_vacam():
+    """Uno de los VACAM (99387 o 99215.03) con clasificación + consejería"""
+    clasificacion = ['AS', 'E', 'AF', 'GC']
+    return todos(
+        alguno(
+            crear_predicado('99387', 'D', clasificacion),
+            crear_predicado('99215.03', 'D', clasificacion)
+        ),
+        crear_predicado('99401', 'D')
+    )
 
-def verificar_agudeza_visual(df):
-    """Verificación especial para agudeza visual con opciones"""
-    dni_cumple = set()
-    
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        
-        # Opción A: Solo 99173
-        tiene_opcion_a = not df_dni[
-            (df_dni['Codigo_Item'] == '99173') & 
-            (df_dni['Tipo_Diagnostico'] == 'D')
-        ].empty
-        
-        # Opción B: Z010 + 99173
-        tiene_z010 = not df_dni[
-            (df_dni['Codigo_Item'] == 'Z010') & 
-            (df_dni['Tipo_Diagnostico'] == 'D') &
-            (df_dni['Valor_Lab'].isin(['N', 'A']))
-        ].empty
-        
-        tiene_99173 = not df_dni[
-            (df_dni['Codigo_Item'] == '99173') & 
-            (df_dni['Tipo_Diagnostico'] == 'D')
-        ].empty
-        
-        tiene_opcion_b = tiene_z010 and tiene_99173
-        
-        # Cumple si tiene opción A o B
-        if tiene_opcion_a or tiene_opcion_b:
-            dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
+def expresion_agudeza_visual():
+    """Opción A: Solo 99173 / Opción B: Z010 + 99173"""
+    return alguno(
+        crear_predicado('99173', 'D'),
+        todos(
+            crear_predicado('Z010', 'D', ['N', 'A']),
+            crear_predicado('99173', 'D')
+        )
+    )
 
-def verificar_tamizaje_salud_mental(df):
-    """Verificación de los 5 tamizajes de salud mental + consejería"""
-    dni_cumple = set()
-    
+def expresion_tamizaje_salud_mental():
+    """Los 5 tamizajes de salud mental + consejería"""
     tamizajes_requeridos = [
         '96150.01',  # Violencia
         '96150.03',  # Depresión
@@ -646,77 +553,42 @@ def verificar_tamizaje_salud_mental(df):
         '96150.07'   # Deterioro cognitivo
     ]
     
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        cumple_todos = True
-        
-        # Verificar cada tamizaje
-        for codigo in tamizajes_requeridos:
-            tiene_tamizaje = not df_dni[
-                (df_dni['Codigo_Item'] == codigo) & 
-                (df_dni['Tipo_Diagnostico'] == 'D') &
-                (df_dni['Valor_Lab'].isna() | df_dni['Valor_Lab'].isin(['', 'G', 'TPE', 'JUD']))
-            ].empty
-            
-            if not tiene_tamizaje:
-                cumple_todos = False
-                break
-        
-        # Verificar consejería obligatoria
-        if cumple_todos:
-            tiene_consejeria = not df_dni[
-                (df_dni['Codigo_Item'] == '99402.09') & 
-                (df_dni['Tipo_Diagnostico'] == 'D')
-            ].empty
-            
-            if tiene_consejeria:
-                dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
+    return todos(
+        *[crear_predicado(codigo, 'D', ['', 'G', 'TPE', 'JUD']) for codigo in tamizajes_requeridos],
+        crear_predicado('99402.09', 'D')
+    )
+
+def expresion_valoracion_clinica_lab():
+    """Los 3 componentes son obligatorios"""
+    return todos(
+        crear_predicado('Z019', 'D', ['DNT']),
+        crear_predicado('Z017', 'D'),
+        crear_predicado('99401.13', 'D')
+    )
+
+# Planes compilados una sola vez al importar (ver compilador_indicadores.py)
+PLANES_ADULTO_MAYOR = compilar_indicadores(INDICADORES_ADULTO_MAYOR, expresion_fuente)
 
-def verificar_valoracion_clinica_lab(df):
-    """Verificación de valoración clínica con laboratorio obligatorio"""
-    dni_cumple = set()
-    
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        
-        # Los 3 componentes son obligatorios
-        tiene_valoracion = not df_dni[
-            (df_dni['Codigo_Item'] == 'Z019') & 
-            (df_dni['Tipo_Diagnostico'] == 'D') &
-            (df_dni['Valor_Lab'] == 'DNT')
-        ].empty
-        
-        tiene_laboratorio = not df_dni[
-            (df_dni['Codigo_Item'] == 'Z017') & 
-            (df_dni['Tipo_Diagnostico'] == 'D')
-        ].empty
-        
-        tiene_consejeria = not df_dni[
-            (df_dni['Codigo_Item'] == '99401.13') & 
-            (df_dni['Tipo_Diagnostico'] == 'D')
-        ].empty
-        
-        if tiene_valoracion and tiene_laboratorio and tiene_consejeria:
-            dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
+def expresion_indicador(indicador_key):
+    """
+    Expresión optimizada que verificar_cumplimiento_indicador evalúa dentro
+    de la banda de edad/género del indicador. None si no existe o si es el
+    paquete integral (se verifica por lote).
+    """
+    plan = PLANES_ADULTO_MAYOR.get(indicador_key)
+    return plan['expresion'] if plan is not None else None
 
-def verificar_paquete_integral_resumido(df):
+def verificar_paquete_integral_resumido(df, indice=None):
     """Verificación rápida del paquete integral para el indicador resumen"""
-    dni_con_paquete = set()
-    
-    for dni in df['pac_Numero_Documento'].unique():
-        resultado = verificar_paquete_integral(df, dni)
-        if resultado['completo']:
-            dni_con_paquete.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_con_paquete))]
+    lote = verificar_paquete_integral_lote(df, indice)
+    return filas_de_dnis(df, lote.loc[lote['completo'], 'pac_Numero_Documento'])
 
-def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
-    """Calcula estadísticas de cumplimiento para un indicador"""
-    df_cumple = verificar_cumplimiento_indicador(df, indicador_key)
+def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None, indice=None, denominadores=None):
+    """
+    Calcula estadísticas de cumplimiento para un indicador.
+    denominadores: tabla de denominadores.py del conjunto (se reutilizan las bandas ya calculadas).
+    """
+    df_cumple = verificar_cumplimiento_indicador(df, indicador_key, indice=indice)
     
     if df_cumple is None:
         return None
@@ -742,15 +614,8 @@ def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
         else:
             denominador = poblacion_total * 0.4  # 40% por defecto
     else:
-        # Contar población elegible en los datos
-        df_elegible = df[
-            (df['edad_anos'] >= indicador['edad_min']) & 
-            (df['edad_anos'] <= indicador['edad_max'])
-        ]
-        if 'genero' in indicador:
-            df_elegible = df_elegible[df_elegible['pac_Genero'] == indicador['genero']]
-        
-        denominador = df_elegible['pac_Numero_Documento'].nunique()
+        # Contar población elegible en los datos (DNIs únicos de la banda de edad/género)
+        denominador = denominador_indicador(df, indicador, denominadores)
     
     porcentaje = (dni_cumplen / denominador * 100) if denominador > 0 else 0
     
@@ -815,4 +680,12 @@ def verificar_paquete_integral(df, dni=None):
     resultados['plan_ejecutado'] = plan_ejecutado
     resultados['completo'] = all(cumplimientos) and plan_ejecutado
     
-    return resultados
\ No newline at end of file
+    return resultados
+
+def verificar_paquete_integral_lote(df, indice=None):
+    """
+    Verifica el paquete integral de todos los DNIs a la vez.
+    Retorna un DataFrame con una fila por DNI, una columna booleana por
+    componente y plan_elaborado, plan_ejecutado y completo.
+    """
+    return verificar_paquete_lote(df, PAQUETE_INTEGRAL_ADULTO_MAYOR, verificar_cumplimiento_indicador, indice)
@@ -5,6 +5,14 @@ Definición de Indicadores para Curso de Vida Joven (18-29 años)
 Sistema HISMINSA - Supervisión de Indicadores
 """
 
+from motor_cumplimiento import (
+    crear_predicado, predicado_desde_regla, todos, alguno,
+    filtrar_filas, verificar_paquete_lote
+)
+from compilador_indicadores import compilar_indicadores, evaluar_plan, filtrar_banda
+
+from denominadores import denominador_indicador
+
 # Diccionario completo de indicadores joven
 INDICADORES_JOVEN = {
     "valoracion_clinica_sin_factores": {
@@ -467,211 +475,105 @@ PAQUETE_INTEGRAL_JOVEN = {
     }
 }
 
-def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None):
+def verificar_cumplimiento_indicador(df, indicador_key, fecha_inicio=None, fecha_fin=None, indice=None):
     """
     Verifica el cumplimiento de un indicador específico para jóvenes
     Retorna DataFrame con DNIs que cumplen y detalles
     """
-    if indicador_key not in INDICADORES_JOVEN:
+    if indicador_key not in PLANES_JOVEN:
         return None
     
-    indicador = INDICADORES_JOVEN[indicador_key]
-    
-    # Filtrar por edad
-    df_edad = df[
-        (df['edad_anos'] >= indicador['edad_min']) & 
-        (df['edad_anos'] <= indicador['edad_max'])
-    ]
+    plan = PLANES_JOVEN[indicador_key]
+    if plan['expresion'] is None:
+        # Regla con condición de establecimiento: se filtran las filas
+        df_edad = filtrar_banda(df, plan['banda'], fecha_inicio, fecha_fin)
+        return verificar_indicador_simple(df_edad, INDICADORES_JOVEN[indicador_key], indice)
     
-    # Filtrar por fechas si se especifican
-    if fecha_inicio and fecha_fin:
-        df_edad = df_edad[
-            (df_edad['Fecha_Atencion'] >= fecha_inicio) & 
-            (df_edad['Fecha_Atencion'] <= fecha_fin)
-        ]
+    # Banda de edad, fechas y expresión compilada del indicador
+    return evaluar_plan(df, plan, indice, fecha_inicio, fecha_fin)
+
+def expresion_fuente(indicador_key):
+    """
+    Expresión (predicados Y/O) del indicador según sus reglas, antes de
+    optimizarla. None si no existe o si la verificación necesita las filas
+    (reglas con condición de establecimiento).
+    """
+    if indicador_key not in INDICADORES_JOVEN:
+        return None
     
-    # Verificar reglas según tipo de indicador
+    indicador = INDICADORES_JOVEN[indicador_key]
     if indicador_key in ["valoracion_clinica_sin_factores", "valoracion_clinica_con_factores"]:
-        return verificar_valoracion_clinica(df_edad, indicador_key)
+        return expresion_todos(indicador)
     elif indicador_key == "tamizaje_vih":
-        return verificar_tamizaje_vih(df_edad)
+        return expresion_tamizaje_vih()
     elif indicador_key == "acceso_anticonceptivos":
-        return verificar_anticonceptivos(df_edad)
-    elif 'requiere_ambos' in indicador and indicador['requiere_ambos']:
-        return verificar_indicador_multiple(df_edad, indicador)
-    elif 'requiere_todos' in indicador and indicador['requiere_todos']:
-        return verificar_indicador_todos(df_edad, indicador)
+        return expresion_anticonceptivos()
+    elif ('requiere_ambos' in indicador and indicador['requiere_ambos']) or \
+            ('requiere_todos' in indicador and indicador['requiere_todos']):
+        return expresion_todos(indicador)
+    elif 'condicion' in indicador['reglas'][0]:
+        return None
     else:
-        return verificar_indicador_simple(df_edad, indicador)
+        return predicado_desde_regla(indicador['reglas'][0])
 
-def verificar_indicador_simple(df, indicador):
-    """Verifica indicadores con una sola regla"""
-    regla = indicador['reglas'][0]
-    
-    # Filtrar por código
-    df_codigo = df[df['Codigo_Item'] == regla['codigo']]
-    
-    # Filtrar por tipo diagnóstico
-    if isinstance(regla['tipo_dx'], list):
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'].isin(regla['tipo_dx'])]
-    else:
-        df_codigo = df_codigo[df_codigo['Tipo_Diagnostico'] == regla['tipo_dx']]
-    
-    # Filtrar por valores Lab si aplica
-    if 'lab_valores' in regla and regla['lab_valores']:
-        if "" in regla['lab_valores']:
-            # Incluir valores vacíos
-            df_codigo = df_codigo[
-                df_codigo['Valor_Lab'].isna() | 
-                df_codigo['Valor_Lab'].isin(regla['lab_valores'])
-            ]
-        else:
-            df_codigo = df_codigo[df_codigo['Valor_Lab'].isin(regla['lab_valores'])]
-    
-    # Filtrar por condición si aplica
-    if 'condicion' in regla:
-        df_codigo = df_codigo[df_codigo['Condicion_Establecimiento'].isin(regla['condicion'])]
-    
-    return df_codigo
-
-def verificar_indicador_multiple(df, indicador):
-    """Verifica indicadores que requieren múltiples códigos"""
-    dfs_cumplimiento = []
-    
-    for regla in indicador['reglas']:
-        df_temp = df[
-            (df['Codigo_Item'] == regla['codigo']) &
-            (df['Tipo_Diagnostico'] == regla['tipo_dx'])
-        ]
-        
-        if 'lab_valores' in regla and regla['lab_valores']:
-            if "" in regla['lab_valores']:
-                df_temp = df_temp[
-                    df_temp['Valor_Lab'].isna() | 
-                    df_temp['Valor_Lab'].isin(regla['lab_valores'])
-                ]
-            else:
-                df_temp = df_temp[df_temp['Valor_Lab'].isin(regla['lab_valores'])]
-        
-        dfs_cumplimiento.append(df_temp['pac_Numero_Documento'].unique())
-    
-    # Encontrar DNIs que tienen todos los códigos requeridos
-    dni_comun = set(dfs_cumplimiento[0])
-    for dni_set in dfs_cumplimiento[1:]:
-        dni_comun = dni_comun.intersection(set(dni_set))
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_comun))]
-
-def verificar_indicador_todos(df, indicador):
-    """Verifica indicadores que requieren todos los componentes"""
-    dni_cumple = set()
-    
-    # Agrupar por DNI
-    for dni in df['pac_Numero_Documento'].unique():
-        df_dni = df[df['pac_Numero_Documento'] == dni]
-        cumple_todos = True
-        
-        for regla in indicador['reglas']:
-            df_codigo = df_dni[
-                (df_dni['Codigo_Item'] == regla['codigo']) &
-                (df_dni['Tipo_Diagnostico'] == regla['tipo_dx'])
-            ]
-            
-            if 'lab_valores' in regla and regla['lab_valores']:
-                if "" in regla['lab_valores']:
-                    df_codigo = df_codigo[
-                        df_codigo['Valor_Lab'].isna() | 
-                        df_codigo['Valor_Lab'].isin(regla['lab_valores'])
-                    ]
-                else:
-                    df_codigo = df_codigo[df_codigo['Valor_Lab'].isin(regla['lab_valores'])]
-            
-            if df_codigo.empty:
-                cumple_todos = False
-                break
-        
-        if cumple_todos:
-            dni_cumple.add(dni)
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_cumple))]
-
-def verificar_valoracion_clinica(df, indicador_key):
-    """Verificación para valoración clínica con o sin factores de riesgo"""
-    # Usar la lógica estándar según el indicador específico
-    return verificar_indicador_todos(df, INDICADORES_JOVEN[indicador_key])
+def expresion_todos(indicador):
+    """Todos los códigos de las reglas"""
+    return todos(*[predicado_desde_regla(regla) for regla in indicador['reglas']])
 
-def verificar_tamizaje_vih(df):
-    """Verificación especial para tamizaje VIH con su flujo específico"""
-    # Buscar pre-test
-    df_pretest = df[
-        (df['Codigo_Item'] == '99401.33') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar pruebas (dual o rápida)
-    df_dual = df[
-        (df['Codigo_Item'] == '86318.01') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    df_rapida = df[
-        (df['Codigo_Item'] == '86703.01') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar post-test
-    df_posttest = df[
-        (df['Codigo_Item'].isin(['99401.34', '99403.03'])) & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # DNIs con flujo completo
-    dni_pretest = set(df_pretest['pac_Numero_Documento'].unique())
-    dni_prueba = set(df_dual['pac_Numero_Documento'].unique()) | set(df_rapida['pac_Numero_Documento'].unique())
-    dni_posttest = set(df_posttest['pac_Numero_Documento'].unique())
-    
-    dni_completo = dni_pretest & dni_prueba & dni_posttest
-    
-    return df[df['pac_Numero_Documento'].isin(list(dni_completo))]
+def expresion_tamizaje_vih():
+    """Pre-test + prueba (dual o rápida) + post-test"""
+    return todos(
+        crear_predicado('99401.33', 'D'),
+        alguno(
+            crear_predicado('86318.01', 'D'),
+            crear_predicado('86703.01', 'D')
+        ),
+        crear_predicado(['99401.34', '99403.03'], 'D')
+    )
 
-def verificar_anticonceptivos(df):
-    """Verificación especial para acceso a anticonceptivos"""
-    # Buscar atención PF
-    df_atencion = df[
-        (df['Codigo_Item'] == '99208') & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar método anticonceptivo
+def expresion_anticonceptivos():
+    """Atención PF, método y evaluación de riesgo reproductivo"""
     metodos_codigos = ["58300", "58300.01", "11975", "99208.05", "99208.04", 
                       "99208.02", "99208.06", "99208.13", "99208.12", "99208.11",
                       "99208.07", "99208.08", "99208.09", "58611", "58605", "55250"]
     
-    df_metodo = df[
-        (df['Codigo_Item'].isin(metodos_codigos)) & 
-        (df['Tipo_Diagnostico'] == 'D')
-    ]
-    
-    # Buscar evaluación riesgo reproductivo
-    df_riesgo = df[
-        (df['Codigo_Item'] == '99208.14') & 
-        (df['Tipo_Diagnostico'] == 'D') &
-        (df['Valor_Lab'].isin(['RSM', 'RSR', 'RSA']))
-    ]
+    return todos(
+        crear_predicado('99208', 'D'),
+        crear_predicado(metodos_codigos, 'D'),
+        crear_predicado('99208.14', 'D', ['RSM', 'RSR', 'RSA'])
+    )
+
+# Planes compilados una sola vez al importar (ver compilador_indicadores.py)
+PLANES_JOVEN = compilar_indicadores(INDICADORES_JOVEN, expresion_fuente)
+
+def expresion_indicador(indicador_key):
+    """
+    Expresión optimizada que verificar_cumplimiento_indicador evalúa dentro
+    de la banda de edad del indicador. None si no existe o si la verificación
+    necesita las filas (reglas con condición de establecimiento).
+    """
+    plan = PLANES_JOVEN.get(indicador_key)
+    return plan['expresion'] if plan is not None else None
+
+def verificar_indicador_simple(df, indicador, indice=None):
+    """Verifica indicadores con una sola regla"""
+    regla = indicador['reglas'][0]
     
-    # DNIs con atención completa
-    dni_atencion = set(df_atencion['pac_Numero_Documento'].unique())
-    dni_metodo = set(df_metodo['pac_Numero_Documento'].unique())
-    dni_riesgo = set(df_riesgo['pac_Numero_Documento'].unique())
+    # Filtrar por código, tipo diagnóstico y valores Lab (vacíos si "" está en la lista)
+    df_codigo = filtrar_filas(df, predicado_desde_regla(regla), indice)
     
-    # Debe tener atención, método y evaluación de riesgo
-    dni_completo = dni_atencion & dni_metodo & dni_riesgo
+    # Filtrar por condición si aplica
+    if 'condicion' in regla:
+        df_codigo = df_codigo[df_codigo['Condicion_Establecimiento'].isin(regla['condicion'])]
     
-    return df[df['pac_Numero_Documento'].isin(list(dni_completo))]
+    return df_codigo
 
-def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
-    """Calcula estadísticas de cumplimiento para un indicador"""
-    df_cumple = verificar_cumplimiento_indicador(df, indicador_key)
+def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None, indice=None, denominadores=None):
+    """
+    Calcula estadísticas de cumplimiento para un indicador.
+    denominadores: tabla de denominadores.py del conjunto (se reutilizan las bandas ya calculadas).
+    """
+    df_cumple = verificar_cumplimiento_indicador(df, indicador_key, indice=indice)
     
     if df_cumple is None:
         return None
@@ -689,13 +591,8 @@ def calcular_estadisticas_indicador(df, indicador_key, poblacion_total=None):
         else:
             denominador = poblacion_total * 0.3  # 30% por defecto
     else:
-        # Contar población elegible en los datos
-        df_elegible = df[
-            (df['edad_anos'] >= indicador['edad_min']) & 
-            (df['edad_anos'] <= indicador['edad_max'])
-        ]
-        
-        denominador = df_elegible['pac_Numero_Documento'].nunique()
+        # Contar población elegible en los datos (DNIs únicos de la banda de edad/género)
+        denominador = denominador_indicador(df, indicador, denominadores)
     
     porcentaje = (dni_cumplen / denominador * 100) if denominador > 0 else 0
     
@@ -760,4 +657,12 @@ def verificar_paquete_integral(df, dni=None):
     resultados['plan_ejecutado'] = plan_ejecutado
     resultados['completo'] = all(cumplimientos) and plan_ejecutado
     
-    return resultados
\ No newline at end of file
+    return resultados
+
+def verificar_paquete_integral_lote(df, indice=None):
+    """
+    Verifica el paquete integral para jóvenes de todos los DNIs a la vez.
+    Retorna un DataFrame con una fila por DNI, una columna booleana por
+    componente y plan_elaborado, plan_ejecutado y completo.
+    """
+    return verificar_paquete_lote(df, PAQUETE_INTEGRAL_JOVEN, verificar_cumplimiento_indicador, indice)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de Filtros de la Barra Lateral
+Sistema HISMINSA - Supervisión de Indicadores
+
+Se construye una vez por carga. Guarda las posiciones de fila ordenadas por
+fecha y por edad, y para establecimiento, turno, género y profesional un
+código entero por fila más las posiciones de cada valor. Los filtros se
+resuelven como intersección de posiciones (partiendo del conjunto más
+pequeño) y solo la selección final se materializa con iloc. También guarda
+el catálogo de opciones de la barra lateral (rango de fechas,
+establecimientos y profesionales) para no recorrer el DataFrame en cada
+ejecución.
+"""
+
+import numpy as np
+import pandas as pd
+
+from perfilado import perfilar
+
+# Filtros de igualdad: clave del dict de filtros -> columna
+COLUMNAS_FILTRO = {
+    'establecimiento': 'Id_Establecimiento',
+    'turno': 'Turno_Desc',
+    'genero': 'pac_Genero',
+    'profesional': 'Personal_Completo'
+}
+
+
+def _grupos(serie):
+    """Código por fila (-1 para nulos), {valor: código} y posiciones de cada código"""
+    codigos, valores = pd.factorize(serie, sort=False)
+    codigos = codigos.astype(np.int32)
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+    return {
+        'codigos': codigos,
+        'valores': {valor: i for i, valor in enumerate(valores)},
+        'orden': orden,
+        'limites': limites
+    }
+
+
+def _orden_valores(valores):
+    """Posiciones ordenadas por valor (sin nulos) y los valores en ese orden"""
+    validas = np.flatnonzero(~pd.isna(valores))
+    orden = validas[np.argsort(valores[validas], kind='stable')]
+    return orden, valores[orden]
+
+
+def construir_catalogo_filtros(df, fechas_ordenadas=None):
+    """Opciones de la barra lateral calculadas en una sola pasada por columna"""
+    if fechas_ordenadas is None:
+        fechas_ordenadas = np.sort(df['Fecha_Atencion'].dropna().to_numpy(dtype='datetime64[ns]'))
+    if len(fechas_ordenadas):
+        fecha_min = pd.Timestamp(fechas_ordenadas[0]).date()
+        fecha_max = pd.Timestamp(fechas_ordenadas[-1]).date()
+    else:
+        fecha_min = fecha_max = None
+
+    # Código -> "código - nombre" con el primer nombre registrado para cada código
+    establecimientos = {}
+    if 'Id_Establecimiento' in df.columns:
+        columnas = ['Id_Establecimiento'] + (['Establecimiento_Nombre'] if 'Establecimiento_Nombre' in df.columns else [])
+        primeros = df[columnas].drop_duplicates('Id_Establecimiento')
+        nombres = primeros['Establecimiento_Nombre'] if 'Establecimiento_Nombre' in primeros.columns else None
+        for i, codigo in enumerate(primeros['Id_Establecimiento']):
+            codigo_str = str(codigo).strip()
+            nombre = nombres.iat[i] if nombres is not None else 'Sin nombre'
+            establecimientos[codigo_str] = f"{codigo_str} - {nombre}"
+
+    profesionales = []
+    if 'Personal_Completo' in df.columns:
+        profesionales = sorted(df['Personal_Completo'].dropna().unique().tolist())
+
+    return {
+        'fecha_min': fecha_min,
+        'fecha_max': fecha_max,
+        'establecimientos': ['Todos'] + [establecimientos[codigo] for codigo in sorted(establecimientos)],
+        'profesionales': ['Todos'] + profesionales
+    }
+
+
+def construir_indice_filtros(df):
+    """Construye el índice de filtros a partir del DataFrame consolidado"""
+    fechas = df['Fecha_Atencion'].to_numpy(dtype='datetime64[ns]')
+    orden_fecha, fechas_ordenadas = _orden_valores(fechas)
+    orden_edad, edades_ordenadas = _orden_valores(df['edad_anos'].to_numpy(dtype=float))
+
+    grupos = {}
+    for filtro, columna in COLUMNAS_FILTRO.items():
+        if columna not in df.columns:
+            continue
+        serie = df[columna]
+        if filtro == 'establecimiento':
+            # Igual que la comparación original: texto sin espacios ('nan' para nulos)
+            serie = serie.astype(str).str.strip()
+        grupos[filtro] = _grupos(serie)
+
+    # Códigos de diagnóstico distintos (el filtro por texto se evalúa sobre ellos)
+    codigo_item, codigos_distintos = pd.factorize(df['Codigo_Item'], sort=False)
+
+    return {
+        'etiquetas': df.index,
+        'fechas': fechas,
+        'orden_fecha': orden_fecha,
+        'fechas_ordenadas': fechas_ordenadas,
+        'edades': df['edad_anos'].to_numpy(dtype=float),
+        'orden_edad': orden_edad,
+        'edades_ordenadas': edades_ordenadas,
+        'grupos': grupos,
+        'dnis': df['pac_Numero_Documento'].to_numpy(),
+        'codigo_item': codigo_item,
+        'codigos_distintos': pd.Series(codigos_distintos, dtype=object),
+        'catalogo': construir_catalogo_filtros(df, fechas_ordenadas)
+    }
+
+
+def _posiciones_grupo(grupo, valor):
+    """Posiciones (ordenadas) de las filas con el valor"""
+    codigo = grupo['valores'].get(valor)
+    if codigo is None:
+        return np.empty(0, dtype=np.int64)
+    return grupo['orden'][grupo['limites'][codigo]:grupo['limites'][codigo + 1]]
+
+
+def _rango(ordenados, minimo, maximo, cerrado_derecha=True):
+    """Rebanada de un arreglo ordenado con minimo <= valor <= maximo (o < maximo)"""
+    inicio = np.searchsorted(ordenados, minimo, side='left')
+    fin = np.searchsorted(ordenados, maximo, side='right' if cerrado_derecha else 'left')
+    return slice(inicio, max(inicio, fin))
+
+
+def seleccionar_posiciones(indice, filtros):
+    """
+    Posiciones de fila (ascendentes) que cumplen los filtros de crear_filtros_sidebar.
+    Mismo resultado que aplicar los filtros uno a uno sobre el DataFrame.
+    """
+    # Fechas por día: desde el inicio de fecha_min hasta antes del día siguiente a fecha_max
+    fecha_desde = np.datetime64(pd.Timestamp(filtros['fecha_min']).normalize(), 'ns')
+    fecha_hasta = np.datetime64(pd.Timestamp(filtros['fecha_max']).normalize() + pd.Timedelta(days=1), 'ns')
+
+    # Conjuntos de igualdad activos, del más pequeño al más grande
+    activos = []
+    for filtro, grupo in indice['grupos'].items():
+        valor = filtros.get(filtro, 'Todos')
+        if valor == 'Todos':
+            continue
+        if filtro == 'establecimiento':
+            valor = str(valor).strip()
+        activos.append((filtro, grupo, valor, _posiciones_grupo(grupo, valor)))
+    activos.sort(key=lambda activo: len(activo[3]))
+
+    if activos:
+        posiciones = activos[0][3]
+        for _, grupo, valor, _ in activos[1:]:
+            codigo = grupo['valores'].get(valor, -2)
+            posiciones = posiciones[grupo['codigos'][posiciones] == codigo]
+    else:
+        # Sin filtros de igualdad se parte del rango ordenado más pequeño (fechas o edades)
+        rango_fecha = _rango(indice['fechas_ordenadas'], fecha_desde, fecha_hasta, cerrado_derecha=False)
+        rango_edad = _rango(indice['edades_ordenadas'], filtros['edad_min'], filtros['edad_max'])
+        if rango_edad.stop - rango_edad.start < rango_fecha.stop - rango_fecha.start:
+            posiciones = np.sort(indice['orden_edad'][rango_edad])
+        else:
+            posiciones = np.sort(indice['orden_fecha'][rango_fecha])
+
+    fechas = indice['fechas'][posiciones]
+    edades = indice['edades'][posiciones]
+    posiciones = posiciones[
+        (fechas >= fecha_desde) & (fechas < fecha_hasta) &
+        (edades >= filtros['edad_min']) & (edades <= filtros['edad_max'])
+    ]
+
+    if filtros.get('dni'):
+        posiciones = posiciones[indice['dnis'][posiciones] == filtros['dni']]
+
+    if filtros.get('codigo'):
+        coincide = indice['codigos_distintos'].str.contains(filtros['codigo'], case=False, na=False).to_numpy()
+        coincide = np.append(coincide.astype(bool), False)  # posición extra para códigos nulos (-1)
+        posiciones = posiciones[coincide[indice['codigo_item'][posiciones]]]
+
+    return posiciones
+
+
+def indice_vigente(indice, df):
+    """¿El índice fue construido para este DataFrame?"""
+    return indice is not None and (
+        df.index is indice['etiquetas'] or
+        (len(df) == len(indice['etiquetas']) and df.index.equals(indice['etiquetas']))
+    )
+
+
+@perfilar('aplicar filtros')
+def filtrar_con_indice(df, indice, filtros):
+    """DataFrame filtrado; sin filtros efectivos retorna df sin copiar"""
+    if not indice_vigente(indice, df):
+        indice = construir_indice_filtros(df)
+    posiciones = seleccionar_posiciones(indice, filtros)
+    if len(posiciones) == len(df):
+        return df
+    return df.iloc[posiciones]
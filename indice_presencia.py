@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de Presencia Paciente × Código
+Sistema HISMINSA - Supervisión de Indicadores
+
+Se construye una vez por carga. Guarda códigos enteros por fila para el DNI
+y para la clave (Codigo_Item, Tipo_Diagnostico, Valor_Lab), la tabla de
+claves distintas, una matriz dispersa DNI × clave en formato CSR y los
+bloques de filas de cada DNI (las posiciones ordenadas por DNI). Los
+predicados se evalúan sobre las claves distintas y no sobre las filas; las
+filas de un paciente se obtienen sin recorrer el DataFrame.
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNA_DNI = 'pac_Numero_Documento'
+COLUMNAS_CLAVE = ['Codigo_Item', 'Tipo_Diagnostico', 'Valor_Lab']
+
+
+def _codificar_claves(df):
+    """Código entero por fila de la clave (código, tipo_dx, LAB); NaN en LAB es un valor propio"""
+    codigos = []
+    tamanos = []
+    for columna in COLUMNAS_CLAVE:
+        codigo, valores = pd.factorize(df[columna], sort=False, use_na_sentinel=False)
+        codigos.append(codigo.astype(np.int64))
+        tamanos.append(max(len(valores), 1))
+
+    combinado = (codigos[0] * tamanos[1] + codigos[1]) * tamanos[2] + codigos[2]
+    fila_clave, _ = pd.factorize(combinado, sort=False)
+
+    # Tabla de claves distintas (primera fila de cada clave)
+    _, primera = np.unique(fila_clave, return_index=True)
+    claves = df[COLUMNAS_CLAVE].iloc[primera].reset_index(drop=True)
+
+    return fila_clave, claves
+
+
+def construir_indice_presencia(df):
+    """Construye el índice de presencia a partir del DataFrame consolidado"""
+    # Códigos enteros por fila (NaN en DNI queda como -1)
+    fila_dni, dnis = pd.factorize(df[COLUMNA_DNI], sort=False)
+    fila_clave, claves = _codificar_claves(df)
+
+    return {
+        'etiquetas': df.index,
+        'fila_dni': fila_dni.astype(np.int32),
+        'fila_clave': fila_clave.astype(np.int32),
+        'dnis': pd.Index(dnis),
+        'claves': claves,
+        'mascaras': {},
+        'csr': None,
+        'bloques': None
+    }
+
+
+def ampliar_indice_presencia(indice, df, n_previas):
+    """
+    Extiende el índice con las filas agregadas al final de df (posiciones
+    n_previas en adelante) sin recodificar las filas existentes. Los DNIs y
+    claves nuevos se agregan al final, igual que al construir desde cero, y
+    las máscaras en caché solo se evalúan sobre las claves nuevas.
+    """
+    from motor_cumplimiento import mascara_predicado
+
+    if indice is None or len(indice['fila_dni']) != n_previas:
+        return construir_indice_presencia(df)
+
+    df_nuevas = df.iloc[n_previas:]
+
+    # DNIs: los ya conocidos conservan su código, los nuevos van al final
+    dni_nuevas = df_nuevas[COLUMNA_DNI]
+    fila_dni = indice['dnis'].get_indexer(dni_nuevas)
+    faltan = (fila_dni < 0) & dni_nuevas.notna().to_numpy()
+    codigos_extra, dnis_extra = pd.factorize(dni_nuevas[faltan], sort=False)
+    fila_dni[faltan] = codigos_extra + len(indice['dnis'])
+    dnis = indice['dnis'].append(pd.Index(dnis_extra))
+
+    # Claves: las existentes (distintas y primero) conservan los códigos 0..k-1
+    n_claves = len(indice['claves'])
+    pila = pd.concat([indice['claves'], df_nuevas[COLUMNAS_CLAVE]], ignore_index=True)
+    codigos_pila, claves = _codificar_claves(pila)
+
+    claves_extra = claves.iloc[n_claves:]
+    mascaras = {
+        predicado: np.concatenate([mascara, mascara_predicado(claves_extra, predicado).to_numpy()])
+        for predicado, mascara in indice['mascaras'].items()
+    }
+
+    return {
+        'etiquetas': df.index,
+        'fila_dni': np.concatenate([indice['fila_dni'], fila_dni.astype(np.int32)]),
+        'fila_clave': np.concatenate([indice['fila_clave'], codigos_pila[n_claves:].astype(np.int32)]),
+        'dnis': dnis,
+        'claves': claves,
+        'mascaras': mascaras,
+        'csr': None,
+        'bloques': None
+    }
+
+
+def _corresponde(indice, df):
+    """¿El índice fue construido para las filas de df (mismas etiquetas en el mismo orden)?"""
+    return df.index is indice['etiquetas'] or (
+        len(df) == len(indice['etiquetas']) and df.index.equals(indice['etiquetas'])
+    )
+
+
+def restringir_indice(indice, df):
+    """
+    Vista del índice para un subconjunto de filas (ej. df_filtrado).
+    Comparte la tabla de claves y la caché de predicados con el índice base.
+    Si el DataFrame no proviene del índice, se construye uno nuevo.
+    """
+    if indice is None:
+        return construir_indice_presencia(df)
+
+    if _corresponde(indice, df):
+        return indice
+
+    posiciones = indice['etiquetas'].get_indexer(df.index) if indice['etiquetas'].is_unique else None
+    if posiciones is None or (posiciones < 0).any():
+        return construir_indice_presencia(df)
+
+    return {
+        'etiquetas': df.index,
+        'fila_dni': indice['fila_dni'][posiciones],
+        'fila_clave': indice['fila_clave'][posiciones],
+        'dnis': indice['dnis'],
+        'claves': indice['claves'],
+        'mascaras': indice['mascaras'],
+        'csr': None,
+        'bloques': None
+    }
+
+
+def _csr(indice):
+    """Matriz dispersa DNI × clave (se construye la primera vez que se necesita)"""
+    if indice['csr'] is None:
+        n_claves = len(indice['claves'])
+        validas = np.flatnonzero(indice['fila_dni'] >= 0)
+        pares = indice['fila_dni'][validas].astype(np.int64) * n_claves + indice['fila_clave'][validas]
+
+        # Pares únicos ordenados por DNI y la primera fila donde aparece cada uno
+        pares_unicos, primera = np.unique(pares, return_index=True)
+        dni_par = pares_unicos // n_claves
+
+        indice['csr'] = {
+            'indptr': np.searchsorted(dni_par, np.arange(len(indice['dnis']) + 1)),
+            'claves': (pares_unicos % n_claves).astype(np.int32),
+            'primera_fila': validas[primera]
+        }
+    return indice['csr']
+
+
+def _mascara_claves(indice, predicado):
+    """Predicado evaluado sobre las claves distintas (con caché)"""
+    from motor_cumplimiento import mascara_predicado
+
+    predicado = predicado._replace(edad=None)
+    if predicado not in indice['mascaras']:
+        indice['mascaras'][predicado] = mascara_predicado(indice['claves'], predicado).to_numpy()
+    return indice['mascaras'][predicado]
+
+
+def mascara_filas(indice, predicado, df=None):
+    """
+    Máscara por fila del predicado usando el índice.
+    El filtro de edad de la regla (si existe) se aplica sobre df.
+    """
+    mascara = _mascara_claves(indice, predicado)[indice['fila_clave']]
+    if predicado.edad is not None and df is not None:
+        edad = df['edad_anos'].to_numpy()
+        mascara = mascara & (edad >= predicado.edad[0]) & (edad <= predicado.edad[1])
+    return mascara
+
+
+def flags_por_dni(indice, predicado, df=None):
+    """Arreglo booleano (uno por DNI del índice) con True si el DNI tiene alguna fila que cumple"""
+    flags = np.zeros(len(indice['dnis']), dtype=bool)
+    dni_filas = indice['fila_dni'][mascara_filas(indice, predicado, df)]
+    flags[dni_filas[dni_filas >= 0]] = True
+    return flags
+
+
+def bloques_por_dni(indice):
+    """
+    Filas agrupadas por DNI: posiciones de las filas ordenadas por DNI (en
+    el orden original dentro de cada DNI) y el inicio del bloque de cada
+    DNI. Se construye la primera vez que se necesita.
+    """
+    if indice['bloques'] is None:
+        orden = np.argsort(indice['fila_dni'], kind='stable')
+        indice['bloques'] = {
+            'orden': orden,
+            'indptr': np.searchsorted(indice['fila_dni'][orden], np.arange(len(indice['dnis']) + 1))
+        }
+    return indice['bloques']
+
+
+def _posicion_dni(indice, dni):
+    """Código entero del DNI en el índice (búsqueda por hash); None si no está"""
+    try:
+        posicion = indice['dnis'].get_loc(dni)
+    except (KeyError, TypeError):
+        return None
+    if not isinstance(posicion, (int, np.integer)):
+        return None
+    return posicion
+
+
+def _entradas_dni(indice, dni):
+    """Rango de la fila CSR del DNI; vacío si no está"""
+    posicion = _posicion_dni(indice, dni)
+    if posicion is None:
+        return slice(0, 0)
+    csr = _csr(indice)
+    return slice(csr['indptr'][posicion], csr['indptr'][posicion + 1])
+
+
+def posiciones_paciente(indice, dni):
+    """Posiciones (para iloc) de las filas del DNI, en el orden del DataFrame; vacío si no está"""
+    posicion = _posicion_dni(indice, dni)
+    if posicion is None:
+        return np.empty(0, dtype=np.intp)
+    bloques = bloques_por_dni(indice)
+    return bloques['orden'][bloques['indptr'][posicion]:bloques['indptr'][posicion + 1]]
+
+
+def filas_paciente(indice, df, dni):
+    """
+    Filas del DNI en df (el DataFrame del índice) sin recorrerlo: equivale a
+    df[df['pac_Numero_Documento'] == dni]. Si df no es el DataFrame del
+    índice (otro orden u otras filas) se usa la máscara.
+    """
+    if indice is None or not _corresponde(indice, df):
+        return df[df[COLUMNA_DNI] == dni]
+    return df.iloc[posiciones_paciente(indice, dni)]
+
+
+def tiene_codigo(indice, dni, codigo):
+    """¿El DNI tiene algún registro con el código?"""
+    claves_dni = _csr(indice)['claves'][_entradas_dni(indice, dni)]
+    return bool((indice['claves']['Codigo_Item'].to_numpy()[claves_dni] == codigo).any())
+
+
+def cumple_predicado(indice, dni, predicado):
+    """¿El DNI tiene algún registro que cumple el predicado (código, tipo_dx, LAB)?"""
+    claves_dni = _csr(indice)['claves'][_entradas_dni(indice, dni)]
+    return bool(_mascara_claves(indice, predicado)[claves_dni].any())
+
+
+def registros_paciente(indice, dni):
+    """
+    Primer registro de cada código del DNI: {codigo: (tipo_dx, valor_lab)}.
+    Equivale a tomar iloc[0] de las filas del paciente con ese código.
+    """
+    csr = _csr(indice)
+    entradas = _entradas_dni(indice, dni)
+    claves_dni = csr['claves'][entradas]
+    orden = np.argsort(csr['primera_fila'][entradas], kind='stable')
+
+    registros = {}
+    claves = indice['claves']
+    for clave in claves_dni[orden]:
+        codigo = claves.iat[clave, 0]
+        if codigo not in registros:
+            registros[codigo] = (claves.iat[clave, 1], claves.iat[clave, 2])
+    return registros
+
+
+def registros_desde_df(df_paciente):
+    """Mismo resultado que registros_paciente, calculado desde las filas del paciente"""
+    primeros = df_paciente.drop_duplicates('Codigo_Item')
+    return {
+        codigo: (tipo, lab)
+        for codigo, tipo, lab in zip(primeros['Codigo_Item'], primeros['Tipo_Diagnostico'], primeros['Valor_Lab'])
+    }
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de Cumplimiento Vectorizado
+Sistema HISMINSA - Supervisión de Indicadores
+
+Calcula en una sola pasada agrupada, por DNI, una bandera de presencia para
+cada predicado (código, tipo_dx, valores LAB) y evalúa los indicadores como
+álgebra de conjuntos (Y / O) sobre esas banderas.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from indice_presencia import restringir_indice, mascara_filas, flags_por_dni
+from perfilado import perfilar
+from evaluacion_compartida import ambito, reutilizar
+
+COLUMNA_DNI = 'pac_Numero_Documento'
+
+# Columnas del resultado por lote del paquete que no son componentes
+COLUMNAS_ESTADO_PAQUETE = (COLUMNA_DNI, 'plan_elaborado', 'plan_ejecutado', 'completo')
+
+# Condición atómica sobre una fila del consolidado
+Predicado = namedtuple(
+    'Predicado',
+    ['codigos', 'tipos_dx', 'lab_valores', 'lab_incluye_vacio', 'edad']
+)
+
+
+def _como_tupla(valor):
+    """Normaliza un valor o lista de valores a una tupla ordenada"""
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(sorted(set(valor)))
+    return (valor,)
+
+
+def crear_predicado(codigo, tipo_dx='D', lab_valores=None, lab_incluye_vacio=None,
+                    edad_min=None, edad_max=None):
+    """
+    Crea un predicado hashable.
+    - lab_valores vacío o None: no se filtra por LAB
+    - lab_incluye_vacio: también acepta Valor_Lab nulo (por defecto si "" está en la lista)
+    - edad_min/edad_max: filtro de edad a nivel de fila (reglas con edad propia)
+    """
+    if lab_valores:
+        lab = _como_tupla(lab_valores)
+        if lab_incluye_vacio is None:
+            lab_incluye_vacio = "" in lab
+    else:
+        lab = None
+        lab_incluye_vacio = False
+
+    edad = (edad_min, edad_max) if edad_min is not None else None
+
+    return Predicado(_como_tupla(codigo), _como_tupla(tipo_dx), lab, bool(lab_incluye_vacio), edad)
+
+
+def predicado_desde_regla(regla, lab_con_vacios=True, con_edad=False):
+    """
+    Convierte una regla de INDICADORES_* en predicado.
+    lab_con_vacios=False reproduce la verificación por opciones (solo isin, sin nulos).
+    """
+    return crear_predicado(
+        regla['codigo'],
+        regla['tipo_dx'],
+        regla.get('lab_valores'),
+        lab_incluye_vacio=None if lab_con_vacios else False,
+        edad_min=regla.get('edad_min') if con_edad else None,
+        edad_max=regla.get('edad_max') if con_edad else None
+    )
+
+
+def etiqueta_predicado(predicado):
+    """Nombre legible del predicado (se usa como columna de banderas)"""
+    partes = [",".join(predicado.codigos), ",".join(predicado.tipos_dx)]
+    if predicado.lab_valores is not None:
+        lab = ",".join(predicado.lab_valores)
+        partes.append(f"LAB[{lab}]" + ("+nulo" if predicado.lab_incluye_vacio else ""))
+    if predicado.edad is not None:
+        partes.append(f"edad[{predicado.edad[0]}-{predicado.edad[1]}]")
+    return "|".join(partes)
+
+
+def mascara_predicado(df, predicado):
+    """Máscara booleana por fila para un predicado"""
+    if len(predicado.codigos) == 1:
+        mascara = df['Codigo_Item'] == predicado.codigos[0]
+    else:
+        mascara = df['Codigo_Item'].isin(predicado.codigos)
+
+    if len(predicado.tipos_dx) == 1:
+        mascara &= df['Tipo_Diagnostico'] == predicado.tipos_dx[0]
+    else:
+        mascara &= df['Tipo_Diagnostico'].isin(predicado.tipos_dx)
+
+    if predicado.lab_valores is not None:
+        mascara_lab = df['Valor_Lab'].isin(predicado.lab_valores)
+        if predicado.lab_incluye_vacio:
+            mascara_lab |= df['Valor_Lab'].isna()
+        mascara &= mascara_lab
+
+    if predicado.edad is not None:
+        mascara &= (df['edad_anos'] >= predicado.edad[0]) & (df['edad_anos'] <= predicado.edad[1])
+
+    return mascara
+
+
+# ---------------------------------------------------------------------------
+# Expresiones: un Predicado, o ('Y', [...]) / ('O', [...])
+# ---------------------------------------------------------------------------
+
+def todos(*expresiones):
+    """Expresión que exige todas las subexpresiones"""
+    return ('Y', list(expresiones))
+
+
+def alguno(*expresiones):
+    """Expresión que exige al menos una subexpresión"""
+    return ('O', list(expresiones))
+
+
+def predicados_de_expresion(expresion):
+    """Lista de predicados distintos usados en una expresión (en orden de aparición)"""
+    if isinstance(expresion, Predicado):
+        return [expresion]
+    predicados = []
+    for sub in expresion[1]:
+        for predicado in predicados_de_expresion(sub):
+            if predicado not in predicados:
+                predicados.append(predicado)
+    return predicados
+
+
+def _indice_restringido(indice, df, alcance):
+    """Índice de presencia restringido al DataFrame (uno por ámbito en la sesión de evaluación)"""
+    return reutilizar(alcance, 'indice', lambda: restringir_indice(indice, df))
+
+
+def filtrar_filas(df, predicado, indice=None, alcance=None):
+    """
+    Filas del DataFrame que cumplen el predicado.
+    alcance: ámbito de evaluacion_compartida que identifica a df; con una
+    sesión activa la máscara se calcula una sola vez por ámbito.
+    """
+    if indice is not None:
+        mascara = reutilizar(
+            alcance, ('filas', predicado),
+            lambda: mascara_filas(_indice_restringido(indice, df, alcance), predicado, df),
+            etiqueta_predicado(predicado)
+        )
+        return df[mascara]
+    return df[mascara_predicado(df, predicado)]
+
+
+def calcular_flags_dni(df, predicados, indice=None):
+    """
+    Banderas de presencia por DNI: un DataFrame indexado por DNI con una
+    columna booleana por predicado (etiqueta_predicado). Solo incluye DNIs
+    con al menos una fila de algún código relevante.
+    Con el índice de presencia se evalúa sobre las claves distintas y el
+    resultado incluye todos los DNIs del índice.
+    """
+    predicados = list(dict.fromkeys(predicados))
+    columnas = [etiqueta_predicado(p) for p in predicados]
+
+    if df.empty or not predicados:
+        return pd.DataFrame(columns=columnas, dtype=bool)
+
+    if indice is not None:
+        indice = restringir_indice(indice, df)
+        return pd.DataFrame(
+            {columna: flags_por_dni(indice, p, df) for columna, p in zip(columnas, predicados)},
+            index=indice['dnis']
+        )
+
+    # Reducir a las filas con algún código relevante antes de construir máscaras
+    codigos = set()
+    for predicado in predicados:
+        codigos.update(predicado.codigos)
+    df_rel = df[df['Codigo_Item'].isin(codigos)]
+
+    if df_rel.empty:
+        return pd.DataFrame(columns=columnas, dtype=bool)
+
+    mascaras = pd.DataFrame(
+        {columna: mascara_predicado(df_rel, p).to_numpy() for columna, p in zip(columnas, predicados)},
+        index=df_rel.index
+    )
+
+    # Una sola pasada agrupada: ¿algún registro del DNI cumple el predicado?
+    return mascaras.groupby(df_rel[COLUMNA_DNI].to_numpy(), sort=False).any()
+
+
+def evaluar_expresion(flags, expresion):
+    """Evalúa una expresión sobre las banderas y retorna una Serie booleana por DNI"""
+    if isinstance(expresion, Predicado):
+        return flags[etiqueta_predicado(expresion)]
+
+    operador, subexpresiones = expresion
+    resultado = None
+    for sub in subexpresiones:
+        valor = evaluar_expresion(flags, sub)
+        if resultado is None:
+            resultado = valor.copy()
+        elif operador == 'Y':
+            resultado &= valor
+        else:
+            resultado |= valor
+
+    if resultado is None:
+        return pd.Series(operador == 'Y', index=flags.index)
+    return resultado
+
+
+def evaluar_con_cortocircuito(expresion, banderas, n):
+    """
+    Evalúa la expresión sobre n unidades pidiendo las banderas de cada
+    predicado (banderas(predicado) -> arreglo booleano) solo cuando hacen
+    falta: un Y se detiene si ninguna unidad puede cumplir y un O si todas
+    cumplen. Conviene que las subexpresiones vengan ordenadas (ver
+    compilador_indicadores.optimizar_expresion).
+    """
+    if isinstance(expresion, Predicado):
+        return banderas(expresion)
+
+    operador, subexpresiones = expresion
+    resultado = None
+    for sub in subexpresiones:
+        valor = evaluar_con_cortocircuito(sub, banderas, n)
+        if resultado is None:
+            resultado = valor.copy()
+        elif operador == 'Y':
+            resultado &= valor
+        else:
+            resultado |= valor
+        if (operador == 'Y' and not resultado.any()) or (operador == 'O' and resultado.all()):
+            break
+
+    if resultado is None:
+        return np.full(n, operador == 'Y')
+    return resultado
+
+
+def dnis_que_cumplen(df, expresion, indice=None, alcance=None):
+    """
+    Conjunto de DNIs del DataFrame que satisfacen la expresión.
+    alcance: como en filtrar_filas; las banderas por DNI de cada predicado se
+    comparten entre todas las expresiones evaluadas sobre el mismo ámbito.
+    """
+    if indice is not None:
+        indice = _indice_restringido(indice, df, alcance)
+
+        def banderas(predicado):
+            return reutilizar(
+                alcance, ('dni', predicado),
+                lambda: flags_por_dni(indice, predicado, df),
+                etiqueta_predicado(predicado)
+            )
+
+        cumple = evaluar_con_cortocircuito(expresion, banderas, len(indice['dnis']))
+        return set(indice['dnis'][cumple])
+
+    flags = calcular_flags_dni(df, predicados_de_expresion(expresion), indice)
+    if flags.empty:
+        return set()
+    cumple = evaluar_expresion(flags, expresion)
+    return set(flags.index[cumple.to_numpy()])
+
+
+def filas_de_dnis(df, dnis):
+    """Filas del DataFrame pertenecientes a los DNIs indicados"""
+    return df[df[COLUMNA_DNI].isin(list(dnis))]
+
+
+def filtrar_por_expresion(df, expresion, indice=None, alcance=None):
+    """Retorna todas las filas de los DNIs que cumplen la expresión"""
+    return filas_de_dnis(df, dnis_que_cumplen(df, expresion, indice, alcance))
+
+
+@perfilar('paquete integral por lote')
+def verificar_paquete_lote(df, paquete, verificar_indicador, indice=None):
+    """
+    Paquete integral para todos los DNIs del DataFrame en una sola pasada.
+    Retorna un DataFrame con una fila por DNI (pac_Numero_Documento), una
+    columna booleana por componente, plan_elaborado, plan_ejecutado y completo.
+    """
+    dnis = pd.Index(df[COLUMNA_DNI].dropna().unique())
+    resultado = pd.DataFrame({COLUMNA_DNI: dnis})
+
+    # Cada componente se evalúa una sola vez para todos los DNIs
+    componentes = []
+    for componente in paquete['componentes_minimos']:
+        df_cumple = verificar_indicador(df, componente['indicador'], indice=indice)
+        dnis_cumple = df_cumple[COLUMNA_DNI].unique() if df_cumple is not None else []
+        resultado[componente['componente']] = dnis.isin(dnis_cumple)
+        componentes.append(componente['componente'])
+
+    # Registro del plan: inicio (elaborado) y fin (ejecutado)
+    registro = paquete['registro_paquete']
+    alcance = ambito(df)
+    for columna, paso in (('plan_elaborado', 'inicio'), ('plan_ejecutado', 'fin')):
+        predicado = crear_predicado(registro[paso]['codigo'], registro[paso]['tipo_dx'], [registro[paso]['lab']])
+        resultado[columna] = dnis.isin(list(dnis_que_cumplen(df, predicado, indice, alcance)))
+
+    resultado['completo'] = resultado[componentes].all(axis=1) & resultado['plan_ejecutado']
+    return resultado
+
+
+def componentes_de_lote(lote):
+    """Nombres de las columnas de componentes de un resultado de verificar_paquete_lote"""
+    return [c for c in lote.columns if c not in COLUMNAS_ESTADO_PAQUETE]
+
+
+def resultado_paquete_desde_fila(fila):
+    """Convierte una fila del lote al formato de verificar_paquete_integral"""
+    return {
+        'dni': fila[COLUMNA_DNI],
+        'componentes': {c: bool(fila[c]) for c in fila.index if c not in COLUMNAS_ESTADO_PAQUETE},
+        'completo': bool(fila['completo']),
+        'plan_elaborado': bool(fila['plan_elaborado']),
+        'plan_ejecutado': bool(fila['plan_ejecutado'])
+    }
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfilado por Etapas
+Sistema HISMINSA - Supervisión de Indicadores
+
+Temporizadores livianos alrededor de cada etapa (lectura de CSV, uniones con
+los maestros, edad detallada, descripciones, filtros, indicadores y
+exportadores). Cada etapa registra segundos y la variación de memoria del
+proceso (RSS) en la traza activa; sin traza activa no se mide nada.
+
+La traza vive en un ContextVar: cada sesión de Streamlit y cada ejecución
+del procesamiento por lotes tienen la suya. Para que los hilos de un
+ThreadPoolExecutor registren en la traza de quien los lanza, la función se
+envía con propagar(). Con varios hilos a la vez la variación de memoria de
+una etapa incluye la de las demás: es orientativa.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_TRAZA = ContextVar('traza_hisminsa', default=None)
+_NIVEL = ContextVar('nivel_etapa_hisminsa', default=0)
+_BLOQUEO = threading.Lock()
+
+try:
+    _PAGINA_MB = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+except (AttributeError, ValueError, OSError):
+    _PAGINA_MB = None
+
+
+def memoria_actual_mb():
+    """Memoria residente del proceso en MB (pico si no se puede leer la actual)"""
+    if _PAGINA_MB is not None:
+        try:
+            with open('/proc/self/statm') as archivo:
+                return int(archivo.read().split()[1]) * _PAGINA_MB
+        except (OSError, ValueError, IndexError):
+            pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return 0.0
+
+
+def nueva_traza(nombre):
+    """Traza vacía: {'nombre', 'inicio', 'reloj', 'segundos_total', 'memoria_inicial_mb', 'etapas'}"""
+    return {
+        'nombre': nombre,
+        'inicio': datetime.now().isoformat(timespec='seconds'),
+        'reloj': time.perf_counter(),
+        'segundos_total': None,
+        'memoria_inicial_mb': round(memoria_actual_mb(), 1),
+        'etapas': []
+    }
+
+
+@contextmanager
+def trazar(nombre):
+    """Activa una traza nueva mientras dura el bloque y la entrega con el tiempo total"""
+    traza = nueva_traza(nombre)
+    token_traza = _TRAZA.set(traza)
+    token_nivel = _NIVEL.set(0)
+    try:
+        yield traza
+    finally:
+        traza['segundos_total'] = round(time.perf_counter() - traza['reloj'], 4)
+        _NIVEL.reset(token_nivel)
+        _TRAZA.reset(token_traza)
+
+
+def traza_activa():
+    """Traza en la que se registran las etapas (None si no hay)"""
+    return _TRAZA.get()
+
+
+@contextmanager
+def etapa(nombre, **detalle):
+    """
+    Mide el bloque como una etapa de la traza activa: inicio (segundos desde
+    el comienzo de la traza), segundos, variación de memoria (MB) y nivel de
+    anidamiento. detalle se agrega al registro.
+    """
+    traza = _TRAZA.get()
+    if traza is None:
+        yield
+        return
+
+    nivel = _NIVEL.get()
+    token = _NIVEL.set(nivel + 1)
+    memoria_inicial = memoria_actual_mb()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        _NIVEL.reset(token)
+        registro = {
+            'etapa': nombre,
+            'nivel': nivel,
+            'inicio_s': round(inicio - traza['reloj'], 4),
+            'segundos': round(segundos, 4),
+            'memoria_mb': round(memoria_actual_mb() - memoria_inicial, 1),
+            'hilo': threading.current_thread().name
+        }
+        registro.update(detalle)
+        with _BLOQUEO:
+            traza['etapas'].append(registro)
+
+
+def perfilar(nombre):
+    """Decorador: cada llamada a la función se registra como la etapa nombre"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with etapa(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def propagar(funcion):
+    """
+    funcion ejecutada en una copia del contexto actual, para enviarla a otro
+    hilo. Una envoltura por envío: una copia no puede usarse en dos hilos a la vez.
+    """
+    contexto = copy_context()
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return contexto.run(funcion, *args, **kwargs)
+    return envoltura
+
+
+def resumir_traza(traza):
+    """
+    Etapas agregadas por nombre, en orden de primer inicio:
+    lista de {'etapa', 'nivel', 'llamadas', 'segundos', 'segundos_max', 'memoria_mb', 'porcentaje'}.
+    porcentaje es respecto del tiempo total de la traza (o de las etapas de nivel 0).
+    """
+    with _BLOQUEO:
+        etapas = list(traza['etapas'])
+
+    resumen = {}
+    for registro in sorted(etapas, key=lambda r: (r['inicio_s'], r['nivel'])):
+        fila = resumen.get(registro['etapa'])
+        if fila is None:
+            fila = resumen[registro['etapa']] = {
+                'etapa': registro['etapa'], 'nivel': registro['nivel'], 'llamadas': 0,
+                'segundos': 0.0, 'segundos_max': 0.0, 'memoria_mb': 0.0
+            }
+        fila['nivel'] = min(fila['nivel'], registro['nivel'])
+        fila['llamadas'] += 1
+        fila['segundos'] += registro['segundos']
+        fila['segundos_max'] = max(fila['segundos_max'], registro['segundos'])
+        fila['memoria_mb'] += registro['memoria_mb']
+
+    total = traza['segundos_total'] or sum(r['segundos'] for r in etapas if r['nivel'] == 0)
+    filas = list(resumen.values())
+    for fila in filas:
+        fila['segundos'] = round(fila['segundos'], 4)
+        fila['memoria_mb'] = round(fila['memoria_mb'], 1)
+        fila['porcentaje'] = round(fila['segundos'] / total * 100, 1) if total else 0.0
+    return filas
+
+
+def traza_json(*trazas):
+    """JSON con las trazas dadas (y su resumen) para compararlas fuera de la aplicación"""
+    return json.dumps(
+        [dict(traza, resumen=resumir_traza(traza)) for traza in trazas if traza is not None],
+        ensure_ascii=False, indent=2
+    )
+
+
+def guardar_traza(ruta, *trazas):
+    """Escribe traza_json en ruta y retorna la ruta"""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write(traza_json(*trazas))
+    return ruta
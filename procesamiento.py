@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Procesamiento de Consolidados sin Interfaz
+Sistema HISMINSA - Supervisión de Indicadores
+
+Encadena la carga (carga_consolidados), el modo agregar, la caché compartida
+entre sesiones y la construcción de los índices de presencia y de filtros.
+No usa Streamlit: retorna el resultado y los mensajes como datos
+(diagnósticos (nivel, texto), con nivel = función de st a usar) para que la
+aplicación web, el procesamiento por lotes o un benchmark usen el mismo
+código y decidan cómo mostrarlos.
+"""
+
+import time
+
+from carga_consolidados import (
+    cargar_consolidados,
+    estadisticas_descripciones,
+    anexar_consolidados,
+    huellas_carga
+)
+from cache_compartido import obtener_conjunto, registrar_conjunto
+from indice_presencia import construir_indice_presencia, ampliar_indice_presencia, bloques_por_dni
+from indice_filtros import construir_indice_filtros
+from perfilado import etapa
+
+
+def _resultado(**valores):
+    """Resultado vacío de procesar_conjunto con los valores dados"""
+    resultado = {
+        'df_completo': None,
+        'archivos_procesados': [],
+        'errores': [],
+        'detalle_carga': None,
+        'indice_presencia': None,
+        'indice_filtros': None,
+        'clave_dataset': None,
+        'reutilizado': False,
+        'diagnosticos': [],
+        'muestra_cie10': None,
+        'tiempos': {}
+    }
+    resultado.update(valores)
+    return resultado
+
+
+def diagnosticos_descripciones(df_completo, descripciones):
+    """
+    Mensajes del mapeo de descripciones (CIE10, establecimientos, UPS) y, si
+    se mapeó menos de la mitad de CIE10, una muestra de códigos y claves.
+    Retorna (diagnosticos, muestra_cie10).
+    """
+    diagnosticos = []
+    muestra_cie10 = None
+    estadisticas = estadisticas_descripciones(df_completo, descripciones)
+
+    if 'cie10' in estadisticas:
+        mapped_count, total_count, unique_codes, _, cie10_dict_clean = estadisticas['cie10']
+        diagnosticos.append(('info', f"📊 CIE10: {mapped_count}/{total_count} registros mapeados "
+                                     f"({mapped_count/total_count*100:.1f}%), {unique_codes} códigos únicos"))
+        # Si hay muy pocos mapeos, algunos ejemplos para depurar
+        if mapped_count < total_count * 0.5:
+            muestra_cie10 = {
+                'codigos': list(df_completo['Codigo_Item_Clean'].dropna().unique()[:5]),
+                'claves': list(cie10_dict_clean.keys())[:5]
+            }
+
+    if 'estab' in estadisticas:
+        mapped_count, total_count, unique_estab, _, _ = estadisticas['estab']
+        diagnosticos.append(('info', f"🏥 Establecimientos: {mapped_count}/{total_count} registros mapeados "
+                                     f"({mapped_count/total_count*100:.1f}%), {unique_estab} establecimientos únicos"))
+
+    if 'ups' in estadisticas:
+        mapped_count, total_count, unique_ups, _, _ = estadisticas['ups']
+        diagnosticos.append(('info', f"🏪 UPS: {mapped_count}/{total_count} registros mapeados "
+                                     f"({mapped_count/total_count*100:.1f}%), {unique_ups} servicios únicos"))
+
+    return diagnosticos, muestra_cie10
+
+
+def procesar_conjunto(archivos, df_pacientes, df_personal, df_registradores, descripciones,
+                      df_existente=None, indice_existente=None, clave_base=None,
+                      n_hilos=None, usar_cache=True, compartir=True):
+    """
+    Procesa varios consolidados y construye los índices del conjunto.
+    archivos: lista de (nombre, bytes)
+    df_existente: datos ya cargados (modo agregar); indice_existente es su
+    índice de presencia y clave_base su huella (sin ella no se comparte)
+    compartir: reutilizar/registrar el conjunto en la caché compartida
+    Retorna un dict con df_completo (None si no se pudo procesar ninguno),
+    archivos_procesados, errores, detalle_carga, indice_presencia,
+    indice_filtros, clave_dataset, reutilizado, diagnosticos, muestra_cie10
+    y tiempos (segundos por etapa).
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    # Conjunto ya procesado en el proceso (por esta u otra sesión)
+    compartir = compartir and (df_existente is None or clave_base is not None)
+    with etapa('huellas de archivos'):
+        huellas = huellas_carga(archivos, df_pacientes, df_personal, df_registradores, descripciones, clave_base)
+    compartido = obtener_conjunto(huellas['clave']) if compartir else None
+    if compartido is not None:
+        return _resultado(
+            df_completo=compartido['df_completo'],
+            archivos_procesados=compartido['archivos_procesados'],
+            errores=compartido['errores'],
+            detalle_carga=compartido['detalle_carga'],
+            indice_presencia=compartido['indice_presencia'],
+            indice_filtros=compartido['indice_filtros'],
+            clave_dataset=huellas['clave'],
+            reutilizado=True,
+            diagnosticos=[('info', "♻️ Este conjunto de archivos ya fue procesado en el servidor: se reutiliza")],
+            tiempos={'carga': round(time.perf_counter() - inicio, 3)}
+        )
+
+    # Leer, unir con maestros y enriquecer cada archivo (o recuperarlo de la caché)
+    with etapa('carga de consolidados'):
+        df_completo, archivos_procesados, errores, detalle = cargar_consolidados(
+            archivos, df_pacientes, df_personal, df_registradores, descripciones,
+            usar_cache=usar_cache, n_hilos=n_hilos, huellas=huellas
+        )
+    tiempos['carga'] = round(time.perf_counter() - inicio, 3)
+    detalle_carga = {
+        'archivos': detalle,
+        'errores': errores,
+        'segundos_total': tiempos['carga']
+    }
+    if df_completo is None:
+        return _resultado(archivos_procesados=archivos_procesados, errores=errores,
+                          detalle_carga=detalle_carga, tiempos=tiempos)
+
+    desde_cache = sum(1 for d in detalle if d['origen'] == 'caché')
+    diagnosticos = [('info', f"💾 Caché: {desde_cache}/{len(detalle)} archivos reutilizados, "
+                             f"{len(detalle) - desde_cache} procesados")]
+
+    # Modo agregar: unir con los datos ya cargados
+    if df_existente is not None:
+        inicio = time.perf_counter()
+        with etapa('anexar consolidados'):
+            df_completo, filas_agregadas, filas_duplicadas = anexar_consolidados(
+                df_existente, df_completo, [d['filas'] for d in detalle]
+            )
+        tiempos['anexar'] = round(time.perf_counter() - inicio, 3)
+        diagnosticos.append(('info', f"➕ Agregados {filas_agregadas:,} registros nuevos; "
+                                     f"{filas_duplicadas:,} omitidos por estar ya cargados o repetidos en los archivos"))
+
+    with etapa('cobertura de descripciones'):
+        mensajes_descripciones, muestra_cie10 = diagnosticos_descripciones(df_completo, descripciones)
+    diagnosticos.extend(mensajes_descripciones)
+
+    # Índice de presencia paciente × (código, tipo_dx, LAB) para las verificaciones
+    inicio = time.perf_counter()
+    with etapa('índice de presencia'):
+        if df_existente is not None and indice_existente is not None:
+            indice_presencia = ampliar_indice_presencia(indice_existente, df_completo, len(df_existente))
+        else:
+            indice_presencia = construir_indice_presencia(df_completo)
+        # Bloques de filas por DNI: la búsqueda de un paciente no recorre el DataFrame
+        bloques_por_dni(indice_presencia)
+    tiempos['indice_presencia'] = round(time.perf_counter() - inicio, 3)
+
+    # Índice de los filtros de la barra lateral
+    inicio = time.perf_counter()
+    with etapa('índice de filtros'):
+        indice_filtros = construir_indice_filtros(df_completo)
+    tiempos['indice_filtros'] = round(time.perf_counter() - inicio, 3)
+
+    # Registrar el conjunto para las demás sesiones
+    if compartir:
+        registrado = registrar_conjunto(huellas['clave'], {
+            'df_completo': df_completo,
+            'indice_presencia': indice_presencia,
+            'indice_filtros': indice_filtros,
+            'detalle_carga': detalle_carga,
+            'archivos_procesados': archivos_procesados,
+            'errores': errores
+        })
+        df_completo = registrado['df_completo']
+        indice_presencia = registrado['indice_presencia']
+        indice_filtros = registrado['indice_filtros']
+
+    return _resultado(
+        df_completo=df_completo,
+        archivos_procesados=archivos_procesados,
+        errores=errores,
+        detalle_carga=detalle_carga,
+        indice_presencia=indice_presencia,
+        indice_filtros=indice_filtros,
+        clave_dataset=huellas['clave'] if compartir else None,
+        diagnosticos=diagnosticos,
+        muestra_cie10=muestra_cie10,
+        tiempos=tiempos
+    )
@@ -0,0 +1,779 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supervisión Individual por Paciente
+Sistema HISMINSA - Supervisión de Indicadores
+
+Verificación detallada de un DNI (paquete integral, cada indicador con sus
+códigos presentes/faltantes y errores de LAB), recomendaciones de corrección
+y los JSON de corrección individual y de paquete integral. supervisar_lote
+hace la misma verificación para todos los pacientes a la vez (matrices
+DNI × regla por bloques) y la entrega como una tabla larga. Sin Streamlit.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from indicadores_adulto import (
+    INDICADORES_ADULTO,
+    PAQUETE_INTEGRAL_ADULTO,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto,
+    verificar_paquete_integral as verificar_paquete_adulto,
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto
+)
+from indicadores_joven import (
+    INDICADORES_JOVEN,
+    PAQUETE_INTEGRAL_JOVEN,
+    verificar_cumplimiento_indicador as verificar_indicador_joven,
+    verificar_paquete_integral as verificar_paquete_joven,
+    verificar_paquete_integral_lote as verificar_paquete_lote_joven
+)
+from indicadores_adulto_mayor import (
+    INDICADORES_ADULTO_MAYOR,
+    PAQUETE_INTEGRAL_ADULTO_MAYOR,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto_mayor,
+    verificar_paquete_integral as verificar_paquete_adulto_mayor,
+    verificar_paquete_integral_lote as verificar_paquete_lote_adulto_mayor
+)
+from indice_presencia import filas_paciente, registros_paciente, registros_desde_df
+from motor_cumplimiento import COLUMNA_DNI, componentes_de_lote
+from perfilado import perfilar
+
+# Columnas que leen las verificaciones del paquete integral: el paquete se
+# evalúa sobre esta vista angosta de las filas del paciente
+COLUMNAS_PAQUETE = [
+    'pac_Numero_Documento', 'Codigo_Item', 'Tipo_Diagnostico', 'Valor_Lab',
+    'edad_anos', 'pac_Genero', 'Fecha_Atencion'
+]
+
+# Componentes prioritarios del paquete integral por curso de vida (componente -> indicador)
+COMPONENTES_PRIORITARIOS = {
+    "Adulto (30-59 años)": {
+        'Valoración Clínica y Tamizaje Laboratorial': 'valoracion_clinica',
+        'Tamizaje Agudeza Visual': 'agudeza_visual',
+        'Tamizaje Trastornos Depresivos': 'depresion',
+        'Tamizaje Violencia': 'violencia',
+        'Tamizaje VIH': 'vih',
+        'Evaluación Oral Completa': 'eval_oral',
+        'Tamizaje Alcohol y Drogas': 'alcohol_drogas'
+    },
+    "Joven (18-29 años)": {
+        'Valoración Clínica y Factores de Riesgo': 'valoracion_clinica',
+        'Tamizaje Violencia Intrafamiliar': 'violencia',
+        'Salud Sexual y Reproductiva': 'salud_sexual',
+        'Tamizaje VIH/ITS': 'vih',
+        'Evaluación Oral': 'eval_oral',
+        'Salud Mental': 'salud_mental'
+    },
+    "Adulto Mayor (60+ años)": {
+        'Valoración Clínica Integral': 'valoracion_clinica',
+        'Evaluación Funcional': 'evaluacion_funcional',
+        'Tamizaje Depresión Geriátrica': 'depresion',
+        'Tamizaje Deterioro Cognitivo': 'deterioro_cognitivo',
+        'Valoración Nutricional': 'valoracion_nutricional',
+        'Prevención de Caídas': 'prevencion_caidas'
+    }
+}
+
+# Indicadores que la supervisión no valida por separado (son el registro del paquete)
+INDICADORES_NO_SUPERVISADOS = ['plan_atencion_elaborado', 'plan_atencion_ejecutado']
+
+# Tabla larga de supervisar_lote
+COLUMNAS_SUPERVISION_LOTE = [
+    'dni', 'indicador', 'nombre_indicador', 'componente', 'estado_indicador',
+    'codigo', 'descripcion', 'estado', 'motivo', 'prioridad', 'recomendacion'
+]
+
+# DNIs por bloque en supervisar_lote (acota las matrices DNI × regla)
+DNIS_POR_BLOQUE = 5000
+
+
+@perfilar('supervisión individual')
+def supervisar_paciente_individual(df, dni, curso_vida, indice=None):
+    """
+    Realiza una supervisión completa de un paciente individual
+    Retorna un diccionario con toda la información de cumplimiento
+    indice: índice de presencia correspondiente a df (opcional); con él las
+    filas del paciente salen de su bloque y no de recorrer df
+    """
+    df_paciente = filas_paciente(indice, df, dni)
+    
+    if df_paciente.empty:
+        return None
+    
+    # Primer registro de cada código del paciente
+    registros = registros_paciente(indice, dni) if indice is not None else registros_desde_df(df_paciente)
+    
+    # Información básica del paciente
+    info_basica = {
+        'dni': dni,
+        'nombre': df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else 'Sin nombre',
+        'edad': df_paciente['edad_anos'].iloc[0],
+        'sexo': df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else 'No especificado',
+        'fecha_nacimiento': df_paciente['Fecha_Nacimiento_Formato'].iloc[0] if 'Fecha_Nacimiento_Formato' in df_paciente.columns else '',
+        'establecimiento': df_paciente['Establecimiento_Nombre'].iloc[0] if 'Establecimiento_Nombre' in df_paciente.columns else '',
+        'total_atenciones': len(df_paciente),
+        'fechas_atencion': sorted(df_paciente['Fecha_Atencion'].unique()) if 'Fecha_Atencion' in df_paciente.columns else []
+    }
+    
+    # Obtener funciones según curso de vida
+    if curso_vida == "Adulto (30-59 años)":
+        indicadores = INDICADORES_ADULTO
+        paquete_info = PAQUETE_INTEGRAL_ADULTO
+        verificar_paquete = verificar_paquete_adulto
+        verificar_indicador = verificar_indicador_adulto
+    elif curso_vida == "Joven (18-29 años)":
+        indicadores = INDICADORES_JOVEN
+        paquete_info = PAQUETE_INTEGRAL_JOVEN
+        verificar_paquete = verificar_paquete_joven
+        verificar_indicador = verificar_indicador_joven
+    else:  # Adulto Mayor
+        indicadores = INDICADORES_ADULTO_MAYOR
+        paquete_info = PAQUETE_INTEGRAL_ADULTO_MAYOR
+        verificar_paquete = verificar_paquete_adulto_mayor
+        verificar_indicador = verificar_indicador_adulto_mayor
+    
+    # Verificar paquete integral (solo con las columnas que usa)
+    df_paquete = df_paciente[[c for c in COLUMNAS_PAQUETE if c in df_paciente.columns]]
+    resultado_paquete = verificar_paquete(df_paquete, dni)
+    
+    # Verificar cada indicador individual
+    resultados_indicadores = {}
+    for key, info in indicadores.items():
+        if key not in INDICADORES_NO_SUPERVISADOS:
+            resultado = validar_indicador_detallado(df_paciente, key, info, curso_vida, registros)
+            resultados_indicadores[key] = resultado
+    
+    # Calcular métricas generales
+    total_indicadores = len(resultados_indicadores)
+    indicadores_completos = sum(1 for r in resultados_indicadores.values() if r['cumple'])
+    indicadores_parciales = sum(1 for r in resultados_indicadores.values() if r['parcial'])
+    indicadores_faltantes = total_indicadores - indicadores_completos - indicadores_parciales
+    
+    # Detectar errores de LAB
+    errores_lab = detectar_errores_lab(df_paciente, indicadores, registros)
+    
+    # Generar recomendaciones
+    recomendaciones = generar_recomendaciones_correccion(
+        df_paciente, resultado_paquete, resultados_indicadores, errores_lab, curso_vida
+    )
+    
+    return {
+        'info_basica': info_basica,
+        'paquete_integral': resultado_paquete,
+        'indicadores': resultados_indicadores,
+        'metricas': {
+            'total_indicadores': total_indicadores,
+            'completos': indicadores_completos,
+            'parciales': indicadores_parciales,
+            'faltantes': indicadores_faltantes,
+            'porcentaje_cumplimiento': round((indicadores_completos / total_indicadores * 100) if total_indicadores > 0 else 0, 1)
+        },
+        'errores_lab': errores_lab,
+        'recomendaciones': recomendaciones
+    }
+
+
+def validar_indicador_detallado(df_paciente, indicador_key, indicador_info, curso_vida, registros=None):
+    """
+    Valida un indicador específico y retorna información detallada
+    registros: {codigo: (tipo_dx, lab)} del paciente; se calcula si no se pasa
+    """
+    resultado = {
+        'nombre': indicador_info['nombre'],
+        'cumple': False,
+        'parcial': False,
+        'codigos_presentes': [],
+        'codigos_faltantes': [],
+        'errores_lab': [],
+        'observaciones': []
+    }
+    
+    # Obtener primer registro de cada código del paciente
+    if registros is None:
+        registros = registros_desde_df(df_paciente)
+    
+    # Verificar según tipo de indicador
+    if 'reglas' in indicador_info:
+        if isinstance(indicador_info['reglas'], list):
+            # Indicador con múltiples reglas
+            for regla in indicador_info['reglas']:
+                codigo = regla['codigo']
+                
+                if codigo in registros:
+                    tipo_dx_actual, lab_actual = registros[codigo]
+                    
+                    # Código presente, verificar LAB
+                    resultado['codigos_presentes'].append({
+                        'codigo': codigo,
+                        'descripcion': regla.get('descripcion', ''),
+                        'tipo_dx': tipo_dx_actual,
+                        'lab': lab_actual
+                    })
+                    
+                    # Validar LAB si aplica
+                    if 'lab_valores' in regla and regla['lab_valores']:
+                        # Manejar NaN como string vacío
+                        if pd.isna(lab_actual):
+                            lab_actual = ''
+                        lab_actual = str(lab_actual)
+                        
+                        # Verificar si el valor actual está en los esperados
+                        if lab_actual not in regla['lab_valores']:
+                            resultado['errores_lab'].append({
+                                'codigo': codigo,
+                                'lab_actual': lab_actual if lab_actual else '(vacío)',
+                                'lab_esperados': regla['lab_valores']
+                            })
+                else:
+                    # Código faltante
+                    resultado['codigos_faltantes'].append({
+                        'codigo': codigo,
+                        'descripcion': regla.get('descripcion', ''),
+                        'tipo_dx': regla.get('tipo_dx', 'D'),
+                        'lab_requerido': regla.get('lab_valores', [])
+                    })
+        else:
+            # Indicador con estructura compleja (ej: tamizaje VIH)
+            resultado['observaciones'].append("Indicador con validación especial")
+    
+    # Determinar estado general
+    if len(resultado['codigos_faltantes']) == 0 and len(resultado['errores_lab']) == 0:
+        resultado['cumple'] = True
+    elif len(resultado['codigos_presentes']) > 0:
+        resultado['parcial'] = True
+    
+    return resultado
+
+
+def detectar_errores_lab(df_paciente, indicadores, registros=None):
+    """
+    Detecta errores en valores LAB según las reglas de los indicadores
+    """
+    errores = []
+    
+    if registros is None:
+        registros = registros_desde_df(df_paciente)
+    
+    for key, info in indicadores.items():
+        if 'reglas' in info and isinstance(info['reglas'], list):
+            for regla in info['reglas']:
+                if 'lab_valores' in regla and regla['lab_valores']:
+                    codigo = regla['codigo']
+                    
+                    if codigo in registros:
+                        lab_actual = registros[codigo][1]
+                        # Manejar NaN como string vacío
+                        if pd.isna(lab_actual):
+                            lab_actual = ''
+                        lab_actual = str(lab_actual)
+                        
+                        # Si el valor vacío no está permitido y el actual está vacío o no está en los esperados
+                        if lab_actual not in regla['lab_valores']:
+                            errores.append({
+                                'indicador': info['nombre'],
+                                'indicador_key': key,  # Agregar la clave del indicador
+                                'codigo': codigo,
+                                'descripcion': regla.get('descripcion', ''),
+                                'lab_actual': lab_actual if lab_actual else '(vacío)',
+                                'lab_esperados': regla['lab_valores'],
+                                'lab_descripcion': regla.get('lab_descripcion', '')
+                            })
+    
+    return errores
+
+
+def generar_recomendaciones_correccion(df_paciente, resultado_paquete, resultados_indicadores, errores_lab, curso_vida):
+    """
+    Genera recomendaciones específicas de corrección con priorización del paquete integral
+    """
+    recomendaciones = []
+    
+    componentes_curso = COMPONENTES_PRIORITARIOS.get(curso_vida, {})
+    
+    # PRIMERO: Componentes del paquete integral completamente faltantes
+    for componente, cumple in resultado_paquete['componentes'].items():
+        if not cumple and componente in componentes_curso:
+            indicador_key = componentes_curso[componente]
+            if indicador_key in resultados_indicadores:
+                resultado_ind = resultados_indicadores[indicador_key]
+                # Si no tiene ningún código registrado
+                if not resultado_ind.get('codigos_presentes', []):
+                    for codigo_faltante in resultado_ind['codigos_faltantes']:
+                        recomendaciones.append({
+                            'tipo': 'paquete_integral_faltante',
+                            'prioridad': 'muy_alta',
+                            'componente': componente,
+                            'indicador': resultado_ind['nombre'],
+                            'codigo': codigo_faltante['codigo'],
+                            'descripcion': codigo_faltante['descripcion'],
+                            'mensaje': f"🚨 PAQUETE INTEGRAL - {componente}: Agregar {codigo_faltante['codigo']} - {codigo_faltante['descripcion']}",
+                            'es_paquete_integral': True
+                        })
+    
+    # SEGUNDO: Componentes del paquete integral parcialmente completos
+    for componente, cumple in resultado_paquete['componentes'].items():
+        if not cumple and componente in componentes_curso:
+            indicador_key = componentes_curso[componente]
+            if indicador_key in resultados_indicadores:
+                resultado_ind = resultados_indicadores[indicador_key]
+                # Si tiene algunos códigos pero faltan otros
+                if resultado_ind['parcial'] and resultado_ind.get('codigos_presentes', []):
+                    for codigo_faltante in resultado_ind['codigos_faltantes']:
+                        recomendaciones.append({
+                            'tipo': 'paquete_integral_parcial',
+                            'prioridad': 'alta',
+                            'componente': componente,
+                            'indicador': resultado_ind['nombre'],
+                            'codigo': codigo_faltante['codigo'],
+                            'descripcion': codigo_faltante['descripcion'],
+                            'mensaje': f"⚠️ PAQUETE INTEGRAL (Parcial) - {componente}: Completar {codigo_faltante['codigo']}",
+                            'es_paquete_integral': True
+                        })
+    
+    # TERCERO: Errores de LAB en componentes del paquete
+    for error in errores_lab:
+        es_paquete = False
+        for componente, indicador_key in componentes_curso.items():
+            if error.get('indicador_key') == indicador_key:
+                es_paquete = True
+                recomendaciones.append({
+                    'tipo': 'error_lab_paquete',
+                    'prioridad': 'alta',
+                    'componente': componente,
+                    'indicador': error['indicador'],
+                    'codigo': error['codigo'],
+                    'lab_actual': error['lab_actual'],
+                    'lab_esperados': error['lab_esperados'],
+                    'mensaje': f"🔧 PAQUETE INTEGRAL - Corregir LAB de {error['codigo']}: actual '{error['lab_actual']}', esperado: {', '.join(error['lab_esperados'])}",
+                    'es_paquete_integral': True
+                })
+                break
+    
+    # CUARTO: Otros indicadores NO prioritarios
+    indicadores_paquete = list(componentes_curso.values())
+    for key, resultado in resultados_indicadores.items():
+        if key not in indicadores_paquete and resultado['parcial']:
+            for codigo_faltante in resultado['codigos_faltantes']:
+                recomendaciones.append({
+                    'tipo': 'codigo_faltante',
+                    'prioridad': 'media',
+                    'indicador': resultado['nombre'],
+                    'codigo': codigo_faltante['codigo'],
+                    'descripcion': codigo_faltante['descripcion'],
+                    'mensaje': f"Agregar código {codigo_faltante['codigo']} para completar {resultado['nombre']}",
+                    'es_paquete_integral': False
+                })
+    
+    # QUINTO: Errores de LAB NO prioritarios
+    for error in errores_lab:
+        es_paquete = any(error.get('indicador_key') == ind_key for ind_key in indicadores_paquete)
+        if not es_paquete:
+            recomendaciones.append({
+                'tipo': 'error_lab',
+                'prioridad': 'media',
+                'indicador': error['indicador'],
+                'codigo': error['codigo'],
+                'lab_actual': error['lab_actual'],
+                'lab_esperados': error['lab_esperados'],
+                'mensaje': f"Corregir LAB de {error['codigo']}: actual '{error['lab_actual']}', esperado: {', '.join(error['lab_esperados'])}",
+                'es_paquete_integral': False
+            })
+    
+    # Ordenar por prioridad
+    prioridad_orden = {'muy_alta': 0, 'alta': 1, 'media': 2, 'baja': 3}
+    recomendaciones.sort(key=lambda x: prioridad_orden.get(x['prioridad'], 4))
+    
+    return recomendaciones
+
+
+def generar_json_correccion_individual(df_paciente, recomendaciones, curso_vida):
+    """
+    Genera un JSON de corrección para un paciente individual
+    """
+    dni = df_paciente['pac_Numero_Documento'].iloc[0]
+    edad = df_paciente['edad_anos'].iloc[0]
+    nombre = df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else ''
+    sexo = df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else ''
+    
+    diagnosticos = []
+    
+    # Agregar códigos faltantes (todos los tipos)
+    for rec in recomendaciones:
+        if rec['tipo'] in ['codigo_faltante', 'paquete_integral_faltante', 'paquete_integral_parcial']:
+            diag = {
+                "codigo": rec['codigo'],
+                "descripcion": f"{rec['codigo']} - {rec['descripcion']}",
+                "tipo": "D",
+                "tipo_original": "D",
+                "modificado": False
+            }
+            
+            # Agregar LAB si es necesario
+            if rec.get('lab_requerido') and len(rec['lab_requerido']) > 0:
+                # Usar el primer valor no vacío
+                lab_val = next((v for v in rec['lab_requerido'] if v != ""), None)
+                if lab_val:
+                    diag['lab'] = lab_val
+            
+            diagnosticos.append(diag)
+    
+    # Generar estructura JSON
+    json_data = {
+        "fecha_exportacion": datetime.now().isoformat() + 'Z',
+        "dia_his": str(datetime.now().day),
+        "fecha_atencion": datetime.now().strftime("%Y-%m-%d"),
+        "total_pacientes": 1,
+        "cambios_realizados": 0,
+        "tipo_correccion": "supervision_individual",
+        "pacientes": [{
+            "dni": dni,
+            "nombre": nombre,
+            "edad": str(edad),
+            "sexo": sexo,
+            "diagnosticos": diagnosticos
+        }]
+    }
+    
+    return json_data
+
+
+def generar_json_paquete_integral(df_paciente, recomendaciones, curso_vida):
+    """
+    Genera un JSON solo con los códigos del paquete integral prioritario
+    """
+    dni = df_paciente['pac_Numero_Documento'].iloc[0]
+    edad = df_paciente['edad_anos'].iloc[0]
+    nombre = df_paciente['Paciente_Completo'].iloc[0] if 'Paciente_Completo' in df_paciente.columns else ''
+    sexo = df_paciente['pac_Genero'].iloc[0] if 'pac_Genero' in df_paciente.columns else ''
+    
+    diagnosticos = []
+    
+    # Solo códigos del paquete integral
+    for rec in recomendaciones:
+        if rec.get('es_paquete_integral', False) and rec['tipo'] in ['paquete_integral_faltante', 'paquete_integral_parcial']:
+            diag = {
+                "codigo": rec['codigo'],
+                "descripcion": f"{rec['codigo']} - {rec['descripcion']}",
+                "tipo": "D",
+                "tipo_original": "D",
+                "modificado": False,
+                "componente": rec.get('componente', '')
+            }
+            
+            # Agregar LAB si es necesario
+            if rec.get('lab_requerido') and len(rec['lab_requerido']) > 0:
+                diag["lab"] = rec['lab_requerido'][0]
+            
+            diagnosticos.append(diag)
+    
+    json_data = {
+        "tipo_archivo": "correccion_paquete_integral",
+        "version": "2.0",
+        "fecha_generacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "establecimiento": "HOSPITAL/CENTRO",
+        "mes": datetime.now().strftime("%Y-%m"),
+        "dia_his": str(datetime.now().day),
+        "fecha_atencion": datetime.now().strftime("%Y-%m-%d"),
+        "total_pacientes": 1,
+        "cambios_realizados": 0,
+        "tipo_correccion": "paquete_integral_prioritario",
+        "curso_vida": curso_vida,
+        "pacientes": [{
+            "dni": dni,
+            "nombre": nombre,
+            "edad": str(edad),
+            "sexo": sexo,
+            "total_codigos_paquete": len(diagnosticos),
+            "diagnosticos": diagnosticos
+        }]
+    }
+    
+    return json_data
+
+
+# ---------------------------------------------------------------------------
+# Supervisión por lote
+# ---------------------------------------------------------------------------
+
+def _funciones_curso(curso_vida):
+    """(indicadores, paquete integral, verificación del paquete por lote) del curso de vida"""
+    if curso_vida == "Adulto (30-59 años)":
+        return INDICADORES_ADULTO, PAQUETE_INTEGRAL_ADULTO, verificar_paquete_lote_adulto
+    if curso_vida == "Joven (18-29 años)":
+        return INDICADORES_JOVEN, PAQUETE_INTEGRAL_JOVEN, verificar_paquete_lote_joven
+    return INDICADORES_ADULTO_MAYOR, PAQUETE_INTEGRAL_ADULTO_MAYOR, verificar_paquete_lote_adulto_mayor
+
+
+def _reglas_supervision(indicadores):
+    """
+    Las reglas que revisan validar_indicador_detallado y detectar_errores_lab,
+    en el mismo orden: lista de dicts (una por regla de los indicadores con
+    lista de reglas o una sin código para los demás, que siempre cumplen).
+    Los INDICADORES_NO_SUPERVISADOS solo aportan errores de LAB
+    (supervisado=False), como en supervisar_paciente_individual: en la
+    tabla solo quedan sus filas con error_lab.
+    """
+    reglas = []
+    for key, info in indicadores.items():
+        supervisado = key not in INDICADORES_NO_SUPERVISADOS
+        base = {'indicador': key, 'nombre_indicador': info['nombre'], 'supervisado': supervisado}
+        if 'reglas' in info and isinstance(info['reglas'], list):
+            for regla in info['reglas']:
+                reglas.append(dict(
+                    base,
+                    codigo=regla['codigo'],
+                    descripcion=regla.get('descripcion', ''),
+                    tipo_dx=regla.get('tipo_dx', 'D'),
+                    lab_valores=list(regla['lab_valores']) if regla.get('lab_valores') else []
+                ))
+        elif supervisado:
+            observacion = "Indicador con validación especial" if 'reglas' in info else ''
+            reglas.append(dict(base, codigo=None, descripcion='', tipo_dx='', lab_valores=[], observacion=observacion))
+    return reglas
+
+
+def _texto(valores):
+    """Arreglo de textos ('' en lugar de NaN)"""
+    valores = np.asarray(valores, dtype=object)
+    return np.array(['' if pd.isna(v) else str(v) for v in valores], dtype=object)
+
+
+def _unir(*partes):
+    """Concatena elemento a elemento arreglos de texto y textos fijos"""
+    resultado = ''
+    for parte in partes:
+        resultado = resultado + (parte if isinstance(parte, str) else pd.Series(parte, dtype=object))
+    return resultado.to_numpy(dtype=object)
+
+
+def _filas_paquete(lote, dnis, paquete_info, componentes):
+    """Filas de la tabla larga con el estado de cada componente y del registro del plan"""
+    completo = lote['completo'].to_numpy(dtype=bool)
+    estado_paquete = np.where(completo, 'cumple', 'faltante')
+    registro = paquete_info['registro_paquete']
+    partes = []
+    for columna in componentes + ['plan_elaborado', 'plan_ejecutado']:
+        cumple = lote[columna].to_numpy(dtype=bool)
+        if columna in ('plan_elaborado', 'plan_ejecutado'):
+            paso = registro['inicio' if columna == 'plan_elaborado' else 'fin']
+            componente = 'Plan elaborado' if columna == 'plan_elaborado' else 'Plan ejecutado'
+            codigo = paso['codigo']
+            motivo = f"Sin {paso['codigo']} ({paso['tipo_dx']}) con LAB {paso['lab']}"
+        else:
+            componente, codigo, motivo = columna, '', "Componente del paquete sin cumplir"
+        partes.append(pd.DataFrame({
+            'dni': dnis,
+            'indicador': 'paquete_integral',
+            'nombre_indicador': paquete_info.get('nombre', 'Paquete Integral'),
+            'componente': componente,
+            'estado_indicador': estado_paquete,
+            'codigo': codigo,
+            'descripcion': '',
+            'estado': np.where(cumple, 'cumple', 'faltante'),
+            'motivo': np.where(cumple, '', motivo),
+            'prioridad': '',
+            'recomendacion': ''
+        }))
+    return partes
+
+
+def _filas_reglas(dnis, reglas, primeros, lote, componentes, curso_vida):
+    """
+    Filas de la tabla larga de un bloque de DNIs: cada regla con su estado
+    (presente, faltante, error_lab), el estado del indicador y la
+    recomendación que daría generar_recomendaciones_correccion.
+    primeros: (fila del DNI en el bloque, columna del código, tipo_dx, LAB)
+    del primer registro de cada código del paciente.
+    Retorna (tabla, fila del DNI en el bloque de cada fila de la tabla).
+    """
+    n_dnis = len(dnis)
+    con_codigo = [j for j, regla in enumerate(reglas) if regla['codigo'] is not None]
+    codigos = pd.Index(list(dict.fromkeys(reglas[j]['codigo'] for j in con_codigo)))
+    columna_codigo = codigos.get_indexer([regla['codigo'] for regla in reglas])
+
+    # Primer registro por DNI × código
+    fila, columna, tipos, labs = primeros
+    presente_c = np.zeros((n_dnis, len(codigos)), dtype=bool)
+    tipo_c = np.full((n_dnis, len(codigos)), '', dtype=object)
+    lab_c = np.full((n_dnis, len(codigos)), '', dtype=object)
+    presente_c[fila, columna] = True
+    tipo_c[fila, columna] = tipos
+    lab_c[fila, columna] = labs
+
+    # Matrices DNI × regla (las reglas sin código no tienen filas presentes ni faltantes)
+    n_reglas = len(reglas)
+    presente = np.zeros((n_dnis, n_reglas), dtype=bool)
+    faltante = np.zeros((n_dnis, n_reglas), dtype=bool)
+    error = np.zeros((n_dnis, n_reglas), dtype=bool)
+    tipo = np.full((n_dnis, n_reglas), '', dtype=object)
+    lab = np.full((n_dnis, n_reglas), '', dtype=object)
+    for j in con_codigo:
+        c = columna_codigo[j]
+        presente[:, j] = presente_c[:, c]
+        faltante[:, j] = ~presente_c[:, c]
+        tipo[:, j] = tipo_c[:, c]
+        lab[:, j] = lab_c[:, c]
+        if reglas[j]['lab_valores']:
+            error[:, j] = presente[:, j] & ~np.isin(lab[:, j], reglas[j]['lab_valores'])
+
+    # Estado del indicador: las reglas de un indicador son consecutivas
+    indicadores = [regla['indicador'] for regla in reglas]
+    inicios = [j for j in range(n_reglas) if j == 0 or indicadores[j] != indicadores[j - 1]]
+    indicador_de_regla = np.cumsum([j in inicios for j in range(n_reglas)]) - 1
+    n_presentes = np.add.reduceat(presente.astype(np.int32), inicios, axis=1)[:, indicador_de_regla]
+    n_faltantes = np.add.reduceat(faltante.astype(np.int32), inicios, axis=1)[:, indicador_de_regla]
+    n_errores = np.add.reduceat(error.astype(np.int32), inicios, axis=1)[:, indicador_de_regla]
+    cumple = (n_faltantes == 0) & (n_errores == 0)
+    parcial = ~cumple & (n_presentes > 0)
+    estado_indicador = np.where(cumple, 'cumple', np.where(parcial, 'parcial', 'faltante'))
+    supervisado = np.array([regla['supervisado'] for regla in reglas])
+    estado_indicador = np.where(supervisado, estado_indicador, 'no_supervisado')
+
+    # Recomendaciones (mismas reglas y prioridades que generar_recomendaciones_correccion)
+    componentes_curso = COMPONENTES_PRIORITARIOS.get(curso_vida, {})
+    prioritarios = set(componentes_curso.values())
+    componente_lab = {}
+    for componente, key in componentes_curso.items():
+        componente_lab.setdefault(key, componente)
+    componente_paquete = {}
+    for componente in componentes:
+        if componente in componentes_curso:
+            componente_paquete.setdefault(componentes_curso[componente], componente)
+
+    es_prioritario = np.array([indicador in prioritarios for indicador in indicadores])
+    componente_sin_cumplir = np.zeros((n_dnis, n_reglas), dtype=bool)
+    for j, indicador in enumerate(indicadores):
+        if indicador in componente_paquete:
+            componente_sin_cumplir[:, j] = ~lote[componente_paquete[indicador]].to_numpy(dtype=bool)
+
+    recomendacion = np.full((n_dnis, n_reglas), '', dtype=object)
+    prioridad = np.full((n_dnis, n_reglas), '', dtype=object)
+    for mascara, tipo_recomendacion, nivel in (
+        (faltante & supervisado & ~es_prioritario & parcial, 'codigo_faltante', 'media'),
+        (error & ~es_prioritario, 'error_lab', 'media'),
+        (error & es_prioritario, 'error_lab_paquete', 'alta'),
+        (faltante & componente_sin_cumplir & parcial, 'paquete_integral_parcial', 'alta'),
+        (faltante & componente_sin_cumplir & (n_presentes == 0), 'paquete_integral_faltante', 'muy_alta')
+    ):
+        recomendacion[mascara] = tipo_recomendacion
+        prioridad[mascara] = nivel
+
+    # Motivo de cada fila
+    estado = np.where(faltante, 'faltante', np.where(error, 'error_lab', np.where(presente, 'presente', 'cumple')))
+    motivo = np.full((n_dnis, n_reglas), '', dtype=object)
+    lab_texto = np.where(lab == '', '(vacío)', lab)
+    motivo[presente] = _unir("Registrado (tipo ", tipo[presente], ", LAB '", lab_texto[presente], "')")
+    for j, regla in enumerate(reglas):
+        esperados = ', '.join(regla['lab_valores'])
+        if regla['codigo'] is None:
+            motivo[:, j] = regla['observacion']
+            continue
+        motivo[faltante[:, j], j] = f"No registrado (tipo {regla['tipo_dx']}" + (
+            f", LAB {esperados})" if esperados else ")"
+        )
+        if esperados and error[:, j].any():
+            motivo[error[:, j], j] = _unir("LAB actual '", lab_texto[error[:, j], j], f"', esperado: {esperados}")
+
+    def _por_regla(clave):
+        return np.tile(np.array([regla[clave] if regla[clave] is not None else '' for regla in reglas], dtype=object), n_dnis)
+
+    tabla = pd.DataFrame({
+        'dni': np.repeat(np.asarray(dnis, dtype=object), n_reglas),
+        'indicador': _por_regla('indicador'),
+        'nombre_indicador': _por_regla('nombre_indicador'),
+        'componente': np.tile(np.array([componente_lab.get(i, '') for i in indicadores], dtype=object), n_dnis),
+        'estado_indicador': estado_indicador.ravel(),
+        'codigo': _por_regla('codigo'),
+        'descripcion': _por_regla('descripcion'),
+        'estado': estado.ravel(),
+        'motivo': motivo.ravel(),
+        'prioridad': prioridad.ravel(),
+        'recomendacion': recomendacion.ravel()
+    })
+
+    # De los indicadores no supervisados solo se informan los errores de LAB
+    conservar = (supervisado | error).ravel()
+    return tabla[conservar], np.repeat(np.arange(n_dnis), n_reglas)[conservar]
+
+
+@perfilar('supervisión por lote')
+def supervisar_lote(df, curso_vida, indice=None, dnis=None, df_lote=None, progreso=None):
+    """
+    Supervisión detallada de todos los pacientes de df (o de los DNIs dados)
+    sin recorrer el DataFrame por paciente. Retorna una tabla larga con
+    COLUMNAS_SUPERVISION_LOTE: por DNI, una fila por componente del paquete
+    y por registro del plan (indicador 'paquete_integral') y una fila por
+    código de cada indicador con su estado (presente, faltante, error_lab),
+    el motivo y la recomendación con su prioridad (vacías si no hay nada
+    que corregir). De los INDICADORES_NO_SUPERVISADOS solo aparecen los
+    errores de LAB, con estado_indicador 'no_supervisado'. Mismo resultado
+    que supervisar_paciente_individual.
+    df_lote: resultado de verificar_paquete_integral_lote sobre df (se calcula si no se pasa)
+    progreso: función (fracción, mensaje) llamada después de cada etapa
+    """
+    indicadores, paquete_info, verificar_lote = _funciones_curso(curso_vida)
+    dnis_df = df[COLUMNA_DNI].dropna().unique()
+    dnis = pd.Index(dnis_df if dnis is None else pd.unique(pd.Series(list(dnis), dtype=object)))
+    dnis = dnis[dnis.isin(dnis_df)]
+    if df.empty or len(dnis) == 0:
+        return pd.DataFrame(columns=COLUMNAS_SUPERVISION_LOTE)
+
+    if progreso:
+        progreso(0.0, f"Supervisando {len(dnis):,} pacientes")
+    if df_lote is None:
+        df_lote = verificar_lote(df, indice)
+    componentes = componentes_de_lote(df_lote)
+    lote = df_lote.set_index(COLUMNA_DNI).reindex(dnis, fill_value=False)
+
+    # Primer registro de cada código de las reglas por paciente (una pasada)
+    reglas = _reglas_supervision(indicadores)
+    codigos = pd.Index(list(dict.fromkeys(r['codigo'] for r in reglas if r['codigo'] is not None)))
+    relevantes = df.loc[
+        df['Codigo_Item'].isin(codigos),
+        [COLUMNA_DNI, 'Codigo_Item', 'Tipo_Diagnostico', 'Valor_Lab']
+    ].drop_duplicates([COLUMNA_DNI, 'Codigo_Item'])
+    fila = dnis.get_indexer(relevantes[COLUMNA_DNI])
+    en_lote = fila >= 0
+    fila = fila[en_lote]
+    columna = codigos.get_indexer(relevantes['Codigo_Item'].to_numpy(dtype=object)[en_lote])
+    tipos = _texto(relevantes['Tipo_Diagnostico'].to_numpy(dtype=object)[en_lote])
+    labs = _texto(relevantes['Valor_Lab'].to_numpy(dtype=object)[en_lote])
+
+    partes = []
+    n_bloques = -(-len(dnis) // DNIS_POR_BLOQUE)
+    for numero, inicio in enumerate(range(0, len(dnis), DNIS_POR_BLOQUE), start=1):
+        fin = min(inicio + DNIS_POR_BLOQUE, len(dnis))
+        dnis_bloque = dnis[inicio:fin]
+        lote_bloque = lote.iloc[inicio:fin]
+        en_bloque = (fila >= inicio) & (fila < fin)
+        primeros = (fila[en_bloque] - inicio, columna[en_bloque], tipos[en_bloque], labs[en_bloque])
+
+        posicion = np.arange(inicio, fin)
+        for parte in _filas_paquete(lote_bloque, np.asarray(dnis_bloque, dtype=object), paquete_info, componentes):
+            partes.append((parte, posicion))
+        tabla_reglas, fila_reglas = _filas_reglas(dnis_bloque, reglas, primeros, lote_bloque, componentes, curso_vida)
+        partes.append((tabla_reglas, posicion[fila_reglas]))
+        if progreso:
+            progreso(numero / n_bloques, f"{fin:,} de {len(dnis):,} pacientes")
+
+    # Filas de cada paciente juntas: primero el paquete y luego los indicadores
+    tabla = pd.concat([parte for parte, _ in partes], ignore_index=True)
+    orden = np.argsort(np.concatenate([posicion for _, posicion in partes]), kind='stable')
+    return tabla.iloc[orden].reset_index(drop=True)[COLUMNAS_SUPERVISION_LOTE]
+
+
+def resumen_supervision_lote(tabla):
+    """Totales de la tabla de supervisar_lote: pacientes, paquetes completos, faltantes, errores LAB y recomendaciones por prioridad"""
+    paquete = tabla[tabla['indicador'] == 'paquete_integral'].drop_duplicates('dni')
+    codigos = tabla[tabla['indicador'] != 'paquete_integral']
+    recomendaciones = tabla[tabla['prioridad'] != '']
+    return {
+        'pacientes': int(tabla['dni'].nunique()),
+        'paquete_completo': int((paquete['estado_indicador'] == 'cumple').sum()),
+        'codigos_faltantes': int((codigos['estado'] == 'faltante').sum()),
+        'errores_lab': int((codigos['estado'] == 'error_lab').sum()),
+        'recomendaciones': {nivel: int(n) for nivel, n in recomendaciones['prioridad'].value_counts().items()}
+    }
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tablero de Indicadores en una Sola Pasada
+Sistema HISMINSA - Supervisión de Indicadores
+
+Evalúa todos los indicadores de uno o de los tres cursos de vida sin filtrar
+el DataFrame por indicador: con el índice de presencia cada predicado se
+evalúa una vez sobre las claves distintas, cada banda de edad/género es una
+máscara por fila y las banderas por DNI se arman con esos arreglos. Las
+expresiones son las mismas que usa verificar_cumplimiento_indicador
+(expresion_indicador de cada módulo). El indicador resumen del paquete
+integral (es_paquete) se arma con las banderas de sus componentes; los
+indicadores sin expresión se calculan con calcular_estadisticas_indicador.
+"""
+
+import numpy as np
+import pandas as pd
+
+from indicadores_adulto import (
+    INDICADORES_ADULTO,
+    PAQUETE_INTEGRAL_ADULTO,
+    expresion_indicador as expresion_adulto,
+    calcular_estadisticas_indicador as calcular_stats_adulto,
+    clasificar_cumplimiento
+)
+from indicadores_joven import (
+    INDICADORES_JOVEN,
+    PAQUETE_INTEGRAL_JOVEN,
+    expresion_indicador as expresion_joven,
+    calcular_estadisticas_indicador as calcular_stats_joven
+)
+from indicadores_adulto_mayor import (
+    INDICADORES_ADULTO_MAYOR,
+    PAQUETE_INTEGRAL_ADULTO_MAYOR,
+    expresion_indicador as expresion_adulto_mayor,
+    calcular_estadisticas_indicador as calcular_stats_adulto_mayor
+)
+from indice_presencia import construir_indice_presencia, restringir_indice, mascara_filas
+from motor_cumplimiento import crear_predicado, etiqueta_predicado, evaluar_con_cortocircuito
+from denominadores import banda_indicador, bandas_indicadores, precalcular_denominadores
+from perfilado import perfilar
+from evaluacion_compartida import ambito, reutilizar, registrar_consulta
+
+# Curso de vida -> (indicadores, expresión por clave, estadísticas por clave, paquete integral)
+CURSOS_VIDA = {
+    "Adulto (30-59 años)": (
+        INDICADORES_ADULTO, expresion_adulto, calcular_stats_adulto, PAQUETE_INTEGRAL_ADULTO
+    ),
+    "Joven (18-29 años)": (
+        INDICADORES_JOVEN, expresion_joven, calcular_stats_joven, PAQUETE_INTEGRAL_JOVEN
+    ),
+    "Adulto Mayor (60+ años)": (
+        INDICADORES_ADULTO_MAYOR, expresion_adulto_mayor, calcular_stats_adulto_mayor, PAQUETE_INTEGRAL_ADULTO_MAYOR
+    )
+}
+
+COLUMNAS_TABLERO = ['curso_vida', 'clave', 'indicador', 'numerador', 'denominador',
+                    'porcentaje', 'meta', 'brecha', 'clasificacion']
+
+# Agrupaciones de las matrices de cumplimiento
+AGRUPACIONES = ('Establecimiento', 'Profesional', 'Mes')
+
+
+def _estadisticas(indicador, numerador, denominador):
+    """Mismas cuentas que calcular_estadisticas_indicador"""
+    porcentaje = (numerador / denominador * 100) if denominador > 0 else 0
+    return {
+        'indicador': indicador['nombre'],
+        'numerador': numerador,
+        'denominador': denominador,
+        'porcentaje': round(porcentaje, 2),
+        'meta': indicador['meta'],
+        'brecha': round(indicador['meta'] - porcentaje, 2),
+        'clasificacion': clasificar_cumplimiento(porcentaje)
+    }
+
+
+def interseccion_bandas(banda, otra):
+    """Filas que están en ambas bandas (edad_min > edad_max si no hay ninguna)"""
+    genero = banda[2] if banda[2] is not None else otra[2]
+    if banda[2] is not None and otra[2] is not None and banda[2] != otra[2]:
+        return (1, 0, None)
+    return (max(banda[0], otra[0]), min(banda[1], otra[1]), genero)
+
+
+def _contexto(df, indice, fila_unidad, n_unidades):
+    """
+    Estado de una pasada: unidades por fila (DNI o par grupo-DNI, -1 sin
+    unidad) y cachés de filas por banda, filas por predicado y banderas.
+    """
+    return {
+        'df': df,
+        'indice': indice,
+        'fila_unidad': fila_unidad,
+        'n_unidades': n_unidades,
+        'con_unidad': fila_unidad >= 0,
+        'edades': df['edad_anos'].to_numpy(dtype=float),
+        'generos': df['pac_Genero'].to_numpy(dtype=object),
+        'alcance': ambito(df),
+        'filas_banda': {},
+        'filas_predicado': {},
+        'banderas': {}
+    }
+
+
+def _filas_banda(contexto, banda):
+    """Máscara de filas (con unidad) dentro de la banda de edad/género"""
+    if banda not in contexto['filas_banda']:
+        edad_min, edad_max, genero = banda
+        edades = contexto['edades']
+        mascara = contexto['con_unidad'] & (edades >= edad_min) & (edades <= edad_max)
+        if genero is not None:
+            mascara &= contexto['generos'] == genero
+        contexto['filas_banda'][banda] = mascara
+    return contexto['filas_banda'][banda]
+
+
+def _marcar(contexto, filas):
+    """Arreglo booleano por unidad: True si alguna de las filas le pertenece"""
+    flags = np.zeros(contexto['n_unidades'], dtype=bool)
+    flags[contexto['fila_unidad'][filas]] = True
+    return flags
+
+
+def _banderas(contexto, banda, predicado):
+    """Unidades con alguna fila de la banda que cumple el predicado"""
+    clave = (banda, predicado)
+    if clave in contexto['banderas']:
+        registrar_consulta(etiqueta_predicado(predicado), evaluada=False)
+    else:
+        if predicado not in contexto['filas_predicado']:
+            # Misma máscara que filtrar_filas sobre df: se comparte con la sesión de evaluación
+            contexto['filas_predicado'][predicado] = reutilizar(
+                contexto['alcance'], ('filas', predicado),
+                lambda: mascara_filas(contexto['indice'], predicado, contexto['df']),
+                etiqueta_predicado(predicado)
+            )
+        contexto['banderas'][clave] = _marcar(
+            contexto, _filas_banda(contexto, banda) & contexto['filas_predicado'][predicado]
+        )
+    return contexto['banderas'][clave]
+
+
+def _cumple(contexto, banda, expresion):
+    """Evalúa la expresión por unidad dentro de la banda (con cortocircuito)"""
+    return evaluar_con_cortocircuito(
+        expresion, lambda predicado: _banderas(contexto, banda, predicado), contexto['n_unidades']
+    )
+
+
+def _cumple_paquete(contexto, banda, paquete, indicadores, expresion_indicador):
+    """Paquete completo: componentes dentro de la banda del paquete y la suya + plan ejecutado"""
+    cumple = None
+    for componente in paquete['componentes_minimos']:
+        expresion = expresion_indicador(componente['indicador'])
+        if expresion is None:
+            return None
+        banda_componente = interseccion_bandas(banda, banda_indicador(indicadores[componente['indicador']]))
+        valor = _cumple(contexto, banda_componente, expresion)
+        cumple = valor.copy() if cumple is None else cumple & valor
+    fin = paquete['registro_paquete']['fin']
+    ejecutado = _cumple(contexto, banda, crear_predicado(fin['codigo'], fin['tipo_dx'], [fin['lab']]))
+    return ejecutado if cumple is None else cumple & ejecutado
+
+
+def _cumplimiento(contexto, curso, clave):
+    """Arreglo booleano por unidad del indicador, o None si no tiene expresión"""
+    indicadores, expresion_indicador, _, paquete = CURSOS_VIDA[curso]
+    indicador = indicadores[clave]
+    banda = banda_indicador(indicador)
+    if indicador.get('es_paquete'):
+        return _cumple_paquete(contexto, banda, paquete, indicadores, expresion_indicador)
+    expresion = expresion_indicador(clave)
+    return _cumple(contexto, banda, expresion) if expresion is not None else None
+
+
+@perfilar('tablero de indicadores')
+def evaluar_tablero(df, cursos=None, indice=None, denominadores=None):
+    """
+    Numerador, denominador, %, meta, brecha y clasificación de todos los
+    indicadores de los cursos de vida (todos si cursos es None).
+    Retorna un DataFrame con COLUMNAS_TABLERO, una fila por indicador.
+    """
+    cursos = list(CURSOS_VIDA) if cursos is None else list(cursos)
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_TABLERO)
+
+    indice = restringir_indice(indice, df) if indice is not None else construir_indice_presencia(df)
+    denominadores = precalcular_denominadores(
+        df, bandas_indicadores(*[CURSOS_VIDA[curso][0] for curso in cursos]), denominadores
+    )
+    contexto = _contexto(df, indice, indice['fila_dni'], len(indice['dnis']))
+
+    resultados = []
+    for curso in cursos:
+        indicadores, _, calcular_estadisticas, _ = CURSOS_VIDA[curso]
+        for clave, indicador in indicadores.items():
+            cumple = _cumplimiento(contexto, curso, clave)
+            if cumple is None:
+                estadisticas = calcular_estadisticas(df, clave, indice=indice, denominadores=denominadores)
+            else:
+                banda = banda_indicador(indicador)
+                estadisticas = _estadisticas(indicador, int(cumple.sum()), len(denominadores['bandas'][banda]))
+            resultados.append({'curso_vida': curso, 'clave': clave, **estadisticas})
+
+    return pd.DataFrame(resultados, columns=COLUMNAS_TABLERO)
+
+
+@perfilar('cumplimiento por grupo')
+def evaluar_por_grupo(df, grupos, cursos=None, indice=None):
+    """
+    Cumplimiento de cada indicador por grupo (establecimiento, profesional,
+    mes...): el mismo resultado que calcular_estadisticas_indicador sobre las
+    filas de cada grupo. grupos es una Serie alineada con df (nulos sin grupo).
+    La unidad es el par (grupo, DNI), así que todos los grupos salen de una
+    sola pasada. Retorna un DataFrame largo: grupo + COLUMNAS_TABLERO.
+    """
+    cursos = list(CURSOS_VIDA) if cursos is None else list(cursos)
+    columnas = ['grupo'] + COLUMNAS_TABLERO
+    if df.empty:
+        return pd.DataFrame(columns=columnas)
+
+    indice = restringir_indice(indice, df) if indice is not None else construir_indice_presencia(df)
+
+    # Unidad = par (grupo, DNI) de cada fila
+    fila_grupo, valores_grupo = pd.factorize(grupos, sort=True)
+    fila_dni = indice['fila_dni']
+    validas = (fila_grupo >= 0) & (fila_dni >= 0)
+    pares = fila_grupo[validas].astype(np.int64) * len(indice['dnis']) + fila_dni[validas]
+    pares_unicos, codigos_par = np.unique(pares, return_inverse=True)
+    fila_unidad = np.full(len(df), -1, dtype=np.int64)
+    fila_unidad[validas] = codigos_par
+    grupo_unidad = pares_unicos // len(indice['dnis'])
+    n_grupos = len(valores_grupo)
+
+    contexto = _contexto(df, indice, fila_unidad, len(pares_unicos))
+
+    def _por_grupo(flags):
+        return np.bincount(grupo_unidad[flags], minlength=n_grupos)
+
+    resultados = []
+    for curso in cursos:
+        indicadores, _, calcular_estadisticas, _ = CURSOS_VIDA[curso]
+        for clave, indicador in indicadores.items():
+            cumple = _cumplimiento(contexto, curso, clave)
+            if cumple is None:
+                # Indicador sin expresión: se calcula grupo por grupo
+                for g, valor in enumerate(valores_grupo):
+                    estadisticas = calcular_estadisticas(df[fila_grupo == g], clave)
+                    resultados.append({'grupo': valor, 'curso_vida': curso, 'clave': clave, **estadisticas})
+                continue
+
+            banda = banda_indicador(indicador)
+            numeradores = _por_grupo(cumple)
+            denominadores = _por_grupo(_marcar(contexto, _filas_banda(contexto, banda)))
+            for g, valor in enumerate(valores_grupo):
+                resultados.append({
+                    'grupo': valor, 'curso_vida': curso, 'clave': clave,
+                    **_estadisticas(indicador, int(numeradores[g]), int(denominadores[g]))
+                })
+
+    return pd.DataFrame(resultados, columns=columnas)
+
+
+def grupos_de(df, agrupacion):
+    """Serie alineada con df con el grupo de cada fila para evaluar_por_grupo"""
+    if agrupacion == 'Establecimiento':
+        return df['Id_Establecimiento']
+    if agrupacion == 'Profesional':
+        return df['Personal_Completo']
+    return df['Fecha_Atencion'].dt.to_period('M')
+
+
+def etiquetar_grupos(df_grupos, agrupacion, catalogo=None):
+    """Etiquetas legibles: "código - nombre" del establecimiento (del catálogo) y el resto como texto"""
+    if agrupacion == 'Establecimiento' and catalogo is not None:
+        nombres_estab = {opcion.split(' - ')[0]: opcion for opcion in catalogo['establecimientos'][1:]}
+        df_grupos['grupo'] = [nombres_estab.get(str(g).strip(), str(g)) for g in df_grupos['grupo']]
+    else:
+        df_grupos['grupo'] = df_grupos['grupo'].astype(str)
+    return df_grupos
+
+
+def matriz_cumplimiento(df_grupos, valor='porcentaje'):
+    """
+    Matriz grupo × indicador (pivote del resultado de evaluar_por_grupo).
+    Con varios cursos de vida la columna lleva el curso delante del indicador.
+    """
+    columna = df_grupos['indicador']
+    if df_grupos['curso_vida'].nunique() > 1:
+        columna = df_grupos['curso_vida'].str.split(' (', regex=False).str[0] + ' - ' + columna
+    return df_grupos.assign(columna=columna).pivot_table(
+        index='grupo', columns='columna', values=valor, aggfunc='first', sort=False
+    ).rename_axis(columns=None)
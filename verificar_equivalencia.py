@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificación de Equivalencia de los Planes Compilados
+Sistema HISMINSA - Supervisión de Indicadores
+
+Compara, sobre datos sintéticos (el generador de benchmark_hisminsa.py), los
+planes compilados de los tres cursos de vida con una verificación de
+referencia escrita como la original: pandas simple, una regla a la vez,
+leyendo las reglas directamente de INDICADORES_* (sin motor_cumplimiento,
+compilador_indicadores ni índice de presencia). Revisa:
+  - cada verificar_cumplimiento_indicador, sin y con índice de presencia y
+    sin y con rango de fechas: mismas filas que la referencia
+  - verificar_paquete_integral_lote frente a verificar_paquete_integral por
+    DNI (componentes, plan elaborado/ejecutado y completo) en una muestra
+Si se cambia un diccionario de indicadores o una expresión y el plan deja de
+coincidir con la regla, el script lista las diferencias y termina con código 1.
+
+Uso:
+    python verificar_equivalencia.py [--filas 20000] [--atenciones-por-paciente 12]
+                                     [--muestra-dni 200] [--semilla 0]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from indicadores_adulto import (
+    INDICADORES_ADULTO,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto,
+    verificar_paquete_integral as verificar_paquete_adulto,
+    verificar_paquete_integral_lote as verificar_lote_adulto
+)
+from indicadores_joven import (
+    INDICADORES_JOVEN,
+    verificar_cumplimiento_indicador as verificar_indicador_joven,
+    verificar_paquete_integral as verificar_paquete_joven,
+    verificar_paquete_integral_lote as verificar_lote_joven
+)
+from indicadores_adulto_mayor import (
+    INDICADORES_ADULTO_MAYOR,
+    verificar_cumplimiento_indicador as verificar_indicador_adulto_mayor,
+    verificar_paquete_integral as verificar_paquete_adulto_mayor,
+    verificar_paquete_integral_lote as verificar_lote_adulto_mayor
+)
+from carga_consolidados import leer_maestros, HILOS_POR_DEFECTO
+from indice_presencia import restringir_indice
+from procesamiento import procesar_conjunto
+from benchmark_hisminsa import escribir_datos
+
+# Métodos anticonceptivos de acceso_anticonceptivos (joven)
+METODOS_ANTICONCEPTIVOS = ["58300", "58300.01", "11975", "99208.05", "99208.04",
+                           "99208.02", "99208.06", "99208.13", "99208.12", "99208.11",
+                           "99208.07", "99208.08", "99208.09", "58611", "58605", "55250"]
+
+# Tamizajes obligatorios de tamizaje_salud_mental (adulto mayor)
+TAMIZAJES_SALUD_MENTAL = ['96150.01', '96150.03', '96150.04', '96150.02', '96150.07']
+
+
+# ==============================================================================
+# VERIFICACIÓN DE REFERENCIA
+# ==============================================================================
+
+def regla(codigo, tipo_dx='D', lab_valores=None):
+    """Regla con el formato de INDICADORES_* (para los flujos especiales)"""
+    return {'codigo': codigo, 'tipo_dx': tipo_dx, 'lab_valores': lab_valores}
+
+
+def filas_regla(df, regla, lab_con_vacios=True, con_edad=False):
+    """
+    Filas de df que cumplen una regla: código y tipo_dx (o uno de la lista),
+    LAB entre los valores de la regla ("" acepta también el LAB vacío si
+    lab_con_vacios) y, con con_edad, el rango de edad propio de la regla.
+    """
+    codigos = regla['codigo'] if isinstance(regla['codigo'], list) else [regla['codigo']]
+    tipos = regla['tipo_dx'] if isinstance(regla['tipo_dx'], list) else [regla['tipo_dx']]
+    mascara = df['Codigo_Item'].isin(codigos) & df['Tipo_Diagnostico'].isin(tipos)
+
+    if regla.get('lab_valores'):
+        lab = df['Valor_Lab'].isin(regla['lab_valores'])
+        if lab_con_vacios and "" in regla['lab_valores']:
+            lab = lab | df['Valor_Lab'].isna()
+        mascara &= lab
+
+    if con_edad and 'edad_min' in regla:
+        mascara &= (df['edad_anos'] >= regla['edad_min']) & (df['edad_anos'] <= regla['edad_max'])
+    return df[mascara]
+
+
+def dnis_regla(df, regla, **opciones):
+    """DNIs con al menos una fila que cumple la regla"""
+    return set(filas_regla(df, regla, **opciones)['pac_Numero_Documento'].unique())
+
+
+def dnis_todas(df, reglas):
+    """DNIs que cumplen todas las reglas"""
+    return set.intersection(*[dnis_regla(df, r) for r in reglas])
+
+
+def filas_banda(df, indicador, fecha_inicio=None, fecha_fin=None):
+    """Filas en el rango de edad (y género, si aplica) del indicador y, si se dan, en las fechas"""
+    df_edad = df[(df['edad_anos'] >= indicador['edad_min']) & (df['edad_anos'] <= indicador['edad_max'])]
+    if 'genero' in indicador:
+        df_edad = df_edad[df_edad['pac_Genero'] == indicador['genero']]
+    if fecha_inicio and fecha_fin:
+        df_edad = df_edad[(df_edad['Fecha_Atencion'] >= fecha_inicio) & (df_edad['Fecha_Atencion'] <= fecha_fin)]
+    return df_edad
+
+
+def referencia_adulto(df, clave):
+    """Filas (regla simple) o DNIs que cumplen un indicador de adulto dentro de su banda"""
+    indicador = INDICADORES_ADULTO[clave]
+    if clave == "tamizaje_vih":
+        prueba = dnis_regla(df, regla('86318.01')) | dnis_regla(df, regla(['86703.01', '86703.02']))
+        return dnis_regla(df, regla('99401.33')) & prueba & dnis_regla(df, regla(['99401.34', '99403.03']))
+    elif indicador.get('requiere_ambos'):
+        return dnis_todas(df, indicador['reglas'])
+    elif indicador.get('requiere_uno'):
+        return set().union(*[dnis_regla(df, r, lab_con_vacios=False, con_edad=True) for r in indicador['reglas']])
+    return filas_regla(df, indicador['reglas'][0])
+
+
+def referencia_joven(df, clave):
+    """Filas (regla simple) o DNIs que cumplen un indicador de joven dentro de su banda"""
+    indicador = INDICADORES_JOVEN[clave]
+    if clave == "tamizaje_vih":
+        prueba = dnis_regla(df, regla('86318.01')) | dnis_regla(df, regla('86703.01'))
+        return dnis_regla(df, regla('99401.33')) & prueba & dnis_regla(df, regla(['99401.34', '99403.03']))
+    elif clave == "acceso_anticonceptivos":
+        return dnis_todas(df, [regla('99208'), regla(METODOS_ANTICONCEPTIVOS), regla('99208.14', 'D', ['RSM', 'RSR', 'RSA'])])
+    elif indicador.get('requiere_ambos') or indicador.get('requiere_todos'):
+        return dnis_todas(df, indicador['reglas'])
+
+    primera = indicador['reglas'][0]
+    df_codigo = filas_regla(df, primera)
+    if 'condicion' in primera:
+        df_codigo = df_codigo[df_codigo['Condicion_Establecimiento'].isin(primera['condicion'])]
+    return df_codigo
+
+
+def referencia_adulto_mayor(df, clave):
+    """Filas (regla simple) o DNIs que cumplen un indicador de adulto mayor dentro de su banda"""
+    indicador = INDICADORES_ADULTO_MAYOR[clave]
+    if clave == "vacam":
+        clasificacion = ['AS', 'E', 'AF', 'GC']
+        vacam = dnis_regla(df, regla('99387', 'D', clasificacion)) | dnis_regla(df, regla('99215.03', 'D', clasificacion))
+        return vacam & dnis_regla(df, regla('99401'))
+    elif clave == "agudeza_visual":
+        return dnis_regla(df, regla('99173')) | dnis_todas(df, [regla('Z010', 'D', ['N', 'A']), regla('99173')])
+    elif clave == "tamizaje_salud_mental":
+        tamizajes = [regla(codigo, 'D', ['', 'G', 'TPE', 'JUD']) for codigo in TAMIZAJES_SALUD_MENTAL]
+        return dnis_todas(df, tamizajes + [regla('99402.09')])
+    elif clave == "valoracion_clinica_lab":
+        return dnis_todas(df, [regla('Z019', 'D', ['DNT']), regla('Z017'), regla('99401.13')])
+    elif clave == "paquete_atencion_integral":
+        # Paquete completo, verificado DNI por DNI
+        return {dni for dni in df['pac_Numero_Documento'].unique()
+                if verificar_paquete_adulto_mayor(df, dni)['completo']}
+    elif indicador.get('requiere_todos'):
+        return dnis_todas(df, indicador['reglas'])
+    return filas_regla(df, indicador['reglas'][0])
+
+
+# Curso de vida -> (indicadores, referencia, verificar_cumplimiento_indicador,
+#                   verificar_paquete_integral, verificar_paquete_integral_lote, rango de edad)
+CURSOS_EQUIVALENCIA = {
+    "Adulto (30-59 años)": (
+        INDICADORES_ADULTO, referencia_adulto, verificar_indicador_adulto,
+        verificar_paquete_adulto, verificar_lote_adulto, (30, 59)
+    ),
+    "Joven (18-29 años)": (
+        INDICADORES_JOVEN, referencia_joven, verificar_indicador_joven,
+        verificar_paquete_joven, verificar_lote_joven, (18, 29)
+    ),
+    "Adulto Mayor (60+ años)": (
+        INDICADORES_ADULTO_MAYOR, referencia_adulto_mayor, verificar_indicador_adulto_mayor,
+        verificar_paquete_adulto_mayor, verificar_lote_adulto_mayor, (60, 150)
+    )
+}
+
+
+# ==============================================================================
+# COMPARACIÓN
+# ==============================================================================
+
+def comparar_indicadores(df, indice, fechas):
+    """
+    Diferencias entre cada verificar_cumplimiento_indicador y la referencia
+    (lista de textos) y pacientes que cumplen cada indicador según la referencia.
+    """
+    diferencias = []
+    cumplen = {}
+    for curso, (indicadores, referencia, verificar_indicador, _, _, _) in CURSOS_EQUIVALENCIA.items():
+        for clave, indicador in indicadores.items():
+            for etiqueta_fechas, (fecha_inicio, fecha_fin) in fechas.items():
+                df_banda = filas_banda(df, indicador, fecha_inicio, fecha_fin)
+                esperado = referencia(df_banda, clave)
+                if isinstance(esperado, set):
+                    esperado = df_banda[df_banda['pac_Numero_Documento'].isin(list(esperado))]
+                if etiqueta_fechas == 'sin fechas':
+                    cumplen[(curso, clave)] = esperado['pac_Numero_Documento'].nunique()
+
+                for etiqueta_indice, indice_usado in (('sin índice', None), ('con índice', indice)):
+                    obtenido = verificar_indicador(df, clave, fecha_inicio, fecha_fin, indice=indice_usado)
+                    faltan = esperado.index.difference(obtenido.index)
+                    sobran = obtenido.index.difference(esperado.index)
+                    if len(faltan) or len(sobran):
+                        diferencias.append(
+                            f"{curso} / {clave} ({etiqueta_fechas}, {etiqueta_indice}): "
+                            f"{len(faltan)} filas faltan y {len(sobran)} sobran frente a la referencia"
+                        )
+    return diferencias, cumplen
+
+
+def comparar_paquetes(df, indice, muestra_dni, rng):
+    """Diferencias entre verificar_paquete_integral_lote y verificar_paquete_integral por DNI (muestra)"""
+    diferencias = []
+    for curso, (_, _, _, verificar_paquete, verificar_lote, (edad_min, edad_max)) in CURSOS_EQUIVALENCIA.items():
+        df_curso = df[(df['edad_anos'] >= edad_min) & (df['edad_anos'] <= edad_max)]
+        lote = verificar_lote(df_curso, restringir_indice(indice, df_curso)).set_index('pac_Numero_Documento')
+        dnis = lote.index.to_numpy()
+        muestra = rng.choice(dnis, min(muestra_dni, len(dnis)), replace=False) if len(dnis) else []
+
+        for dni in muestra:
+            individual = verificar_paquete(df_curso, dni)
+            esperado = dict(individual['componentes'])
+            for columna in ('plan_elaborado', 'plan_ejecutado', 'completo'):
+                esperado[columna] = individual[columna]
+            distintos = [columna for columna, valor in esperado.items() if bool(lote.at[dni, columna]) != bool(valor)]
+            if distintos:
+                diferencias.append(f"{curso} / paquete integral DNI {dni}: difiere en {', '.join(distintos)}")
+    return diferencias
+
+
+def cargar_sinteticos(args):
+    """Genera y procesa los datos sintéticos; retorna (df_completo, índice de presencia)"""
+    descripciones = {'cie10': {}, 'estab': {}, 'ups': {}, 'etnia': {}}
+    with tempfile.TemporaryDirectory() as carpeta:
+        carpeta_consolidados = escribir_datos(carpeta, args.filas, args.atenciones_por_paciente, args.dias,
+                                              args.fraccion_indicadores, args.semilla)
+        df_pacientes, df_personal, df_registradores = leer_maestros(carpeta)
+        archivos = []
+        for nombre in sorted(os.listdir(carpeta_consolidados)):
+            with open(os.path.join(carpeta_consolidados, nombre), 'rb') as f:
+                archivos.append((nombre, f.read()))
+
+    carga = procesar_conjunto(archivos, df_pacientes, df_personal, df_registradores, descripciones,
+                              n_hilos=args.hilos, usar_cache=False, compartir=False)
+    return carga['df_completo'], carga['indice_presencia']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equivalencia de los planes compilados con la verificación por reglas")
+    parser.add_argument('--filas', type=int, default=20_000)
+    parser.add_argument('--atenciones-por-paciente', type=float, default=12.0,
+                        help="Más atenciones por paciente dan más pacientes que cumplen indicadores de varios códigos")
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--fraccion-indicadores', type=float, default=0.9)
+    parser.add_argument('--muestra-dni', type=int, default=200,
+                        help="DNIs por curso de vida para comparar el paquete integral por DNI")
+    parser.add_argument('--hilos', type=int, default=HILOS_POR_DEFECTO)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    df, indice = cargar_sinteticos(args)
+    print(f"📦 {len(df):,} filas sintéticas, {df['pac_Numero_Documento'].nunique():,} pacientes")
+
+    # Sin fechas y con los primeros diez días del periodo
+    fecha_inicio = df['Fecha_Atencion'].min()
+    fechas = {
+        'sin fechas': (None, None),
+        'primeros 10 días': (fecha_inicio, fecha_inicio + pd.Timedelta(days=9))
+    }
+    diferencias, cumplen = comparar_indicadores(df, indice, fechas)
+    diferencias += comparar_paquetes(df, indice, args.muestra_dni, np.random.default_rng(args.semilla))
+
+    sin_casos = [f"{curso} / {clave}" for (curso, clave), n in cumplen.items() if n == 0]
+    print(f"🔎 {len(cumplen)} indicadores comparados ({len(cumplen) - len(sin_casos)} con pacientes que cumplen)")
+    if sin_casos:
+        print(f"⚠️  Sin pacientes que cumplan en los datos sintéticos: {', '.join(sin_casos)}")
+
+    if diferencias:
+        print(f"\n❌ {len(diferencias)} diferencias con la verificación de referencia:")
+        for diferencia in diferencias:
+            print(f"   {diferencia}")
+        return 1
+    print("✅ Los planes compilados coinciden con la verificación de referencia")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())